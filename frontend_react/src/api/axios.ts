@@ -2,6 +2,12 @@ import axios, { type AxiosInstance, type AxiosError, type AxiosRequestConfig, ty
 
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 export const BACKEND_URL = API_URL;
+
+// Handshake de Socket.IO: cookie HttpOnly + JWT. El backend une el socket a los rooms de su tenant/usuario.
+export const socketAuthOptions = () => ({
+  withCredentials: true,
+  auth: { token: localStorage.getItem('JWT_TOKEN') || undefined },
+});
 const MAX_RETRIES = 3;
 const BASE_DELAY = 1000;
 
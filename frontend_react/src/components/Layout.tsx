@@ -4,7 +4,7 @@ import { Sidebar } from './Sidebar';
 import { useAuth } from '../context/AuthContext';
 import { useTranslation } from '../context/LanguageContext';
 import { io, Socket } from 'socket.io-client';
-import { BACKEND_URL } from '../api/axios';
+import { BACKEND_URL, socketAuthOptions } from '../api/axios';
 import { AlertCircle, X, HelpCircle } from 'lucide-react';
 import NotificationBell from './NotificationBell';
 import OnboardingGuide from './OnboardingGuide';
@@ -71,7 +71,7 @@ export const Layout: React.FC<LayoutProps> = ({ children }) => {
     // Conectar socket si no existe
     if (!socketRef.current) {
       // Connect to root namespace (matching ChatsView.tsx logic)
-      socketRef.current = io(BACKEND_URL);
+      socketRef.current = io(BACKEND_URL, socketAuthOptions());
     }
 
     // Listener
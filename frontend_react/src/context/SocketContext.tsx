@@ -1,6 +1,6 @@
 import React, { createContext, useContext, useEffect, useRef, useState, ReactNode } from 'react';
 import { io, Socket } from 'socket.io-client';
-import { BACKEND_URL } from '../api/axios';
+import { BACKEND_URL, socketAuthOptions } from '../api/axios';
 import { useAuth } from './AuthContext';
 
 interface SocketContextType {
@@ -36,6 +36,7 @@ export const SocketProvider: React.FC<SocketProviderProps> = ({
     try {
       // Conectar al servidor Socket.IO
       socketRef.current = io(BACKEND_URL, {
+        ...socketAuthOptions(),
         transports: ['websocket', 'polling'],
         reconnection: true,
         reconnectionAttempts: 5,
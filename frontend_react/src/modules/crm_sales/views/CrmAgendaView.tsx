@@ -5,7 +5,7 @@ import interactionPlugin from '@fullcalendar/interaction';
 import timeGridPlugin from '@fullcalendar/timegrid';
 import { RefreshCw, User } from 'lucide-react';
 import { io } from 'socket.io-client';
-import api, { BACKEND_URL } from '../../../api/axios';
+import api, { BACKEND_URL, socketAuthOptions } from '../../../api/axios';
 import { useAuth } from '../../../context/AuthContext';
 import { useTranslation } from '../../../context/LanguageContext';
 import AgendaEventForm, { type AgendaEventFormData, type SellerOption } from '../components/AgendaEventForm';
@@ -151,7 +151,7 @@ export default function CrmAgendaView() {
 
   // Socket.IO real-time sync
   useEffect(() => {
-    const socket = io(BACKEND_URL, { reconnection: true, reconnectionDelay: 1000 });
+    const socket = io(BACKEND_URL, { ...socketAuthOptions(), reconnection: true, reconnectionDelay: 1000 });
 
     socket.on('NEW_APPOINTMENT', () => refetchCurrentRange());
     socket.on('APPOINTMENT_UPDATED', () => refetchCurrentRange());
@@ -1,7 +1,7 @@
 import { useState, useEffect, useCallback, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { Users, Clock, DollarSign, User, GripVertical, RefreshCw, Filter, LayoutGrid, List } from 'lucide-react';
-import api, { BACKEND_URL } from '../../../api/axios';
+import api, { BACKEND_URL, socketAuthOptions } from '../../../api/axios';
 import { parseTags } from '../../../utils/parseTags';
 import PageHeader from '../../../components/PageHeader';
 import { useTranslation } from '../../../context/LanguageContext';
@@ -73,7 +73,7 @@ export default function KanbanPipelineView() {
   // WebSocket: real-time pipeline updates
   useEffect(() => {
     const wsUrl = BACKEND_URL.replace(/^http/, 'ws').replace(/\/+$/, '');
-    const socket = io(wsUrl, { transports: ['websocket', 'polling'], reconnection: true });
+    const socket = io(wsUrl, { ...socketAuthOptions(), transports: ['websocket', 'polling'], reconnection: true });
     socketRef.current = socket;
 
     // Lead status changed (by AI agent, another user, or API)
@@ -1,7 +1,7 @@
 import { useState, useEffect, useRef, useMemo } from 'react';
 import { Eye, MessageSquare, ShieldAlert, Zap, Clock, User, Bot, Monitor, Phone, Filter } from 'lucide-react';
 import { io, Socket } from 'socket.io-client';
-import api, { BACKEND_URL } from '../../../api/axios';
+import api, { BACKEND_URL, socketAuthOptions } from '../../../api/axios';
 import { useAuth } from '../../../context/AuthContext';
 import PageHeader from '../../../components/PageHeader';
 import GlassCard, { CARD_IMAGES } from '../../../components/GlassCard';
@@ -59,7 +59,7 @@ export default function SupervisorDashboard() {
 
   useEffect(() => {
     if (!user || !user.tenant_id) return;
-    const socket = io(BACKEND_URL);
+    const socket = io(BACKEND_URL, socketAuthOptions());
     socketRef.current = socket;
 
     socket.on('connect', () => {
@@ -71,6 +71,11 @@ export default function SupervisorDashboard() {
       setMessages(prev => [msg, ...prev].slice(0, 50));
     });
 
+    // El backend agrupa los eventos de alta frecuencia en ventanas cortas
+    socket.on('SUPERVISOR_CHAT_EVENT_BATCH', (batch: { events: LiveMessage[] }) => {
+      setMessages(prev => [...[...batch.events].reverse(), ...prev].slice(0, 50));
+    });
+
     return () => { socket.disconnect(); };
   }, [user]);
 
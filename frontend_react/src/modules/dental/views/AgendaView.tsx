@@ -12,7 +12,7 @@ import AppointmentCard from '../../../components/AppointmentCard';
 import api from '../../../api/axios';
 import { addDays, subDays, startOfDay, endOfDay } from 'date-fns';
 import { io, Socket } from 'socket.io-client';
-import { BACKEND_URL } from '../../../api/axios';
+import { BACKEND_URL, socketAuthOptions } from '../../../api/axios';
 import { useAuth } from '../../../context/AuthContext';
 import { useTranslation } from '../../../context/LanguageContext';
 
@@ -325,6 +325,7 @@ export default function AgendaView() {
 
     // Setup WebSocket connection
     socketRef.current = io(BACKEND_URL, {
+      ...socketAuthOptions(),
       transports: ['websocket', 'polling'],
       reconnection: true,
       reconnectionAttempts: 5,
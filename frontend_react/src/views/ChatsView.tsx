@@ -7,7 +7,7 @@ import {
   UserPlus, Users, Target, Zap, Crown, Bot, RefreshCw, X,
   Tag, Star, HandMetal, Shield, FileText, Instagram, Facebook
 } from 'lucide-react';
-import api, { BACKEND_URL } from '../api/axios';
+import api, { BACKEND_URL, socketAuthOptions } from '../api/axios';
 import { parseTags } from '../utils/parseTags';
 import { useTranslation } from '../context/LanguageContext';
 import { useAuth } from '../context/AuthContext';
@@ -203,7 +203,7 @@ export default function ChatsView() {
 
   useEffect(() => {
     // Conectar al WebSocket
-    socketRef.current = io(BACKEND_URL);
+    socketRef.current = io(BACKEND_URL, socketAuthOptions());
 
     // Evento: Nueva derivación humana (derivhumano) — solo para la empresa seleccionada
     socketRef.current.on('HUMAN_HANDOFF', (data: { phone_number: string; reason: string; tenant_id?: number }) => {
@@ -25,7 +25,7 @@ import {
   BarChart,
   Bar
 } from 'recharts';
-import api, { BACKEND_URL } from '../api/axios';
+import api, { BACKEND_URL, socketAuthOptions } from '../api/axios';
 import { useTranslation } from '../context/LanguageContext';
 import { useAuth } from '../context/AuthContext';
 import PageHeader from '../components/PageHeader';
@@ -139,7 +139,7 @@ export default function DashboardView() {
 
   useEffect(() => {
     // 1. Conectar WebSocket
-    socketRef.current = io(BACKEND_URL);
+    socketRef.current = io(BACKEND_URL, socketAuthOptions());
 
     // 2. Escuchar nuevos turnos/mensajes para actualización en vivo
     socketRef.current.on('NEW_APPOINTMENT', () => {
@@ -2,7 +2,6 @@ import os
 import uuid
 import json
 import logging
-import httpx
 from datetime import datetime, timedelta, date
 from typing import List, Optional, Dict, Any
 from fastapi import APIRouter, HTTPException, Depends, Request, BackgroundTasks, Header
@@ -14,11 +13,15 @@ from core.credentials import (
     YCLOUD_API_KEY, YCLOUD_WEBHOOK_SECRET
 )
 from core.security import verify_admin_token, get_resolved_tenant_id, get_allowed_tenant_ids, ADMIN_TOKEN, audit_access
+from core.identity import invalidate_identity
+from core.tenant_cache import tenant_cache, NS_CREDENTIAL, NS_SEARCH_CONFIG
+from core.http_clients import http_clients
 from core.utils import normalize_phone, ARG_TZ
 
 from core.services.chat_service import ChatService
 from services.analytics_service import analytics_service
 from services.search_service import search_service
+from services.search_index_service import normalize_search_config
 from services.blacklist_service import blacklist_service
 
 logger = logging.getLogger(__name__)
@@ -28,6 +31,8 @@ INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN", "internal-secret-token")
 WHATSAPP_SERVICE_URL = os.getenv("WHATSAPP_SERVICE_URL", "http://whatsapp:8002")
 
 router = APIRouter(prefix="/admin/core", tags=["Core Admin"])
+# Service-to-service endpoints: also mounted in the webhook role (core/boot_profile.py)
+internal_router = APIRouter(prefix="/admin/core", tags=["Internal"])
 
 # ... (MODELS and HELPERS remain unchanged) ...
 
@@ -54,6 +59,7 @@ class TenantUpdate(BaseModel):
     clinic_name: Optional[str] = None
     bot_phone_number: Optional[str] = None
     calendar_provider: Optional[str] = None  # 'local' | 'google' — stored in config
+    search_config: Optional[Dict[str, Any]] = None  # relevance tuning for global search — stored in config.search
 
 class TenantCreate(BaseModel):
     clinic_name: str
@@ -77,7 +83,7 @@ async def emit_appointment_event(event_type: str, data: Dict[str, Any], request:
 async def send_to_whatsapp_task(phone: str, message: str, business_number: str):
     normalized = normalize_phone(phone)
     try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
+        async with http_clients.session(timeout=15.0) as client:
             await client.post(
                 f"{WHATSAPP_SERVICE_URL}/send",
                 json={"to": normalized, "message": message},
@@ -135,7 +141,9 @@ async def update_user_status(user_id: str, payload: StatusUpdate, user_data = De
             # Activate in professionals (Legacy/Dental fallback)
             if user['role'] == 'professional':
                 await db.pool.execute("UPDATE professionals SET is_active = TRUE, updated_at = NOW() WHERE user_id = $1", uid)
-        
+    
+    # Estado y sede resuelta cambian: descartar la identidad cacheada en todas las réplicas
+    invalidate_identity(user_id)
     return {"status": "updated"}
 
 # --- RUTAS DE CHAT ---
@@ -289,7 +297,7 @@ async def get_tenants(user_data=Depends(verify_admin_token)):
 @router.put("/tenants/{tenant_id}", tags=["Sedes"])
 async def update_tenant(tenant_id: int, payload: TenantUpdate, user_data=Depends(verify_admin_token)):
     if user_data.role != 'ceo': raise HTTPException(status_code=403)
-    existing = await db.pool.fetchrow("SELECT id FROM tenants WHERE id = $1", tenant_id)
+    existing = await db.pool.fetchrow("SELECT id, bot_phone_number FROM tenants WHERE id = $1", tenant_id)
     if not existing: raise HTTPException(status_code=404, detail="Tenant not found")
     updates, params = [], []
     pos = 1
@@ -297,14 +305,27 @@ async def update_tenant(tenant_id: int, payload: TenantUpdate, user_data=Depends
         updates.append(f"clinic_name = ${pos}"); params.append(payload.clinic_name); pos += 1
     if payload.bot_phone_number is not None:
         updates.append(f"bot_phone_number = ${pos}"); params.append(payload.bot_phone_number); pos += 1
+    # Both keys nest into a single assignment: two "config = ..." in one UPDATE is an error
+    config_base = config_expr = "COALESCE(config, '{}')"
     if payload.calendar_provider is not None and payload.calendar_provider in ("local", "google"):
-        updates.append("config = jsonb_set(COALESCE(config, '{}'), '{calendar_provider}', to_jsonb($%s::text))" % pos)
+        config_expr = "jsonb_set(%s, '{calendar_provider}', to_jsonb($%s::text))" % (config_expr, pos)
         params.append(payload.calendar_provider); pos += 1
+    if payload.search_config is not None:
+        # The pool's jsonb codec encodes the dict
+        config_expr = "jsonb_set(%s, '{search}', $%s::jsonb)" % (config_expr, pos)
+        params.append(normalize_search_config(payload.search_config)); pos += 1
+    if config_expr != config_base:
+        updates.append("config = " + config_expr)
     if not updates:
         return {"status": "ok"}
     params.append(tenant_id)
     query = "UPDATE tenants SET " + ", ".join(updates) + f", updated_at = NOW() WHERE id = ${pos}"
     await db.pool.execute(query, *params)
+    if payload.bot_phone_number is not None:
+        tenant_cache.invalidate_tenant(tenant_id)
+        tenant_cache.invalidate_bot_phones(existing["bot_phone_number"], payload.bot_phone_number)
+    elif payload.search_config is not None:
+        tenant_cache.invalidate(NS_SEARCH_CONFIG, tenant_id)
     return {"status": "ok"}
 
 @router.post("/tenants", tags=["Sedes"])
@@ -333,6 +354,7 @@ async def delete_tenant(tenant_id: int, user_data=Depends(verify_admin_token)):
     count = await db.pool.fetchval("SELECT COUNT(*) FROM tenants")
     if count <= 1: raise HTTPException(status_code=400, detail="Cannot delete the last tenant")
     await db.pool.execute("DELETE FROM tenants WHERE id = $1", tenant_id)
+    tenant_cache.invalidate_tenant(tenant_id)
     return {"status": "deleted"}
 
 def _config_as_dict(config):  # config from DB can be dict (JSONB) or str
@@ -372,7 +394,7 @@ async def update_clinic_settings(payload: ClinicSettingsUpdate, resolved_tenant_
     out = {"status": "ok"}
     return out
 
-@router.get("/internal/credentials/{name}", tags=["Internal"])
+@internal_router.get("/internal/credentials/{name}")
 async def get_internal_credential(name: str, tenant_id: Optional[int] = None, x_internal_token: str = Header(None)):
     if x_internal_token != INTERNAL_API_TOKEN: raise HTTPException(status_code=401, detail="Internal token invalid")
     
@@ -463,6 +485,8 @@ async def delete_credential(cred_id: int, user_data=Depends(verify_admin_token),
         
     if result == "DELETE 0":
         raise HTTPException(status_code=404, detail="Credential not found or access denied")
+    # CEO may delete another tenant's credential: drop the whole credential namespace
+    tenant_cache.invalidate_namespace(NS_CREDENTIAL)
     return {"status": "ok"}
 
 @router.get("/settings/integration/{provider}/{tenant_id}", dependencies=[Depends(verify_admin_token)], tags=["Configuración"])
@@ -598,10 +622,13 @@ async def get_funnel_analytics(tenant_id: int = Depends(get_resolved_tenant_id))
 
 # --- GLOBAL SEARCH (DEV-54) ---
 @router.get("/search", dependencies=[Depends(verify_admin_token)], tags=["Búsqueda"])
-async def global_search(query: str, tenant_id: int = Depends(get_resolved_tenant_id)):
-    """Performs full-text search across leads, notes and messages."""
+async def global_search(query: str, limit: int = 20, cursor: Optional[str] = None,
+                        tenant_id: int = Depends(get_resolved_tenant_id)):
+    """Performs full-text search across leads, notes and messages (cursor-paginated via next_cursor)."""
     try:
-        return await search_service.global_search(tenant_id, query)
+        return await search_service.global_search(tenant_id, query, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error in global_search: {e}")
         raise HTTPException(status_code=500, detail="Error performing global search")
@@ -1,8 +1,13 @@
+import asyncio
 import os
 from logging.config import fileConfig
 
-from sqlalchemy import engine_from_config, pool
+from sqlalchemy import pool
+from sqlalchemy.ext.asyncio import create_async_engine
 from alembic import context
+from alembic.script import ScriptDirectory
+
+from db.schema_version import SCHEMA_MIGRATION_LOCK_ID, prepare_ledger
 
 # No models.py in CRM Ventas, so no autogenerate for now
 target_metadata = None
@@ -16,15 +21,17 @@ if config.config_file_name is not None:
 def get_url() -> str:
     """
     Lee la URL de la base de datos desde la variable de entorno POSTGRES_DSN.
-    Alembic usa SQLAlchemy sincrónico, por eso reemplazamos el driver asyncpg.
+    Las migraciones corren sobre asyncpg (el mismo driver que la app): las revisiones
+    del ledger ejecutan DDL multi-statement directo sobre la conexión asyncpg.
     """
     dsn = os.getenv("POSTGRES_DSN", "")
-    # Normalizar el esquema de la URL para SQLAlchemy sincrónico:
-    # - postgresql+asyncpg:// → postgresql://  (FastAPI async driver)
-    # - postgres://           → postgresql://  (formato corto usado por algunos providers)
-    dsn = dsn.replace("postgresql+asyncpg://", "postgresql://")
+    # Normalizar el esquema de la URL para SQLAlchemy + asyncpg:
+    # - postgres://   → postgresql+asyncpg://  (formato corto usado por algunos providers)
+    # - postgresql:// → postgresql+asyncpg://
     if dsn.startswith("postgres://"):
-        dsn = dsn.replace("postgres://", "postgresql://", 1)
+        dsn = dsn.replace("postgres://", "postgresql+asyncpg://", 1)
+    elif dsn.startswith("postgresql://"):
+        dsn = dsn.replace("postgresql://", "postgresql+asyncpg://", 1)
     return dsn
 
 
@@ -41,24 +48,30 @@ def run_migrations_offline() -> None:
         context.run_migrations()
 
 
-def run_migrations_online() -> None:
-    """Corre migraciones conectándose directamente a la DB."""
-    configuration = config.get_section(config.config_ini_section, {})
-    configuration["sqlalchemy.url"] = get_url()
-
-    connectable = engine_from_config(
-        configuration,
-        prefix="sqlalchemy.",
-        poolclass=pool.NullPool,
+def do_run_migrations(connection) -> None:
+    """Corre las revisiones pendientes en una transacción, serializado entre jobs concurrentes."""
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
     )
+    with context.begin_transaction():
+        # Un solo job migra a la vez; el lock se libera con el COMMIT
+        connection.exec_driver_sql(f"SELECT pg_advisory_xact_lock({SCHEMA_MIGRATION_LOCK_ID})")
+        script = ScriptDirectory.from_config(config)
+        prepare_ledger(connection, [rev.module for rev in script.walk_revisions()])
+        context.run_migrations()
+
+
+async def run_async_migrations() -> None:
+    connectable = create_async_engine(get_url(), poolclass=pool.NullPool)
+    async with connectable.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+    await connectable.dispose()
 
-    with connectable.connect() as connection:
-        context.configure(
-            connection=connection,
-            target_metadata=target_metadata,
-        )
-        with context.begin_transaction():
-            context.run_migrations()
+
+def run_migrations_online() -> None:
+    """Corre migraciones conectándose directamente a la DB (job de migraciones: alembic upgrade head)."""
+    asyncio.run(run_async_migrations())
 
 
 if context.is_offline_mode():
@@ -5,11 +5,12 @@ Revises: ${down_revision | comma,n}
 Create Date: ${create_date}
 
 """
-from typing import Sequence, Union
+from typing import List, Sequence, Union
 
 from alembic import op
 import sqlalchemy as sa
 ${imports if imports else ""}
+from db.schema_version import apply_revision, forget_revision
 
 # revision identifiers, used by Alembic.
 revision: str = ${repr(up_revision)}
@@ -17,12 +18,23 @@ down_revision: Union[str, Sequence[str], None] = ${repr(down_revision)}
 branch_labels: Union[str, Sequence[str], None] = ${repr(branch_labels)}
 depends_on: Union[str, Sequence[str], None] = ${repr(depends_on)}
 
+# Versión en el ledger schema_migrations (siguiente entero):
+# subir db/schema_version.REQUIRED_SCHEMA_VERSION al mismo valor
+schema_version: int = 0
+
+
+def statements() -> List[str]:
+    """SQL de esta revisión (checksum en schema_migrations: no editar una vez aplicada)."""
+    return [
+        ${upgrades if upgrades else ""}
+    ]
+
 
 def upgrade() -> None:
     """Upgrade schema."""
-    ${upgrades if upgrades else "pass"}
+    apply_revision(op, schema_version, revision, ${repr(message)}, statements())
 
 
 def downgrade() -> None:
     """Downgrade schema."""
-    ${downgrades if downgrades else "pass"}
+    forget_revision(op, schema_version)
@@ -0,0 +1,68 @@
+"""legacy_evolution_pipeline
+
+Revision ID: 0001
+Revises: 9572635983a1
+Create Date: 2026-10-17 18:00:00.000000
+
+Esquema previo al ledger: lo que el Maintenance Robot corría en cada arranque.
+- Foundation (db/init/dentalogic_schema.sql) si faltan las tablas críticas.
+- Parches 1..49 de db/legacy.py (Database.evolution_patches), todos o ninguno.
+- Parches de db/migrations.py (MigrationRunner), best-effort como en el Robot.
+
+Todos son idempotentes: sobre una base existente no cambian nada y sólo dejan
+registrada la versión 1 en schema_migrations. Ambas listas quedan congeladas
+(checksum); los cambios nuevos van en revisiones nuevas.
+"""
+from typing import List, Sequence, Union
+
+from alembic import op
+
+from db.legacy import CRITICAL_TABLES, Database, load_foundation_sql
+from db.migrations import MigrationRunner
+from db.schema_version import apply_revision, await_driver, driver_connection, forget_revision
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, Sequence[str], None] = '9572635983a1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+schema_version: int = 1
+
+
+def _legacy_patches() -> List[str]:
+    return Database.evolution_patches()
+
+
+def _runner_patches() -> List[str]:
+    return MigrationRunner(None)._get_patches()
+
+
+def statements() -> List[str]:
+    """SQL de esta revisión (checksum en schema_migrations: no editar una vez aplicada)."""
+    return _legacy_patches() + _runner_patches()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    raw = driver_connection(op.get_bind())
+    existing = await_driver(raw.fetchval(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = 'public' AND table_name = ANY($1)",
+        CRITICAL_TABLES,
+    ))
+    if existing < len(CRITICAL_TABLES):
+        foundation_sql = load_foundation_sql()
+        if foundation_sql is None:
+            raise RuntimeError("Foundation schema (db/init/dentalogic_schema.sql) not found")
+        await_driver(raw.execute(foundation_sql))
+
+    apply_revision(
+        op, schema_version, revision, "legacy_evolution_pipeline",
+        _legacy_patches(), best_effort=_runner_patches(),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Los parches legacy no tienen rollback: sólo se olvida la versión en el ledger
+    forget_revision(op, schema_version)
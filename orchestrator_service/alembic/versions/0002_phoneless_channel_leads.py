@@ -0,0 +1,48 @@
+"""phoneless_channel_leads
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 20:00:00.000000
+
+Leads de Instagram/Facebook sin teléfono: phone_number pasa a aceptar NULL.
+Con '' todos los contactos sin teléfono de un tenant chocaban en
+leads_tenant_phone_unique (tenant_id, phone_number); con NULL la constraint no
+los compara y cada PSID queda en su propio lead.
+"""
+from typing import List, Sequence, Union
+
+from alembic import op
+
+from db.schema_version import apply_revision, forget_revision
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Versión en el ledger schema_migrations (siguiente entero):
+# subir db/schema_version.REQUIRED_SCHEMA_VERSION al mismo valor
+schema_version: int = 2
+
+
+def statements() -> List[str]:
+    """SQL de esta revisión (checksum en schema_migrations: no editar una vez aplicada)."""
+    return [
+        "ALTER TABLE leads ALTER COLUMN phone_number DROP NOT NULL",
+        """
+        UPDATE leads SET phone_number = NULL
+        WHERE phone_number = '' AND (instagram_psid IS NOT NULL OR facebook_psid IS NOT NULL)
+        """,
+    ]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    apply_revision(op, schema_version, revision, "phoneless_channel_leads", statements())
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # NOT NULL no se restaura: puede haber varios leads sin teléfono por tenant
+    forget_revision(op, schema_version)
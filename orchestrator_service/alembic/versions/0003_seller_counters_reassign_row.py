@@ -0,0 +1,113 @@
+"""seller_counters_reassign_row
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 21:00:00.000000
+
+trg_seller_counters_reassign (Parche 47) era FOR EACH STATEMENT con tablas de
+transición sobre todo UPDATE de chat_messages: cada UPDATE (estado de entrega,
+lectura, contenido) materializaba old_rows/new_rows y tomaba el lock compartido
+7345 aunque no tocara la asignación. Postgres no permite tablas de transición
+junto con UPDATE OF, así que el trigger pasa a ser por fila, restringido a
+UPDATE OF assigned_seller_id, assigned_at y con WHEN: los demás UPDATE no lo
+disparan.
+"""
+from typing import List, Sequence, Union
+
+from alembic import op
+
+from db.schema_version import apply_revision, forget_revision
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Versión en el ledger schema_migrations (siguiente entero):
+# subir db/schema_version.REQUIRED_SCHEMA_VERSION al mismo valor
+schema_version: int = 3
+
+
+def statements() -> List[str]:
+    """SQL de esta revisión (checksum en schema_migrations: no editar una vez aplicada)."""
+    return [
+        """
+        CREATE OR REPLACE FUNCTION seller_counters_reassign_row() RETURNS trigger
+        LANGUAGE plpgsql AS $fn$
+        DECLARE
+            v_day DATE;
+        BEGIN
+            IF NEW.from_number IS NULL THEN
+                RETURN NULL;
+            END IF;
+            PERFORM pg_advisory_xact_lock_shared(7345, NEW.tenant_id);
+
+            IF NEW.role IN ('user', 'assistant')
+               AND NEW.assigned_seller_id IS DISTINCT FROM OLD.assigned_seller_id THEN
+                v_day := (COALESCE(NEW.created_at, NOW()) AT TIME ZONE 'UTC')::date;
+                IF OLD.assigned_seller_id IS NOT NULL THEN
+                    INSERT INTO seller_daily_counters AS c (tenant_id, seller_id, day, messages_sent, messages_received)
+                    VALUES (
+                        NEW.tenant_id, OLD.assigned_seller_id, v_day,
+                        CASE WHEN NEW.role = 'assistant' THEN -1 ELSE 0 END,
+                        CASE WHEN NEW.role = 'user' THEN -1 ELSE 0 END
+                    )
+                    ON CONFLICT (tenant_id, seller_id, day) DO UPDATE SET
+                        messages_sent = c.messages_sent + EXCLUDED.messages_sent,
+                        messages_received = c.messages_received + EXCLUDED.messages_received,
+                        updated_at = NOW();
+                END IF;
+                IF NEW.assigned_seller_id IS NOT NULL THEN
+                    INSERT INTO seller_daily_counters AS c (
+                        tenant_id, seller_id, day, messages_sent, messages_received, last_message_at
+                    ) VALUES (
+                        NEW.tenant_id, NEW.assigned_seller_id, v_day,
+                        CASE WHEN NEW.role = 'assistant' THEN 1 ELSE 0 END,
+                        CASE WHEN NEW.role = 'user' THEN 1 ELSE 0 END,
+                        NEW.created_at
+                    )
+                    ON CONFLICT (tenant_id, seller_id, day) DO UPDATE SET
+                        messages_sent = c.messages_sent + EXCLUDED.messages_sent,
+                        messages_received = c.messages_received + EXCLUDED.messages_received,
+                        last_message_at = GREATEST(c.last_message_at, EXCLUDED.last_message_at),
+                        updated_at = NOW();
+                END IF;
+            END IF;
+
+            IF NEW.assigned_seller_id IS NOT NULL THEN
+                INSERT INTO seller_conversation_state AS s (tenant_id, from_number, seller_id, assigned_at)
+                VALUES (NEW.tenant_id, NEW.from_number, NEW.assigned_seller_id, NEW.assigned_at)
+                ON CONFLICT (tenant_id, from_number) DO UPDATE SET
+                    seller_id = EXCLUDED.seller_id,
+                    assigned_at = EXCLUDED.assigned_at,
+                    updated_at = NOW()
+                WHERE (s.seller_id, s.assigned_at) IS DISTINCT FROM (EXCLUDED.seller_id, EXCLUDED.assigned_at)
+                  AND (s.assigned_at IS NULL OR EXCLUDED.assigned_at IS NULL OR EXCLUDED.assigned_at >= s.assigned_at);
+            END IF;
+            RETURN NULL;
+        END
+        $fn$
+        """,
+        "DROP TRIGGER IF EXISTS trg_seller_counters_reassign ON chat_messages",
+        """
+        CREATE TRIGGER trg_seller_counters_reassign
+            AFTER UPDATE OF assigned_seller_id, assigned_at ON chat_messages
+            FOR EACH ROW
+            WHEN (OLD.assigned_seller_id IS DISTINCT FROM NEW.assigned_seller_id
+                  OR OLD.assigned_at IS DISTINCT FROM NEW.assigned_at)
+            EXECUTE FUNCTION seller_counters_reassign_row()
+        """,
+        "DROP FUNCTION IF EXISTS seller_counters_reassign()",
+    ]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    apply_revision(op, schema_version, revision, "seller_counters_reassign_row", statements())
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # El trigger por sentencia de Parche 47 no se restaura: el por fila es equivalente
+    forget_revision(op, schema_version)
@@ -0,0 +1,64 @@
+"""notifications_partitioning
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 22:00:00.000000
+
+Conversión de `notifications` a tabla particionada por día de vencimiento
+(funciones de Parche 46). Antes la corría Database._check_schema en cada
+arranque con NOTIFICATIONS_PARTITIONED=true: DDL en el boot de cada réplica.
+Ahora corre una vez, en el job de migraciones, si el deploy tiene
+NOTIFICATIONS_PARTITIONED=true (app.notifications_partitioned, ver
+db/schema_version.revision_settings). Las particiones de los próximos días las
+crea el job notifications_partitions (main.py).
+
+La PK de la tabla particionada es (id, expires_on): Postgres exige la clave de
+partición en la PK, así que la base ya no garantiza un id único. Lo mantiene
+save_notifications, que borra la fila anterior de un id re-guardado con otro día
+de vencimiento (services/seller_notification_service.py).
+
+Para activarla en una base que ya pasó esta versión:
+    NOTIFICATIONS_PARTITIONED=true alembic downgrade 0003 && alembic upgrade head
+(la conversión es idempotente).
+"""
+from typing import List, Sequence, Union
+
+from alembic import op
+
+from db.schema_version import apply_revision, forget_revision
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Versión en el ledger schema_migrations (siguiente entero):
+# subir db/schema_version.REQUIRED_SCHEMA_VERSION al mismo valor
+schema_version: int = 4
+
+
+def statements() -> List[str]:
+    """SQL de esta revisión (checksum en schema_migrations: no editar una vez aplicada)."""
+    return [
+        """
+        DO $$ BEGIN
+            IF COALESCE(current_setting('app.notifications_partitioned', true), 'off') = 'on' THEN
+                PERFORM notifications_enable_partitioning(
+                    COALESCE(NULLIF(current_setting('app.notifications_partition_days_ahead', true), '')::integer, 14)
+                );
+            END IF;
+        END $$
+        """,
+    ]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    apply_revision(op, schema_version, revision, "notifications_partitioning", statements())
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # La tabla queda particionada: sólo se olvida la versión en el ledger
+    forget_revision(op, schema_version)
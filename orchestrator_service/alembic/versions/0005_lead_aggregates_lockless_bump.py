@@ -0,0 +1,81 @@
+"""lead_aggregates_lockless_bump
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 23:00:00.000000
+
+lead_aggregates_bump (Parche 44) tomaba pg_advisory_xact_lock_shared(7344,
+tenant) en cada escritura de leads para que la reconciliación pudiera
+reescribir los buckets con el lock exclusivo. La reconciliación ahora calcula
+las correcciones sobre un snapshot y las suma como deltas (ver
+services/lead_aggregates_service.py): conmutan con los incrementos del trigger,
+así que el trigger ya no toma ningún lock.
+"""
+from typing import List, Sequence, Union
+
+from alembic import op
+
+from db.schema_version import apply_revision, forget_revision
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Versión en el ledger schema_migrations (siguiente entero):
+# subir db/schema_version.REQUIRED_SCHEMA_VERSION al mismo valor
+schema_version: int = 5
+
+
+def statements() -> List[str]:
+    """SQL de esta revisión (checksum en schema_migrations: no editar una vez aplicada)."""
+    return [
+        """
+        CREATE OR REPLACE FUNCTION lead_aggregates_bump(
+            p_tenant INTEGER, p_created TIMESTAMPTZ, p_status TEXT, p_seller UUID,
+            p_value NUMERIC, p_prob NUMERIC, p_sign INTEGER
+        ) RETURNS void
+        LANGUAGE plpgsql AS $fn$
+        DECLARE
+            v_value NUMERIC := COALESCE(p_value, 0);
+            v_prob NUMERIC := COALESCE(p_prob, 0);
+        BEGIN
+            INSERT INTO lead_daily_aggregates AS a (
+                tenant_id, day, status, seller_id, lead_count, value_sum,
+                prob_count, prob_value_sum, prob_sum, weighted_value_sum
+            ) VALUES (
+                p_tenant,
+                (COALESCE(p_created, NOW()) AT TIME ZONE 'UTC')::date,
+                COALESCE(p_status, 'new'),
+                COALESCE(p_seller, '00000000-0000-0000-0000-000000000000'::uuid),
+                p_sign,
+                p_sign * v_value,
+                CASE WHEN v_prob > 0 THEN p_sign ELSE 0 END,
+                CASE WHEN v_prob > 0 THEN p_sign * v_value ELSE 0 END,
+                p_sign * v_prob / 100,
+                p_sign * v_value * v_prob / 100
+            )
+            ON CONFLICT (tenant_id, day, status, seller_id) DO UPDATE SET
+                lead_count = a.lead_count + EXCLUDED.lead_count,
+                value_sum = a.value_sum + EXCLUDED.value_sum,
+                prob_count = a.prob_count + EXCLUDED.prob_count,
+                prob_value_sum = a.prob_value_sum + EXCLUDED.prob_value_sum,
+                prob_sum = a.prob_sum + EXCLUDED.prob_sum,
+                weighted_value_sum = a.weighted_value_sum + EXCLUDED.weighted_value_sum,
+                updated_at = NOW();
+        END
+        $fn$
+        """,
+    ]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    apply_revision(op, schema_version, revision, "lead_aggregates_lockless_bump", statements())
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # La versión con lock de Parche 44 no se restaura: la reconciliación ya no lo necesita
+    forget_revision(op, schema_version)
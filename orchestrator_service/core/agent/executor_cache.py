@@ -0,0 +1,154 @@
+"""
+Per-tenant cache of ready-to-run AgentExecutors.
+
+Building an executor (tenant row -> system prompt -> ChatPromptTemplate ->
+create_openai_tools_agent -> AgentExecutor) is pure overhead when the tenant
+AI config did not change, so /chat reuses the compiled executor.
+
+Entries are keyed by tenant_id and carry a fingerprint (sha256 of the AI-config
+columns + the niche tool set). Routes that write tenant AI config call
+invalidate(); the TTL only bounds staleness for writes made by other replicas,
+and on expiry the executor is reused if the fingerprint did not change.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("agent_executor_cache")
+
+AGENT_CACHE_MAX_TENANTS = int(os.getenv("AGENT_CACHE_MAX_TENANTS", "256"))
+AGENT_CACHE_TTL_SECONDS = int(os.getenv("AGENT_CACHE_TTL_SECONDS", "600"))
+
+
+@dataclass
+class _CacheEntry:
+    fingerprint: str
+    executor: Any
+    loaded_at: float
+
+
+def compute_fingerprint(config: Optional[Dict[str, Any]], tools: List[Any]) -> str:
+    """Stable hash of the tenant AI config and the names of the tools bound to the agent."""
+    payload = {
+        "config": dict(config) if config else None,
+        "tools": sorted(getattr(t, "name", str(t)) for t in tools),
+    }
+    raw = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class AgentExecutorCache:
+    """Bounded LRU of AgentExecutors per tenant with hit/miss/build-time stats."""
+
+    def __init__(self, max_size: int = AGENT_CACHE_MAX_TENANTS, ttl_seconds: int = AGENT_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[int, _CacheEntry]" = OrderedDict()
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "builds": 0,
+            "revalidations": 0,
+            "invalidations": 0,
+            "evictions": 0,
+            "build_time_total_ms": 0.0,
+            "build_time_max_ms": 0.0,
+        }
+
+    def _lock_for(self, tenant_id: int) -> asyncio.Lock:
+        lock = self._locks.get(tenant_id)
+        if lock is None:
+            lock = self._locks[tenant_id] = asyncio.Lock()
+        return lock
+
+    def _fresh(self, entry: _CacheEntry) -> bool:
+        return (time.monotonic() - entry.loaded_at) < self.ttl_seconds
+
+    def _store(self, tenant_id: int, entry: _CacheEntry):
+        self._entries[tenant_id] = entry
+        self._entries.move_to_end(tenant_id)
+        while len(self._entries) > self.max_size:
+            evicted_id, _ = self._entries.popitem(last=False)
+            self._locks.pop(evicted_id, None)
+            self._stats["evictions"] += 1
+
+    async def get_or_build(
+        self,
+        tenant_id: int,
+        load_config: Callable[[int], Awaitable[Tuple[Optional[Dict[str, Any]], List[Any]]]],
+        build: Callable[[Optional[Dict[str, Any]], List[Any]], Any],
+    ) -> Any:
+        """
+        Returns the cached executor for the tenant, building it if needed.
+
+        load_config(tenant_id) -> (tenant_config_row, tools)
+        build(tenant_config_row, tools) -> AgentExecutor
+        """
+        entry = self._entries.get(tenant_id)
+        if entry and self._fresh(entry):
+            self._entries.move_to_end(tenant_id)
+            self._stats["hits"] += 1
+            return entry.executor
+
+        async with self._lock_for(tenant_id):
+            # Another coroutine may have rebuilt it while we waited
+            entry = self._entries.get(tenant_id)
+            if entry and self._fresh(entry):
+                self._stats["hits"] += 1
+                return entry.executor
+
+            self._stats["misses"] += 1
+            config, tools = await load_config(tenant_id)
+            fingerprint = compute_fingerprint(config, tools)
+
+            if entry and entry.fingerprint == fingerprint:
+                # TTL expired but config is unchanged: keep the compiled executor
+                entry.loaded_at = time.monotonic()
+                self._entries.move_to_end(tenant_id)
+                self._stats["revalidations"] += 1
+                return entry.executor
+
+            started = time.perf_counter()
+            executor = build(config, tools)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self._stats["builds"] += 1
+            self._stats["build_time_total_ms"] += elapsed_ms
+            self._stats["build_time_max_ms"] = max(self._stats["build_time_max_ms"], elapsed_ms)
+
+            self._store(tenant_id, _CacheEntry(fingerprint, executor, time.monotonic()))
+            logger.info(f"Agent executor built for tenant {tenant_id} in {elapsed_ms:.1f}ms (fp={fingerprint[:12]})")
+            return executor
+
+    def invalidate(self, tenant_id: Optional[int] = None):
+        """Drops the cached executor for one tenant (or all tenants when tenant_id is None)."""
+        if tenant_id is None:
+            dropped = len(self._entries)
+            self._entries.clear()
+        else:
+            dropped = 1 if self._entries.pop(int(tenant_id), None) else 0
+        self._stats["invalidations"] += dropped
+        if dropped:
+            logger.info(f"Agent executor cache invalidated (tenant={tenant_id}, dropped={dropped})")
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        builds = self._stats["builds"]
+        return {
+            **self._stats,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+            "build_time_avg_ms": round(self._stats["build_time_total_ms"] / builds, 2) if builds else 0.0,
+        }
+
+
+# Global instance
+agent_executor_cache = AgentExecutorCache()
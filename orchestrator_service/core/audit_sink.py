@@ -0,0 +1,305 @@
+"""
+Buffered audit sink for security events (core/security.log_security_event).
+
+@audit_access used to await an INSERT INTO system_events before the endpoint
+ran, so every audited request paid one DB round trip (and stalled with the
+DB). Events are now enqueued in memory and a background worker writes them:
+
+- One multi-row INSERT (unnest over column arrays) per batch, flushed when
+  AUDIT_FLUSH_BATCH_SIZE events are pending or every AUDIT_FLUSH_INTERVAL_SECONDS.
+- The queue is bounded (AUDIT_QUEUE_MAX_PENDING). When it is full, or a flush
+  fails / exceeds AUDIT_FLUSH_TIMEOUT_SECONDS, the events are appended to a
+  per-process JSONL spill file in AUDIT_SPILL_DIR instead of being lost.
+- Spilled events are replayed once flushes succeed again; spill files left by
+  dead processes are adopted on start. Replay is at-least-once: a crash in the
+  middle of a replay can write a batch twice.
+
+created_at is taken when the event is recorded, not when it is flushed.
+get_stats() exposes queue depth, high watermark, spill / replay counters and
+flush latency for /health/audit-sink.
+"""
+import asyncio
+import glob
+import json
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger("audit_sink")
+
+AUDIT_QUEUE_MAX_PENDING = int(os.getenv("AUDIT_QUEUE_MAX_PENDING", "10000"))
+AUDIT_FLUSH_BATCH_SIZE = int(os.getenv("AUDIT_FLUSH_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL_SECONDS = float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", "1.0"))
+AUDIT_FLUSH_TIMEOUT_SECONDS = float(os.getenv("AUDIT_FLUSH_TIMEOUT_SECONDS", "5.0"))
+AUDIT_SPILL_DIR = os.getenv("AUDIT_SPILL_DIR", "/tmp/audit_spill")
+
+INSERT_EVENTS_SQL = """
+    INSERT INTO system_events (tenant_id, event_type, severity, message, payload, created_at)
+    SELECT t, e, s, m, p::jsonb, c
+    FROM unnest($1::int[], $2::text[], $3::text[], $4::text[], $5::text[], $6::timestamptz[])
+        AS x(t, e, s, m, p, c)
+"""
+
+
+def _default_pool():
+    from db import db
+    return db.pool
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class AuditSink:
+    """Bounded in-memory queue of audit events, flushed in batches by a background task."""
+
+    def __init__(
+        self,
+        max_pending: int = AUDIT_QUEUE_MAX_PENDING,
+        batch_size: int = AUDIT_FLUSH_BATCH_SIZE,
+        flush_interval_seconds: float = AUDIT_FLUSH_INTERVAL_SECONDS,
+        flush_timeout_seconds: float = AUDIT_FLUSH_TIMEOUT_SECONDS,
+        spill_dir: str = AUDIT_SPILL_DIR,
+        pool_getter: Callable[[], Any] = _default_pool,
+    ):
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.flush_timeout_seconds = flush_timeout_seconds
+        self.spill_dir = spill_dir
+        self.spill_path = os.path.join(spill_dir, f"audit-{os.getpid()}.jsonl")
+        self._pool_getter = pool_getter
+        self._pending: Deque[Dict[str, Any]] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._adopted_orphans = False
+        self._replay_done = 0
+        self._stats = {
+            "enqueued": 0,
+            "flushed": 0,
+            "batches": 0,
+            "flush_errors": 0,
+            "spilled": 0,
+            "replayed": 0,
+            "dropped": 0,
+            "high_watermark": 0,
+            "last_flush_ms": 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # Producer side (request path)
+    # ------------------------------------------------------------------
+    def record(
+        self,
+        event_type: str,
+        severity: str,
+        message: str,
+        payload: Dict[str, Any],
+        tenant_id: Optional[int] = None,
+    ) -> bool:
+        """Queues one event; never touches the DB. Returns False if it had to spill to disk."""
+        event = {
+            "tenant_id": tenant_id,
+            "event_type": event_type,
+            "severity": severity,
+            "message": message,
+            "payload": payload,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+        self._stats["enqueued"] += 1
+        if len(self._pending) >= self.max_pending:
+            # Backpressure: the DB is not keeping up, keep the event on disk instead of growing memory
+            self._spill([event])
+            return False
+        self._pending.append(event)
+        self._stats["high_watermark"] = max(self._stats["high_watermark"], len(self._pending))
+        self._ensure_worker()
+        if len(self._pending) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    def _ensure_worker(self):
+        if self._worker and not self._worker.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # No loop (sync context): the next record from the app will start it
+        self._wakeup = asyncio.Event()
+        self._worker = loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+                await self.replay_spill()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Audit sink worker error: {e}")
+
+    # ------------------------------------------------------------------
+    # Flushing
+    # ------------------------------------------------------------------
+    async def flush(self) -> int:
+        """Writes everything queued so far in batches; failed batches go to the spill file."""
+        written = 0
+        while self._pending:
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            if await self._write(batch):
+                written += len(batch)
+            else:
+                self._spill(batch)
+                # DB slow or down: spill the rest too instead of retrying batch by batch
+                rest = list(self._pending)
+                self._pending.clear()
+                if rest:
+                    self._spill(rest)
+                break
+        return written
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> bool:
+        started = time.perf_counter()
+        try:
+            pool = self._pool_getter()
+            if pool is None:
+                raise RuntimeError("database pool not ready")
+            await asyncio.wait_for(
+                pool.execute(
+                    INSERT_EVENTS_SQL,
+                    [e["tenant_id"] for e in batch],
+                    [e["event_type"] for e in batch],
+                    [e["severity"] for e in batch],
+                    [e["message"] for e in batch],
+                    [json.dumps(e["payload"], default=str) for e in batch],
+                    [datetime.fromisoformat(e["created_at"]) for e in batch],
+                ),
+                timeout=self.flush_timeout_seconds,
+            )
+        except Exception as e:
+            self._stats["flush_errors"] += 1
+            logger.warning(f"Audit flush of {len(batch)} events failed ({type(e).__name__}: {e}); spilling to disk")
+            return False
+        self._stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        self._stats["batches"] += 1
+        self._stats["flushed"] += len(batch)
+        return True
+
+    # ------------------------------------------------------------------
+    # Spill file
+    # ------------------------------------------------------------------
+    def _spill(self, events: List[Dict[str, Any]]):
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                for event in events:
+                    f.write(json.dumps(event, default=str) + "\n")
+            self._stats["spilled"] += len(events)
+        except OSError as e:
+            self._stats["dropped"] += len(events)
+            logger.error(f"Audit spill to {self.spill_path} failed, dropping {len(events)} events: {e}")
+
+    def _adopt_orphans(self):
+        """Moves spill files of dead processes into this process' replay queue."""
+        self._adopted_orphans = True
+        for path in glob.glob(os.path.join(self.spill_dir, "audit-*.jsonl")):
+            if path == self.spill_path:
+                continue
+            try:
+                pid = int(os.path.basename(path)[len("audit-"):-len(".jsonl")])
+            except ValueError:
+                continue
+            if _pid_alive(pid):
+                continue
+            try:
+                os.replace(path, f"{path}.replay-{os.getpid()}")
+            except OSError:
+                pass  # Another process adopted it first
+
+    async def replay_spill(self) -> int:
+        """Re-inserts spilled events once the queue is drained; stops at the first failing batch."""
+        if self._pending:
+            return 0
+        if not self._adopted_orphans:
+            self._adopt_orphans()
+        own_replay = f"{self.spill_path}.replay-{os.getpid()}"
+        if os.path.exists(self.spill_path) and not os.path.exists(own_replay):
+            os.replace(self.spill_path, own_replay)
+            self._replay_done = 0
+
+        replayed = 0
+        for path in sorted(glob.glob(os.path.join(self.spill_dir, f"audit-*.jsonl.replay-{os.getpid()}"))):
+            with open(path, encoding="utf-8") as f:
+                events = [json.loads(line) for line in f if line.strip()]
+            # Resume after the batches already written from this file
+            start = self._replay_done if path == own_replay else 0
+            for i in range(start, len(events), self.batch_size):
+                batch = events[i:i + self.batch_size]
+                if not await self._write(batch):
+                    if path == own_replay:
+                        self._replay_done = i
+                    return replayed
+                replayed += len(batch)
+                self._stats["replayed"] += len(batch)
+            os.remove(path)
+            if path == own_replay:
+                self._replay_done = 0
+        return replayed
+
+    def _spill_backlog(self) -> int:
+        total = 0
+        for path in glob.glob(os.path.join(self.spill_dir, "audit-*.jsonl*")):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    total += sum(1 for _ in f)
+            except OSError:
+                pass
+        return total
+
+    # ------------------------------------------------------------------
+    # Lifecycle / stats
+    # ------------------------------------------------------------------
+    async def stop(self):
+        """Stops the worker and flushes what is still queued (app shutdown); failures are spilled."""
+        if self._worker and not self._worker.done():
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._worker = None
+        await self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        oldest = self._pending[0]["created_at"] if self._pending else None
+        age = 0.0
+        if oldest:
+            age = (datetime.now(timezone.utc) - datetime.fromisoformat(oldest)).total_seconds()
+        return {
+            **self._stats,
+            "pending": len(self._pending),
+            "max_pending": self.max_pending,
+            "batch_size": self.batch_size,
+            "flush_interval_seconds": self.flush_interval_seconds,
+            "oldest_pending_age_seconds": round(age, 2),
+            "spill_backlog": self._spill_backlog(),
+            "spill_dir": self.spill_dir,
+        }
+
+
+# Global instance
+audit_sink = AuditSink()
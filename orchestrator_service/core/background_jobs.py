@@ -0,0 +1,126 @@
+"""
+Background jobs that must run even where APScheduler is not available.
+
+services/scheduled_tasks.py only starts when apscheduler and its own imports
+resolve; the projection jobs (seller counters reconciliation and snapshot,
+search index backfill, lead aggregates reconciliation) cannot depend on that.
+They are registered here and run as plain asyncio tasks, started by main.py in
+the roles that run background work (boot_profile.runs_scheduler()).
+
+    background_jobs.every("search_index_backfill", 60, job)
+    background_jobs.daily("seller_counters_reconciliation", job, hour=3, minute=15)
+    await background_jobs.start()
+    ...
+    await background_jobs.stop()
+
+A job never overlaps itself (one task per job, the next run is scheduled after
+the previous one finishes) and an exception is logged and counted without
+stopping the loop. Daily jobs are scheduled in UTC.
+"""
+import asyncio
+import logging
+import time as _time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger("background_jobs")
+
+JobFunc = Callable[[], Awaitable[Any]]
+
+
+@dataclass
+class Job:
+    name: str
+    func: JobFunc
+    interval_seconds: Optional[float] = None
+    daily_at: Optional[tuple] = None  # (hour, minute) UTC
+    initial_delay: float = 0.0
+    runs: int = 0
+    errors: int = 0
+    last_run_at: Optional[str] = None
+    last_duration_ms: Optional[float] = None
+    last_error: Optional[str] = None
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    def next_delay(self, now: Optional[datetime] = None) -> float:
+        """Seconds until the next run."""
+        if self.interval_seconds is not None:
+            return self.interval_seconds
+        now = now or datetime.now(timezone.utc)
+        hour, minute = self.daily_at
+        target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if target <= now:
+            target += timedelta(days=1)
+        return (target - now).total_seconds()
+
+
+class BackgroundJobs:
+    def __init__(self):
+        self._jobs: Dict[str, Job] = {}
+
+    def every(self, name: str, seconds: float, func: JobFunc, initial_delay: float = 0.0) -> Job:
+        """Runs `func` every `seconds` (after `initial_delay`, then after each run finishes)."""
+        job = Job(name=name, func=func, interval_seconds=seconds, initial_delay=initial_delay)
+        self._jobs[name] = job
+        return job
+
+    def daily(self, name: str, func: JobFunc, hour: int, minute: int = 0) -> Job:
+        """Runs `func` once a day at hour:minute UTC."""
+        job = Job(name=name, func=func, daily_at=(hour, minute))
+        self._jobs[name] = job
+        return job
+
+    async def run_once(self, job: Job):
+        started = _time.perf_counter()
+        job.last_run_at = datetime.now(timezone.utc).isoformat()
+        try:
+            await job.func()
+            job.last_error = None
+        except Exception as e:
+            job.errors += 1
+            job.last_error = str(e)
+            logger.error(f"Background job {job.name} failed: {e}", exc_info=True)
+        finally:
+            job.runs += 1
+            job.last_duration_ms = round((_time.perf_counter() - started) * 1000, 1)
+
+    async def _loop(self, job: Job):
+        delay = job.initial_delay if job.interval_seconds is not None else job.next_delay()
+        while True:
+            await asyncio.sleep(delay)
+            await self.run_once(job)
+            delay = job.next_delay()
+
+    async def start(self):
+        for job in self._jobs.values():
+            if job.task and not job.task.done():
+                continue
+            job.task = asyncio.create_task(self._loop(job), name=f"background_job:{job.name}")
+            schedule = f"every {job.interval_seconds:g}s" if job.interval_seconds is not None else "daily at %02d:%02d UTC" % job.daily_at
+            logger.info(f"Background job {job.name} started ({schedule})")
+
+    async def stop(self):
+        tasks = [job.task for job in self._jobs.values() if job.task and not job.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for job in self._jobs.values():
+            job.task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            name: {
+                "running": bool(job.task and not job.task.done()),
+                "runs": job.runs,
+                "errors": job.errors,
+                "last_run_at": job.last_run_at,
+                "last_duration_ms": job.last_duration_ms,
+                "last_error": job.last_error,
+            }
+            for name, job in self._jobs.items()
+        }
+
+
+# Global instance
+background_jobs = BackgroundJobs()
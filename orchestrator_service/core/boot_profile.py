@@ -0,0 +1,296 @@
+"""
+Role-based boot profile: which routers and background workers a process loads.
+
+main.py used to import and mount every route module at import time, build a
+global ChatOpenAI client and pull LangChain into every worker, including the
+ones that only receive webhooks. Now the process role decides what is loaded:
+
+    ORCHESTRATOR_ROLE=all        everything (default, previous behavior)
+    ORCHESTRATOR_ROLE=webhook    inbound ingest: /chat, /webhook/ycloud, /webhooks (Meta),
+                                 /internal/* service-to-service routes, public lead forms
+    ORCHESTRATOR_ROLE=admin      admin / CRM API for the frontend and the Nova voice socket
+    ORCHESTRATOR_ROLE=scheduler  scheduled tasks + email lead monitor, health routes only
+
+Route modules are imported only when the role mounts them (ROUTER_MOUNTS keeps
+the same prefixes, tags and mount order as before). The endpoints declared in
+main.py itself (/chat, /webhook/ycloud, the Nova voice socket) exist in every
+role; their dependencies are imported inside the handlers. The LangChain agent
+SDK is imported on first use; roles that answer /chat preload it in a
+background thread after startup so the first inbound message does not pay for it.
+
+Import cost per role can be measured with `python -X importtime` through
+scripts/profile_imports.py; mounted routers, per-module import time, time to
+ready and peak RSS are exposed through get_stats() / GET /health/boot.
+"""
+import asyncio
+import importlib
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows: sin ru_maxrss
+    resource = None
+
+logger = logging.getLogger("boot_profile")
+
+# Reference point for time-to-ready: main.py imports this module first
+BOOT_STARTED = time.perf_counter()
+
+ROLE_ALL = "all"
+ROLE_WEBHOOK = "webhook"
+ROLE_ADMIN = "admin"
+ROLE_SCHEDULER = "scheduler"
+ROLES = (ROLE_ALL, ROLE_WEBHOOK, ROLE_ADMIN, ROLE_SCHEDULER)
+
+# Modules behind the LangChain agent (/chat), imported lazily by main.py
+AGENT_SDK_MODULES = (
+    "langchain_openai",
+    "langchain.agents",
+    "langchain_core.prompts",
+    "langchain_core.messages",
+    "modules.crm_sales.tools_provider",
+)
+BOOT_PRELOAD_AGENT = os.getenv("BOOT_PRELOAD_AGENT", "true").lower() == "true"
+
+
+def resolve_role(value: Optional[str]) -> str:
+    """Normalizes ORCHESTRATOR_ROLE; unknown values fall back to 'all'."""
+    role = (value or ROLE_ALL).strip().lower()
+    if role not in ROLES:
+        logger.warning(f"⚠️ Unknown ORCHESTRATOR_ROLE={value!r}, booting with role 'all'")
+        return ROLE_ALL
+    return role
+
+
+ORCHESTRATOR_ROLE = resolve_role(os.getenv("ORCHESTRATOR_ROLE"))
+
+
+def serves(roles: Iterable[str], role: Optional[str] = None) -> bool:
+    """True when the process role loads something declared for `roles`."""
+    role = role or ORCHESTRATOR_ROLE
+    return role == ROLE_ALL or role in roles
+
+
+def runs_scheduler(role: Optional[str] = None) -> bool:
+    """Scheduled tasks and the email lead monitor run only in 'all' and 'scheduler'."""
+    return serves((ROLE_SCHEDULER,), role)
+
+
+def handles_inbound(role: Optional[str] = None) -> bool:
+    """Roles that answer /chat (and therefore need the agent SDK)."""
+    return serves((ROLE_WEBHOOK,), role)
+
+
+WEBHOOK: FrozenSet[str] = frozenset({ROLE_WEBHOOK})
+ADMIN: FrozenSet[str] = frozenset({ROLE_ADMIN})
+SCHEDULER: FrozenSet[str] = frozenset({ROLE_SCHEDULER})
+EVERY_ROLE: FrozenSet[str] = frozenset({ROLE_WEBHOOK, ROLE_ADMIN, ROLE_SCHEDULER})
+
+
+@dataclass(frozen=True)
+class RouterMount:
+    """One app.include_router() call, imported only for the roles that need it."""
+
+    name: str
+    module: str
+    attr: str = "router"
+    prefix: str = ""
+    tags: Optional[Tuple[str, ...]] = None
+    roles: FrozenSet[str] = ADMIN
+    # Failures are logged as warnings instead of errors (previous behavior per module)
+    optional: bool = False
+    # Failures abort startup (modules main.py used to import at top level)
+    required: bool = False
+
+
+ROUTER_MOUNTS: Tuple[RouterMount, ...] = (
+    RouterMount("auth", "auth_routes", required=True),
+    RouterMount("admin", "admin_routes", required=True),
+    # Service-to-service credential lookup (whatsapp_service), same /admin/core prefix
+    RouterMount("admin_internal", "admin_routes", attr="internal_router", roles=ADMIN | WEBHOOK, required=True),
+    RouterMount("sellers", "routes.seller_routes", tags=("Seller Management",)),
+    RouterMount("notifications", "routes.notification_routes", tags=("Notifications",)),
+    RouterMount("scheduled_tasks", "routes.scheduled_tasks_routes", tags=("Scheduled Tasks",), roles=ADMIN | SCHEDULER),
+    RouterMount("health", "routes.health_routes", tags=("Health",), roles=EVERY_ROLE),
+    # Single-niche: CRM Sales (NicheManager.load_niche_router path)
+    RouterMount("niche_crm_sales", "modules.crm_sales.routes", prefix="/niche/crm_sales", tags=("crm_sales",)),
+    # CRM Sales under /admin/core/crm so proxy/CORS work (same path as other admin routes)
+    RouterMount("crm_admin", "modules.crm_sales.routes", prefix="/admin/core/crm", tags=("CRM Sales (Admin)",), optional=True),
+    RouterMount("lead_status", "routes.lead_status_routes", tags=("Lead Status",)),
+    RouterMount("telegram", "routes.telegram_routes", tags=("Telegram Notifications",), roles=ADMIN | WEBHOOK, optional=True),
+    RouterMount("lead_timeline", "routes.lead_timeline_routes", tags=("Lead Timeline",)),
+    RouterMount("lead_tags", "routes.lead_tags_routes", tags=("Lead Tags",)),
+    RouterMount("lead_notes", "routes.lead_notes_routes", tags=("Lead Notes & Derivation",)),
+    RouterMount("user_management", "routes.user_management_routes", tags=("User Management",)),
+    RouterMount("hsm_templates", "routes.hsm_templates_routes", tags=("HSM Templates",)),
+    RouterMount("chat_send", "routes.chat_routes", tags=("Chat Send",)),
+    RouterMount("marketing", "routes.marketing", prefix="/crm/marketing", tags=("Marketing",)),
+    RouterMount("meta_auth", "routes.meta_auth", prefix="/crm/auth/meta", tags=("Meta OAuth",)),
+    RouterMount("meta_webhooks", "routes.meta_webhooks", prefix="/webhooks", tags=("Webhooks",), roles=WEBHOOK),
+    RouterMount("meta_connect", "routes.meta_connect", prefix="/admin/meta", tags=("Meta Embedded Signup",)),
+    RouterMount("google_auth", "routes.google_auth", prefix="/crm/auth/google", tags=("Google OAuth",)),
+    RouterMount("google_ads", "routes.google_ads_routes", prefix="/crm/marketing", tags=("Google Ads",)),
+    RouterMount("email_monitor", "routes.email_monitor_routes", tags=("Email Lead Monitor",)),
+    RouterMount("company_settings", "routes.company_settings_routes", tags=("Company Settings",)),
+    RouterMount("company_setup", "routes.company_settings_routes", attr="setup_router", tags=("Setup",)),
+    RouterMount("ai_agent", "routes.ai_agent_routes", tags=("AI Agent Config",)),
+    RouterMount("ai_agent_setup", "routes.ai_agent_routes", attr="setup_router", tags=("Setup",)),
+    RouterMount("channel_routing", "routes.channel_routes", attr="internal_router", tags=("Internal Routing",), roles=ADMIN | WEBHOOK),
+    RouterMount("channel_admin", "routes.channel_routes", attr="admin_router", tags=("Channel Management",)),
+    RouterMount("team_activity", "routes.team_activity_routes", tags=("Team Activity",)),
+    RouterMount("sla_rules", "routes.sla_routes", tags=("SLA Rules",)),
+    RouterMount("reactivation", "routes.reactivation_routes", tags=("Reactivation DEV-47",)),
+    RouterMount("deduplication", "routes.deduplication_routes", tags=("Deduplication DEV-50",)),
+    RouterMount("analytics", "routes.analytics_routes", optional=True),
+    RouterMount("drive", "routes.drive_routes", tags=("Drive Storage",), optional=True),
+    RouterMount("lead_forms", "routes.lead_forms_routes", tags=("Lead Forms",), optional=True),
+    RouterMount("lead_forms_public", "routes.lead_forms_routes", attr="public_router", tags=("Lead Forms Public",), roles=ADMIN | WEBHOOK, optional=True),
+    RouterMount("checkin", "routes.checkin_routes", tags=("Daily Check-in",), optional=True),
+    RouterMount("vendor_tasks", "routes.vendor_tasks_routes", tags=("Vendor Tasks",), optional=True),
+    RouterMount("manuales", "routes.manuales_routes", tags=("Knowledge Base",), optional=True),
+    RouterMount("internal_chat", "routes.internal_chat_routes", tags=("Internal Chat",), optional=True),
+    RouterMount("plantillas", "routes.plantillas_routes", tags=("Plantillas",), optional=True),
+)
+
+# Filled by mount_routers() / preload_modules() / mark_ready(), read by get_stats()
+boot_stats: Dict[str, Any] = {
+    "role": ORCHESTRATOR_ROLE,
+    "mounted": [],
+    "skipped": [],
+    "failed": {},
+    "module_import_ms": {},
+    "mount_ms": None,
+    "preloaded": {},
+    "ready_ms": None,
+}
+
+
+def _import_timed(module: str) -> Tuple[Any, float]:
+    started = time.perf_counter()
+    imported = importlib.import_module(module)
+    return imported, (time.perf_counter() - started) * 1000
+
+
+def mount_routers(app, mounts: Iterable[RouterMount] = ROUTER_MOUNTS, role: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Includes the routers the role needs, in order. A module that fails to
+    import or has no such router is logged and skipped; the rest still mount.
+    A required mount re-raises instead (the app must not start without it).
+    Returns boot_stats.
+    """
+    role = role or ORCHESTRATOR_ROLE
+    started = time.perf_counter()
+    boot_stats.update(role=role, mounted=[], skipped=[], failed={}, module_import_ms={})
+    for mount in mounts:
+        if not serves(mount.roles, role):
+            boot_stats["skipped"].append(mount.name)
+            continue
+        try:
+            if mount.module in boot_stats["module_import_ms"]:
+                module = importlib.import_module(mount.module)
+            else:
+                module, elapsed_ms = _import_timed(mount.module)
+                boot_stats["module_import_ms"][mount.module] = round(elapsed_ms, 1)
+            kwargs: Dict[str, Any] = {}
+            if mount.prefix:
+                kwargs["prefix"] = mount.prefix
+            if mount.tags:
+                kwargs["tags"] = list(mount.tags)
+            app.include_router(getattr(module, mount.attr), **kwargs)
+            boot_stats["mounted"].append(mount.name)
+        except Exception as e:
+            boot_stats["failed"][mount.name] = str(e)
+            if mount.required:
+                logger.critical(f"🚨 Could not mount required {mount.name} routes ({mount.module}): {e}")
+                raise
+            if mount.optional:
+                logger.warning(f"⚠️ Could not mount {mount.name} routes ({mount.module}): {e}")
+            else:
+                logger.error(f"❌ Could not mount {mount.name} routes ({mount.module}): {e}", exc_info=True)
+    boot_stats["mount_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(
+        f"✅ Role '{role}': {len(boot_stats['mounted'])} routers mounted in {boot_stats['mount_ms']} ms "
+        f"({len(boot_stats['skipped'])} skipped, {len(boot_stats['failed'])} failed)"
+    )
+    return boot_stats
+
+
+async def preload_modules(modules: Iterable[str] = AGENT_SDK_MODULES) -> Dict[str, float]:
+    """Imports modules in a worker thread so a later lazy import is a dict lookup."""
+    for module in modules:
+        try:
+            _, elapsed_ms = await asyncio.to_thread(_import_timed, module)
+            boot_stats["preloaded"][module] = round(elapsed_ms, 1)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not preload {module}: {e}")
+    return boot_stats["preloaded"]
+
+
+def mark_ready() -> float:
+    """Records time from the first main.py import to the end of the startup handler."""
+    boot_stats["ready_ms"] = round((time.perf_counter() - BOOT_STARTED) * 1000, 1)
+    logger.info(f"🚀 Role '{boot_stats['role']}' ready in {boot_stats['ready_ms']} ms")
+    return boot_stats["ready_ms"]
+
+
+def max_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process (ru_maxrss is KiB on Linux)."""
+    if resource is None:
+        return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def get_stats() -> Dict[str, Any]:
+    slowest = sorted(boot_stats["module_import_ms"].items(), key=lambda kv: kv[1], reverse=True)[:10]
+    return {
+        **boot_stats,
+        "module_import_ms": dict(slowest),
+        "max_rss_mb": max_rss_mb(),
+    }
+
+
+# ============================================================================
+# `python -X importtime` report (scripts/profile_imports.py)
+# ============================================================================
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)\s*$")
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """
+    Parses `-X importtime` output into [{module, self_us, cumulative_us, depth}],
+    in import order. The header line and any other stderr output are ignored.
+    """
+    entries = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        entries.append({
+            "module": module,
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us),
+            # One space before a top-level import, two more per nesting level
+            "depth": (len(indent) - 1) // 2,
+        })
+    return entries
+
+
+def summarize_importtime(entries: List[Dict[str, Any]], top: int = 20) -> Dict[str, Any]:
+    """Total import time, slowest modules (cumulative) and self time per top-level package."""
+    by_package: Dict[str, int] = {}
+    for entry in entries:
+        package = entry["module"].split(".", 1)[0]
+        by_package[package] = by_package.get(package, 0) + entry["self_us"]
+    return {
+        "modules": len(entries),
+        "total_ms": round(sum(e["self_us"] for e in entries) / 1000, 1),
+        "slowest": sorted(entries, key=lambda e: e["cumulative_us"], reverse=True)[:top],
+        "packages": sorted(by_package.items(), key=lambda kv: kv[1], reverse=True)[:top],
+    }
@@ -35,6 +35,7 @@ def decrypt_value(cipher: str) -> str:
         return cipher
 
 from db import db
+from core.tenant_cache import tenant_cache, NS_CREDENTIAL, NS_WEBHOOK_TENANT
 
 CHATWOOT_API_TOKEN = "CHATWOOT_API_TOKEN"
 CHATWOOT_ACCOUNT_ID = "CHATWOOT_ACCOUNT_ID"
@@ -59,17 +60,22 @@ async def get_tenant_credential(tenant_id: int, name: str) -> Optional[str]:
     """
     Obtiene el valor de una credencial del tenant desde la tabla credentials.
     Nexus Resilience: Aislamiento estricto por tenant_id.
+    El valor desencriptado se cachea en proceso (core/tenant_cache) hasta que
+    save_tenant_credential lo invalide o expire el TTL.
     """
-    row = await db.fetchrow(
-        "SELECT value FROM credentials WHERE tenant_id = $1 AND name = $2 LIMIT 1",
-        tenant_id,
-        name,
-    )
-    if not row or not row["value"]:
-        return None
-    
-    # Intentar decriptar si es un valor encriptado (Fernet)
-    return decrypt_value(str(row["value"]))
+    async def _load() -> Optional[str]:
+        row = await db.fetchrow(
+            "SELECT value FROM credentials WHERE tenant_id = $1 AND name = $2 LIMIT 1",
+            tenant_id,
+            name,
+        )
+        if not row or not row["value"]:
+            return None
+
+        # Intentar decriptar si es un valor encriptado (Fernet)
+        return decrypt_value(str(row["value"]))
+
+    return await tenant_cache.get_or_load(NS_CREDENTIAL, (int(tenant_id), name), _load, tenant_id=int(tenant_id))
 
 
 
@@ -88,12 +94,17 @@ async def get_tenant_credential_int(tenant_id: int, name: str) -> Optional[int]:
 
 async def resolve_tenant_from_webhook_token(access_token: str) -> Optional[int]:
     """Resuelve tenant_id desde WEBHOOK_ACCESS_TOKEN (para webhook Chatwoot)."""
-    row = await db.fetchrow(
-        "SELECT tenant_id FROM credentials WHERE name = $1 AND value = $2 LIMIT 1",
-        WEBHOOK_ACCESS_TOKEN,
-        access_token.strip(),
-    )
-    return int(row["tenant_id"]) if row else None
+    token = access_token.strip()
+
+    async def _load() -> Optional[int]:
+        row = await db.fetchrow(
+            "SELECT tenant_id FROM credentials WHERE name = $1 AND value = $2 LIMIT 1",
+            WEBHOOK_ACCESS_TOKEN,
+            token,
+        )
+        return int(row["tenant_id"]) if row else None
+
+    return await tenant_cache.get_or_load(NS_WEBHOOK_TENANT, ("webhook_token", token), _load)
 
 
 async def save_tenant_credential(tenant_id: int, name: str, value: str, category: str = "general") -> bool:
@@ -107,6 +118,7 @@ async def save_tenant_credential(tenant_id: int, name: str, value: str, category
             ON CONFLICT (tenant_id, name) 
             DO UPDATE SET value = $3, category = $4, updated_at = NOW()
         """, tenant_id, name, final_value, category)
+        tenant_cache.invalidate_tenant(tenant_id)
         return True
     except Exception as e:
         logger.error(f"Error saving credential {name} for tenant {tenant_id}: {e}")
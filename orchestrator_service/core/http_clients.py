@@ -0,0 +1,254 @@
+"""
+Shared, lifecycle-managed httpx clients for outbound provider traffic.
+
+Every outbound call used to open its own httpx.AsyncClient, paying a fresh
+TCP + TLS handshake per request (YCloud, Meta Graph, Telegram, the internal
+/chat forward...). The registry keeps ONE keep-alive pool per upstream origin
+(scheme://host[:port]) with per-host connection limits; HTTP/2 is negotiated
+when the optional `h2` package is installed (httpx[http2]).
+
+Usage — call sites keep their own timeouts:
+
+    async with http_clients.session(timeout=10.0) as client:
+        resp = await client.post(url, json=payload)
+
+`session()` does not open or close anything: each request is routed to the
+pool of its URL's origin, so one block may talk to several hosts.
+
+Pools are created lazily (or up front via start()) and closed by aclose() on
+shutdown. Per-origin metrics (latency histogram, new vs reused connections,
+errors) are exposed through get_stats() / GET /health/http-clients.
+"""
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Iterable, Optional
+
+import httpx
+
+logger = logging.getLogger("http_clients")
+
+HTTP_CLIENT_MAX_CONNECTIONS = int(os.getenv("HTTP_CLIENT_MAX_CONNECTIONS", "20"))  # por host
+HTTP_CLIENT_MAX_KEEPALIVE = int(os.getenv("HTTP_CLIENT_MAX_KEEPALIVE", "10"))  # por host
+HTTP_CLIENT_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("HTTP_CLIENT_KEEPALIVE_EXPIRY_SECONDS", "30"))
+# Same default as a bare httpx.AsyncClient(): call sites that passed no timeout keep 5s
+HTTP_CLIENT_DEFAULT_TIMEOUT = float(os.getenv("HTTP_CLIENT_DEFAULT_TIMEOUT", "5"))
+HTTP_CLIENT_CONNECT_TIMEOUT = float(os.getenv("HTTP_CLIENT_CONNECT_TIMEOUT", "5"))
+HTTP_CLIENT_HTTP2 = os.getenv("HTTP_CLIENT_HTTP2", "true").lower() == "true"
+
+try:
+    import h2  # noqa: F401
+
+    _H2_AVAILABLE = True
+except ImportError:
+    _H2_AVAILABLE = False
+
+# Cumulative latency buckets (ms), time to response headers
+LATENCY_BUCKETS_MS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def origin_of(url: str) -> str:
+    """scheme://host[:port] of an absolute URL (default ports omitted)."""
+    u = httpx.URL(url)
+    if not u.host:
+        raise ValueError(f"http_clients needs an absolute URL, got {url!r}")
+    return f"{u.scheme}://{u.host}" + (f":{u.port}" if u.port else "")
+
+
+class OriginStats:
+    """Counters for one upstream origin."""
+
+    def __init__(self, origin: str):
+        self.origin = origin
+        self.requests = 0
+        self.errors = 0
+        self.new_connections = 0
+        self.in_flight = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.http_versions: Dict[str, int] = {}
+
+    def record(self, elapsed_ms: float, new_connection: bool, http_version: Optional[str] = None, failed: bool = False):
+        if failed:
+            self.errors += 1
+        else:
+            self.requests += 1
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+            for i, bound in enumerate(LATENCY_BUCKETS_MS):
+                if elapsed_ms <= bound:
+                    self.buckets[i] += 1
+                    break
+            else:
+                self.buckets[-1] += 1
+            if http_version:
+                self.http_versions[http_version] = self.http_versions.get(http_version, 0) + 1
+        if new_connection:
+            self.new_connections += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        histogram, running = {}, 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.buckets):
+            running += count
+            histogram[f"le_{bound}"] = running
+        histogram["le_+Inf"] = running + self.buckets[-1]
+        attempts = self.requests + self.errors
+        reused = max(attempts - self.new_connections, 0)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "new_connections": self.new_connections,
+            "reused_connections": reused,
+            "reuse_rate": round(reused / attempts, 4) if attempts else 0.0,
+            "latency_avg_ms": round(self.total_ms / self.requests, 2) if self.requests else 0.0,
+            "latency_max_ms": round(self.max_ms, 2),
+            "latency_histogram_ms": histogram,
+            "http_versions": self.http_versions,
+        }
+
+
+class _MeteredTransport(httpx.AsyncBaseTransport):
+    """Wraps the pooled transport: times each request and detects new TCP connections via httpcore's trace hook."""
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, stats: OriginStats):
+        self._inner = inner
+        self._stats = stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        opened = False
+        caller_trace = request.extensions.get("trace")
+
+        async def _trace(event_name: str, info: dict):
+            nonlocal opened
+            if event_name == "connection.connect_tcp.complete":
+                opened = True
+            if caller_trace is not None:
+                await caller_trace(event_name, info)
+
+        request.extensions = {**request.extensions, "trace": _trace}
+        stats = self._stats
+        stats.in_flight += 1
+        started = time.perf_counter()
+        try:
+            response = await self._inner.handle_async_request(request)
+        except Exception:
+            stats.record((time.perf_counter() - started) * 1000, opened, failed=True)
+            raise
+        finally:
+            stats.in_flight -= 1
+        stats.record(
+            (time.perf_counter() - started) * 1000,
+            opened,
+            http_version=response.extensions.get("http_version", b"").decode("ascii", "ignore") or None,
+        )
+        return response
+
+    async def aclose(self):
+        await self._inner.aclose()
+
+
+class _Session:
+    """Request helper bound to a default timeout; routes each call to the pool of its origin."""
+
+    def __init__(self, registry: "HttpClientRegistry", timeout: Any):
+        self._registry = registry
+        self._timeout = timeout
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        if self._timeout is not None:
+            kwargs.setdefault("timeout", self._timeout)
+        return await self._registry.get(url).request(method, url, **kwargs)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def put(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("PUT", url, **kwargs)
+
+    async def patch(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("PATCH", url, **kwargs)
+
+    async def delete(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("DELETE", url, **kwargs)
+
+
+class HttpClientRegistry:
+    """One pooled httpx.AsyncClient per upstream origin."""
+
+    def __init__(
+        self,
+        max_connections: int = HTTP_CLIENT_MAX_CONNECTIONS,
+        max_keepalive: int = HTTP_CLIENT_MAX_KEEPALIVE,
+        keepalive_expiry: float = HTTP_CLIENT_KEEPALIVE_EXPIRY_SECONDS,
+        http2: bool = HTTP_CLIENT_HTTP2,
+        transport_factory=None,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2 and _H2_AVAILABLE
+        self.timeout = httpx.Timeout(HTTP_CLIENT_DEFAULT_TIMEOUT, connect=HTTP_CLIENT_CONNECT_TIMEOUT)
+        self._transport_factory = transport_factory or self._default_transport
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._stats: Dict[str, OriginStats] = {}
+
+    def _default_transport(self, origin: str) -> httpx.AsyncBaseTransport:
+        return httpx.AsyncHTTPTransport(limits=self.limits, http2=self.http2)
+
+    def get(self, url: str) -> httpx.AsyncClient:
+        """Pooled client for the URL's origin (created on first use)."""
+        origin = origin_of(url)
+        client = self._clients.get(origin)
+        if client is None or client.is_closed:
+            stats = self._stats.get(origin) or self._stats.setdefault(origin, OriginStats(origin))
+            client = httpx.AsyncClient(
+                transport=_MeteredTransport(self._transport_factory(origin), stats),
+                timeout=self.timeout,
+            )
+            self._clients[origin] = client
+        return client
+
+    @asynccontextmanager
+    async def session(self, timeout: Any = None) -> AsyncIterator[_Session]:
+        """Drop-in replacement for `async with httpx.AsyncClient(timeout=...) as client`; nothing is closed on exit."""
+        yield _Session(self, timeout)
+
+    async def start(self, urls: Iterable[str] = ()):
+        """Creates the pools for the given upstreams up front (the TCP/TLS handshake still happens on first request)."""
+        for url in urls:
+            if url:
+                try:
+                    self.get(url)
+                except ValueError as e:
+                    logger.warning(f"http_clients: skipping upstream {url!r}: {e}")
+        logger.info(f"✅ HTTP client registry ready ({len(self._clients)} upstreams, http2={self.http2})")
+
+    async def aclose(self):
+        clients, self._clients = self._clients, {}
+        for origin, client in clients.items():
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"http_clients: error closing pool for {origin}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "http2": self.http2,
+            "max_connections_per_host": self.limits.max_connections,
+            "max_keepalive_per_host": self.limits.max_keepalive_connections,
+            "keepalive_expiry_seconds": self.limits.keepalive_expiry,
+            "open_pools": sorted(self._clients),
+            "origins": {origin: s.get_stats() for origin, s in self._stats.items()},
+        }
+
+
+# Global instance
+http_clients = HttpClientRegistry()
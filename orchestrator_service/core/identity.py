@@ -0,0 +1,195 @@
+"""
+Cached identity resolution for admin requests: user_id -> tenant_id, role, status.
+
+core/security.get_resolved_tenant_id used to run up to three sequential lookups
+on every admin call (sellers, then professionals, then the first tenant), and
+routes that call it directly next to the dependency repeated them. Now:
+
+1. Request scope: verify_admin_token opens a per-request memo (ContextVar), so
+   every resolution after the first one in the same request is free.
+2. Process scope: identities live in tenant_cache (NS_USER_IDENTITY) for
+   IDENTITY_CACHE_TTL_SECONDS. User / seller / professional writers call
+   invalidate_identity(), which also fans out to other replicas through the
+   tenant cache pub/sub channel.
+3. Misses resolve in one statement (LATERAL lookups on sellers and
+   professionals plus the first-tenant fallback). IDENTITY_SINGLE_QUERY=false,
+   or a failing statement (legacy schemas without `sellers`), falls back to the
+   sequential lookups.
+
+Priority is unchanged: sellers (CRM) -> professionals (legacy) -> first tenant -> 1.
+get_stats() reports the DB round trips saved against the sequential path.
+"""
+import logging
+import os
+import uuid
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from db import db
+from core.tenant_cache import tenant_cache, NS_USER_IDENTITY
+
+logger = logging.getLogger("identity")
+
+IDENTITY_CACHE_TTL_SECONDS = float(os.getenv("IDENTITY_CACHE_TTL_SECONDS", "60"))
+IDENTITY_SINGLE_QUERY = os.getenv("IDENTITY_SINGLE_QUERY", "true").lower() == "true"
+
+IDENTITY_SQL = """
+    SELECT
+        u.role,
+        u.status,
+        s.tenant_id AS seller_tenant_id,
+        p.tenant_id AS professional_tenant_id,
+        (SELECT id FROM tenants ORDER BY id ASC LIMIT 1) AS first_tenant_id
+    FROM (SELECT $1::uuid AS id) k
+    LEFT JOIN users u ON u.id = k.id
+    LEFT JOIN LATERAL (SELECT tenant_id FROM sellers WHERE user_id = k.id LIMIT 1) s ON TRUE
+    LEFT JOIN LATERAL (SELECT tenant_id FROM professionals WHERE user_id = k.id LIMIT 1) p ON TRUE
+"""
+
+# user_id -> identity, for the request being served (None outside a request)
+_request_identities: ContextVar[Optional[Dict[str, Dict[str, Any]]]] = ContextVar(
+    "request_identities", default=None
+)
+
+
+def _sequential_round_trips(source: str) -> int:
+    """Lookups the sequential path needs to reach this source (sellers=1, professionals=2, fallback=3)."""
+    return {"seller": 1, "professional": 2}.get(source, 3)
+
+
+class IdentityResolver:
+    """Resolves and caches user identities; keeps round-trip counters for /health/identity-cache."""
+
+    def __init__(self):
+        self._stats = {
+            "requests": 0,
+            "resolutions": 0,
+            "request_hits": 0,
+            "cache_hits": 0,
+            "loads": 0,
+            "single_query_failures": 0,
+            "db_round_trips": 0,
+            "round_trips_saved": 0,
+        }
+
+    def begin_request(self):
+        """Opens the request-scoped memo (called by verify_admin_token)."""
+        self._stats["requests"] += 1
+        _request_identities.set({})
+
+    async def resolve(self, user_id: Any) -> Dict[str, Any]:
+        """
+        {"tenant_id", "role", "status", "source"} for the user. role/status are
+        None when the user row does not exist; tenant_id always resolves.
+        """
+        self._stats["resolutions"] += 1
+        key = str(user_id)
+        memo = _request_identities.get()
+        if memo is not None and key in memo:
+            self._stats["request_hits"] += 1
+            self._stats["round_trips_saved"] += _sequential_round_trips(memo[key]["source"])
+            return memo[key]
+
+        loaded = False
+
+        async def _load():
+            nonlocal loaded
+            loaded = True
+            return await self._load(user_id)
+
+        identity = await tenant_cache.get_or_load(
+            NS_USER_IDENTITY, key, _load, ttl_seconds=IDENTITY_CACHE_TTL_SECONDS
+        )
+        if not loaded:
+            self._stats["cache_hits"] += 1
+            self._stats["round_trips_saved"] += _sequential_round_trips(identity["source"])
+        if memo is not None:
+            memo[key] = identity
+        return identity
+
+    async def _load(self, user_id: Any) -> Dict[str, Any]:
+        self._stats["loads"] += 1
+        uid = user_id if isinstance(user_id, uuid.UUID) else uuid.UUID(str(user_id))
+        if IDENTITY_SINGLE_QUERY:
+            try:
+                row = await db.pool.fetchrow(IDENTITY_SQL, uid)
+                self._stats["db_round_trips"] += 1
+            except Exception as e:
+                self._stats["db_round_trips"] += 1
+                self._stats["single_query_failures"] += 1
+                logger.debug(f"Identity single query failed, using sequential lookups: {e}")
+            else:
+                identity = self._from_row(row)
+                self._stats["round_trips_saved"] += _sequential_round_trips(identity["source"]) - 1
+                return identity
+        return await self._load_sequential(uid)
+
+    @staticmethod
+    def _from_row(row) -> Dict[str, Any]:
+        if row["seller_tenant_id"] is not None:
+            tenant_id, source = row["seller_tenant_id"], "seller"
+        elif row["professional_tenant_id"] is not None:
+            tenant_id, source = row["professional_tenant_id"], "professional"
+        else:
+            tenant_id, source = row["first_tenant_id"], "fallback"
+        return {
+            "tenant_id": int(tenant_id) if tenant_id is not None else 1,
+            "role": row["role"],
+            "status": row["status"],
+            "source": source,
+        }
+
+    async def _load_sequential(self, uid: uuid.UUID) -> Dict[str, Any]:
+        """Former lookup order, one statement at a time; tolerates missing legacy tables."""
+        identity: Dict[str, Any] = {"tenant_id": None, "role": None, "status": None, "source": "fallback"}
+        for table, source in (("sellers", "seller"), ("professionals", "professional")):
+            try:
+                self._stats["db_round_trips"] += 1
+                tid = await db.pool.fetchval(f"SELECT tenant_id FROM {table} WHERE user_id = $1", uid)
+            except Exception:
+                continue  # Tabla puede no existir en entornos legacy
+            if tid is not None:
+                identity.update(tenant_id=int(tid), source=source)
+                break
+        if identity["tenant_id"] is None:
+            try:
+                self._stats["db_round_trips"] += 1
+                first = await db.pool.fetchval("SELECT id FROM tenants ORDER BY id ASC LIMIT 1")
+                identity["tenant_id"] = int(first) if first is not None else 1
+            except Exception:
+                identity["tenant_id"] = 1
+        try:
+            self._stats["db_round_trips"] += 1
+            user = await db.pool.fetchrow("SELECT role, status FROM users WHERE id = $1", uid)
+            if user:
+                identity.update(role=user["role"], status=user["status"])
+        except Exception:
+            pass
+        return identity
+
+    def invalidate(self, user_id: Any):
+        """Drops the cached identity here and on every replica (user status/role, seller or professional rows)."""
+        tenant_cache.invalidate(NS_USER_IDENTITY, str(user_id))
+        memo = _request_identities.get()
+        if memo is not None:
+            memo.pop(str(user_id), None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        requests = self._stats["requests"]
+        return {
+            **self._stats,
+            "ttl_seconds": IDENTITY_CACHE_TTL_SECONDS,
+            "single_query": IDENTITY_SINGLE_QUERY,
+            "round_trips_saved_per_request": round(self._stats["round_trips_saved"] / requests, 3) if requests else 0.0,
+        }
+
+
+identity_resolver = IdentityResolver()
+
+
+def invalidate_identity(user_id: Any):
+    """Call after writing users.role/status or a user's sellers / professionals row."""
+    try:
+        identity_resolver.invalidate(user_id)
+    except Exception as e:
+        logger.error(f"Error invalidating identity cache: {e}")
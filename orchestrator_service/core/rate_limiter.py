@@ -1,4 +1,451 @@
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+"""
+Distributed, tenant-aware rate limiting (replaces the per-process slowapi limiter).
 
-limiter = Limiter(key_func=get_remote_address)
+slowapi kept its counters in each worker's memory and keyed them on the remote
+address, which behind the proxy is the proxy itself: limits were both wrong
+and multiplied by the number of workers. Now:
+
+- One token bucket per key lives in Redis and is updated by an atomic Lua
+  script (refill + take in a single round trip, clock from Redis TIME, so
+  every worker and replica shares the same bucket).
+- HTTP keys combine the route with tenant and user (request.state.user, set
+  by verify_admin_token); anonymous endpoints (login/register) fall back to
+  the client IP. Behind a proxy set RATE_LIMIT_TRUST_FORWARDED=true: the IP
+  is then the X-Forwarded-For hop appended by the trusted proxies
+  (RATE_LIMIT_TRUSTED_PROXY_HOPS from the right), never the client-controlled
+  leftmost entry.
+- Local pre-check: when the bucket is clearly under the limit (still at least
+  half full after the take) the script leases a few extra tokens to the
+  worker, which spends them locally without a Redis hop. Leased tokens are
+  already removed from the shared bucket, so the global limit holds; unused
+  ones simply expire after RATE_LIMIT_LEASE_TTL_SECONDS. Small limits (below
+  RATE_LIMIT_LEASE_MIN_CAPACITY) never lease.
+- Without Redis, or while its circuit breaker is open, buckets fall back to
+  process memory: limits keep working, per worker, instead of failing open.
+
+The same engine throttles outbound provider sends (acquire() waits for a
+token instead of rejecting), keyed per YCloud / Meta sender number.
+
+Usage (unchanged for the routes):
+
+    @router.get("/leads")
+    @limiter.limit("100/minute")
+    async def list_leads(request: Request, ...): ...
+"""
+import asyncio
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import wraps
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request
+
+from core.two_tier_cache import RedisCircuitBreaker
+
+logger = logging.getLogger("rate_limiter")
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_PREFIX = os.getenv("RATE_LIMIT_PREFIX", "rl")
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() == "true"
+RATE_LIMIT_TRUSTED_PROXY_HOPS = max(1, int(os.getenv("RATE_LIMIT_TRUSTED_PROXY_HOPS", "1")))
+RATE_LIMIT_LEASE_FRACTION = float(os.getenv("RATE_LIMIT_LEASE_FRACTION", "0.1"))
+RATE_LIMIT_LEASE_MIN_CAPACITY = int(os.getenv("RATE_LIMIT_LEASE_MIN_CAPACITY", "20"))
+RATE_LIMIT_LEASE_TTL_SECONDS = float(os.getenv("RATE_LIMIT_LEASE_TTL_SECONDS", "1.0"))
+RATE_LIMIT_LOCAL_MAX_KEYS = int(os.getenv("RATE_LIMIT_LOCAL_MAX_KEYS", "10000"))
+RATE_LIMIT_REDIS_TIMEOUT_SECONDS = float(os.getenv("RATE_LIMIT_REDIS_TIMEOUT_SECONDS", "0.2"))
+RATE_LIMIT_REDIS_FAILURE_THRESHOLD = int(os.getenv("RATE_LIMIT_REDIS_FAILURE_THRESHOLD", "3"))
+RATE_LIMIT_REDIS_COOLDOWN_SECONDS = float(os.getenv("RATE_LIMIT_REDIS_COOLDOWN_SECONDS", "30"))
+
+# KEYS[1] = bucket key
+# ARGV = capacity, refill per second, cost, lease
+# Returns {allowed, leased, tokens left, retry after seconds}; floats as strings
+# because Redis truncates Lua numbers to integers.
+TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local refill = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local lease = tonumber(ARGV[4])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil or ts == nil then
+  tokens = capacity
+  ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * refill)
+local allowed = 0
+local leased = 0
+local retry_after = 0
+if tokens >= cost then
+  allowed = 1
+  tokens = tokens - cost
+  if lease > 0 and tokens - lease >= capacity / 2 then
+    leased = lease
+    tokens = tokens - lease
+  end
+else
+  retry_after = (cost - tokens) / refill
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / refill * 1000) + 1000)
+return {allowed, leased, tostring(tokens), tostring(retry_after)}
+"""
+
+_PERIODS = {
+    "second": 1, "seconds": 1, "s": 1,
+    "minute": 60, "minutes": 60, "m": 60,
+    "hour": 3600, "hours": 3600, "h": 3600,
+    "day": 86400, "days": 86400, "d": 86400,
+}
+_RATE_RE = re.compile(r"^\s*(\d+)\s*(?:/|per)\s*(\d+)?\s*([a-z]+)\s*$")
+
+
+@dataclass(frozen=True)
+class Rate:
+    """capacity tokens per period_seconds; the bucket refills continuously."""
+    capacity: int
+    period_seconds: float
+
+    @property
+    def refill_per_second(self) -> float:
+        return self.capacity / self.period_seconds
+
+    @classmethod
+    def parse(cls, value: str) -> "Rate":
+        """'100/minute', '3 per minute', '20/second', '1000/2 hours' (slowapi syntax)."""
+        match = _RATE_RE.match(value.lower())
+        if not match or match.group(3) not in _PERIODS:
+            raise ValueError(f"Invalid rate limit: {value!r}")
+        capacity = int(match.group(1))
+        if capacity <= 0:
+            raise ValueError(f"Invalid rate limit: {value!r}")
+        return cls(capacity, int(match.group(2) or 1) * _PERIODS[match.group(3)])
+
+    def __str__(self) -> str:
+        return f"{self.capacity}/{self.period_seconds:g}s"
+
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    retry_after: float = 0.0
+    source: str = "redis"  # redis | lease | local
+
+
+class RateLimitExceeded(HTTPException):
+    """429 with Retry-After; FastAPI renders it like any HTTPException."""
+
+    def __init__(self, rate: Rate, retry_after: float):
+        seconds = max(1, int(retry_after + 0.999))
+        super().__init__(
+            status_code=429,
+            detail=f"Demasiadas solicitudes (límite {rate}). Reintentá en {seconds}s.",
+            headers={"Retry-After": str(seconds)},
+        )
+        self.retry_after = seconds
+
+
+class RateLimitTimeout(Exception):
+    """acquire() could not get a token within max_wait_seconds."""
+
+
+class LocalTokenBuckets:
+    """Process-local token buckets (fallback when Redis is not available); bounded LRU."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_LOCAL_MAX_KEYS, clock: Callable[[], float] = time.monotonic):
+        self.max_keys = max_keys
+        self._clock = clock
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def take(self, key: str, rate: Rate, cost: int = 1) -> RateLimitResult:
+        now = self._clock()
+        tokens, updated = self._buckets.pop(key, (float(rate.capacity), now))
+        tokens = min(rate.capacity, tokens + max(0.0, now - updated) * rate.refill_per_second)
+        if tokens >= cost:
+            result = RateLimitResult(True, source="local")
+            tokens -= cost
+        else:
+            result = RateLimitResult(False, (cost - tokens) / rate.refill_per_second, source="local")
+        self._buckets[key] = (tokens, now)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return result
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class RateLimitEngine:
+    """Redis token buckets (atomic Lua) with local leases and a process-local fallback."""
+
+    def __init__(
+        self,
+        redis_factory: Optional[Callable[[], Any]] = None,
+        prefix: str = RATE_LIMIT_PREFIX,
+        lease_fraction: float = RATE_LIMIT_LEASE_FRACTION,
+        lease_min_capacity: int = RATE_LIMIT_LEASE_MIN_CAPACITY,
+        lease_ttl_seconds: float = RATE_LIMIT_LEASE_TTL_SECONDS,
+        breaker: Optional[RedisCircuitBreaker] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.prefix = prefix
+        self.lease_fraction = lease_fraction
+        self.lease_min_capacity = lease_min_capacity
+        self.lease_ttl_seconds = lease_ttl_seconds
+        self.breaker = breaker or RedisCircuitBreaker(
+            failure_threshold=RATE_LIMIT_REDIS_FAILURE_THRESHOLD,
+            cooldown_seconds=RATE_LIMIT_REDIS_COOLDOWN_SECONDS,
+        )
+        self._redis_factory = redis_factory
+        self._redis = None
+        self._script = None
+        self._clock = clock
+        self.local = LocalTokenBuckets(clock=clock)
+        # key -> (leased tokens left, expires at)
+        self._leases: Dict[str, Tuple[int, float]] = {}
+        self._stats = {
+            "checks": 0,
+            "allowed": 0,
+            "rejected": 0,
+            "lease_hits": 0,
+            "redis_calls": 0,
+            "redis_errors": 0,
+            "local_fallbacks": 0,
+            "tokens_leased": 0,
+            "acquire_waits": 0,
+            "acquire_wait_seconds": 0.0,
+            "acquire_timeouts": 0,
+        }
+
+    def _lease_size(self, rate: Rate) -> int:
+        if rate.capacity < self.lease_min_capacity:
+            return 0
+        return int(rate.capacity * self.lease_fraction)
+
+    # ------------------------------------------------------------------
+    # Redis (behind the breaker)
+    # ------------------------------------------------------------------
+    async def _get_script(self):
+        if self._redis_factory is None or not self.breaker.allow():
+            return None
+        if self._script is None:
+            try:
+                client = self._redis_factory()
+                if client is None:
+                    logger.info("Rate limiter: no REDIS_URL, limits are enforced per process")
+                    self._redis_factory = None
+                    return None
+                self._script = client.register_script(TOKEN_BUCKET_LUA)
+                self._redis = client
+            except Exception as e:
+                self._redis_failed(e)
+                return None
+        return self._script
+
+    def _redis_failed(self, error: Exception):
+        self._stats["redis_errors"] += 1
+        was_open = self.breaker.state == RedisCircuitBreaker.OPEN
+        self.breaker.record_failure()
+        if not was_open and self.breaker.state == RedisCircuitBreaker.OPEN:
+            logger.warning(
+                f"Rate limiter: Redis circuit opened ({error}); "
+                f"process-local buckets for {self.breaker.cooldown_seconds:.0f}s"
+            )
+            self._redis = None
+            self._script = None
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    async def hit(self, key: str, rate: Rate, cost: int = 1) -> RateLimitResult:
+        """Takes cost tokens from the bucket of key; never waits."""
+        self._stats["checks"] += 1
+        result = await self._hit(key, rate, cost)
+        self._stats["allowed" if result.allowed else "rejected"] += 1
+        return result
+
+    async def _hit(self, key: str, rate: Rate, cost: int) -> RateLimitResult:
+        # 1. Local pre-check: spend tokens leased by a previous Redis call
+        lease = self._leases.get(key)
+        if lease is not None:
+            left, expires_at = lease
+            if self._clock() < expires_at and left >= cost:
+                self._leases[key] = (left - cost, expires_at)
+                self._stats["lease_hits"] += 1
+                return RateLimitResult(True, source="lease")
+            del self._leases[key]
+
+        # 2. Shared bucket in Redis
+        script = await self._get_script()
+        if script is not None:
+            lease_size = self._lease_size(rate)
+            try:
+                self._stats["redis_calls"] += 1
+                allowed, leased, _, retry_after = await script(
+                    keys=[f"{self.prefix}:{key}"],
+                    args=[rate.capacity, rate.refill_per_second, cost, lease_size],
+                )
+            except Exception as e:
+                self._redis_failed(e)
+            else:
+                self.breaker.record_success()
+                leased = int(leased)
+                if leased:
+                    self._stats["tokens_leased"] += leased
+                    self._leases[key] = (leased, self._clock() + self.lease_ttl_seconds)
+                    if len(self._leases) > RATE_LIMIT_LOCAL_MAX_KEYS:
+                        self._prune_leases()
+                return RateLimitResult(bool(int(allowed)), float(retry_after))
+
+        # 3. No Redis: this process' own bucket
+        self._stats["local_fallbacks"] += 1
+        return self.local.take(key, rate, cost)
+
+    def _prune_leases(self):
+        now = self._clock()
+        for key in [k for k, (_, expires_at) in self._leases.items() if expires_at <= now]:
+            del self._leases[key]
+
+    async def acquire(self, key: str, rate: Rate, cost: int = 1, max_wait_seconds: float = 10.0) -> float:
+        """
+        Waits until the bucket grants cost tokens (outbound sends). Returns the
+        seconds waited; raises RateLimitTimeout after max_wait_seconds.
+        """
+        cost = min(cost, rate.capacity)
+        waited = 0.0
+        while True:
+            result = await self.hit(key, rate, cost)
+            if result.allowed:
+                if waited:
+                    self._stats["acquire_waits"] += 1
+                    self._stats["acquire_wait_seconds"] += waited
+                return waited
+            delay = max(result.retry_after, 0.01)
+            if waited + delay > max_wait_seconds:
+                self._stats["acquire_timeouts"] += 1
+                raise RateLimitTimeout(f"{key}: no token within {max_wait_seconds:g}s ({rate})")
+            await asyncio.sleep(delay)
+            waited += delay
+
+    async def close(self):
+        if self._redis is not None:
+            try:
+                await self._redis.close()
+            except Exception:
+                pass
+        self._redis = None
+        self._script = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        checks = self._stats["checks"]
+        return {
+            **self._stats,
+            "acquire_wait_seconds": round(self._stats["acquire_wait_seconds"], 3),
+            "lease_hit_rate": round(self._stats["lease_hits"] / checks, 3) if checks else 0.0,
+            "active_leases": len(self._leases),
+            "local_buckets": len(self.local),
+            "redis_configured": self._redis_factory is not None,
+            "redis_breaker": self.breaker.get_stats(),
+            "enabled": RATE_LIMIT_ENABLED,
+        }
+
+
+# ---------------------------------------------------------------------------
+# HTTP keys and decorator
+# ---------------------------------------------------------------------------
+def client_ip(request: Request) -> str:
+    """
+    Peer address, or with RATE_LIMIT_TRUST_FORWARDED the X-Forwarded-For entry
+    added by the outermost trusted proxy. Entries left of it come from the
+    client and can be rotated freely, so they are never used.
+    """
+    if RATE_LIMIT_TRUST_FORWARDED:
+        hops = [h.strip() for h in request.headers.get("x-forwarded-for", "").split(",") if h.strip()]
+        if hops:
+            return hops[-min(RATE_LIMIT_TRUSTED_PROXY_HOPS, len(hops))]
+    return request.client.host if request.client else "unknown"
+
+
+def tenant_user_key(request: Request) -> str:
+    """t{tenant}:u{user} for authenticated requests, ip:{client} otherwise."""
+    user = getattr(request.state, "user", None)
+    user_id = getattr(user, "user_id", None)
+    if user_id:
+        return f"t{getattr(user, 'tenant_id', None)}:u{user_id}"
+    return f"ip:{client_ip(request)}"
+
+
+def _route_scope(request: Request, func: Callable) -> str:
+    route = request.scope.get("route")
+    path = getattr(route, "path", None)
+    if path:
+        return f"{request.method}:{path}"
+    return f"{func.__module__}.{func.__qualname__}"
+
+
+class Limiter:
+    """Drop-in for the slowapi decorator API, backed by RateLimitEngine."""
+
+    def __init__(self, engine: RateLimitEngine, key_func: Callable[[Request], str] = tenant_user_key):
+        self.engine = engine
+        self.key_func = key_func
+
+    def limit(self, limit_value: str, key_func: Optional[Callable[[Request], str]] = None, scope: Optional[str] = None):
+        rate = Rate.parse(limit_value)
+        key_of = key_func or self.key_func
+
+        def decorator(func):
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                request = kwargs.get("request")
+                if not isinstance(request, Request):
+                    request = next((a for a in args if isinstance(a, Request)), None)
+                if RATE_LIMIT_ENABLED and request is not None:
+                    key = f"{scope or _route_scope(request, func)}:{key_of(request)}"
+                    result = await self.engine.hit(key, rate)
+                    if not result.allowed:
+                        logger.info(f"429 rate limit {rate} key={key}")
+                        raise RateLimitExceeded(rate, result.retry_after)
+                return await func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+
+class KeyedLimit:
+    """One rate over many keys (e.g. Telegram chat ids) on the shared engine."""
+
+    def __init__(self, engine: RateLimitEngine, scope: str, rate: Rate):
+        self.engine = engine
+        self.scope = scope
+        self.rate = rate
+
+    async def allow(self, key: str) -> bool:
+        return (await self.engine.hit(f"{self.scope}:{key}", self.rate)).allowed
+
+
+def _default_redis_factory() -> Optional[Any]:
+    # Read on first use, not at import: importing this module must not build
+    # config.Settings() (it rejects unknown keys in a local .env)
+    redis_url = os.getenv("REDIS_URL", "")
+    if not redis_url:
+        return None
+    import redis.asyncio as redis
+
+    return redis.from_url(
+        redis_url,
+        password=os.getenv("REDIS_PASSWORD") or None,
+        decode_responses=True,
+        socket_timeout=RATE_LIMIT_REDIS_TIMEOUT_SECONDS,
+        socket_connect_timeout=RATE_LIMIT_REDIS_TIMEOUT_SECONDS,
+    )
+
+
+# Global instances
+rate_limit_engine = RateLimitEngine(redis_factory=_default_redis_factory)
+limiter = Limiter(rate_limit_engine)
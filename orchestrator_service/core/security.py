@@ -6,10 +6,11 @@ Basado en ClinicForge Nexus Security v7.6.
 import os
 import uuid
 import logging
-import json
 from typing import List, Optional, Any
 from fastapi import Header, HTTPException, Depends, Request, status
 from db import db
+from core.audit_sink import audit_sink
+from core.identity import identity_resolver
 
 logger = logging.getLogger(__name__)
 
@@ -92,6 +93,8 @@ async def verify_admin_token(
 
     # Inyectar datos del usuario en el request state para uso posterior
     request.state.user = user_data
+    # Memo de identidad por request: las resoluciones de tenant siguientes no tocan la base
+    identity_resolver.begin_request()
     return user_data
 
 
@@ -126,6 +129,7 @@ async def get_resolved_tenant_id(user_data=Depends(verify_admin_token)) -> int:
     Resuelve el tenant_id real contra la base de datos (Nexus Protocol).
     Prioridad: sellers (CRM) → professionals (dental legacy) → primer tenant → 1.
     Garantiza aislamiento total: nunca se usa tenant_id del JWT sin validar.
+    La resolución se cachea por request y por proceso (core/identity.py).
     """
     uid = None
     try:
@@ -134,27 +138,12 @@ async def get_resolved_tenant_id(user_data=Depends(verify_admin_token)) -> int:
         pass
 
     if uid is not None:
-        # Prioridad 1: Tabla sellers (CRM Ventas — rol nativo)
+        # Prioridades 1-3 en una sola consulta, cacheada con TTL corto
         try:
-            tid = await db.pool.fetchval(
-                "SELECT tenant_id FROM sellers WHERE user_id = $1",
-                uid
-            )
-            if tid is not None:
-                return int(tid)
-        except Exception:
-            pass  # Tabla sellers puede no existir en entornos legacy
-
-        # Prioridad 2: Tabla professionals (dental/legacy fallback)
-        try:
-            tid = await db.pool.fetchval(
-                "SELECT tenant_id FROM professionals WHERE user_id = $1",
-                uid
-            )
-            if tid is not None:
-                return int(tid)
-        except Exception:
-            pass
+            identity = await identity_resolver.resolve(uid)
+            return identity["tenant_id"]
+        except Exception as e:
+            logger.warning(f"Identity resolution failed for {uid}: {e}")
 
     # Prioridad 3: Primer tenant del sistema (CEO sin fila en sellers/professionals)
     try:
@@ -181,23 +170,10 @@ async def get_allowed_tenant_ids(user_data=Depends(verify_admin_token)) -> List[
             pass
 
         if uid is not None:
-            # Buscar en sellers primero (CRM)
-            try:
-                tid = await db.pool.fetchval(
-                    "SELECT tenant_id FROM sellers WHERE user_id = $1", uid
-                )
-                if tid is not None:
-                    return [int(tid)]
-            except Exception:
-                pass
-
-            # Fallback a professionals
+            # sellers (CRM) → professionals → primer tenant, misma resolución cacheada que get_resolved_tenant_id
             try:
-                tid = await db.pool.fetchval(
-                    "SELECT tenant_id FROM professionals WHERE user_id = $1", uid
-                )
-                if tid is not None:
-                    return [int(tid)]
+                identity = await identity_resolver.resolve(uid)
+                return [identity["tenant_id"]]
             except Exception:
                 pass
 
@@ -219,6 +195,8 @@ async def log_security_event(
 ):
     """
     Nexus Protocol v7.7 — Registro persistente de eventos de seguridad.
+    Encola el evento en el audit sink (core/audit_sink.py): la escritura en
+    system_events es por lotes en segundo plano y no agrega latencia al request.
     """
     payload = {
         "user_id": user_data.user_id,
@@ -233,10 +211,9 @@ async def log_security_event(
     }
 
     try:
-        await db.pool.execute("""
-            INSERT INTO system_events (event_type, severity, message, payload)
-            VALUES ($1, $2, $3, $4::jsonb)
-        """, event_type, severity, f"{user_data.role}@{user_data.email}: {event_type}", json.dumps(payload))
+        audit_sink.record(
+            event_type, severity, f"{user_data.role}@{user_data.email}: {event_type}", payload
+        )
     except Exception as e:
         logger.error(f"❌ Error logging security event: {e}")
 
@@ -1,5 +1,183 @@
+"""
+Socket.IO server, rooms and emit helpers.
+
+Multi-worker: with SOCKETIO_MANAGER=redis every orchestrator process shares one
+AsyncRedisManager (pub/sub on SOCKETIO_REDIS_URL / REDIS_URL), so an emit from
+any worker reaches sockets connected to any other. The default ("memory") keeps
+the single-process behaviour.
+
+Rooms (every server-side emit targets one of these, never a global broadcast):
+  tenant:{tenant_id}        every authenticated socket of the tenant (joined on connect)
+  user:{user_id}            one user's sockets (joined on connect)
+  supervisors:{tenant_id}   Supervisor Mode live feed (joined via 'join')
+  notifications:{user_id}, lead:{lead_id}, chat:..., team_activity:... (see socket_notifications)
+
+High-frequency events (SUPERVISOR_CHAT_EVENT) go through `emit_batcher`, which
+coalesces them per (event, room) during SOCKETIO_BATCH_WINDOW_MS and emits a
+single `<EVENT>_BATCH` payload {"events": [...]}.
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
 import socketio
 
+logger = logging.getLogger("socket_manager")
+
+SOCKETIO_MANAGER = os.getenv("SOCKETIO_MANAGER", "memory").lower()  # "memory" | "redis"
+SOCKETIO_REDIS_URL = os.getenv("SOCKETIO_REDIS_URL") or os.getenv("REDIS_URL", "")
+SOCKETIO_CHANNEL = os.getenv("SOCKETIO_CHANNEL", "crmventas-socketio")
+SOCKETIO_BATCH_WINDOW_MS = int(os.getenv("SOCKETIO_BATCH_WINDOW_MS", "250"))
+SOCKETIO_BATCH_MAX_EVENTS = int(os.getenv("SOCKETIO_BATCH_MAX_EVENTS", "100"))
+
+
+def _client_manager():
+    if SOCKETIO_MANAGER != "redis":
+        return None
+    if not SOCKETIO_REDIS_URL:
+        logger.error("❌ SOCKETIO_MANAGER=redis pero no hay SOCKETIO_REDIS_URL/REDIS_URL; usando manager en memoria")
+        return None
+    logger.info(f"🔌 Socket.IO Redis manager enabled (channel={SOCKETIO_CHANNEL})")
+    return socketio.AsyncRedisManager(SOCKETIO_REDIS_URL, channel=SOCKETIO_CHANNEL)
+
+
 # Initialize Socket.IO server
 # cors_allowed_origins='*' is critical for development
-sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*', client_manager=_client_manager())
+
+
+# ─── Rooms ────────────────────────────────────────────────────────────────────
+
+def tenant_room(tenant_id: Any) -> str:
+    return f"tenant:{int(tenant_id)}"
+
+
+def user_room(user_id: Any) -> str:
+    return f"user:{user_id}"
+
+
+def supervisors_room(tenant_id: Any) -> str:
+    return f"supervisors:{int(tenant_id)}"
+
+
+def _token_from_handshake(environ: Dict[str, Any], auth: Any) -> Optional[str]:
+    """JWT from the Socket.IO auth payload, the Authorization header or the access_token cookie."""
+    if isinstance(auth, dict) and auth.get("token"):
+        return str(auth["token"])
+    header = environ.get("HTTP_AUTHORIZATION") or ""
+    if header.startswith("Bearer "):
+        return header.split(" ", 1)[1]
+    for chunk in (environ.get("HTTP_COOKIE") or "").split(";"):
+        name, _, value = chunk.strip().partition("=")
+        if name == "access_token" and value:
+            return value
+    return None
+
+
+async def authenticate_socket(sid: str, environ: Dict[str, Any], auth: Any = None) -> Optional[Dict[str, Any]]:
+    """
+    Resolves the socket's user + tenant on connect and joins tenant:/user: rooms.
+    The tenant is resolved against the DB (get_resolved_tenant_id), never taken from the JWT as is.
+    Unauthenticated sockets stay connected but only receive events of rooms they join explicitly.
+    """
+    token = _token_from_handshake(environ, auth)
+    if not token:
+        return None
+
+    from auth_service import auth_service
+    from core.security import CRM_ROLES, get_resolved_tenant_id
+
+    user_data = auth_service.decode_token(token)
+    if not user_data or user_data.role not in CRM_ROLES:
+        return None
+    tenant_id = await get_resolved_tenant_id(user_data)
+    session = {"user_id": str(user_data.user_id), "tenant_id": int(tenant_id), "role": user_data.role}
+    await sio.save_session(sid, session)
+    await sio.enter_room(sid, tenant_room(tenant_id))
+    await sio.enter_room(sid, user_room(user_data.user_id))
+    return session
+
+
+async def get_socket_session(sid: str) -> Dict[str, Any]:
+    try:
+        return await sio.get_session(sid) or {}
+    except KeyError:
+        return {}
+
+
+# ─── Emit helpers ─────────────────────────────────────────────────────────────
+
+async def emit_to_tenant(event: str, data: Any, tenant_id: Any):
+    """Emits to every socket of the tenant. Events without a tenant are dropped (never broadcast)."""
+    if tenant_id is None:
+        logger.warning(f"⚠️ Socket emit '{event}' sin tenant_id descartado (no se hace broadcast global)")
+        return
+    await sio.emit(event, data, room=tenant_room(tenant_id))
+
+
+class EmitBatcher:
+    """Coalesces high-frequency emits per (event, room) into one `<EVENT>_BATCH` emit per window."""
+
+    def __init__(self, server: socketio.AsyncServer, window_ms: int = SOCKETIO_BATCH_WINDOW_MS,
+                 max_events: int = SOCKETIO_BATCH_MAX_EVENTS):
+        self.server = server
+        self.window = window_ms / 1000
+        self.max_events = max_events
+        self._pending: Dict[Tuple[str, str], List[Any]] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self._tasks: set = set()
+        self._stats = {"queued": 0, "emits": 0, "errors": 0}
+
+    def add(self, event: str, data: Any, room: str):
+        """Queues an event (non-blocking). A full batch is flushed right away."""
+        batch = self._pending.setdefault((event, room), [])
+        batch.append(data)
+        self._stats["queued"] += 1
+        if len(batch) >= self.max_events:
+            self._spawn(self.flush())
+        elif self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_later())
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        await self.flush()
+
+    async def flush(self):
+        pending, self._pending = self._pending, {}
+        for (event, room), events in pending.items():
+            try:
+                await self.server.emit(f"{event}_BATCH", {"events": events}, room=room)
+                self._stats["emits"] += 1
+            except Exception as e:
+                self._stats["errors"] += 1
+                logger.error(f"❌ Error emitting {event}_BATCH to {room}: {e}")
+
+    async def stop(self):
+        """Emits whatever is still pending (shutdown)."""
+        await self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "pending": sum(len(v) for v in self._pending.values()),
+            "window_ms": int(self.window * 1000),
+            "max_events": self.max_events,
+        }
+
+
+def get_socket_stats() -> Dict[str, Any]:
+    return {
+        "manager": type(sio.manager).__name__,
+        "channel": SOCKETIO_CHANNEL if isinstance(sio.manager, socketio.AsyncRedisManager) else None,
+        "batcher": emit_batcher.get_stats(),
+    }
+
+
+# Global instance
+emit_batcher = EmitBatcher(sio)
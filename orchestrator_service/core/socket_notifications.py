@@ -10,7 +10,7 @@ from typing import Dict, Any
 
 logger = logging.getLogger(__name__)
 
-from .socket_manager import sio
+from .socket_manager import sio, authenticate_socket, get_socket_session, supervisors_room, tenant_room
 
 # Importación de notification_service - manejar diferentes contextos
 notification_service = None
@@ -55,15 +55,42 @@ def register_notification_socket_handlers():
     """Registrar handlers de Socket.IO para notificaciones"""
     
     @sio.on('connect')
-    async def handle_connect(sid, environ):
-        """Manejar conexión de cliente"""
-        logger.info(f"Client connected: {sid}")
+    async def handle_connect(sid, environ, auth=None):
+        """Manejar conexión de cliente: autentica (JWT) y une el socket a los rooms de su tenant/usuario"""
+        session = None
+        try:
+            session = await authenticate_socket(sid, environ, auth)
+        except Exception as e:
+            logger.error(f"Error authenticating socket {sid}: {e}")
+        logger.info(f"Client connected: {sid} (tenant={session.get('tenant_id') if session else None})")
         
         # Enviar estado inicial
         await sio.emit('notification_connected', {
             'status': 'connected',
+            'authenticated': session is not None,
             'message': 'Notification socket connected'
         }, room=sid)
+
+    @sio.on('join')
+    async def handle_join(sid, data):
+        """Unirse a un room de tenant (tenant:{id} / supervisors:{id}); solo el tenant del socket autenticado"""
+        try:
+            room = (data or {}).get('room') or ''
+            session = await get_socket_session(sid)
+            tenant_id = session.get('tenant_id')
+            if tenant_id is None:
+                logger.warning(f"Unauthenticated socket {sid} tried to join {room}")
+                return
+            allowed = {tenant_room(tenant_id)}
+            if session.get('role') == 'ceo':
+                allowed.add(supervisors_room(tenant_id))
+            if room not in allowed:
+                logger.warning(f"Socket {sid} (tenant={tenant_id}) denied join to {room}")
+                return
+            await sio.enter_room(sid, room)
+            logger.info(f"Client {sid} joined room {room}")
+        except Exception as e:
+            logger.error(f"Error in join: {e}")
     
     @sio.on('disconnect')
     async def handle_disconnect(sid):
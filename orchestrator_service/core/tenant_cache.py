@@ -0,0 +1,277 @@
+"""
+Process-local TTL cache for per-tenant lookups on the hot message path.
+
+Namespaces:
+- credential:     (tenant_id, name)              -> decrypted credential value
+- channel_binding:(tenant_id, channel, field)    -> provider / page_id from channel_bindings
+- webhook_tenant: (kind, external_id)            -> tenant_id (Meta page/phone ids, bot_phone_number,
+                                                    WEBHOOK_ACCESS_TOKEN)
+- search_config:  tenant_id                      -> relevance settings for global search (tenants.config.search)
+- user_identity:  user_id                        -> resolved tenant_id, role, status (core/identity.py,
+                                                    short per-entry TTL)
+
+Every outbound WhatsApp message used to read `credentials` twice (plus a Fernet
+decrypt) and every webhook resolved its tenant with one or two queries. Entries
+are bounded (LRU) and expire after TENANT_CACHE_TTL_SECONDS; misses (None) are
+cached for a shorter TENANT_CACHE_NEGATIVE_TTL_SECONDS so a newly connected
+channel is picked up quickly even without an explicit invalidation.
+
+Writers (save_tenant_credential, channel binding routes, Meta connect/disconnect,
+tenant updates) call invalidate_tenant()/invalidate(). When Redis is configured,
+invalidations are also published on a pub/sub channel so every replica drops
+the same entries.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger("tenant_cache")
+
+TENANT_CACHE_MAX_ENTRIES = int(os.getenv("TENANT_CACHE_MAX_ENTRIES", "4096"))
+TENANT_CACHE_TTL_SECONDS = float(os.getenv("TENANT_CACHE_TTL_SECONDS", "300"))
+TENANT_CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv("TENANT_CACHE_NEGATIVE_TTL_SECONDS", "30"))
+TENANT_CACHE_PUBSUB_CHANNEL = os.getenv("TENANT_CACHE_PUBSUB_CHANNEL", "tenant_cache:invalidate")
+
+NS_CREDENTIAL = "credential"
+NS_CHANNEL_BINDING = "channel_binding"
+NS_WEBHOOK_TENANT = "webhook_tenant"
+NS_SEARCH_CONFIG = "search_config"
+NS_USER_IDENTITY = "user_identity"
+
+
+@dataclass
+class _Entry:
+    value: Any
+    tenant_id: Optional[int]
+    expires_at: float
+
+
+class TenantCache:
+    """Bounded LRU + TTL cache with per-namespace hit/miss counters and optional Redis fan-out."""
+
+    def __init__(
+        self,
+        max_entries: int = TENANT_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = TENANT_CACHE_TTL_SECONDS,
+        negative_ttl_seconds: float = TENANT_CACHE_NEGATIVE_TTL_SECONDS,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, Hashable], _Entry]" = OrderedDict()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._instance_id = uuid.uuid4().hex
+        self._redis = None
+        self._listener: Optional[asyncio.Task] = None
+        self._remote_invalidations = 0
+
+    def _ns_stats(self, namespace: str) -> Dict[str, int]:
+        stats = self._stats.get(namespace)
+        if stats is None:
+            stats = self._stats[namespace] = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+        return stats
+
+    async def get_or_load(
+        self,
+        namespace: str,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        tenant_id: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+    ) -> Any:
+        """
+        Returns the cached value or awaits loader() and caches its result.
+
+        tenant_id marks the owning tenant for invalidate_tenant(); when omitted and
+        the loaded value is an int (webhook -> tenant resolution) the value itself is
+        the owner. ttl_seconds overrides the cache TTL for this entry. Loader
+        exceptions propagate and nothing is cached.
+        """
+        stats = self._ns_stats(namespace)
+        cache_key = (namespace, key)
+        entry = self._entries.get(cache_key)
+        now = time.monotonic()
+        if entry and entry.expires_at > now:
+            self._entries.move_to_end(cache_key)
+            stats["hits"] += 1
+            return entry.value
+
+        stats["misses"] += 1
+        value = await loader()
+        owner = tenant_id if tenant_id is not None else (value if isinstance(value, int) else None)
+        if value is None:
+            ttl = self.negative_ttl_seconds
+        else:
+            ttl = ttl_seconds if ttl_seconds is not None else self.ttl_seconds
+        self._entries[cache_key] = _Entry(value, owner, time.monotonic() + ttl)
+        self._entries.move_to_end(cache_key)
+        while len(self._entries) > self.max_entries:
+            (evicted_ns, _), _ = self._entries.popitem(last=False)
+            self._ns_stats(evicted_ns)["evictions"] += 1
+        return value
+
+    # ------------------------------------------------------------------
+    # Invalidation
+    # ------------------------------------------------------------------
+    def invalidate(self, namespace: str, key: Hashable, _publish: bool = True):
+        """Drops a single entry."""
+        if self._entries.pop((namespace, key), None) is not None:
+            self._ns_stats(namespace)["invalidations"] += 1
+        if _publish:
+            self._publish({"op": "key", "namespace": namespace, "key": _encode_key(key)})
+
+    def invalidate_bot_phones(self, *numbers: Optional[str]):
+        """Drops the webhook -> tenant entries of bot_phone_number values (old and new one on a change)."""
+        for number in {n for n in numbers if n}:
+            self.invalidate(NS_WEBHOOK_TENANT, ("bot_phone", number))
+
+    def invalidate_tenant(self, tenant_id: int, _publish: bool = True):
+        """Drops every entry owned by the tenant plus all cached misses (a new binding may resolve them)."""
+        tenant_id = int(tenant_id)
+        doomed = [
+            k for k, e in self._entries.items()
+            if e.tenant_id == tenant_id or e.value is None
+        ]
+        for k in doomed:
+            del self._entries[k]
+            self._ns_stats(k[0])["invalidations"] += 1
+        if doomed:
+            logger.info(f"Tenant cache invalidated for tenant {tenant_id} ({len(doomed)} entries)")
+        if _publish:
+            self._publish({"op": "tenant", "tenant_id": tenant_id})
+
+    def invalidate_namespace(self, namespace: Optional[str] = None, _publish: bool = True):
+        """Drops a whole namespace (or everything when namespace is None)."""
+        doomed = [k for k in self._entries if namespace is None or k[0] == namespace]
+        for k in doomed:
+            del self._entries[k]
+            self._ns_stats(k[0])["invalidations"] += 1
+        if _publish:
+            self._publish({"op": "namespace", "namespace": namespace})
+
+    # ------------------------------------------------------------------
+    # Redis pub/sub (multi-replica coherence)
+    # ------------------------------------------------------------------
+    def _publish(self, message: Dict[str, Any]):
+        if not self._redis:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        payload = json.dumps({**message, "origin": self._instance_id})
+        loop.create_task(self._safe_publish(payload))
+
+    async def _safe_publish(self, payload: str):
+        try:
+            await self._redis.publish(TENANT_CACHE_PUBSUB_CHANNEL, payload)
+        except Exception as e:
+            logger.warning(f"Tenant cache invalidation publish failed: {e}")
+
+    def _apply_remote(self, raw: str):
+        try:
+            message = json.loads(raw)
+        except (TypeError, ValueError):
+            return
+        if message.get("origin") == self._instance_id:
+            return
+        self._remote_invalidations += 1
+        op = message.get("op")
+        if op == "key":
+            self.invalidate(message["namespace"], _decode_key(message["key"]), _publish=False)
+        elif op == "tenant":
+            self.invalidate_tenant(message["tenant_id"], _publish=False)
+        elif op == "namespace":
+            self.invalidate_namespace(message.get("namespace"), _publish=False)
+
+    async def start_pubsub(self):
+        """Subscribes to the invalidation channel if Redis is configured (no-op otherwise)."""
+        if self._listener:
+            return
+        try:
+            import redis.asyncio as aioredis
+            from config import Settings
+            settings = Settings()
+            if not settings.REDIS_URL:
+                logger.info("Tenant cache: no REDIS_URL, invalidations stay process-local")
+                return
+            self._redis = aioredis.Redis.from_url(
+                settings.REDIS_URL,
+                password=settings.REDIS_PASSWORD,
+                decode_responses=True,
+            )
+            pubsub = self._redis.pubsub()
+            await pubsub.subscribe(TENANT_CACHE_PUBSUB_CHANNEL)
+        except Exception as e:
+            logger.warning(f"Tenant cache: Redis unavailable ({e}), invalidations stay process-local")
+            self._redis = None
+            return
+        self._listener = asyncio.create_task(self._listen(pubsub))
+        logger.info(f"Tenant cache: subscribed to {TENANT_CACHE_PUBSUB_CHANNEL}")
+
+    async def _listen(self, pubsub):
+        try:
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    self._apply_remote(message.get("data"))
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Tenant cache pub/sub listener stopped: {e}")
+        finally:
+            try:
+                await pubsub.close()
+            except Exception:
+                pass
+
+    async def stop_pubsub(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._redis:
+            try:
+                await self._redis.close()
+            except Exception:
+                pass
+            self._redis = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        namespaces = {}
+        for ns, stats in self._stats.items():
+            lookups = stats["hits"] + stats["misses"]
+            namespaces[ns] = {
+                **stats,
+                "size": sum(1 for k in self._entries if k[0] == ns),
+                "hit_rate": round(stats["hits"] / lookups, 4) if lookups else 0.0,
+            }
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "negative_ttl_seconds": self.negative_ttl_seconds,
+            "pubsub": self._listener is not None,
+            "remote_invalidations": self._remote_invalidations,
+            "namespaces": namespaces,
+        }
+
+
+def _encode_key(key: Hashable) -> Any:
+    return list(key) if isinstance(key, tuple) else key
+
+
+def _decode_key(key: Any) -> Hashable:
+    return tuple(key) if isinstance(key, list) else key
+
+
+# Global instance
+tenant_cache = TenantCache()
@@ -0,0 +1,477 @@
+"""
+Two-tier cache (process LRU in front of optional Redis) for computed dashboard values.
+
+Used by services/metrics_cache_service.py. Every lookup goes:
+
+1. L1 (process-local LRU). Entries live at most l1_ttl_seconds so replicas
+   converge on the shared value even without cross-process invalidation.
+2. L2 (Redis), guarded by a circuit breaker: after REDIS failure_threshold
+   consecutive errors Redis is skipped for cooldown_seconds, then a single
+   probe decides whether to close the breaker again. While open the cache
+   keeps working on L1 alone instead of reconnecting on every call.
+3. The loader, single-flight per key: concurrent misses for the same key
+   await one computation, and one slow key never blocks another.
+
+TTLs are jittered (+/- jitter) so entries written together do not expire
+together. After the fresh TTL an entry is still served for stale_seconds
+while one background refresh recomputes it (stale-while-revalidate).
+
+Entries carry tags (per tenant / per seller). invalidate_tags() marks the
+tagged L1 entries stale at once and deletes the tagged Redis keys; Redis
+deletes from many writes are coalesced into one flush per
+invalidation_window_seconds. An L2 value stored before its tag was
+invalidated is treated as stale, so the flush window never resurrects it.
+With serve_stale_on_invalidate=False an invalidated entry is dropped instead
+of served stale (views that must reflect the user's own write at once).
+Tags that depend on the loaded value (e.g. the conversations a panel shows)
+come from value_tags(value) and are attached after the load.
+"""
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger("two_tier_cache")
+
+
+class RedisCircuitBreaker:
+    """closed -> open after N consecutive failures -> half-open probe after the cooldown."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, cooldown_seconds: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = max(failure_threshold, 1)
+        self.cooldown_seconds = cooldown_seconds
+        self._clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if self._clock() - self.opened_at < self.cooldown_seconds:
+                return False
+            self.state = self.HALF_OPEN
+            self._probing = False
+        # Half-open: exactly one caller probes Redis until it reports back
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.trips += 1
+            self.state = self.OPEN
+            self.opened_at = self._clock()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "trips": self.trips,
+            "failure_threshold": self.failure_threshold,
+            "cooldown_seconds": self.cooldown_seconds,
+        }
+
+
+@dataclass
+class _Entry:
+    value: Any
+    fresh_until: float
+    stale_until: float
+    tags: List[str] = field(default_factory=list)
+
+
+class TwoTierCache:
+    """Process LRU + optional Redis with single-flight, stale-while-revalidate and tag invalidation."""
+
+    def __init__(
+        self,
+        prefix: str,
+        redis_factory: Optional[Callable[[], Any]] = None,
+        max_entries: int = 2048,
+        l1_ttl_seconds: float = 15.0,
+        stale_seconds: float = 60.0,
+        jitter: float = 0.1,
+        invalidation_window_seconds: float = 0.25,
+        breaker: Optional[RedisCircuitBreaker] = None,
+        clock: Callable[[], float] = time.time,
+        serve_stale_on_invalidate: bool = True,
+    ):
+        self.prefix = prefix
+        self.max_entries = max_entries
+        self.l1_ttl_seconds = l1_ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.jitter = jitter
+        self.invalidation_window_seconds = invalidation_window_seconds
+        self.serve_stale_on_invalidate = serve_stale_on_invalidate
+        self.breaker = breaker or RedisCircuitBreaker()
+        self._redis_factory = redis_factory
+        self._redis = None
+        self._clock = clock
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._tag_index: Dict[str, Set[str]] = {}
+        self._tag_invalidated_at: Dict[str, float] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._background: Set[asyncio.Task] = set()
+        self._pending_tags: Set[str] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._stats = {
+            "l1_hits": 0, "l2_hits": 0, "stale_served": 0, "misses": 0, "loads": 0,
+            "coalesced": 0, "load_errors": 0, "refresh_errors": 0, "invalidations": 0,
+            "evictions": 0, "redis_errors": 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+    async def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl_seconds: float,
+        tags: Iterable[str] = (),
+        value_tags: Optional[Callable[[Any], Iterable[str]]] = None,
+    ) -> Any:
+        """Returns the cached value (possibly stale while a refresh runs) or the loader's result."""
+        tags = list(tags)
+        if value_tags is not None:
+            loader = self._with_value_tags(loader, value_tags, tags)
+        now = self._clock()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if now < entry.fresh_until:
+                self._entries.move_to_end(key)
+                self._stats["l1_hits"] += 1
+                return entry.value
+            if now < entry.stale_until:
+                self._entries.move_to_end(key)
+                self._stats["stale_served"] += 1
+                self._refresh_in_background(key, loader, ttl_seconds, tags)
+                return entry.value
+
+        envelope = await self._l2_get(key)
+        if envelope is not None:
+            if self._is_fresh(envelope, now):
+                self._stats["l2_hits"] += 1
+                self._store_l1(key, envelope["value"], envelope["fresh_until"], envelope["stale_until"], tags)
+                return envelope["value"]
+            if now < envelope["stale_until"]:
+                self._stats["stale_served"] += 1
+                self._refresh_in_background(key, loader, ttl_seconds, tags)
+                return envelope["value"]
+
+        self._stats["misses"] += 1
+        return await self._single_flight(key, lambda: self._load(key, loader, ttl_seconds, tags))
+
+    @staticmethod
+    def _with_value_tags(loader, value_tags, tags: List[str]):
+        base = list(tags)
+
+        async def _load():
+            value = await loader()
+            # Same list object the load stores with: base tags + the ones read off the value
+            tags[:] = base + [t for t in value_tags(value) if t not in base]
+            return value
+
+        return _load
+
+    def _is_fresh(self, envelope: Dict[str, Any], now: float) -> bool:
+        if now >= envelope.get("fresh_until", 0):
+            return False
+        stored_at = envelope.get("stored_at", 0)
+        return all(self._tag_invalidated_at.get(t, 0) < stored_at for t in envelope.get("tags", []))
+
+    async def _load(self, key: str, loader, ttl_seconds: float, tags: List[str]) -> Any:
+        # A refresh triggered by L1 expiry only needs the shared value when another replica already refreshed it
+        envelope = await self._l2_get(key)
+        now = self._clock()
+        if envelope is not None and self._is_fresh(envelope, now):
+            self._store_l1(key, envelope["value"], envelope["fresh_until"], envelope["stale_until"], tags)
+            return envelope["value"]
+
+        self._stats["loads"] += 1
+        started = self._clock()
+        value = await loader()
+        now = self._clock()
+        fresh_until = now + self._jittered(ttl_seconds)
+        stale_until = fresh_until + self.stale_seconds
+        self._store_l1(key, value, fresh_until, stale_until, tags, invalidated_since=started)
+        await self._l2_set(key, value, fresh_until, stale_until, tags, stored_at=started)
+        return value
+
+    def _jittered(self, ttl_seconds: float) -> float:
+        if not self.jitter:
+            return ttl_seconds
+        return ttl_seconds * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    async def _single_flight(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self._stats["coalesced"] += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+        except BaseException as e:
+            self._stats["load_errors"] += 1
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # Mark retrieved so a flight without followers does not log "exception never retrieved"
+                future.exception()
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def _refresh_in_background(self, key: str, loader, ttl_seconds: float, tags: List[str]):
+        if key in self._inflight:
+            return
+
+        async def _refresh():
+            try:
+                await self._single_flight(key, lambda: self._load(key, loader, ttl_seconds, tags))
+            except Exception as e:
+                self._stats["refresh_errors"] += 1
+                logger.warning(f"Background refresh failed for {key}: {e}")
+
+        task = asyncio.get_running_loop().create_task(_refresh())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    # ------------------------------------------------------------------
+    # L1
+    # ------------------------------------------------------------------
+    def _store_l1(self, key: str, value: Any, fresh_until: float, stale_until: float, tags: List[str],
+                  invalidated_since: Optional[float] = None):
+        now = self._clock()
+        fresh_until = min(fresh_until, now + self.l1_ttl_seconds)
+        # Invalidated while the loader ran: keep the value, but only as stale
+        if invalidated_since is not None and any(
+            self._tag_invalidated_at.get(t, 0) >= invalidated_since for t in tags
+        ):
+            if not self.serve_stale_on_invalidate:
+                self._drop_l1(key)
+                return
+            fresh_until = now
+        self._drop_l1(key)
+        self._entries[key] = _Entry(value, fresh_until, max(stale_until, fresh_until), list(tags))
+        for tag in tags:
+            self._tag_index.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._drop_l1(oldest)
+            self._stats["evictions"] += 1
+
+    def _drop_l1(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry.tags:
+            keys = self._tag_index.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tag_index[tag]
+
+    # ------------------------------------------------------------------
+    # L2 (Redis behind the breaker)
+    # ------------------------------------------------------------------
+    def _redis_key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.prefix}:tag:{tag}"
+
+    async def get_redis(self):
+        """Redis client, or None when Redis is not configured or the breaker is open."""
+        if self._redis_factory is None or not self.breaker.allow():
+            return None
+        if self._redis is None:
+            try:
+                client = self._redis_factory()
+                await client.ping()
+                self._redis = client
+            except Exception as e:
+                self._redis_failed(e)
+                return None
+        return self._redis
+
+    def _redis_failed(self, error: Exception):
+        self._stats["redis_errors"] += 1
+        was_open = self.breaker.state == RedisCircuitBreaker.OPEN
+        self.breaker.record_failure()
+        if not was_open and self.breaker.state == RedisCircuitBreaker.OPEN:
+            logger.warning(
+                f"Redis circuit opened for {self.prefix} ({error}); "
+                f"L1-only for {self.breaker.cooldown_seconds:.0f}s"
+            )
+            # Reconnect from scratch on the next probe
+            self._redis = None
+
+    async def _redis_call(self, op: Callable[[Any], Awaitable[Any]]) -> Any:
+        client = await self.get_redis()
+        if client is None:
+            return None
+        try:
+            result = await op(client)
+        except Exception as e:
+            self._redis_failed(e)
+            return None
+        self.breaker.record_success()
+        return result
+
+    async def _l2_get(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = await self._redis_call(lambda r: r.get(self._redis_key(key)))
+        if not raw:
+            return None
+        try:
+            return json.loads(raw)
+        except (TypeError, ValueError):
+            return None
+
+    async def _l2_set(self, key: str, value: Any, fresh_until: float, stale_until: float,
+                      tags: List[str], stored_at: float):
+        expire = max(int(stale_until - self._clock()) + 1, 1)
+        payload = json.dumps({
+            "value": value, "fresh_until": fresh_until, "stale_until": stale_until,
+            "stored_at": stored_at, "tags": tags,
+        }, default=str)
+
+        async def _op(r):
+            pipe = r.pipeline(transaction=False)
+            pipe.set(self._redis_key(key), payload, ex=expire)
+            for tag in tags:
+                pipe.sadd(self._tag_key(tag), key)
+                pipe.expire(self._tag_key(tag), expire)
+            await pipe.execute()
+
+        await self._redis_call(_op)
+
+    # ------------------------------------------------------------------
+    # Invalidation
+    # ------------------------------------------------------------------
+    def invalidate_tags(self, tags: Iterable[str]):
+        """Marks every L1 entry with one of the tags stale and schedules the Redis delete."""
+        now = self._clock()
+        for tag in tags:
+            # Re-insert so the map stays ordered by last invalidation
+            self._tag_invalidated_at.pop(tag, None)
+            self._tag_invalidated_at[tag] = now
+            self._stats["invalidations"] += 1
+            for key in list(self._tag_index.get(tag, ())):
+                if not self.serve_stale_on_invalidate:
+                    self._drop_l1(key)
+                    continue
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.fresh_until = min(entry.fresh_until, now)
+            if self._redis_factory is not None:
+                self._pending_tags.add(tag)
+        # Old marks only matter within the flush window and for in-flight loads; per-conversation tags would grow forever
+        while len(self._tag_invalidated_at) > self.max_entries * 4:
+            del self._tag_invalidated_at[next(iter(self._tag_invalidated_at))]
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if not self._pending_tags or (self._flush_task and not self._flush_task.done()):
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._flush_task = loop.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        # Tags put back by a failed flush are retried every window until Redis takes them
+        while self._pending_tags:
+            await asyncio.sleep(self.invalidation_window_seconds)
+            await self.flush_invalidations()
+
+    async def flush_invalidations(self) -> bool:
+        """Deletes the Redis keys of every tag invalidated since the last flush. False = kept for a retry."""
+        if not self._pending_tags:
+            return True
+        tags, self._pending_tags = list(self._pending_tags), set()
+
+        async def _op(r):
+            members = []
+            for tag in tags:
+                members.extend(await r.smembers(self._tag_key(tag)))
+            doomed = [self._redis_key(k) for k in set(members)] + [self._tag_key(t) for t in tags]
+            await r.delete(*doomed)
+            return True
+
+        if await self._redis_call(_op):
+            return True
+        # Redis down or breaker open: other replicas would keep reading the invalidated L2 values
+        self._pending_tags.update(tags)
+        return False
+
+    async def clear_l2_orphans(self, batch: int = 500) -> int:
+        """Deletes prefixed Redis keys without a TTL (left by older cache versions)."""
+        async def _op(r):
+            removed = 0
+            async for key in r.scan_iter(match=f"{self.prefix}:*", count=batch):
+                if await r.ttl(key) < 0:
+                    await r.delete(key)
+                    removed += 1
+            return removed
+
+        return await self._redis_call(_op) or 0
+
+    async def close(self):
+        for task in list(self._background):
+            task.cancel()
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+        if self._redis is not None:
+            try:
+                await self._redis.close()
+            except Exception:
+                pass
+            self._redis = None
+
+    def hit_rate(self) -> float:
+        hits = self._stats["l1_hits"] + self._stats["l2_hits"] + self._stats["stale_served"]
+        lookups = hits + self._stats["misses"]
+        return round(hits / lookups, 4) if lookups else 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "hit_rate": self.hit_rate(),
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "l1_ttl_seconds": self.l1_ttl_seconds,
+            "stale_seconds": self.stale_seconds,
+            "inflight": len(self._inflight),
+            "redis_configured": self._redis_factory is not None,
+            "redis_breaker": self.breaker.get_stats(),
+        }
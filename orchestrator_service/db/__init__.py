@@ -6,7 +6,8 @@ while the internal structure is being refactored.
 
 New structure:
 - db/pool.py: Pool management
-- db/migrations.py: Auto-migrations (Maintenance Robot)
+- db/migrations.py: Auto-migrations (Maintenance Robot, only with SCHEMA_AUTO_MIGRATE)
+- db/schema_version.py: Versioned migrations ledger + boot-time version check
 - db/queries/: Query modules by domain
 - db/models.py: SQLAlchemy models
 
@@ -20,8 +21,9 @@ import asyncpg
 from typing import Optional, List, Tuple, Dict, Any
 from contextlib import asynccontextmanager
 
-from .pool import pool_manager, DatabasePool
+from .pool import pool_manager, DatabasePool, create_lane_pools
 from .migrations import create_migration_runner, MigrationRunner
+from .schema_version import check_schema_version, migrate_ledger
 
 
 class Database:
@@ -32,6 +34,8 @@ class Database:
 
     def __init__(self):
         self.pool: Optional[asyncpg.Pool] = None
+        # Dashboard / analytics reads (db/pool.py lanes); same object as pool when not split
+        self.read_pool: Optional[asyncpg.Pool] = None
 
     @asynccontextmanager
     async def get_connection(self):
@@ -49,7 +53,7 @@ class Database:
         )
 
     async def connect(self):
-        """Conecta al pool y ejecuta auto-migraciones"""
+        """Conecta al pool y verifica la versión del esquema"""
         if not self.pool:
             from .pool import POSTGRES_DSN
 
@@ -57,44 +61,93 @@ class Database:
                 print("❌ ERROR: POSTGRES_DSN environment variable is not set!")
                 return
 
-            dsn = POSTGRES_DSN.replace("postgresql+asyncpg://", "postgresql://")
-
             try:
-                self.pool = await asyncpg.create_pool(dsn, init=self._init_connection)
+                self.pool, self.read_pool = await create_lane_pools(
+                    POSTGRES_DSN, init=self._init_connection
+                )
             except Exception as e:
                 print(f"❌ ERROR: Failed to create database pool: {e}")
                 return
 
-            await self._run_auto_migrations()
+            await self._check_schema()
+
+    async def _check_schema(self):
+        """Una query contra schema_migrations; las migraciones corren en el job (alembic upgrade head)"""
+        import logging
+
+        try:
+            await check_schema_version(self.pool, auto_migrate=self._run_auto_migrations)
+        except Exception as e:
+            logging.getLogger("db").error(f"❌ Schema version check failed: {e}")
 
     async def _run_auto_migrations(self):
-        """Ejecuta el sistema de auto-migración"""
+        """SCHEMA_AUTO_MIGRATE: Robot (versión 1) + revisiones pendientes del ledger, todas registradas"""
+        return await migrate_ledger(self.pool, run_robot=self._run_maintenance_robot)
+
+    async def _run_maintenance_robot(self) -> bool:
+        """
+        Ejecuta la revisión 0001 del ledger (versión 1): Foundation si faltan tablas
+        críticas, Parches de db/legacy.py (todos o ninguno) y de db/migrations.py
+        (best-effort). Mismas sentencias que statements() de 0001; False si falló
+        """
         import logging
+        from .legacy import CRITICAL_TABLES
 
         logger = logging.getLogger("db")
 
         try:
-            migration_runner = create_migration_runner(self.pool)
-            await migration_runner.run_all()
+            async with self.pool.acquire() as conn:
+                existing = await conn.fetchval(
+                    """
+                    SELECT COUNT(*) FROM information_schema.tables
+                    WHERE table_schema = 'public' AND table_name = ANY($1)
+                """,
+                    CRITICAL_TABLES,
+                )
+
+            if existing < len(CRITICAL_TABLES):
+                logger.warning("⚠️ Esquema incompleto, aplicando Foundation...")
+                await self._apply_foundation(logger)
+
+            await self._run_evolution_pipeline(logger)
             logger.info("✅ Database optimized and synced (Maintenance Robot OK)")
+            return True
         except Exception as e:
             import traceback
 
             logger.error(f"❌ Error in Maintenance Robot: {e}")
             logger.debug(traceback.format_exc())
+            return False
 
     async def _apply_foundation(self, logger):
-        """Legacy: foundation schema application"""
-        migration_runner = create_migration_runner(self.pool)
-        await migration_runner._apply_foundation()
+        """Esquema base dentalogic_schema.sql (igual que la revisión 0001)"""
+        from .legacy import load_foundation_sql
+
+        foundation_sql = load_foundation_sql()
+        if foundation_sql is None:
+            raise RuntimeError("Foundation schema (db/init/dentalogic_schema.sql) not found")
+        async with self.pool.acquire() as conn:
+            await conn.execute(foundation_sql)
+        logger.info("✅ Foundation applied.")
 
     async def _run_evolution_pipeline(self, logger):
-        """Legacy: evolution pipeline"""
-        migration_runner = create_migration_runner(self.pool)
-        await migration_runner._run_evolution_pipeline()
+        """Parches 1..49 de db/legacy.py en una transacción, luego los de MigrationRunner best-effort"""
+        from .legacy import Database as LegacyDatabase
+
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                for i, patch in enumerate(LegacyDatabase.evolution_patches()):
+                    try:
+                        await conn.execute(patch)
+                    except Exception as e:
+                        logger.error(f"❌ Evolution Patch {i+1} failed: {e}")
+                        raise
+        await create_migration_runner(self.pool)._run_evolution_pipeline()
 
     async def disconnect(self):
         """Desconecta el pool"""
+        if self.read_pool and self.read_pool is not self.pool:
+            await self.read_pool.close()
         if self.pool:
             await self.pool.close()
 
@@ -150,6 +203,13 @@ async def execute_many(query: str, *args) -> None:
         return await conn.executemany(query, *args)
 
 
+def get_db():
+    """SQLAlchemy AsyncSession context manager (db/legacy.py), for services built on text() queries"""
+    from .legacy import get_db as legacy_get_db
+
+    return legacy_get_db()
+
+
 # Additional utility functions that were in the original db.py
 
 
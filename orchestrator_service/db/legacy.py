@@ -1,4 +1,5 @@
 import asyncpg
+import logging
 import os
 import json
 from datetime import datetime
@@ -6,11 +7,50 @@ from typing import List, Tuple, Optional, Dict, Any
 
 from contextlib import asynccontextmanager
 
+from db.pool import create_lane_pools
+from db.schema_version import check_schema_version, migrate_ledger
+
 POSTGRES_DSN = os.getenv("POSTGRES_DSN")
+# Opt-in: convert `notifications` into daily partitions by expiry (Parche 46) so expiry is a partition drop.
+# The conversion runs once in revision 0004; main.py's notifications_partitions job keeps days ahead created
+NOTIFICATIONS_PARTITIONED = os.getenv("NOTIFICATIONS_PARTITIONED", "false").lower() == "true"
+NOTIFICATIONS_PARTITION_DAYS_AHEAD = int(os.getenv("NOTIFICATIONS_PARTITION_DAYS_AHEAD", "14"))
+
+logger = logging.getLogger("db")
+
+# Multi-channel chat message insert, shared with the consolidated inbound path (services/inbound_pipeline.py)
+CHAT_MESSAGE_INSERT = """INSERT INTO chat_messages
+    (from_number, role, content, correlation_id, tenant_id,
+     platform, platform_message_id, channel_source, external_user_id)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)"""
+
+# Tablas cuya ausencia indica una base vacía (se aplica Foundation antes de los parches)
+CRITICAL_TABLES = ['tenants', 'users', 'leads']
+
+
+def load_foundation_sql() -> Optional[str]:
+    """dentalogic_schema.sql sin comentarios, o None si no se encuentra."""
+    possible_paths = [
+        os.path.join(os.path.dirname(__file__), "..", "db", "init", "dentalogic_schema.sql"),
+        os.path.join(os.path.dirname(__file__), "db", "init", "dentalogic_schema.sql"),
+        "/app/db/init/dentalogic_schema.sql"
+    ]
+
+    schema_path = next((p for p in possible_paths if os.path.exists(p)), None)
+    if not schema_path:
+        return None
+
+    with open(schema_path, "r", encoding="utf-8") as f:
+        schema_sql = f.read()
+
+    clean_lines = [line.split('--')[0].rstrip() for line in schema_sql.splitlines() if line.strip()]
+    return "\n".join(clean_lines)
+
 
 class Database:
     def __init__(self):
         self.pool: Optional[asyncpg.Pool] = None
+        self.read_pool: Optional[asyncpg.Pool] = None
 
     @asynccontextmanager
     async def get_connection(self):
@@ -33,33 +73,48 @@ class Database:
         )
 
     async def connect(self):
-        """Conecta al pool de PostgreSQL y ejecuta auto-migraciones."""
+        """Conecta al pool de PostgreSQL y verifica la versión del esquema."""
         if not self.pool:
             if not POSTGRES_DSN:
                 print("❌ ERROR: POSTGRES_DSN environment variable is not set!")
                 return
 
-            dsn = POSTGRES_DSN.replace("postgresql+asyncpg://", "postgresql://")
-            
             try:
-                self.pool = await asyncpg.create_pool(dsn, init=self._init_connection)
+                self.pool, self.read_pool = await create_lane_pools(
+                    POSTGRES_DSN, init=self._init_connection, owner="legacy"
+                )
             except Exception as e:
                 print(f"❌ ERROR: Failed to create database pool: {e}")
                 return
             
-            await self._run_auto_migrations()
+            await self._check_schema()
+
+    async def _check_schema(self):
+        """
+        Chequeo de versión del esquema al arrancar (una query contra schema_migrations).
+        Las migraciones corren fuera de banda (alembic upgrade head, ver db/schema_version.py).
+        """
+        try:
+            await check_schema_version(self.pool, auto_migrate=self._run_auto_migrations)
+        except Exception as e:
+            logger.error(f"❌ Schema version check failed: {e}")
     
     async def _run_auto_migrations(self):
+        """SCHEMA_AUTO_MIGRATE: Robot (versión 1) + revisiones pendientes del ledger, todas registradas."""
+        return await migrate_ledger(self.pool, run_robot=self._run_maintenance_robot)
+
+    async def _run_maintenance_robot(self) -> bool:
         """
         Sistema de Auto-Migración (Maintenance Robot / Schema Surgeon).
         Garantiza idempotencia y resiliencia en redimensionamientos de base de datos.
+        Devuelve False si falló (la versión 1 no se registra).
         """
         import logging
         logger = logging.getLogger("db")
         
         try:
             async with self.pool.acquire() as conn:
-                critical_tables = ['tenants', 'users', 'leads']
+                critical_tables = CRITICAL_TABLES
                 existing_tables = await conn.fetch("""
                     SELECT table_name FROM information_schema.tables 
                     WHERE table_schema = 'public' AND table_name = ANY($1)
@@ -74,31 +129,21 @@ class Database:
             
             await self._run_evolution_pipeline(logger)
             logger.info("✅ Database optimized and synced (Maintenance Robot OK)")
+            return True
             
         except Exception as e:
             import traceback
             logger.error(f"❌ Error in Maintenance Robot: {e}")
             logger.debug(traceback.format_exc())
+            return False
 
     async def _apply_foundation(self, logger):
         """Ejecuta el esquema base dentalogic_schema.sql"""
-        possible_paths = [
-            os.path.join(os.path.dirname(__file__), "..", "db", "init", "dentalogic_schema.sql"),
-            os.path.join(os.path.dirname(__file__), "db", "init", "dentalogic_schema.sql"),
-            "/app/db/init/dentalogic_schema.sql"
-        ]
-        
-        schema_path = next((p for p in possible_paths if os.path.exists(p)), None)
-        if not schema_path:
+        clean_sql = load_foundation_sql()
+        if clean_sql is None:
             logger.error("❌ Foundation schema not found!")
             return
 
-        with open(schema_path, "r", encoding="utf-8") as f:
-            schema_sql = f.read()
-
-        clean_lines = [line.split('--')[0].rstrip() for line in schema_sql.splitlines() if line.strip()]
-        clean_sql = "\n".join(clean_lines)
-        
         async with self.pool.acquire() as conn:
             try:
                 await conn.execute(clean_sql)
@@ -106,9 +151,14 @@ class Database:
             except Exception as e:
                 logger.error(f"❌ Error applying Foundation: {e}")
 
-    async def _run_evolution_pipeline(self, logger):
-        """Pipeline de parches atómicos e idempotentes."""
-        patches = [
+    @staticmethod
+    def evolution_patches() -> List[str]:
+        """
+        Parches atómicos e idempotentes del Maintenance Robot.
+        Lista congelada en la migración 0001 (alembic/versions, checksum en schema_migrations):
+        los cambios de esquema nuevos van en una revisión nueva, no acá.
+        """
+        return [
             # Parche 1: Columna user_id en professionals
             "DO $$ BEGIN IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name='professionals' AND column_name='user_id') THEN ALTER TABLE professionals ADD COLUMN user_id UUID REFERENCES users(id) ON DELETE SET NULL; END IF; END $$;",
             
@@ -1440,26 +1490,10 @@ class Database:
             """,
 
             # Parche 38: DEV-54 — Full-Text Search index on leads
+            # Superseded by search_documents (Parche 48): the expression indexes are dropped there and no longer rebuilt here
             """
             DO $$ BEGIN
-                CREATE INDEX IF NOT EXISTS idx_leads_search_fts ON leads USING gin(
-                    to_tsvector('spanish', 
-                        coalesce(first_name, '') || ' ' || 
-                        coalesce(last_name, '') || ' ' || 
-                        coalesce(email, '') || ' ' || 
-                        coalesce(phone_number, '')
-                    )
-                );
-                
-                CREATE INDEX IF NOT EXISTS idx_lead_notes_search_fts ON lead_notes USING gin(
-                    to_tsvector('spanish', coalesce(content, ''))
-                );
-
-                CREATE INDEX IF NOT EXISTS idx_chat_messages_search_fts ON chat_messages USING gin(
-                    to_tsvector('spanish', coalesce(content, ''))
-                );
-                
-                RAISE NOTICE 'Parche 38: DEV-54 FTS indexes created';
+                RAISE NOTICE 'Parche 38: DEV-54 FTS indexes superseded by search_documents (Parche 48)';
             EXCEPTION WHEN OTHERS THEN
                 RAISE NOTICE 'Parche 38: Error: %', SQLERRM;
             END $$;
@@ -1514,9 +1548,1011 @@ class Database:
             EXCEPTION WHEN OTHERS THEN
                 RAISE NOTICE 'Parche 41: Error: %', SQLERRM;
             END $$;
+            """,
+
+            # Parche 42: Set-based lead scoring — grouped lookups by (tenant, external_user_id) and newest messages per conversation
+            """
+            DO $$ BEGIN
+                IF EXISTS (SELECT 1 FROM information_schema.tables WHERE table_name = 'chat_conversations') THEN
+                    CREATE INDEX IF NOT EXISTS idx_chat_conversations_tenant_user ON chat_conversations (tenant_id, external_user_id);
+                END IF;
+                IF EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name = 'chat_messages' AND column_name = 'conversation_id') THEN
+                    CREATE INDEX IF NOT EXISTS idx_chat_messages_conversation_created ON chat_messages (conversation_id, created_at DESC);
+                END IF;
+                RAISE NOTICE 'Parche 42: lead scoring indexes created';
+            EXCEPTION WHEN OTHERS THEN
+                RAISE NOTICE 'Parche 42: Error: %', SQLERRM;
+            END $$;
+            """,
+
+            # Parche 43: DEV-50 — Blocking-key index for duplicate detection (maintained by trigger on leads)
+            """
+            DO $$ BEGIN
+                CREATE TABLE IF NOT EXISTS lead_dedup_keys (
+                    tenant_id INTEGER NOT NULL,
+                    lead_id UUID NOT NULL REFERENCES leads(id) ON DELETE CASCADE,
+                    key_type TEXT NOT NULL,
+                    key_value TEXT NOT NULL,
+                    indexed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                    PRIMARY KEY (tenant_id, key_type, key_value, lead_id)
+                );
+                CREATE INDEX IF NOT EXISTS idx_lead_dedup_keys_lead ON lead_dedup_keys (lead_id);
+                CREATE INDEX IF NOT EXISTS idx_lead_dedup_keys_indexed ON lead_dedup_keys (tenant_id, indexed_at);
+
+                CREATE TABLE IF NOT EXISTS dedup_checkpoints (
+                    tenant_id INTEGER PRIMARY KEY REFERENCES tenants(id) ON DELETE CASCADE,
+                    last_run_at TIMESTAMPTZ NOT NULL
+                );
+
+                -- Spanish-oriented phonetic folding (mirrored by deduplication_service.phonetic_fold)
+                CREATE OR REPLACE FUNCTION lead_dedup_phonetic(txt TEXT) RETURNS TEXT
+                LANGUAGE sql IMMUTABLE AS $fn$
+                    SELECT regexp_replace(
+                        replace(replace(replace(replace(replace(
+                            regexp_replace(
+                                replace(
+                                    regexp_replace(translate(lower(coalesce(txt, '')), 'áéíóúüñ', 'aeiouun'), '[^a-z ]', '', 'g'),
+                                'qu', 'k'),
+                            'c([ei])', 's\\1', 'g'),
+                        'c', 'k'), 'z', 's'), 'v', 'b'), 'll', 'y'), 'h', ''),
+                    '(.)\\1+', '\\1', 'g')
+                $fn$;
+
+                -- Blocking keys: phone (last 10 digits), lowercased email, pairs of phonetic name tokens
+                CREATE OR REPLACE FUNCTION lead_dedup_keys_for(p_phone TEXT, p_email TEXT, p_first TEXT, p_last TEXT)
+                RETURNS TABLE (key_type TEXT, key_value TEXT)
+                LANGUAGE sql IMMUTABLE AS $fn$
+                    WITH toks AS (
+                        SELECT DISTINCT tok
+                        FROM unnest(string_to_array(lead_dedup_phonetic(p_first || ' ' || p_last), ' ')) AS tok
+                        WHERE length(tok) >= 2
+                          AND coalesce(p_first, '') <> '' AND coalesce(p_last, '') <> ''
+                    )
+                    SELECT 'phone'::text, right(regexp_replace(p_phone, '\\D', '', 'g'), 10)
+                    WHERE length(regexp_replace(coalesce(p_phone, ''), '\\D', '', 'g')) >= 8
+                    UNION
+                    SELECT 'email'::text, lower(trim(p_email))
+                    WHERE coalesce(trim(p_email), '') <> ''
+                    UNION
+                    SELECT 'name_pair'::text, a.tok || ' ' || b.tok
+                    FROM toks a JOIN toks b ON a.tok < b.tok
+                $fn$;
+
+                CREATE OR REPLACE FUNCTION lead_dedup_keys_refresh() RETURNS trigger
+                LANGUAGE plpgsql AS $fn$
+                BEGIN
+                    IF TG_OP = 'UPDATE'
+                       AND NEW.phone_number IS NOT DISTINCT FROM OLD.phone_number
+                       AND NEW.email IS NOT DISTINCT FROM OLD.email
+                       AND NEW.first_name IS NOT DISTINCT FROM OLD.first_name
+                       AND NEW.last_name IS NOT DISTINCT FROM OLD.last_name
+                       AND NEW.status IS NOT DISTINCT FROM OLD.status THEN
+                        RETURN NEW;
+                    END IF;
+                    DELETE FROM lead_dedup_keys WHERE lead_id = NEW.id;
+                    IF NEW.status IS DISTINCT FROM 'merged' THEN
+                        INSERT INTO lead_dedup_keys (tenant_id, lead_id, key_type, key_value)
+                        SELECT NEW.tenant_id, NEW.id, k.key_type, k.key_value
+                        FROM lead_dedup_keys_for(NEW.phone_number, NEW.email, NEW.first_name, NEW.last_name) k
+                        ON CONFLICT DO NOTHING;
+                    END IF;
+                    RETURN NEW;
+                END
+                $fn$;
+
+                DROP TRIGGER IF EXISTS trg_lead_dedup_keys ON leads;
+                CREATE TRIGGER trg_lead_dedup_keys
+                    AFTER INSERT OR UPDATE OF phone_number, email, first_name, last_name, status ON leads
+                    FOR EACH ROW EXECUTE FUNCTION lead_dedup_keys_refresh();
+
+                -- Backfill once for existing leads
+                IF NOT EXISTS (SELECT 1 FROM lead_dedup_keys LIMIT 1) THEN
+                    INSERT INTO lead_dedup_keys (tenant_id, lead_id, key_type, key_value)
+                    SELECT l.tenant_id, l.id, k.key_type, k.key_value
+                    FROM leads l
+                    CROSS JOIN LATERAL lead_dedup_keys_for(l.phone_number, l.email, l.first_name, l.last_name) k
+                    WHERE l.status IS DISTINCT FROM 'merged'
+                    ON CONFLICT DO NOTHING;
+                END IF;
+                RAISE NOTICE 'Parche 43: DEV-50 lead_dedup_keys blocking index created';
+            EXCEPTION WHEN OTHERS THEN
+                RAISE NOTICE 'Parche 43: Error: %', SQLERRM;
+            END $$;
+            """,
+            # Parche 44: Dashboard aggregates — lead counts/values per (tenant, day, status, seller), maintained by trigger
+            """
+            DO $$ BEGIN
+                IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name='leads' AND column_name='close_probability') THEN
+                    ALTER TABLE leads ADD COLUMN close_probability DECIMAL(5,2) NOT NULL DEFAULT 0 CHECK (close_probability >= 0 AND close_probability <= 100);
+                END IF;
+
+                -- seller_id uses the nil UUID for unassigned leads (primary key columns cannot be NULL)
+                CREATE TABLE IF NOT EXISTS lead_daily_aggregates (
+                    tenant_id INTEGER NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+                    day DATE NOT NULL,
+                    status TEXT NOT NULL,
+                    seller_id UUID NOT NULL,
+                    lead_count INTEGER NOT NULL DEFAULT 0,
+                    value_sum NUMERIC NOT NULL DEFAULT 0,
+                    prob_count INTEGER NOT NULL DEFAULT 0,
+                    prob_value_sum NUMERIC NOT NULL DEFAULT 0,
+                    prob_sum NUMERIC NOT NULL DEFAULT 0,
+                    weighted_value_sum NUMERIC NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                    PRIMARY KEY (tenant_id, day, status, seller_id)
+                );
+                CREATE INDEX IF NOT EXISTS idx_lead_daily_aggregates_seller ON lead_daily_aggregates (tenant_id, seller_id, day);
+
+                CREATE TABLE IF NOT EXISTS lead_aggregate_state (
+                    tenant_id INTEGER PRIMARY KEY REFERENCES tenants(id) ON DELETE CASCADE,
+                    reconciled_at TIMESTAMPTZ NOT NULL,
+                    drift_rows INTEGER NOT NULL DEFAULT 0
+                );
+
+                -- Adds (p_sign = 1) or removes (p_sign = -1) one lead's contribution.
+                -- Writers hold a shared advisory lock per tenant; reconciliation takes it exclusively.
+                CREATE OR REPLACE FUNCTION lead_aggregates_bump(
+                    p_tenant INTEGER, p_created TIMESTAMPTZ, p_status TEXT, p_seller UUID,
+                    p_value NUMERIC, p_prob NUMERIC, p_sign INTEGER
+                ) RETURNS void
+                LANGUAGE plpgsql AS $fn$
+                DECLARE
+                    v_value NUMERIC := COALESCE(p_value, 0);
+                    v_prob NUMERIC := COALESCE(p_prob, 0);
+                BEGIN
+                    PERFORM pg_advisory_xact_lock_shared(7344, p_tenant);
+                    INSERT INTO lead_daily_aggregates AS a (
+                        tenant_id, day, status, seller_id, lead_count, value_sum,
+                        prob_count, prob_value_sum, prob_sum, weighted_value_sum
+                    ) VALUES (
+                        p_tenant,
+                        (COALESCE(p_created, NOW()) AT TIME ZONE 'UTC')::date,
+                        COALESCE(p_status, 'new'),
+                        COALESCE(p_seller, '00000000-0000-0000-0000-000000000000'::uuid),
+                        p_sign,
+                        p_sign * v_value,
+                        CASE WHEN v_prob > 0 THEN p_sign ELSE 0 END,
+                        CASE WHEN v_prob > 0 THEN p_sign * v_value ELSE 0 END,
+                        p_sign * v_prob / 100,
+                        p_sign * v_value * v_prob / 100
+                    )
+                    ON CONFLICT (tenant_id, day, status, seller_id) DO UPDATE SET
+                        lead_count = a.lead_count + EXCLUDED.lead_count,
+                        value_sum = a.value_sum + EXCLUDED.value_sum,
+                        prob_count = a.prob_count + EXCLUDED.prob_count,
+                        prob_value_sum = a.prob_value_sum + EXCLUDED.prob_value_sum,
+                        prob_sum = a.prob_sum + EXCLUDED.prob_sum,
+                        weighted_value_sum = a.weighted_value_sum + EXCLUDED.weighted_value_sum,
+                        updated_at = NOW();
+                END
+                $fn$;
+
+                CREATE OR REPLACE FUNCTION lead_aggregates_refresh() RETURNS trigger
+                LANGUAGE plpgsql AS $fn$
+                BEGIN
+                    IF TG_OP = 'UPDATE'
+                       AND NEW.tenant_id IS NOT DISTINCT FROM OLD.tenant_id
+                       AND NEW.created_at IS NOT DISTINCT FROM OLD.created_at
+                       AND NEW.status IS NOT DISTINCT FROM OLD.status
+                       AND NEW.assigned_seller_id IS NOT DISTINCT FROM OLD.assigned_seller_id
+                       AND NEW.estimated_value IS NOT DISTINCT FROM OLD.estimated_value
+                       AND NEW.close_probability IS NOT DISTINCT FROM OLD.close_probability THEN
+                        RETURN NULL;
+                    END IF;
+                    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                        PERFORM lead_aggregates_bump(OLD.tenant_id, OLD.created_at, OLD.status, OLD.assigned_seller_id,
+                                                     OLD.estimated_value, OLD.close_probability, -1);
+                    END IF;
+                    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                        PERFORM lead_aggregates_bump(NEW.tenant_id, NEW.created_at, NEW.status, NEW.assigned_seller_id,
+                                                     NEW.estimated_value, NEW.close_probability, 1);
+                    END IF;
+                    RETURN NULL;
+                END
+                $fn$;
+
+                DROP TRIGGER IF EXISTS trg_lead_aggregates ON leads;
+                CREATE TRIGGER trg_lead_aggregates
+                    AFTER INSERT OR DELETE
+                       OR UPDATE OF tenant_id, created_at, status, assigned_seller_id, estimated_value, close_probability
+                    ON leads
+                    FOR EACH ROW EXECUTE FUNCTION lead_aggregates_refresh();
+
+                -- Backfill once; lead_aggregates_service reconciles from here on
+                IF NOT EXISTS (SELECT 1 FROM lead_aggregate_state LIMIT 1) THEN
+                    DELETE FROM lead_daily_aggregates;
+                    INSERT INTO lead_daily_aggregates (
+                        tenant_id, day, status, seller_id, lead_count, value_sum,
+                        prob_count, prob_value_sum, prob_sum, weighted_value_sum
+                    )
+                    SELECT tenant_id,
+                           (COALESCE(created_at, NOW()) AT TIME ZONE 'UTC')::date,
+                           COALESCE(status, 'new'),
+                           COALESCE(assigned_seller_id, '00000000-0000-0000-0000-000000000000'::uuid),
+                           COUNT(*),
+                           SUM(COALESCE(estimated_value, 0)),
+                           COUNT(*) FILTER (WHERE close_probability > 0),
+                           COALESCE(SUM(COALESCE(estimated_value, 0)) FILTER (WHERE close_probability > 0), 0),
+                           SUM(COALESCE(close_probability, 0) / 100),
+                           SUM(COALESCE(estimated_value, 0) * COALESCE(close_probability, 0) / 100)
+                    FROM leads
+                    GROUP BY 1, 2, 3, 4;
+                    INSERT INTO lead_aggregate_state (tenant_id, reconciled_at)
+                    SELECT id, NOW() FROM tenants
+                    ON CONFLICT (tenant_id) DO NOTHING;
+                END IF;
+                RAISE NOTICE 'Parche 44: lead_daily_aggregates created';
+            EXCEPTION WHEN OTHERS THEN
+                RAISE NOTICE 'Parche 44: Error: %', SQLERRM;
+            END $$;
+            """,
+            # Parche 45: DEV-42 — SLA projection (last activity / first seller response per lead) + emitted violations
+            """
+            DO $$ BEGIN
+                -- seller_id/first_response_at: first activity by the seller assigned when it happened
+                CREATE TABLE IF NOT EXISTS lead_sla_state (
+                    lead_id UUID PRIMARY KEY REFERENCES leads(id) ON DELETE CASCADE,
+                    tenant_id INTEGER NOT NULL,
+                    last_activity_at TIMESTAMPTZ,
+                    seller_id UUID,
+                    first_response_at TIMESTAMPTZ,
+                    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+                );
+                CREATE INDEX IF NOT EXISTS idx_lead_sla_state_tenant ON lead_sla_state (tenant_id);
+
+                -- Violations already notified; rows disappear when the lead stops violating the rule
+                CREATE TABLE IF NOT EXISTS sla_violation_state (
+                    rule_id UUID NOT NULL REFERENCES sla_rules(id) ON DELETE CASCADE,
+                    lead_id UUID NOT NULL REFERENCES leads(id) ON DELETE CASCADE,
+                    tenant_id INTEGER NOT NULL,
+                    escalated BOOLEAN NOT NULL DEFAULT FALSE,
+                    first_seen_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                    PRIMARY KEY (rule_id, lead_id)
+                );
+                CREATE INDEX IF NOT EXISTS idx_sla_violation_state_tenant ON sla_violation_state (tenant_id);
+
+                CREATE OR REPLACE FUNCTION lead_sla_state_touch() RETURNS trigger
+                LANGUAGE plpgsql AS $fn$
+                DECLARE
+                    v_lead UUID;
+                    v_seller UUID;
+                BEGIN
+                    IF NEW.entity_id !~* '^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$' THEN
+                        RETURN NULL;
+                    END IF;
+                    SELECT id, assigned_seller_id INTO v_lead, v_seller
+                    FROM leads WHERE id = NEW.entity_id::uuid AND tenant_id = NEW.tenant_id;
+                    IF v_lead IS NULL THEN
+                        RETURN NULL;
+                    END IF;
+                    INSERT INTO lead_sla_state AS s (lead_id, tenant_id, last_activity_at, seller_id, first_response_at)
+                    VALUES (
+                        v_lead, NEW.tenant_id, NEW.created_at,
+                        CASE WHEN NEW.actor_id = v_seller THEN v_seller END,
+                        CASE WHEN NEW.actor_id = v_seller THEN NEW.created_at END
+                    )
+                    ON CONFLICT (lead_id) DO UPDATE SET
+                        last_activity_at = GREATEST(s.last_activity_at, EXCLUDED.last_activity_at),
+                        seller_id = COALESCE(EXCLUDED.seller_id, s.seller_id),
+                        first_response_at = CASE
+                            WHEN EXCLUDED.seller_id IS NOT NULL AND s.seller_id IS DISTINCT FROM EXCLUDED.seller_id
+                                THEN EXCLUDED.first_response_at
+                            ELSE COALESCE(s.first_response_at, EXCLUDED.first_response_at)
+                        END,
+                        updated_at = NOW();
+                    RETURN NULL;
+                END
+                $fn$;
+
+                DROP TRIGGER IF EXISTS trg_lead_sla_state ON activity_events;
+                CREATE TRIGGER trg_lead_sla_state
+                    AFTER INSERT ON activity_events
+                    FOR EACH ROW EXECUTE FUNCTION lead_sla_state_touch();
+
+                -- Backfill once from the activity history
+                IF NOT EXISTS (SELECT 1 FROM lead_sla_state LIMIT 1) THEN
+                    INSERT INTO lead_sla_state (lead_id, tenant_id, last_activity_at, seller_id, first_response_at)
+                    SELECT l.id, l.tenant_id, a.last_at,
+                           CASE WHEN f.first_at IS NOT NULL THEN l.assigned_seller_id END,
+                           f.first_at
+                    FROM (
+                        SELECT tenant_id, entity_id, MAX(created_at) AS last_at
+                        FROM activity_events
+                        WHERE entity_id ~* '^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$'
+                        GROUP BY tenant_id, entity_id
+                    ) a
+                    JOIN leads l ON l.id = a.entity_id::uuid AND l.tenant_id = a.tenant_id
+                    LEFT JOIN LATERAL (
+                        SELECT MIN(ae.created_at) AS first_at
+                        FROM activity_events ae
+                        WHERE ae.tenant_id = a.tenant_id AND ae.entity_id = a.entity_id
+                          AND ae.actor_id = l.assigned_seller_id
+                    ) f ON TRUE
+                    ON CONFLICT (lead_id) DO NOTHING;
+                END IF;
+                RAISE NOTICE 'Parche 45: DEV-42 lead_sla_state projection created';
+            EXCEPTION WHEN OTHERS THEN
+                RAISE NOTICE 'Parche 45: Error: %', SQLERRM;
+            END $$;
+            """,
+            # Parche 46: Notifications — FIFO trim index + optional partitioning by expiry day
+            """
+            DO $$ BEGIN
+                -- Per-recipient FIFO trim (save_notifications) walks recipient_id + created_at
+                CREATE INDEX IF NOT EXISTS idx_notifications_recipient_created ON notifications (recipient_id, created_at DESC);
+
+                -- Partitioned layout (NOTIFICATIONS_PARTITIONED=true): RANGE on expires_on = UTC day of expires_at.
+                -- notifications_pYYYYMMDD holds the rows expiring that day, so expiry is a DROP TABLE;
+                -- rows without expiry go to notifications_never ('infinity'), out-of-horizon days to notifications_default.
+                CREATE OR REPLACE FUNCTION notifications_is_partitioned() RETURNS BOOLEAN
+                LANGUAGE sql STABLE AS $fn$
+                    SELECT EXISTS (
+                        SELECT 1 FROM pg_partitioned_table pt
+                        JOIN pg_class c ON c.oid = pt.partrelid
+                        WHERE c.relname = 'notifications' AND c.relnamespace = 'public'::regnamespace
+                    );
+                $fn$;
+
+                CREATE OR REPLACE FUNCTION notifications_ensure_partitions(p_days_ahead INTEGER DEFAULT 14) RETURNS INTEGER
+                LANGUAGE plpgsql AS $fn$
+                DECLARE
+                    d DATE;
+                    part TEXT;
+                    created INTEGER := 0;
+                    today DATE := (NOW() AT TIME ZONE 'UTC')::date;
+                BEGIN
+                    IF NOT notifications_is_partitioned() THEN
+                        RETURN 0;
+                    END IF;
+                    FOR d IN SELECT g::date FROM generate_series(today, today + p_days_ahead, INTERVAL '1 day') g LOOP
+                        part := 'notifications_p' || to_char(d, 'YYYYMMDD');
+                        CONTINUE WHEN to_regclass(part) IS NOT NULL;
+                        -- The default partition may already hold rows of that day: park them while attaching
+                        CREATE TEMP TABLE IF NOT EXISTS notifications_parked (LIKE notifications) ON COMMIT DROP;
+                        INSERT INTO notifications_parked SELECT * FROM notifications_default WHERE expires_on = d;
+                        DELETE FROM notifications_default WHERE expires_on = d;
+                        EXECUTE format('CREATE TABLE %I PARTITION OF notifications FOR VALUES FROM (%L) TO (%L)', part, d, d + 1);
+                        INSERT INTO notifications SELECT * FROM notifications_parked;
+                        TRUNCATE notifications_parked;
+                        created := created + 1;
+                    END LOOP;
+                    RETURN created;
+                END
+                $fn$;
+
+                -- Returns the rows removed (estimated from pg_class.reltuples for dropped partitions)
+                CREATE OR REPLACE FUNCTION notifications_drop_expired_partitions() RETURNS BIGINT
+                LANGUAGE plpgsql AS $fn$
+                DECLARE
+                    r RECORD;
+                    removed BIGINT := 0;
+                    deleted BIGINT;
+                BEGIN
+                    IF NOT notifications_is_partitioned() THEN
+                        RETURN 0;
+                    END IF;
+                    FOR r IN
+                        SELECT c.relname, c.reltuples
+                        FROM pg_inherits i
+                        JOIN pg_class c ON c.oid = i.inhrelid
+                        WHERE i.inhparent = 'notifications'::regclass
+                          AND c.relname ~ '^notifications_p[0-9]{8}$'
+                          AND to_date(substring(c.relname FROM 16), 'YYYYMMDD') < (NOW() AT TIME ZONE 'UTC')::date
+                    LOOP
+                        removed := removed + GREATEST(r.reltuples, 0)::bigint;
+                        EXECUTE format('DROP TABLE %I', r.relname);
+                    END LOOP;
+                    DELETE FROM notifications_default WHERE expires_at < NOW();
+                    GET DIAGNOSTICS deleted = ROW_COUNT;
+                    RETURN removed + deleted;
+                END
+                $fn$;
+
+                -- One-shot conversion of the plain table; already-expired rows are not copied
+                CREATE OR REPLACE FUNCTION notifications_enable_partitioning(p_days_ahead INTEGER DEFAULT 14) RETURNS BOOLEAN
+                LANGUAGE plpgsql AS $fn$
+                BEGIN
+                    IF notifications_is_partitioned() THEN
+                        PERFORM notifications_ensure_partitions(p_days_ahead);
+                        RETURN FALSE;
+                    END IF;
+                    LOCK TABLE notifications IN ACCESS EXCLUSIVE MODE;
+                    DROP VIEW IF EXISTS unread_notifications_count;
+                    ALTER TABLE notifications RENAME TO notifications_unpartitioned;
+
+                    CREATE TABLE notifications (
+                        id VARCHAR(255) NOT NULL,
+                        tenant_id INTEGER REFERENCES tenants(id) ON DELETE CASCADE,
+                        type VARCHAR(100) NOT NULL,
+                        title VARCHAR(255) NOT NULL,
+                        message TEXT NOT NULL,
+                        priority VARCHAR(50) DEFAULT 'medium',
+                        recipient_id UUID REFERENCES users(id) ON DELETE CASCADE NOT NULL,
+                        sender_id UUID REFERENCES users(id) ON DELETE SET NULL,
+                        related_entity_type VARCHAR(100),
+                        related_entity_id VARCHAR(255),
+                        metadata JSONB,
+                        read BOOLEAN DEFAULT FALSE,
+                        created_at TIMESTAMPTZ DEFAULT NOW(),
+                        expires_at TIMESTAMPTZ,
+                        expires_on DATE NOT NULL DEFAULT 'infinity',
+                        CONSTRAINT notifications_partitioned_pkey PRIMARY KEY (id, expires_on)
+                    ) PARTITION BY RANGE (expires_on);
+                    CREATE TABLE notifications_never PARTITION OF notifications FOR VALUES FROM ('infinity') TO (MAXVALUE);
+                    CREATE TABLE notifications_default PARTITION OF notifications DEFAULT;
+                    PERFORM notifications_ensure_partitions(p_days_ahead);
+
+                    INSERT INTO notifications (
+                        id, tenant_id, type, title, message, priority, recipient_id, sender_id,
+                        related_entity_type, related_entity_id, metadata, read, created_at, expires_at, expires_on
+                    )
+                    SELECT id, tenant_id, type, title, message, priority, recipient_id, sender_id,
+                           related_entity_type, related_entity_id, metadata, read, created_at, expires_at,
+                           COALESCE((expires_at AT TIME ZONE 'UTC')::date, 'infinity'::date)
+                    FROM notifications_unpartitioned
+                    WHERE expires_at IS NULL OR expires_at >= NOW();
+                    DROP TABLE notifications_unpartitioned;
+
+                    CREATE INDEX IF NOT EXISTS idx_notifications_recipient_tenant ON notifications (recipient_id, tenant_id, created_at DESC);
+                    CREATE INDEX IF NOT EXISTS idx_notifications_recipient_created ON notifications (recipient_id, created_at DESC);
+                    CREATE VIEW unread_notifications_count AS
+                    SELECT
+                        recipient_id as user_id,
+                        COUNT(*) as count,
+                        COUNT(*) FILTER (WHERE priority = 'critical') as critical_count,
+                        COUNT(*) FILTER (WHERE priority = 'high') as high_count,
+                        COUNT(*) FILTER (WHERE priority = 'medium') as medium_count,
+                        COUNT(*) FILTER (WHERE priority = 'low') as low_count
+                    FROM notifications
+                    WHERE read = FALSE
+                    GROUP BY recipient_id;
+                    RETURN TRUE;
+                END
+                $fn$;
+                RAISE NOTICE 'Parche 46: notifications trim index + partitioning functions created';
+            EXCEPTION WHEN OTHERS THEN
+                RAISE NOTICE 'Parche 46: Error: %', SQLERRM;
+            END $$;
+            """,
+            # Parche 47: Seller metrics projection — per-seller daily counters + per-conversation state, maintained by triggers
+            """
+            DO $$ BEGIN
+                -- Same definition as migrations/patch_009_meta_ads_tables.sql, which is not part of the robot
+                IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name='leads' AND column_name='lead_source') THEN
+                    ALTER TABLE leads ADD COLUMN lead_source VARCHAR(50) DEFAULT 'ORGANIC';
+                END IF;
+
+                -- Message counters are keyed by the UTC day of the message, lead counters by the UTC day the lead was created
+                CREATE TABLE IF NOT EXISTS seller_daily_counters (
+                    tenant_id INTEGER NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+                    seller_id UUID NOT NULL,
+                    day DATE NOT NULL,
+                    messages_sent INTEGER NOT NULL DEFAULT 0,
+                    messages_received INTEGER NOT NULL DEFAULT 0,
+                    responses INTEGER NOT NULL DEFAULT 0,
+                    response_seconds_sum BIGINT NOT NULL DEFAULT 0,
+                    leads_assigned INTEGER NOT NULL DEFAULT 0,
+                    leads_converted INTEGER NOT NULL DEFAULT 0,
+                    prospects_generated INTEGER NOT NULL DEFAULT 0,
+                    prospects_converted INTEGER NOT NULL DEFAULT 0,
+                    last_message_at TIMESTAMPTZ,
+                    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                    PRIMARY KEY (tenant_id, seller_id, day)
+                );
+                CREATE INDEX IF NOT EXISTS idx_seller_daily_counters_day ON seller_daily_counters (tenant_id, day);
+
+                -- One row per conversation: current assignment, lifetime and the oldest unanswered user message
+                CREATE TABLE IF NOT EXISTS seller_conversation_state (
+                    tenant_id INTEGER NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+                    from_number TEXT NOT NULL,
+                    seller_id UUID,
+                    assigned_at TIMESTAMPTZ,
+                    first_message_at TIMESTAMPTZ,
+                    last_message_at TIMESTAMPTZ,
+                    pending_since TIMESTAMPTZ,
+                    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                    PRIMARY KEY (tenant_id, from_number)
+                );
+                CREATE INDEX IF NOT EXISTS idx_seller_conversation_state_seller
+                    ON seller_conversation_state (tenant_id, seller_id, assigned_at DESC);
+
+                CREATE TABLE IF NOT EXISTS seller_counters_state (
+                    tenant_id INTEGER PRIMARY KEY REFERENCES tenants(id) ON DELETE CASCADE,
+                    reconciled_at TIMESTAMPTZ NOT NULL,
+                    drift_rows INTEGER NOT NULL DEFAULT 0
+                );
+
+                -- Source of truth for the backfill and seller_counters_service reconciliation.
+                -- A response is the first assistant message after one or more user messages; its
+                -- latency is measured from the oldest message of that unanswered run.
+                CREATE OR REPLACE FUNCTION seller_counters_expected(p_tenant INTEGER)
+                RETURNS TABLE (
+                    seller_id UUID, day DATE, messages_sent INTEGER, messages_received INTEGER,
+                    responses INTEGER, response_seconds_sum BIGINT, leads_assigned INTEGER,
+                    leads_converted INTEGER, prospects_generated INTEGER, prospects_converted INTEGER,
+                    last_message_at TIMESTAMPTZ
+                )
+                LANGUAGE sql STABLE AS $fn$
+                    WITH m AS (
+                        SELECT from_number, role, created_at, assigned_seller_id,
+                               COALESCE(COUNT(*) FILTER (WHERE role = 'assistant') OVER (
+                                   PARTITION BY from_number ORDER BY created_at, id
+                                   ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                               ), 0) AS turn
+                        FROM chat_messages
+                        WHERE tenant_id = p_tenant AND from_number IS NOT NULL AND role IN ('user', 'assistant')
+                    ),
+                    pending AS (
+                        SELECT from_number, turn, MIN(created_at) AS pending_since
+                        FROM m WHERE role = 'user'
+                        GROUP BY from_number, turn
+                    ),
+                    msgs AS (
+                        SELECT m.assigned_seller_id AS seller_id,
+                               (m.created_at AT TIME ZONE 'UTC')::date AS day,
+                               (COUNT(*) FILTER (WHERE m.role = 'assistant'))::int AS messages_sent,
+                               (COUNT(*) FILTER (WHERE m.role = 'user'))::int AS messages_received,
+                               (COUNT(*) FILTER (WHERE m.role = 'assistant' AND p.pending_since IS NOT NULL))::int AS responses,
+                               COALESCE(SUM(GREATEST(ROUND(EXTRACT(EPOCH FROM (m.created_at - p.pending_since))), 0))
+                                   FILTER (WHERE m.role = 'assistant'), 0)::bigint AS response_seconds_sum,
+                               MAX(m.created_at) AS last_message_at
+                        FROM m
+                        LEFT JOIN pending p ON p.from_number = m.from_number AND p.turn = m.turn AND m.role = 'assistant'
+                        WHERE m.assigned_seller_id IS NOT NULL
+                        GROUP BY 1, 2
+                    ),
+                    lds AS (
+                        SELECT assigned_seller_id AS seller_id,
+                               (COALESCE(created_at, NOW()) AT TIME ZONE 'UTC')::date AS day,
+                               COUNT(*)::int AS leads_assigned,
+                               (COUNT(*) FILTER (WHERE status IN ('converted', 'closed_won', 'client')))::int AS leads_converted,
+                               (COUNT(*) FILTER (WHERE lead_source = 'PROSPECTING'))::int AS prospects_generated,
+                               (COUNT(*) FILTER (WHERE lead_source = 'PROSPECTING'
+                                                   AND status IN ('converted', 'closed_won', 'client')))::int AS prospects_converted
+                        FROM leads
+                        WHERE tenant_id = p_tenant AND assigned_seller_id IS NOT NULL
+                        GROUP BY 1, 2
+                    )
+                    SELECT seller_id, day,
+                           COALESCE(msgs.messages_sent, 0), COALESCE(msgs.messages_received, 0),
+                           COALESCE(msgs.responses, 0), COALESCE(msgs.response_seconds_sum, 0)::bigint,
+                           COALESCE(lds.leads_assigned, 0), COALESCE(lds.leads_converted, 0),
+                           COALESCE(lds.prospects_generated, 0), COALESCE(lds.prospects_converted, 0),
+                           msgs.last_message_at
+                    FROM msgs FULL JOIN lds USING (seller_id, day);
+                $fn$;
+
+                CREATE OR REPLACE FUNCTION seller_conversations_expected(p_tenant INTEGER)
+                RETURNS TABLE (
+                    from_number TEXT, seller_id UUID, assigned_at TIMESTAMPTZ,
+                    first_message_at TIMESTAMPTZ, last_message_at TIMESTAMPTZ, pending_since TIMESTAMPTZ
+                )
+                LANGUAGE sql STABLE AS $fn$
+                    WITH c AS (
+                        SELECT from_number, MIN(created_at) AS first_message_at, MAX(created_at) AS last_message_at,
+                               MAX(created_at) FILTER (WHERE role = 'assistant') AS last_reply_at
+                        FROM chat_messages
+                        WHERE tenant_id = p_tenant AND from_number IS NOT NULL AND role IN ('user', 'assistant')
+                        GROUP BY from_number
+                    ),
+                    a AS (
+                        SELECT DISTINCT ON (from_number) from_number, assigned_seller_id, assigned_at
+                        FROM chat_messages
+                        WHERE tenant_id = p_tenant AND from_number IS NOT NULL AND assigned_seller_id IS NOT NULL
+                        ORDER BY from_number, assigned_at DESC NULLS LAST, created_at DESC
+                    ),
+                    p AS (
+                        SELECT cm.from_number, MIN(cm.created_at) AS pending_since
+                        FROM chat_messages cm
+                        JOIN c ON c.from_number = cm.from_number
+                        WHERE cm.tenant_id = p_tenant AND cm.role = 'user'
+                          AND cm.created_at > COALESCE(c.last_reply_at, '-infinity'::timestamptz)
+                        GROUP BY cm.from_number
+                    )
+                    SELECT c.from_number, a.assigned_seller_id, a.assigned_at,
+                           c.first_message_at, c.last_message_at, p.pending_since
+                    FROM c
+                    LEFT JOIN a ON a.from_number = c.from_number
+                    LEFT JOIN p ON p.from_number = c.from_number;
+                $fn$;
+
+                -- New message: conversation state + the assigned seller's message/response counters.
+                -- Writers hold a shared advisory lock per tenant; reconciliation takes it exclusively.
+                CREATE OR REPLACE FUNCTION seller_counters_message() RETURNS trigger
+                LANGUAGE plpgsql AS $fn$
+                DECLARE
+                    v_at TIMESTAMPTZ := COALESCE(NEW.created_at, NOW());
+                    v_pending TIMESTAMPTZ;
+                    v_reply BOOLEAN;
+                BEGIN
+                    IF NEW.from_number IS NULL OR NEW.role NOT IN ('user', 'assistant') THEN
+                        RETURN NULL;
+                    END IF;
+                    PERFORM pg_advisory_xact_lock_shared(7345, NEW.tenant_id);
+                    SELECT pending_since INTO v_pending
+                    FROM seller_conversation_state
+                    WHERE tenant_id = NEW.tenant_id AND from_number = NEW.from_number
+                    FOR UPDATE;
+                    v_reply := NEW.role = 'assistant' AND v_pending IS NOT NULL;
+
+                    INSERT INTO seller_conversation_state AS s (
+                        tenant_id, from_number, seller_id, assigned_at, first_message_at, last_message_at, pending_since
+                    ) VALUES (
+                        NEW.tenant_id, NEW.from_number, NEW.assigned_seller_id,
+                        CASE WHEN NEW.assigned_seller_id IS NOT NULL THEN NEW.assigned_at END,
+                        v_at, v_at, CASE WHEN NEW.role = 'user' THEN v_at END
+                    )
+                    ON CONFLICT (tenant_id, from_number) DO UPDATE SET
+                        seller_id = COALESCE(EXCLUDED.seller_id, s.seller_id),
+                        assigned_at = CASE WHEN EXCLUDED.seller_id IS NOT NULL THEN EXCLUDED.assigned_at ELSE s.assigned_at END,
+                        first_message_at = LEAST(s.first_message_at, EXCLUDED.first_message_at),
+                        last_message_at = GREATEST(s.last_message_at, EXCLUDED.last_message_at),
+                        pending_since = CASE WHEN NEW.role = 'user' THEN COALESCE(s.pending_since, EXCLUDED.pending_since) END,
+                        updated_at = NOW();
+
+                    IF NEW.assigned_seller_id IS NULL THEN
+                        RETURN NULL;
+                    END IF;
+                    INSERT INTO seller_daily_counters AS c (
+                        tenant_id, seller_id, day, messages_sent, messages_received, responses, response_seconds_sum, last_message_at
+                    ) VALUES (
+                        NEW.tenant_id, NEW.assigned_seller_id, (v_at AT TIME ZONE 'UTC')::date,
+                        CASE WHEN NEW.role = 'assistant' THEN 1 ELSE 0 END,
+                        CASE WHEN NEW.role = 'user' THEN 1 ELSE 0 END,
+                        CASE WHEN v_reply THEN 1 ELSE 0 END,
+                        CASE WHEN v_reply THEN GREATEST(ROUND(EXTRACT(EPOCH FROM (v_at - v_pending))), 0) ELSE 0 END,
+                        v_at
+                    )
+                    ON CONFLICT (tenant_id, seller_id, day) DO UPDATE SET
+                        messages_sent = c.messages_sent + EXCLUDED.messages_sent,
+                        messages_received = c.messages_received + EXCLUDED.messages_received,
+                        responses = c.responses + EXCLUDED.responses,
+                        response_seconds_sum = c.response_seconds_sum + EXCLUDED.response_seconds_sum,
+                        last_message_at = GREATEST(c.last_message_at, EXCLUDED.last_message_at),
+                        updated_at = NOW();
+                    RETURN NULL;
+                END
+                $fn$;
+
+                -- (Re)assignment: seller_assignment_service updates every row of a conversation in one
+                -- statement, so this runs once per statement and moves the message counts of the rows
+                -- whose seller changed. Response counters stay with the seller who replied until the
+                -- nightly reconciliation re-attributes them.
+                CREATE OR REPLACE FUNCTION seller_counters_reassign() RETURNS trigger
+                LANGUAGE plpgsql AS $fn$
+                BEGIN
+                    PERFORM pg_advisory_xact_lock_shared(7345, t.tenant_id)
+                    FROM (SELECT DISTINCT tenant_id FROM new_rows) t;
+
+                    WITH moved AS (
+                        SELECT n.tenant_id, n.role, n.created_at,
+                               o.assigned_seller_id AS old_seller, n.assigned_seller_id AS new_seller
+                        FROM new_rows n JOIN old_rows o ON o.id = n.id
+                        WHERE n.assigned_seller_id IS DISTINCT FROM o.assigned_seller_id
+                          AND n.from_number IS NOT NULL AND n.role IN ('user', 'assistant')
+                    ),
+                    deltas AS (
+                        SELECT tenant_id, old_seller AS seller_id, created_at, role, -1 AS sign FROM moved WHERE old_seller IS NOT NULL
+                        UNION ALL
+                        SELECT tenant_id, new_seller, created_at, role, 1 FROM moved WHERE new_seller IS NOT NULL
+                    )
+                    INSERT INTO seller_daily_counters AS c (tenant_id, seller_id, day, messages_sent, messages_received, last_message_at)
+                    SELECT tenant_id, seller_id, (COALESCE(created_at, NOW()) AT TIME ZONE 'UTC')::date,
+                           COALESCE(SUM(sign) FILTER (WHERE role = 'assistant'), 0),
+                           COALESCE(SUM(sign) FILTER (WHERE role = 'user'), 0),
+                           MAX(created_at) FILTER (WHERE sign = 1)
+                    FROM deltas
+                    GROUP BY 1, 2, 3
+                    ON CONFLICT (tenant_id, seller_id, day) DO UPDATE SET
+                        messages_sent = c.messages_sent + EXCLUDED.messages_sent,
+                        messages_received = c.messages_received + EXCLUDED.messages_received,
+                        last_message_at = GREATEST(c.last_message_at, EXCLUDED.last_message_at),
+                        updated_at = NOW();
+
+                    INSERT INTO seller_conversation_state AS s (tenant_id, from_number, seller_id, assigned_at)
+                    SELECT DISTINCT ON (n.tenant_id, n.from_number) n.tenant_id, n.from_number, n.assigned_seller_id, n.assigned_at
+                    FROM new_rows n JOIN old_rows o ON o.id = n.id
+                    WHERE n.from_number IS NOT NULL AND n.assigned_seller_id IS NOT NULL
+                      AND (n.assigned_seller_id IS DISTINCT FROM o.assigned_seller_id
+                           OR n.assigned_at IS DISTINCT FROM o.assigned_at)
+                    ORDER BY n.tenant_id, n.from_number, n.assigned_at DESC NULLS LAST
+                    ON CONFLICT (tenant_id, from_number) DO UPDATE SET
+                        seller_id = EXCLUDED.seller_id,
+                        assigned_at = EXCLUDED.assigned_at,
+                        updated_at = NOW();
+                    RETURN NULL;
+                END
+                $fn$;
+
+                -- Adds (p_sign = 1) or removes (p_sign = -1) one lead's contribution to its seller's counters
+                CREATE OR REPLACE FUNCTION seller_counters_lead_bump(
+                    p_tenant INTEGER, p_seller UUID, p_created TIMESTAMPTZ, p_status TEXT, p_source TEXT, p_sign INTEGER
+                ) RETURNS void
+                LANGUAGE plpgsql AS $fn$
+                DECLARE
+                    v_won BOOLEAN := COALESCE(p_status IN ('converted', 'closed_won', 'client'), FALSE);
+                    v_prospect BOOLEAN := COALESCE(p_source = 'PROSPECTING', FALSE);
+                BEGIN
+                    IF p_seller IS NULL THEN
+                        RETURN;
+                    END IF;
+                    PERFORM pg_advisory_xact_lock_shared(7345, p_tenant);
+                    INSERT INTO seller_daily_counters AS c (
+                        tenant_id, seller_id, day, leads_assigned, leads_converted, prospects_generated, prospects_converted
+                    ) VALUES (
+                        p_tenant, p_seller, (COALESCE(p_created, NOW()) AT TIME ZONE 'UTC')::date,
+                        p_sign,
+                        CASE WHEN v_won THEN p_sign ELSE 0 END,
+                        CASE WHEN v_prospect THEN p_sign ELSE 0 END,
+                        CASE WHEN v_won AND v_prospect THEN p_sign ELSE 0 END
+                    )
+                    ON CONFLICT (tenant_id, seller_id, day) DO UPDATE SET
+                        leads_assigned = c.leads_assigned + EXCLUDED.leads_assigned,
+                        leads_converted = c.leads_converted + EXCLUDED.leads_converted,
+                        prospects_generated = c.prospects_generated + EXCLUDED.prospects_generated,
+                        prospects_converted = c.prospects_converted + EXCLUDED.prospects_converted,
+                        updated_at = NOW();
+                END
+                $fn$;
+
+                CREATE OR REPLACE FUNCTION seller_counters_lead() RETURNS trigger
+                LANGUAGE plpgsql AS $fn$
+                BEGIN
+                    IF TG_OP = 'UPDATE'
+                       AND NEW.tenant_id IS NOT DISTINCT FROM OLD.tenant_id
+                       AND NEW.created_at IS NOT DISTINCT FROM OLD.created_at
+                       AND NEW.status IS NOT DISTINCT FROM OLD.status
+                       AND NEW.assigned_seller_id IS NOT DISTINCT FROM OLD.assigned_seller_id
+                       AND NEW.lead_source IS NOT DISTINCT FROM OLD.lead_source THEN
+                        RETURN NULL;
+                    END IF;
+                    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                        PERFORM seller_counters_lead_bump(OLD.tenant_id, OLD.assigned_seller_id, OLD.created_at,
+                                                          OLD.status, OLD.lead_source, -1);
+                    END IF;
+                    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                        PERFORM seller_counters_lead_bump(NEW.tenant_id, NEW.assigned_seller_id, NEW.created_at,
+                                                          NEW.status, NEW.lead_source, 1);
+                    END IF;
+                    RETURN NULL;
+                END
+                $fn$;
+
+                DROP TRIGGER IF EXISTS trg_seller_counters_message ON chat_messages;
+                CREATE TRIGGER trg_seller_counters_message
+                    AFTER INSERT ON chat_messages
+                    FOR EACH ROW EXECUTE FUNCTION seller_counters_message();
+
+                -- Transition tables cannot be combined with a column list, hence every UPDATE statement
+                DROP TRIGGER IF EXISTS trg_seller_counters_reassign ON chat_messages;
+                CREATE TRIGGER trg_seller_counters_reassign
+                    AFTER UPDATE ON chat_messages
+                    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+                    FOR EACH STATEMENT EXECUTE FUNCTION seller_counters_reassign();
+
+                DROP TRIGGER IF EXISTS trg_seller_counters_lead ON leads;
+                CREATE TRIGGER trg_seller_counters_lead
+                    AFTER INSERT OR DELETE
+                       OR UPDATE OF tenant_id, created_at, status, assigned_seller_id, lead_source
+                    ON leads
+                    FOR EACH ROW EXECUTE FUNCTION seller_counters_lead();
+
+                -- Backfill once; seller_counters_service reconciles nightly from here on
+                IF NOT EXISTS (SELECT 1 FROM seller_counters_state LIMIT 1) THEN
+                    DELETE FROM seller_daily_counters;
+                    DELETE FROM seller_conversation_state;
+                    INSERT INTO seller_daily_counters (
+                        tenant_id, seller_id, day, messages_sent, messages_received, responses, response_seconds_sum,
+                        leads_assigned, leads_converted, prospects_generated, prospects_converted, last_message_at
+                    )
+                    SELECT t.id, e.* FROM tenants t, LATERAL seller_counters_expected(t.id) e;
+                    INSERT INTO seller_conversation_state (
+                        tenant_id, from_number, seller_id, assigned_at, first_message_at, last_message_at, pending_since
+                    )
+                    SELECT t.id, e.* FROM tenants t, LATERAL seller_conversations_expected(t.id) e;
+                    INSERT INTO seller_counters_state (tenant_id, reconciled_at)
+                    SELECT id, NOW() FROM tenants
+                    ON CONFLICT (tenant_id) DO NOTHING;
+                END IF;
+                RAISE NOTICE 'Parche 47: seller metrics projection created';
+            EXCEPTION WHEN OTHERS THEN
+                RAISE NOTICE 'Parche 47: Error: %', SQLERRM;
+            END $$;
+            """,
+
+            # Parche 48: DEV-54 — Unified search index (persisted tsvectors for leads/notes/messages, maintained by triggers)
+            """
+            DO $$ BEGIN
+                CREATE TABLE IF NOT EXISTS search_documents (
+                    tenant_id INTEGER NOT NULL,
+                    doc_type TEXT NOT NULL CHECK (doc_type IN ('lead', 'note', 'message')),
+                    doc_id TEXT NOT NULL,
+                    lead_id UUID,
+                    phone TEXT,
+                    contact TEXT,
+                    search_vector TSVECTOR NOT NULL,
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                    PRIMARY KEY (tenant_id, doc_type, doc_id)
+                );
+                CREATE INDEX IF NOT EXISTS idx_search_documents_unlinked
+                    ON search_documents (tenant_id, phone) WHERE doc_type = 'message' AND lead_id IS NULL;
+
+                CREATE TABLE IF NOT EXISTS search_index_state (
+                    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+                    messages_backfill_upto BIGINT NOT NULL DEFAULT 0,
+                    messages_backfill_cursor BIGINT NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+                );
+
+                -- (tenant_id, search_vector) in one GIN index when btree_gin is available, vector-only otherwise
+                BEGIN
+                    CREATE EXTENSION IF NOT EXISTS btree_gin;
+                    CREATE INDEX IF NOT EXISTS idx_search_documents_fts
+                        ON search_documents USING gin (tenant_id, doc_type, search_vector);
+                EXCEPTION WHEN OTHERS THEN
+                    CREATE INDEX IF NOT EXISTS idx_search_documents_fts
+                        ON search_documents USING gin (search_vector);
+                END;
+                -- Trigram index for partial phone/email matches (ILIKE still works without pg_trgm, just unindexed)
+                BEGIN
+                    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+                    CREATE INDEX IF NOT EXISTS idx_search_documents_contact_trgm
+                        ON search_documents USING gin (contact gin_trgm_ops) WHERE contact IS NOT NULL;
+                EXCEPTION WHEN OTHERS THEN
+                    RAISE NOTICE 'Parche 48: pg_trgm unavailable, contact matches stay unindexed: %', SQLERRM;
+                END;
+
+                DROP INDEX IF EXISTS idx_leads_search_fts;
+                DROP INDEX IF EXISTS idx_lead_notes_search_fts;
+                DROP INDEX IF EXISTS idx_chat_messages_search_fts;
+
+                -- Names weigh A, email/phone B (ts_rank_cd weights are tunable per tenant)
+                CREATE OR REPLACE FUNCTION search_lead_vector(p_first TEXT, p_last TEXT, p_email TEXT, p_phone TEXT)
+                RETURNS TSVECTOR LANGUAGE sql IMMUTABLE AS $fn$
+                    SELECT setweight(to_tsvector('spanish', coalesce(p_first, '') || ' ' || coalesce(p_last, '')), 'A')
+                        || setweight(to_tsvector('spanish', coalesce(p_email, '') || ' ' || coalesce(p_phone, '')), 'B')
+                $fn$;
+
+                -- Digits of the phone + lowercased email, the text partial matches run against
+                CREATE OR REPLACE FUNCTION search_contact_text(p_phone TEXT, p_email TEXT)
+                RETURNS TEXT LANGUAGE sql IMMUTABLE AS $fn$
+                    SELECT NULLIF(concat_ws(' ',
+                        NULLIF(regexp_replace(coalesce(p_phone, ''), '\\D', '', 'g'), ''),
+                        NULLIF(lower(trim(coalesce(p_email, ''))), '')
+                    ), '')
+                $fn$;
+
+                CREATE OR REPLACE FUNCTION search_documents_lead() RETURNS trigger
+                LANGUAGE plpgsql AS $fn$
+                BEGIN
+                    IF TG_OP = 'DELETE' THEN
+                        DELETE FROM search_documents
+                        WHERE tenant_id = OLD.tenant_id AND doc_type = 'lead' AND doc_id = OLD.id::text;
+                        RETURN OLD;
+                    END IF;
+                    INSERT INTO search_documents (tenant_id, doc_type, doc_id, lead_id, phone, contact, search_vector, created_at)
+                    VALUES (
+                        NEW.tenant_id, 'lead', NEW.id::text, NEW.id, NEW.phone_number,
+                        search_contact_text(NEW.phone_number, NEW.email),
+                        search_lead_vector(NEW.first_name, NEW.last_name, NEW.email, NEW.phone_number),
+                        COALESCE(NEW.created_at, NOW())
+                    )
+                    ON CONFLICT (tenant_id, doc_type, doc_id) DO UPDATE SET
+                        phone = EXCLUDED.phone, contact = EXCLUDED.contact, search_vector = EXCLUDED.search_vector;
+                    -- Messages indexed before the lead existed get linked to it
+                    UPDATE search_documents SET lead_id = NEW.id
+                    WHERE tenant_id = NEW.tenant_id AND doc_type = 'message' AND lead_id IS NULL
+                      AND phone = NEW.phone_number;
+                    RETURN NEW;
+                END
+                $fn$;
+
+                CREATE OR REPLACE FUNCTION search_documents_note() RETURNS trigger
+                LANGUAGE plpgsql AS $fn$
+                BEGIN
+                    IF TG_OP = 'DELETE' THEN
+                        DELETE FROM search_documents
+                        WHERE tenant_id = OLD.tenant_id AND doc_type = 'note' AND doc_id = OLD.id::text;
+                        RETURN OLD;
+                    END IF;
+                    INSERT INTO search_documents (tenant_id, doc_type, doc_id, lead_id, search_vector, created_at)
+                    VALUES (
+                        NEW.tenant_id, 'note', NEW.id::text, NEW.lead_id,
+                        to_tsvector('spanish', coalesce(NEW.content, '')), COALESCE(NEW.created_at, NOW())
+                    )
+                    ON CONFLICT (tenant_id, doc_type, doc_id) DO UPDATE SET search_vector = EXCLUDED.search_vector;
+                    RETURN NEW;
+                END
+                $fn$;
+
+                CREATE OR REPLACE FUNCTION search_documents_message() RETURNS trigger
+                LANGUAGE plpgsql AS $fn$
+                BEGIN
+                    IF TG_OP = 'DELETE' THEN
+                        DELETE FROM search_documents
+                        WHERE tenant_id = OLD.tenant_id AND doc_type = 'message' AND doc_id = OLD.id::text;
+                        RETURN OLD;
+                    END IF;
+                    INSERT INTO search_documents (tenant_id, doc_type, doc_id, lead_id, phone, contact, search_vector, created_at)
+                    VALUES (
+                        NEW.tenant_id, 'message', NEW.id::text,
+                        (SELECT l.id FROM leads l WHERE l.tenant_id = NEW.tenant_id AND l.phone_number = NEW.from_number LIMIT 1),
+                        NEW.from_number, search_contact_text(NEW.from_number, NULL),
+                        to_tsvector('spanish', coalesce(NEW.content, '')), COALESCE(NEW.created_at, NOW())
+                    )
+                    ON CONFLICT (tenant_id, doc_type, doc_id) DO UPDATE SET search_vector = EXCLUDED.search_vector;
+                    RETURN NEW;
+                END
+                $fn$;
+
+                DROP TRIGGER IF EXISTS trg_search_documents_lead ON leads;
+                CREATE TRIGGER trg_search_documents_lead
+                    AFTER INSERT OR DELETE OR UPDATE OF first_name, last_name, email, phone_number ON leads
+                    FOR EACH ROW EXECUTE FUNCTION search_documents_lead();
+                DROP TRIGGER IF EXISTS trg_search_documents_note ON lead_notes;
+                CREATE TRIGGER trg_search_documents_note
+                    AFTER INSERT OR DELETE OR UPDATE OF content ON lead_notes
+                    FOR EACH ROW EXECUTE FUNCTION search_documents_note();
+                DROP TRIGGER IF EXISTS trg_search_documents_message ON chat_messages;
+                CREATE TRIGGER trg_search_documents_message
+                    AFTER INSERT OR DELETE OR UPDATE OF content ON chat_messages
+                    FOR EACH ROW EXECUTE FUNCTION search_documents_message();
+
+                -- One-time backfill: leads and notes inline; messages up to the current max id are
+                -- indexed in batches by the search_index_backfill job (services/search_index_service.py)
+                IF NOT EXISTS (SELECT 1 FROM search_index_state) THEN
+                    INSERT INTO search_documents (tenant_id, doc_type, doc_id, lead_id, phone, contact, search_vector, created_at)
+                    SELECT tenant_id, 'lead', id::text, id, phone_number,
+                           search_contact_text(phone_number, email),
+                           search_lead_vector(first_name, last_name, email, phone_number),
+                           COALESCE(created_at, NOW())
+                    FROM leads
+                    ON CONFLICT DO NOTHING;
+                    INSERT INTO search_documents (tenant_id, doc_type, doc_id, lead_id, search_vector, created_at)
+                    SELECT tenant_id, 'note', id::text, lead_id,
+                           to_tsvector('spanish', coalesce(content, '')), COALESCE(created_at, NOW())
+                    FROM lead_notes
+                    ON CONFLICT DO NOTHING;
+                    INSERT INTO search_index_state (messages_backfill_upto, messages_backfill_cursor)
+                    SELECT COALESCE(MAX(id), 0), 0 FROM chat_messages;
+                END IF;
+                RAISE NOTICE 'Parche 48: DEV-54 search_documents index created';
+            EXCEPTION WHEN OTHERS THEN
+                RAISE NOTICE 'Parche 48: Error: %', SQLERRM;
+            END $$;
+            """,
+
+            # Parche 49: Lead listing — keyset indexes on (created_at, id), tags GIN and trigram search (services/lead_listing_service.py)
+            """
+            DO $$ BEGIN
+                CREATE INDEX IF NOT EXISTS idx_leads_tenant_created_keyset
+                    ON leads (tenant_id, created_at DESC, id DESC) INCLUDE (status, assigned_seller_id)
+                    WHERE status IS DISTINCT FROM 'deleted';
+                CREATE INDEX IF NOT EXISTS idx_leads_seller_created_keyset
+                    ON leads (tenant_id, assigned_seller_id, created_at DESC, id DESC) INCLUDE (status)
+                    WHERE status IS DISTINCT FROM 'deleted';
+                -- Parche 17 only created it together with the column; schemas that shipped the column lack it
+                CREATE INDEX IF NOT EXISTS idx_leads_tags ON leads USING gin (tags);
+                BEGIN
+                    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+                    -- Same expression as lead_listing_service.LEAD_SEARCH_EXPR
+                    CREATE INDEX IF NOT EXISTS idx_leads_search_trgm ON leads USING gin (
+                        (COALESCE(first_name, '') || ' ' || COALESCE(last_name, '') || ' ' ||
+                         COALESCE(phone_number, '') || ' ' || COALESCE(email, '')) gin_trgm_ops
+                    );
+                EXCEPTION WHEN OTHERS THEN
+                    RAISE NOTICE 'Parche 49: pg_trgm unavailable, lead search stays unindexed: %', SQLERRM;
+                END;
+                RAISE NOTICE 'Parche 49: lead listing keyset/tags/search indexes created';
+            EXCEPTION WHEN OTHERS THEN
+                RAISE NOTICE 'Parche 49: Error: %', SQLERRM;
+            END $$;
             """
         ]
 
+    async def _run_evolution_pipeline(self, logger):
+        """Pipeline de parches atómicos e idempotentes."""
+        patches = self.evolution_patches()
         async with self.pool.acquire() as conn:
             async with conn.transaction():
                 for i, patch in enumerate(patches):
@@ -1527,6 +2563,8 @@ class Database:
                         raise e
 
     async def disconnect(self):
+        if self.read_pool and self.read_pool is not self.pool:
+            await self.read_pool.close()
         if self.pool:
             await self.pool.close()
 
@@ -1572,71 +2610,38 @@ class Database:
 
         async with self.pool.acquire() as conn:
             # 1. Insert message (with multi-channel columns)
-            query = """INSERT INTO chat_messages
-                (from_number, role, content, correlation_id, tenant_id,
-                 platform, platform_message_id, channel_source, external_user_id)
-                VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)"""
             await conn.execute(
-                query, from_number, role, content, correlation_id, tenant_id,
+                CHAT_MESSAGE_INSERT, from_number, role, content, correlation_id, tenant_id,
                 _platform, platform_message_id, _channel_source, _external_user_id
             )
-            
-            # 2. Trigger Notification if it's a message FROM the USER (lead)
-            if role == "user":
-                try:
-                    # Get assigned seller and lead info
-                    row = await conn.fetchrow("""
-                        SELECT assigned_seller_id, first_name, last_name 
-                        FROM chat_messages cm
-                        LEFT JOIN leads l ON cm.from_number = l.phone_number AND cm.tenant_id = l.tenant_id
-                        WHERE cm.from_number = $1 AND cm.tenant_id = $2
-                        AND cm.assigned_seller_id IS NOT NULL
-                        ORDER BY cm.created_at DESC LIMIT 1
-                    """, from_number, tenant_id)
-                    
-                    if row:
-                        from services.seller_notification_service import seller_notification_service, Notification
-                        import datetime
-                        timestamp = datetime.datetime.utcnow().timestamp()
-                        lead_name = f"{row['first_name'] or ''} {row['last_name'] or ''}".strip() or from_number
-                        
-                        # Notification for Seller
-                        notif_seller = Notification(
-                            id=f"msg_{from_number}_{timestamp}",
-                            tenant_id=tenant_id,
-                            type="unanswered",
-                            title="💬 Nuevo mensaje de Lead",
-                            message=f"{lead_name}: {content[:50]}...",
-                            priority="high",
-                            recipient_id=str(row['assigned_seller_id']),
-                            related_entity_type="conversation",
-                            related_entity_id=from_number,
-                            metadata={"phone": from_number, "preview": content[:100]}
-                        )
-                        
-                        # Notification for CEO
-                        ceo = await conn.fetchrow("SELECT id FROM users WHERE tenant_id = $1 AND role = 'ceo' AND status = 'active' LIMIT 1", tenant_id)
-                        notifications = [notif_seller]
-                        
-                        if ceo and str(ceo['id']) != str(row['assigned_seller_id']):
-                            notif_ceo = Notification(
-                                id=f"msg_ceo_{from_number}_{timestamp}",
-                                tenant_id=tenant_id,
-                                type="unanswered",
-                                title="📢 Actividad Lead (Global)",
-                                message=f"{lead_name} envió un mensaje. Asignado a: (Seller ID: {row['assigned_seller_id']})",
-                                priority="medium",
-                                recipient_id=str(ceo['id']),
-                                related_entity_type="conversation",
-                                related_entity_id=from_number,
-                                metadata={"phone": from_number, "seller_id": str(row['assigned_seller_id'])}
-                            )
-                            notifications.append(notif_ceo)
-                            
-                        await seller_notification_service.save_notifications(notifications)
-                        await seller_notification_service.broadcast_notifications(notifications)
-                except Exception as e:
-                    logger.error(f"Error triggering message notification: {e}")
+
+        # 2. Trigger Notification if it's a message FROM the USER (lead).
+        # Write-behind: seller/CEO resolution and fan-out run in the notification
+        # worker, so the pool connection is released right after the insert.
+        if role == "user":
+            self.notify_user_message(from_number, content, tenant_id)
+        self.invalidate_read_caches(tenant_id, from_number)
+
+    def invalidate_read_caches(self, tenant_id: int, from_number: Optional[str] = None):
+        """Marks the tenant's cached dashboard metrics stale and drops the seller panels showing the conversation."""
+        try:
+            from services.metrics_cache_service import metrics_cache_service
+            from services.lead_enrichment_service import lead_enrichment_service
+
+            metrics_cache_service.invalidate_tenant(tenant_id)
+            if from_number:
+                lead_enrichment_service.invalidate_conversation(tenant_id, from_number)
+        except Exception as e:
+            logger.error(f"Error invalidating read caches: {e}")
+
+    def notify_user_message(self, from_number: str, content: str, tenant_id: int):
+        """Queues a "new lead message" notification (coalesced per conversation per window)."""
+        try:
+            from services.message_notification_queue import message_notification_queue
+
+            message_notification_queue.enqueue(tenant_id, from_number, content)
+        except Exception as e:
+            logger.error(f"Error triggering message notification: {e}")
 
     async def ensure_lead_exists(
         self,
@@ -90,7 +90,7 @@ class MigrationRunner:
                     logger.debug(f"Patch execution: {e}")
 
     def _get_patches(self) -> List[str]:
-        """Retorna lista de parches idempotentes"""
+        """Retorna lista de parches idempotentes (congelada en la migración 0001, ver db/schema_version.py)"""
         return [
             # Parche 1: Columna user_id en professionals
             """DO $$ BEGIN IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name='professionals' AND column_name='user_id') THEN ALTER TABLE professionals ADD COLUMN user_id UUID REFERENCES users(id) ON DELETE SET NULL; END IF; END $$;""",
@@ -1,22 +1,307 @@
 """
 Database Pool Management
 Responsable: Conexiones al pool de PostgreSQL
+
+Lanes:
+- primary: default pool (webhook ingest, inbound pipeline, writes)
+- read:    dashboards / analytics reads, sized separately so a burst of heavy
+           reports can never hold the connections the webhook path needs.
+           With DB_READ_POOL_MAX_SIZE=0 the read lane shares the primary pool.
+
+Every pool is wrapped in InstrumentedPool, which records acquire-wait
+histograms and in-use/idle gauges, and registers a per-connection query logger
+that reports statements slower than DB_SLOW_QUERY_MS by fingerprint
+(literals and bind placeholders folded, no argument values are kept).
+Exposed through /health/db-pool, keyed "{owner}:{lane}" (each Database
+instance that opens pools is an owner).
 """
 
 import asyncpg
+import bisect
+import hashlib
+import logging
 import os
 import json
-from typing import Optional
+import re
+import time
+from typing import Any, Dict, Optional
 from contextlib import asynccontextmanager
 
 POSTGRES_DSN = os.getenv("POSTGRES_DSN")
 
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "5"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "20"))
+DB_READ_POOL_MIN_SIZE = int(os.getenv("DB_READ_POOL_MIN_SIZE", "1"))
+DB_READ_POOL_MAX_SIZE = int(os.getenv("DB_READ_POOL_MAX_SIZE", "5"))
+DB_POOL_MAX_INACTIVE_LIFETIME = float(os.getenv("DB_POOL_MAX_INACTIVE_LIFETIME", "300"))
+DB_POOL_MAX_QUERIES = int(os.getenv("DB_POOL_MAX_QUERIES", "50000"))
+# No statement timeout unless set: migrations and the Maintenance Robot run long DDL through these pools
+DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", "0")) or None
+# Set to 0 behind PgBouncer in transaction mode (prepared statements are per server connection)
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "512"))
+DB_MAX_CACHED_STATEMENT_LIFETIME = int(os.getenv("DB_MAX_CACHED_STATEMENT_LIFETIME", "1800"))
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "500"))
+DB_SLOW_QUERY_MAX_FINGERPRINTS = int(os.getenv("DB_SLOW_QUERY_MAX_FINGERPRINTS", "200"))
+
+LANE_PRIMARY = "primary"
+LANE_READ = "read"
+
+# Upper bounds (ms) of the acquire-wait histogram buckets; the last bucket is +Inf
+ACQUIRE_WAIT_BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+logger = logging.getLogger("db.pool")
+
+_FP_LITERALS = re.compile(r"'(?:[^']|'')*'|\$\d+|\b\d+(?:\.\d+)?\b")
+_FP_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_FP_SPACES = re.compile(r"\s+")
+
+
+def fingerprint_query(query: str) -> tuple:
+    """Normalizes a statement (literals/placeholders -> ?, whitespace collapsed). Returns (id, normalized)."""
+    normalized = _FP_LITERALS.sub("?", query or "")
+    normalized = _FP_IN_LIST.sub("(?)", normalized)
+    normalized = _FP_SPACES.sub(" ", normalized).strip().lower()
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12], normalized
+
+
+class PoolTelemetry:
+    """Acquire-wait histogram, timeouts and slow-query fingerprints for one pool lane."""
+
+    def __init__(self, lane: str, slow_query_ms: float = DB_SLOW_QUERY_MS,
+                 max_fingerprints: int = DB_SLOW_QUERY_MAX_FINGERPRINTS):
+        self.lane = lane
+        self.slow_query_ms = slow_query_ms
+        self.max_fingerprints = max_fingerprints
+        self.wait_buckets = [0] * (len(ACQUIRE_WAIT_BUCKETS_MS) + 1)
+        self.acquires = 0
+        self.acquire_errors = 0
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+        self.slow_queries: Dict[str, Dict[str, Any]] = {}
+        self.slow_total = 0
+        self.slow_untracked = 0
+
+    def record_acquire(self, wait_ms: float, failed: bool = False):
+        if failed:
+            self.acquire_errors += 1
+            return
+        self.acquires += 1
+        self.wait_total_ms += wait_ms
+        self.wait_max_ms = max(self.wait_max_ms, wait_ms)
+        self.wait_buckets[bisect.bisect_left(ACQUIRE_WAIT_BUCKETS_MS, wait_ms)] += 1
+
+    def record_query(self, query: str, elapsed_ms: float, failed: bool = False):
+        if elapsed_ms < self.slow_query_ms:
+            return
+        self.slow_total += 1
+        fp, normalized = fingerprint_query(query)
+        entry = self.slow_queries.get(fp)
+        if entry is None:
+            if len(self.slow_queries) >= self.max_fingerprints:
+                self.slow_untracked += 1
+            else:
+                entry = self.slow_queries[fp] = {
+                    "query": normalized[:300], "count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0,
+                }
+        if entry is not None:
+            entry["count"] += 1
+            entry["errors"] += int(failed)
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+        logger.warning(f"Slow query [{self.lane}] fp={fp} {elapsed_ms:.0f}ms{' (failed)' if failed else ''}: {normalized[:200]}")
+
+    def on_logged_query(self, record):
+        """asyncpg query logger callback (Connection.add_query_logger)."""
+        self.record_query(record.query, (record.elapsed or 0) * 1000, failed=record.exception is not None)
+
+    def get_stats(self, top: int = 10) -> Dict[str, Any]:
+        histogram = {}
+        cumulative = 0
+        for bound, count in zip(ACQUIRE_WAIT_BUCKETS_MS + ["+Inf"], self.wait_buckets):
+            cumulative += count
+            histogram[f"le_{bound}"] = cumulative
+        slowest = sorted(self.slow_queries.items(), key=lambda kv: kv[1]["total_ms"], reverse=True)[:top]
+        return {
+            "acquires": self.acquires,
+            "acquire_errors": self.acquire_errors,
+            "wait_avg_ms": round(self.wait_total_ms / self.acquires, 2) if self.acquires else 0.0,
+            "wait_max_ms": round(self.wait_max_ms, 2),
+            "wait_histogram_ms": histogram,
+            "slow_query_ms": self.slow_query_ms,
+            "slow_queries_total": self.slow_total,
+            "slow_queries_untracked": self.slow_untracked,
+            "slow_queries_top": [
+                {"fingerprint": fp, **{k: round(v, 2) if isinstance(v, float) else v for k, v in e.items()}}
+                for fp, e in slowest
+            ],
+        }
+
+
+class _TimedAcquire:
+    """Wraps asyncpg's PoolAcquireContext to time the wait for a free connection."""
+
+    def __init__(self, ctx, telemetry: PoolTelemetry):
+        self._ctx = ctx
+        self._telemetry = telemetry
+
+    async def _timed(self, acquire):
+        started = time.perf_counter()
+        try:
+            conn = await acquire
+        except Exception:
+            self._telemetry.record_acquire(0.0, failed=True)
+            raise
+        self._telemetry.record_acquire((time.perf_counter() - started) * 1000)
+        return conn
+
+    async def __aenter__(self):
+        return await self._timed(self._ctx.__aenter__())
+
+    async def __aexit__(self, *exc):
+        return await self._ctx.__aexit__(*exc)
+
+    def __await__(self):
+        return self._timed(self._ctx).__await__()
+
+
+class InstrumentedPool:
+    """
+    Thin proxy over asyncpg.Pool: acquire() is timed, the pool-level query helpers
+    go through it, everything else (release, close, get_size, ...) is delegated.
+    """
+
+    def __init__(self, pool: asyncpg.Pool, telemetry: PoolTelemetry):
+        self._pool = pool
+        self.telemetry = telemetry
+
+    def acquire(self, *, timeout: Optional[float] = None):
+        return _TimedAcquire(self._pool.acquire(timeout=timeout), self.telemetry)
+
+    async def execute(self, query: str, *args, timeout: Optional[float] = None):
+        async with self.acquire() as conn:
+            return await conn.execute(query, *args, timeout=timeout)
+
+    async def executemany(self, command: str, args, *, timeout: Optional[float] = None):
+        async with self.acquire() as conn:
+            return await conn.executemany(command, args, timeout=timeout)
+
+    async def fetch(self, query: str, *args, timeout: Optional[float] = None, **kwargs):
+        async with self.acquire() as conn:
+            return await conn.fetch(query, *args, timeout=timeout, **kwargs)
+
+    async def fetchval(self, query: str, *args, column: int = 0, timeout: Optional[float] = None):
+        async with self.acquire() as conn:
+            return await conn.fetchval(query, *args, column=column, timeout=timeout)
+
+    async def fetchrow(self, query: str, *args, timeout: Optional[float] = None, **kwargs):
+        async with self.acquire() as conn:
+            return await conn.fetchrow(query, *args, timeout=timeout, **kwargs)
+
+    async def close(self):
+        for key in [k for k, p in _registry.items() if p is self]:
+            del _registry[key]
+        await self._pool.close()
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+    def get_stats(self) -> Dict[str, Any]:
+        size = self._pool.get_size()
+        idle = self._pool.get_idle_size()
+        return {
+            "size": size,
+            "idle": idle,
+            "in_use": size - idle,
+            "min_size": self._pool.get_min_size(),
+            "max_size": self._pool.get_max_size(),
+            **self.telemetry.get_stats(),
+        }
+
+
+# "{owner}:{lane}" -> pool (several Database instances open the same lanes)
+_registry: Dict[str, InstrumentedPool] = {}
+
+
+async def init_connection(conn):
+    """Registra codecs para JSON/JSONB en cada conexión"""
+    await conn.set_type_codec(
+        "json", encoder=json.dumps, decoder=json.loads, schema="pg_catalog"
+    )
+    await conn.set_type_codec(
+        "jsonb", encoder=json.dumps, decoder=json.loads, schema="pg_catalog"
+    )
+
+
+async def create_instrumented_pool(
+    dsn: str,
+    lane: str = LANE_PRIMARY,
+    init=init_connection,
+    min_size: Optional[int] = None,
+    max_size: Optional[int] = None,
+    owner: str = "db",
+) -> InstrumentedPool:
+    """Crea un pool asyncpg con sizing/timeouts/statement cache configurables y telemetría."""
+    dsn = dsn.replace("postgresql+asyncpg://", "postgresql://")
+    telemetry = PoolTelemetry(lane)
+    if min_size is None:
+        min_size = DB_READ_POOL_MIN_SIZE if lane == LANE_READ else DB_POOL_MIN_SIZE
+    if max_size is None:
+        max_size = DB_READ_POOL_MAX_SIZE if lane == LANE_READ else DB_POOL_MAX_SIZE
+    min_size = min(min_size, max_size)
+
+    async def _init(conn):
+        if init:
+            await init(conn)
+        if DB_SLOW_QUERY_MS > 0 and hasattr(conn, "add_query_logger"):
+            conn.add_query_logger(telemetry.on_logged_query)
+
+    raw = await asyncpg.create_pool(
+        dsn,
+        init=_init,
+        min_size=min_size,
+        max_size=max_size,
+        max_queries=DB_POOL_MAX_QUERIES,
+        max_inactive_connection_lifetime=DB_POOL_MAX_INACTIVE_LIFETIME,
+        command_timeout=DB_COMMAND_TIMEOUT,
+        statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+        max_cached_statement_lifetime=DB_MAX_CACHED_STATEMENT_LIFETIME,
+    )
+    pool = InstrumentedPool(raw, telemetry)
+    _registry[f"{owner}:{lane}"] = pool
+    logger.info(f"DB pool [{owner}:{lane}] ready (min={min_size}, max={max_size}, statement_cache={DB_STATEMENT_CACHE_SIZE})")
+    return pool
+
+
+async def create_lane_pools(dsn: str, init=init_connection, owner: str = "db") -> tuple:
+    """Returns (primary, read). read is the primary pool when DB_READ_POOL_MAX_SIZE is 0."""
+    primary = await create_instrumented_pool(dsn, LANE_PRIMARY, init=init, owner=owner)
+    if DB_READ_POOL_MAX_SIZE <= 0:
+        return primary, primary
+    try:
+        read = await create_instrumented_pool(dsn, LANE_READ, init=init, owner=owner)
+    except Exception as e:
+        logger.warning(f"DB read pool unavailable ({e}), dashboard reads share the primary pool")
+        read = primary
+    return primary, read
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Gauges + telemetry por owner:lane (para /health/db-pool)."""
+    stats = {}
+    for key, pool in _registry.items():
+        try:
+            stats[key] = pool.get_stats()
+        except Exception as e:
+            stats[key] = {"error": str(e)}
+    return stats
+
 
 class DatabasePool:
     """Manejo del pool de conexiones AsyncPG"""
 
     def __init__(self):
-        self.pool: Optional[asyncpg.Pool] = None
+        self.pool: Optional[InstrumentedPool] = None
+        self.read_pool: Optional[InstrumentedPool] = None
 
     @asynccontextmanager
     async def acquire(self):
@@ -26,24 +311,20 @@ class DatabasePool:
 
     async def init_connection(self, conn):
         """Registra codecs para JSON/JSONB en cada conexión"""
-        await conn.set_type_codec(
-            "json", encoder=json.dumps, decoder=json.loads, schema="pg_catalog"
-        )
-        await conn.set_type_codec(
-            "jsonb", encoder=json.dumps, decoder=json.loads, schema="pg_catalog"
-        )
+        await init_connection(conn)
 
     async def create_pool(self):
         """Crea el pool de conexiones"""
         if not POSTGRES_DSN:
             raise ValueError("POSTGRES_DSN environment variable is not set!")
 
-        dsn = POSTGRES_DSN.replace("postgresql+asyncpg://", "postgresql://")
-        self.pool = await asyncpg.create_pool(dsn, init=self.init_connection)
+        self.pool, self.read_pool = await create_lane_pools(POSTGRES_DSN, init=self.init_connection, owner="pool_manager")
         return self.pool
 
     async def close_pool(self):
         """Cierra el pool de conexiones"""
+        if self.read_pool and self.read_pool is not self.pool:
+            await self.read_pool.close()
         if self.pool:
             await self.pool.close()
 
@@ -0,0 +1,311 @@
+"""
+Schema Version Ledger
+Responsable: Migraciones versionadas fuera de banda + chequeo de versión al arrancar
+
+The "Maintenance Robot" (Database._run_auto_migrations) ran the whole evolution
+pipeline (~180 idempotent DO $$ patches over information_schema) on every
+process start: each replica's cold start paid seconds of catalog queries and
+took DDL locks in the middle of rolling deploys. Now:
+
+- Migrations are numbered Alembic revisions (alembic/versions). Each ledger
+  revision declares `schema_version` (increasing integer) and `statements()`,
+  and is applied once per deploy by the migration job:
+
+      cd orchestrator_service && alembic upgrade head
+
+- Applying a revision records (version, revision, name, checksum, execution_ms)
+  in the schema_migrations ledger. Before upgrading, env.py re-checks the
+  checksum of every applied revision against the code: editing a migration
+  after it ran fails the job instead of silently diverging. Schema changes
+  always go into a new revision.
+- At boot Database.connect only runs check_schema_version(): one query for
+  MAX(version) compared with REQUIRED_SCHEMA_VERSION. A replica on a schema
+  that is behind logs it and reports not_ready on /health/readiness until the
+  job has run. SCHEMA_AUTO_MIGRATE=true (single-process local setups) applies
+  the pending revisions from the app's pool instead (migrate_ledger): the
+  Robot stands in for version 1, later versions run their statements(), and
+  every version is recorded, so the next boot is a plain version check.
+- Deployment flags reach revision SQL through current_setting('app.*', true)
+  (revision_settings); they are set per transaction and are not part of the
+  checksum.
+"""
+
+import glob
+import hashlib
+import importlib.util
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger("db.schema_version")
+
+# Bump together with every new ledger revision in alembic/versions
+REQUIRED_SCHEMA_VERSION = 5
+SCHEMA_AUTO_MIGRATE = os.getenv("SCHEMA_AUTO_MIGRATE", "false").lower() == "true"
+SCHEMA_ALLOW_CHECKSUM_DRIFT = os.getenv("SCHEMA_ALLOW_CHECKSUM_DRIFT", "false").lower() == "true"
+# Serializes concurrent migration jobs (7344-7346 are reserved for the projections)
+SCHEMA_MIGRATION_LOCK_ID = 7347
+
+LEDGER_DDL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        revision TEXT NOT NULL,
+        name TEXT NOT NULL,
+        checksum TEXT NOT NULL,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        execution_ms INTEGER
+    )
+"""
+
+RECORD_MIGRATION_SQL = """
+    INSERT INTO schema_migrations (version, revision, name, checksum, execution_ms)
+    VALUES ($1, $2, $3, $4, $5)
+    ON CONFLICT (version) DO UPDATE SET
+        revision = EXCLUDED.revision, name = EXCLUDED.name, checksum = EXCLUDED.checksum,
+        applied_at = NOW(), execution_ms = EXCLUDED.execution_ms
+"""
+
+CURRENT_VERSION_SQL = "SELECT COALESCE(MAX(version), 0) FROM schema_migrations"
+
+SET_SETTING_SQL = "SELECT set_config($1, $2, true)"
+
+VERSIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic", "versions")
+
+# Last boot check, for /health/readiness and /health/schema
+schema_status: Dict[str, Any] = {
+    "checked": False,
+    "current": None,
+    "required": REQUIRED_SCHEMA_VERSION,
+    "ok": None,
+}
+
+
+def statements_checksum(statements: Iterable[str]) -> str:
+    """sha256 over the statements in order (surrounding whitespace ignored)."""
+    digest = hashlib.sha256()
+    for sql in statements:
+        digest.update(sql.strip().encode("utf-8"))
+        digest.update(b"\n--\n")
+    return digest.hexdigest()
+
+
+def revision_settings() -> Dict[str, str]:
+    """Deployment flags visible to revision SQL as current_setting(name, true)."""
+    partitioned = os.getenv("NOTIFICATIONS_PARTITIONED", "false").lower() == "true"
+    return {
+        "app.notifications_partitioned": "on" if partitioned else "off",
+        "app.notifications_partition_days_ahead": os.getenv("NOTIFICATIONS_PARTITION_DAYS_AHEAD", "14"),
+    }
+
+
+def ledger_revisions(versions_dir: str = VERSIONS_DIR) -> List[Any]:
+    """Revision modules of alembic/versions that declare schema_version, ordered by version."""
+    modules = []
+    for path in sorted(glob.glob(os.path.join(versions_dir, "*.py"))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        spec = importlib.util.spec_from_file_location(f"_ledger_revision_{name}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        if getattr(module, "schema_version", None) is not None:
+            modules.append(module)
+    return sorted(modules, key=lambda m: m.schema_version)
+
+
+# ============================================================================
+# Boot side (asyncpg pool)
+# ============================================================================
+
+
+async def get_schema_version(pool) -> int:
+    """Highest applied ledger version; 0 when the ledger does not exist yet."""
+    try:
+        return int(await pool.fetchval(CURRENT_VERSION_SQL) or 0)
+    except Exception as e:
+        if getattr(e, "sqlstate", None) == "42P01":  # undefined_table
+            return 0
+        raise
+
+
+async def check_schema_version(
+    pool, auto_migrate: Optional[Callable[[], Awaitable[Any]]] = None
+) -> Dict[str, Any]:
+    """Single version check at boot; runs auto_migrate only with SCHEMA_AUTO_MIGRATE."""
+    started = time.perf_counter()
+    current = await get_schema_version(pool)
+    status = {
+        "checked": True,
+        "current": current,
+        "required": REQUIRED_SCHEMA_VERSION,
+        "ok": current >= REQUIRED_SCHEMA_VERSION,
+        "auto_migrated": False,
+        "check_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+    if status["ok"]:
+        logger.info(f"✅ Schema version {current} (required {REQUIRED_SCHEMA_VERSION})")
+    elif SCHEMA_AUTO_MIGRATE and auto_migrate is not None:
+        logger.warning(
+            f"⚠️ Schema version {current} < {REQUIRED_SCHEMA_VERSION}, "
+            "SCHEMA_AUTO_MIGRATE=true: running the Maintenance Robot on start"
+        )
+        await auto_migrate()
+        status["auto_migrated"] = True
+        current = await get_schema_version(pool)
+        status["current"] = current
+        status["ok"] = current >= REQUIRED_SCHEMA_VERSION
+        if status["ok"]:
+            logger.info(f"✅ Schema migrated to version {current} (required {REQUIRED_SCHEMA_VERSION})")
+        else:
+            logger.critical(f"🚨 Auto-migration stopped at schema version {current} < {REQUIRED_SCHEMA_VERSION}")
+    else:
+        logger.critical(
+            f"🚨 Schema version {current} < required {REQUIRED_SCHEMA_VERSION}. "
+            "Run the migration job (cd orchestrator_service && alembic upgrade head) before serving traffic."
+        )
+    schema_status.clear()
+    schema_status.update(status)
+    return status
+
+
+def _revision_name(module) -> str:
+    # First docstring line of an Alembic revision is its message (apply_revision's `name`)
+    lines = (module.__doc__ or "").strip().splitlines()
+    return lines[0].strip() if lines else module.revision
+
+
+async def migrate_ledger(
+    pool,
+    run_robot: Callable[[], Awaitable[bool]],
+    revisions: Optional[List[Any]] = None,
+) -> int:
+    """
+    SCHEMA_AUTO_MIGRATE: `alembic upgrade head` from the app's pool. Version 1
+    is the Maintenance Robot (the same patches as revision 0001); later
+    versions run their statements() in one transaction each. Every applied
+    version is recorded in the ledger. Returns the version reached; stops at
+    the first failure.
+    """
+    revisions = ledger_revisions() if revisions is None else revisions
+    async with pool.acquire() as conn:
+        await conn.execute("SELECT pg_advisory_lock($1)", SCHEMA_MIGRATION_LOCK_ID)
+        try:
+            await conn.execute(LEDGER_DDL)
+            applied = {row["version"] for row in await conn.fetch("SELECT version FROM schema_migrations")}
+            for module in revisions:
+                version = module.schema_version
+                if version in applied:
+                    continue
+                statements = module.statements()
+                started = time.perf_counter()
+                async with conn.transaction():
+                    if version == 1:
+                        if not await run_robot():
+                            raise RuntimeError("Maintenance Robot failed, schema version 1 not recorded")
+                    else:
+                        for key, value in revision_settings().items():
+                            await conn.execute(SET_SETTING_SQL, key, value)
+                        for sql in statements:
+                            await conn.execute(sql)
+                    elapsed_ms = int((time.perf_counter() - started) * 1000)
+                    await conn.execute(
+                        RECORD_MIGRATION_SQL,
+                        version, module.revision, _revision_name(module),
+                        statements_checksum(statements), elapsed_ms,
+                    )
+                applied.add(version)
+                logger.info(f"✅ Migration {version} ({module.revision}) applied on start in {elapsed_ms} ms")
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", SCHEMA_MIGRATION_LOCK_ID)
+    return max(applied, default=0)
+
+
+# ============================================================================
+# Migration job side (alembic env.py / revisions, inside connection.run_sync)
+# ============================================================================
+
+
+def await_driver(awaitable):
+    # Alembic runs the revisions in SQLAlchemy's greenlet (AsyncConnection.run_sync);
+    # await_only drives asyncpg coroutines from there.
+    from sqlalchemy.util import await_only
+
+    return await_only(awaitable)
+
+
+def driver_connection(bind):
+    """Raw asyncpg connection behind an Alembic/SQLAlchemy bind (multi-statement DDL, $n params)."""
+    return bind.connection.driver_connection
+
+
+def prepare_ledger(bind, revision_modules: Iterable[Any]) -> Dict[int, str]:
+    """
+    Creates the ledger if needed and checks the checksum of every applied
+    revision against the code. Returns {version: checksum} of applied revisions.
+    """
+    raw = driver_connection(bind)
+    await_driver(raw.execute(LEDGER_DDL))
+    applied = {
+        row["version"]: row["checksum"]
+        for row in await_driver(raw.fetch("SELECT version, checksum FROM schema_migrations"))
+    }
+    drifted: List[str] = []
+    for module in revision_modules:
+        version = getattr(module, "schema_version", None)
+        statements = getattr(module, "statements", None)
+        if version is None or statements is None or version not in applied:
+            continue
+        if statements_checksum(statements()) != applied[version]:
+            drifted.append(f"{version} ({module.revision})")
+    if drifted:
+        message = (
+            f"Applied migrations changed after they ran: {', '.join(drifted)}. "
+            "Put schema changes in a new revision."
+        )
+        if not SCHEMA_ALLOW_CHECKSUM_DRIFT:
+            raise RuntimeError(message)
+        logger.warning(f"{message} (SCHEMA_ALLOW_CHECKSUM_DRIFT=true, continuing)")
+    return applied
+
+
+def apply_revision(
+    op,
+    version: int,
+    revision: str,
+    name: str,
+    statements: List[str],
+    best_effort: List[str] = (),
+):
+    """
+    Runs the statements of a ledger revision in the job's transaction (a
+    failure rolls the whole upgrade back) and records it in schema_migrations.
+    best_effort statements run under a savepoint each; failures are logged.
+    The checksum covers statements + best_effort, in that order.
+    """
+    if op.get_context().as_sql:
+        raise RuntimeError("Ledger revisions need a live connection (offline --sql mode is not supported)")
+    raw = driver_connection(op.get_bind())
+    started = time.perf_counter()
+    for key, value in revision_settings().items():
+        await_driver(raw.execute(SET_SETTING_SQL, key, value))
+    for sql in statements:
+        await_driver(raw.execute(sql))
+    for i, sql in enumerate(best_effort):
+        await_driver(raw.execute("SAVEPOINT schema_best_effort"))
+        try:
+            await_driver(raw.execute(sql))
+        except Exception as e:
+            await_driver(raw.execute("ROLLBACK TO SAVEPOINT schema_best_effort"))
+            logger.warning(f"Migration {version}: best-effort statement {i + 1} skipped: {e}")
+        else:
+            await_driver(raw.execute("RELEASE SAVEPOINT schema_best_effort"))
+    elapsed_ms = int((time.perf_counter() - started) * 1000)
+    await_driver(raw.execute(
+        RECORD_MIGRATION_SQL,
+        version, revision, name, statements_checksum(list(statements) + list(best_effort)), elapsed_ms,
+    ))
+    logger.info(f"✅ Migration {version} ({revision} {name}) applied in {elapsed_ms} ms")
+
+
+def forget_revision(op, version: int):
+    """Downgrade helper: removes the ledger row (the DDL itself is not reverted)."""
+    await_driver(driver_connection(op.get_bind()).execute("DELETE FROM schema_migrations WHERE version = $1", version))
@@ -1,40 +1,28 @@
 import os
-import json
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
 import logging
 import asyncio
 import socketio
 from datetime import datetime, timezone
 from typing import Optional, List, Any
 
+# Role-based boot profile (ORCHESTRATOR_ROLE): decides which routers/workers load.
+# LangChain (agent SDK) is imported on first use, see _build_agent_executor.
+from core import boot_profile
+
 from fastapi import FastAPI, Request, Header, HTTPException, Depends, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 
-from langchain_openai import ChatOpenAI
-from langchain.agents import AgentExecutor
-from langchain_community.agent_toolkits.load_tools import load_tools
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
-
 from services.calcom_service import calcom_service
 
 # --- APP SETUP ---
-from core.rate_limiter import limiter
-
 from db import db
-from admin_routes import router as admin_router
-from auth_routes import router as auth_router
-from modules.crm_sales.tools_provider import tool_registry  # Registered via import
-from core.socket_manager import sio
+from core.socket_manager import sio, emit_batcher, emit_to_tenant, supervisors_room, tenant_room
 from core.socket_notifications import register_notification_socket_handlers
 from core.context import current_customer_phone, current_patient_id, current_tenant_id
-from core.tools import tool_registry
-from core.niche_manager import NicheManager
 from core.agent.prompt_loader import prompt_loader
+from core.agent.executor_cache import agent_executor_cache
 
 # --- CONFIGURACIÓN ---
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
@@ -50,8 +38,6 @@ AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=F
 
 # --- APP CONFIG ---
 app = FastAPI(title="Nexus Orchestrator", version="7.7.0")
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
 # CORS: merge defaults with CORS_ALLOWED_ORIGINS (comma-separated) for EasyPanel/custom deployments
 _default_origins = [
@@ -71,7 +57,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["*"],
+    # "*" is not honored on credentialed requests; pagination cursors are listed explicitly
+    expose_headers=["*", "X-Next-Cursor"],
 )
 
 # Nexus Security Middleware: CSP, HSTS, X-Frame-Options (se aplica DESPUÉS de CORS)
@@ -84,30 +71,10 @@ app.add_middleware(SecurityHeadersMiddleware)
 sio_app = socketio.ASGIApp(sio, app)
 
 # --- ROUTERS ---
-app.include_router(auth_router)
-app.include_router(admin_router)
-
-# Seller Assignment Routes
-try:
-    from routes.seller_routes import router as seller_router
-
-    app.include_router(seller_router, tags=["Seller Management"])
-    logger.info("✅ Seller Management API mounted at /admin/core/sellers")
-except Exception as e:
-    logger.error(f"❌ Could not mount Seller Management routes: {e}")
-    import traceback
-
-    traceback.print_exc()
-
-# Notification Routes
-try:
-    from routes.notification_routes import router as notification_router
-
-    app.include_router(notification_router, tags=["Notifications"])
-    logger.info("✅ Notification API mounted")
-except Exception as e:
-    logger.error(f"❌ Could not mount Notification routes: {e}", exc_info=True)
+# Only the routers of this process role are imported and mounted (core/boot_profile.py)
+boot_profile.mount_routers(app)
 
+if "notifications" in boot_profile.boot_stats["failed"]:
     # Fallback: minimal notifications/count endpoint so frontend doesn't break
     @app.get("/admin/core/notifications/count")
     async def _fallback_notifications_count(x_admin_token: str = Header(None)):
@@ -121,315 +88,23 @@ except Exception as e:
 
     logger.info("✅ Fallback /admin/core/notifications/count endpoint registered")
 
-# Scheduled Tasks Routes
-try:
-    from routes.scheduled_tasks_routes import router as scheduled_tasks_router
-
-    app.include_router(scheduled_tasks_router, tags=["Scheduled Tasks"])
-    logger.info("✅ Scheduled Tasks API mounted")
-except Exception as e:
-    logger.error(f"❌ Could not mount Scheduled Tasks routes: {e}", exc_info=True)
-
-# Health Check Routes
-try:
-    from routes.health_routes import router as health_router
-
-    app.include_router(health_router, tags=["Health"])
-    logger.info("✅ Health Check API mounted")
-except Exception as e:
-    logger.error(f"❌ Could not mount Health Check routes: {e}", exc_info=True)
-
-# Single-niche: CRM Sales only (no sales)
-SUPPORTED_NICHES = ["crm_sales"]
-for niche in SUPPORTED_NICHES:
-    NicheManager.load_niche_router(app, niche)
-
-# CRM Sales under /admin/core/crm so proxy/CORS work (same path as other admin routes)
-try:
-    from modules.crm_sales import routes as crm_routes
-
-    app.include_router(
-        crm_routes.router, prefix="/admin/core/crm", tags=["CRM Sales (Admin)"]
-    )
-    logger.info("✅ CRM API also mounted at /admin/core/crm")
-except Exception as e:
-    logger.warning(f"Could not mount CRM under /admin/core/crm: {e}")
-
-# Lead Status Routes (DEV-27: pipeline de estados)
-try:
-    from routes.lead_status_routes import router as lead_status_router
-
-    app.include_router(lead_status_router, tags=["Lead Status"])
-    logger.info("✅ Lead Status API mounted at /admin/core/crm/lead-statuses")
-except Exception as e:
-    logger.error(f"❌ Could not mount Lead Status routes: {e}", exc_info=True)
-
-# Lead Tags Routes
-try:
-    from routes.lead_tags_routes import router as lead_tags_router
-
-    app.include_router(lead_tags_router, tags=["Lead Tags"])
-    logger.info("✅ Lead Tags API mounted")
-except Exception as e:
-    logger.error(f"❌ Could not mount Lead Tags routes: {e}", exc_info=True)
-
-# Lead Notes & Derivation Routes (DEV-21)
-try:
-    from routes.lead_notes_routes import router as lead_notes_router
-
-    app.include_router(lead_notes_router, tags=["Lead Notes & Derivation"])
-    logger.info("✅ Lead Notes & Derivation API mounted")
-except Exception as e:
-    logger.error(f"❌ Could not mount Lead Notes routes: {e}", exc_info=True)
-
-# User Management Routes (DEV-29)
-try:
-    from routes.user_management_routes import router as user_mgmt_router
-
-    app.include_router(user_mgmt_router, tags=["User Management"])
-    logger.info("✅ User Management API mounted (seed-team, users CRUD)")
-except Exception as e:
-    logger.error(f"❌ Could not mount User Management routes: {e}", exc_info=True)
-
-# HSM Templates Routes (DEV-31)
-try:
-    from routes.hsm_templates_routes import router as hsm_templates_router
-
-    app.include_router(hsm_templates_router, tags=["HSM Templates"])
-    logger.info("✅ HSM Templates API mounted (seed + CRUD + send)")
-except Exception as e:
-    logger.error(f"❌ Could not mount HSM Templates routes: {e}", exc_info=True)
-
-# Free-text Chat Send Routes
-try:
-    from routes.chat_routes import router as chat_routes_router
-
-    app.include_router(chat_routes_router, tags=["Chat Send"])
-    logger.info("✅ Chat Send API mounted (POST /admin/core/chat/send)")
-except Exception as e:
-    logger.error(f"❌ Could not mount Chat Send routes: {e}", exc_info=True)
-
-# Meta Ads Marketing Routes
-try:
-    from routes.marketing import router as marketing_router
-    from routes.meta_auth import router as meta_auth_router
-    from routes.meta_webhooks import router as meta_webhooks_router
-
-    app.include_router(marketing_router, prefix="/crm/marketing", tags=["Marketing"])
-    app.include_router(meta_auth_router, prefix="/crm/auth/meta", tags=["Meta OAuth"])
-    app.include_router(meta_webhooks_router, prefix="/webhooks", tags=["Webhooks"])
-    logger.info("✅ Meta Ads Marketing API and Webhooks mounted")
-except Exception as e:
-    logger.error(f"❌ Could not mount Meta Ads Marketing routes: {e}", exc_info=True)
-
-# Meta Embedded Signup — WhatsApp, Instagram, Facebook Pages connection
-try:
-    from routes.meta_connect import router as meta_connect_router
-
-    app.include_router(
-        meta_connect_router, prefix="/admin/meta", tags=["Meta Embedded Signup"]
-    )
-    logger.info("✅ Meta Embedded Signup routes mounted at /admin/meta")
-except Exception as e:
-    logger.error(f"❌ Could not mount Meta Embedded Signup routes: {e}", exc_info=True)
-
-# Google Ads Marketing Routes
-try:
-    from routes.google_auth import router as google_auth_router
-    from routes.google_ads_routes import router as google_ads_routes_router
-
-    app.include_router(
-        google_auth_router, prefix="/crm/auth/google", tags=["Google OAuth"]
-    )
-    app.include_router(
-        google_ads_routes_router, prefix="/crm/marketing", tags=["Google Ads"]
-    )
-    logger.info("✅ Google Ads Marketing API mounted")
-except Exception as e:
-    logger.error(f"❌ Could not mount Google Ads Marketing routes: {e}", exc_info=True)
-
-# Email Lead Monitor Routes (DEV-34 Part 2)
-try:
-    from routes.email_monitor_routes import router as email_monitor_router
-
-    app.include_router(email_monitor_router, tags=["Email Lead Monitor"])
-    logger.info("✅ Email Lead Monitor API mounted at /admin/core/email-monitor")
-except Exception as e:
-    logger.error(f"❌ Could not mount Email Lead Monitor routes: {e}", exc_info=True)
-
-# Company Settings Routes (DEV-35)
-try:
-    from routes.company_settings_routes import router as company_settings_router
-    from routes.company_settings_routes import setup_router as setup_router
-
-    app.include_router(company_settings_router, tags=["Company Settings"])
-    app.include_router(setup_router, tags=["Setup"])
-    logger.info(
-        "✅ Company Settings API mounted (GET/PUT /admin/core/settings/company + POST /admin/setup/configure-tenant)"
-    )
-except Exception as e:
-    logger.error(f"❌ Could not mount Company Settings routes: {e}", exc_info=True)
+# --- LANGCHAIN AGENT FACTORY ---
+# LangChain is only imported by workers that build agents (/chat); see boot_profile.AGENT_SDK_MODULES
+_llm = None
 
-# AI Agent Config Routes (DEV-36)
-try:
-    from routes.ai_agent_routes import router as ai_agent_router
-    from routes.ai_agent_routes import setup_router as ai_agent_setup_router
 
-    app.include_router(ai_agent_router, tags=["AI Agent Config"])
-    app.include_router(ai_agent_setup_router, tags=["Setup"])
-    logger.info(
-        "✅ AI Agent Config API mounted (GET/PUT /admin/core/settings/ai-agent + POST /admin/setup/seed-ai-agent)"
-    )
-except Exception as e:
-    logger.error(f"❌ Could not mount AI Agent Config routes: {e}", exc_info=True)
+def get_llm():
+    """Shared ChatOpenAI client, created on first agent build."""
+    global _llm
+    if _llm is None:
+        from langchain_openai import ChatOpenAI
 
-# Channel Bindings & Multi-Channel Routing (Patch 27)
-try:
-    from routes.channel_routes import internal_router as channel_internal_router
-    from routes.channel_routes import admin_router as channel_admin_router
+        _llm = ChatOpenAI(model="gpt-4o", temperature=0, api_key=OPENAI_API_KEY)
+    return _llm
 
-    app.include_router(channel_internal_router, tags=["Internal Routing"])
-    app.include_router(channel_admin_router, tags=["Channel Management"])
-    logger.info(
-        "✅ Channel Routing API mounted (GET /internal/routing/resolve + /admin/core/channels CRUD)"
-    )
-except Exception as e:
-    logger.error(f"❌ Could not mount Channel Routing routes: {e}", exc_info=True)
-
-# Team Activity Routes (DEV-39 + DEV-40 + DEV-41)
-try:
-    from routes.team_activity_routes import router as team_activity_router
-
-    app.include_router(team_activity_router, tags=["Team Activity"])
-    logger.info("✅ Team Activity API mounted at /admin/core/team-activity")
-except Exception as e:
-    logger.error(f"❌ Could not mount Team Activity routes: {e}", exc_info=True)
-
-# SLA Rules Routes (DEV-42)
-try:
-    from routes.sla_routes import router as sla_router
-
-    app.include_router(sla_router, tags=["SLA Rules"])
-    logger.info("✅ SLA Rules API mounted at /admin/core/sla-rules")
-except Exception as e:
-    logger.error(f"❌ Could not mount SLA Rules routes: {e}", exc_info=True)
-
-# Reactivation Routes (DEV-47)
-try:
-    from routes.reactivation_routes import router as reactivation_router
-
-    app.include_router(reactivation_router, tags=["Reactivation DEV-47"])
-    logger.info("✅ Reactivation API mounted at /admin/core/crm/reactivation")
-except Exception as e:
-    logger.error(f"❌ Could not mount Reactivation routes: {e}", exc_info=True)
-
-# Deduplication Routes (DEV-50)
-try:
-    from routes.deduplication_routes import router as deduplication_router
-
-    app.include_router(deduplication_router, tags=["Deduplication DEV-50"])
-    logger.info("✅ Deduplication API mounted at /admin/core/crm/duplicates")
-except Exception as e:
-    logger.error(f"❌ Could not mount Deduplication routes: {e}", exc_info=True)
-
-# Analytics Dashboard Routes (Integrated from Dashboard_Analytics_Sovereign)
-try:
-    from routes.analytics_routes import router as analytics_router
-
-    app.include_router(analytics_router)
-    logger.info(
-        "✅ Analytics Dashboard API mounted at /admin/analytics/ceo, /admin/analytics/secretary"
-    )
-except Exception as e:
-    logger.warning(f"⚠️ Could not mount Analytics routes: {e}")
-
-# Drive Storage Routes (SPEC-01)
-try:
-    from routes.drive_routes import router as drive_router
-
-    app.include_router(drive_router, tags=["Drive Storage"])
-    logger.info("✅ Drive Storage API mounted at /api/v1/drive")
-except Exception as e:
-    logger.warning(f"⚠️ Could not mount Drive routes: {e}")
-
-# Lead Forms Routes (F-02)
-try:
-    from routes.lead_forms_routes import router as lead_forms_router, public_router as lead_forms_public_router
-    app.include_router(lead_forms_router, tags=["Lead Forms"])
-    app.include_router(lead_forms_public_router, tags=["Lead Forms Public"])
-    logger.info("✅ Lead Forms API mounted at /admin/core/crm/forms + /f/{slug}")
-except Exception as e:
-    logger.warning(f"⚠️ Could not mount Lead Forms routes: {e}")
-
-# Daily Check-in Routes (SPEC-05)
-try:
-    from routes.checkin_routes import router as checkin_router
-    app.include_router(checkin_router, tags=["Daily Check-in"])
-    logger.info("✅ Daily Check-in API mounted at /admin/core/checkin")
-except Exception as e:
-    logger.warning(f"⚠️ Could not mount Check-in routes: {e}")
-
-# Vendor Tasks Routes (SPEC-06)
-try:
-    from routes.vendor_tasks_routes import router as vendor_tasks_router
-    app.include_router(vendor_tasks_router, tags=["Vendor Tasks"])
-    logger.info("✅ Vendor Tasks API mounted at /admin/core/crm/vendor-tasks")
-except Exception as e:
-    logger.warning(f"⚠️ Could not mount Vendor Tasks routes: {e}")
-
-# Knowledge Base Routes (SPEC-03)
-try:
-    from routes.manuales_routes import router as manuales_router
-    app.include_router(manuales_router, tags=["Knowledge Base"])
-    logger.info("✅ Knowledge Base API mounted at /admin/core/manuales")
-except Exception as e:
-    logger.warning(f"⚠️ Could not mount Manuales routes: {e}")
-
-# Internal Chat Routes (SPEC-04)
-try:
-    from routes.internal_chat_routes import router as internal_chat_router
-
-    app.include_router(internal_chat_router, tags=["Internal Chat"])
-    logger.info("✅ Internal Chat API mounted at /admin/core/internal-chat")
-except Exception as e:
-    logger.warning(f"⚠️ Could not mount Internal Chat routes: {e}")
-
-# Plantillas Routes (SPEC-02)
-try:
-    from routes.plantillas_routes import router as plantillas_router
-
-    app.include_router(plantillas_router, tags=["Plantillas"])
-    logger.info("✅ Plantillas API mounted at /api/v1/plantillas")
-except Exception as e:
-    logger.warning(f"⚠️ Could not mount Plantillas routes: {e}")
-
-# Telegram Notification Routes (SPEC-07)
-try:
-    from routes.telegram_routes import router as telegram_router
-
-    app.include_router(telegram_router, tags=["Telegram Notifications"])
-    logger.info("✅ Telegram Notification API mounted at /internal/telegram/notify")
-except Exception as e:
-    logger.warning(f"⚠️ Could not mount Telegram routes: {e}")
-
-# Lead Timeline Routes (DEV-45)
-try:
-    from routes.lead_timeline_routes import router as lead_timeline_router
-
-    app.include_router(lead_timeline_router, tags=["Lead Timeline"])
-    logger.info("✅ Lead Timeline API mounted at /admin/core/crm/leads/{lead_id}/timeline")
-except Exception as e:
-    logger.error(f"❌ Could not mount Lead Timeline routes: {e}", exc_info=True)
 
-# --- LANGCHAIN AGENT FACTORY ---
-llm = ChatOpenAI(model="gpt-4o", temperature=0, api_key=OPENAI_API_KEY)
-
-
-async def get_agent_executor(tenant_id: int):
-    """
-    Creates an AgentExecutor with CRM Sales tools and prompt.
-    DEV-36: Fetches tenant AI config to build dynamic or custom system prompt.
-    """
+async def _load_agent_config(tenant_id: int):
+    """Loads the tenant AI config row and the niche tool set used to build the agent."""
     row = await db.fetchrow(
         """SELECT COALESCE(niche_type, 'crm_sales') AS niche_type, clinic_name,
                   ai_system_prompt, ai_agent_name, ai_tone, ai_services_description,
@@ -440,10 +115,20 @@ async def get_agent_executor(tenant_id: int):
         tenant_id,
     )
     niche_type = (row["niche_type"] if row else "crm_sales") or "crm_sales"
+    from modules.crm_sales.tools_provider import tool_registry  # Registered via import
+
+    tools = tool_registry.get_tools(niche_type, tenant_id)
+    return row, tools
+
+
+def _build_agent_executor(row, tools):
+    """Compiles prompt template + OpenAI tools agent for a tenant config row."""
+    from langchain.agents import AgentExecutor, create_openai_tools_agent
+    from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
     tenant_name = (
         row["clinic_name"] if row else "nuestra empresa"
     ) or "nuestra empresa"
-    tools = tool_registry.get_tools(niche_type, tenant_id)
 
     # --- DEV-36: Build system prompt from tenant AI config ---
     system_prompt = _build_system_prompt(row, tenant_name)
@@ -459,12 +144,22 @@ async def get_agent_executor(tenant_id: int):
     )
 
     # Create agent with niche-specific tools and prompt
-    from langchain.agents import create_openai_tools_agent
-
-    agent = create_openai_tools_agent(llm, tools, prompt_template)
+    agent = create_openai_tools_agent(get_llm(), tools, prompt_template)
     return AgentExecutor(agent=agent, tools=tools, verbose=True)
 
 
+async def get_agent_executor(tenant_id: int):
+    """
+    Returns the AgentExecutor with CRM Sales tools and prompt for a tenant.
+    DEV-36: Fetches tenant AI config to build dynamic or custom system prompt.
+    Executors are cached per tenant (see core/agent/executor_cache.py) and
+    invalidated by the company settings / AI agent config routes.
+    """
+    return await agent_executor_cache.get_or_build(
+        tenant_id, _load_agent_config, _build_agent_executor
+    )
+
+
 def _build_system_prompt(tenant_row, tenant_name: str) -> str:
     """
     DEV-36: Builds the AI agent system prompt from tenant config.
@@ -682,6 +377,7 @@ Usa las herramientas qualify_lead, book_sales_meeting, request_human_handoff, as
 
 # --- PUBLIC WEBHOOK PROXIES ---
 import httpx
+from core.http_clients import http_clients
 from fastapi.responses import Response
 
 
@@ -698,7 +394,7 @@ async def proxy_ycloud_webhook(tenant_id: int, request: Request):
     headers = dict(request.headers)
     headers.pop("host", None)  # Remove host to avoid conflicts
 
-    async with httpx.AsyncClient() as client:
+    async with http_clients.session(timeout=5.0) as client:
         try:
             resp = await client.post(
                 f"{WHATSAPP_SERVICE_URL}/webhook/ycloud/{tenant_id}",
@@ -795,60 +491,53 @@ async def chat_inbound(
     if channel_source in ("instagram", "facebook"):
         conversation_key = f"{channel_source}:{from_number}"
 
-    # Resolve tenant (prioritize explicit tenant_id from payload)
-    tenant_id = body.get("tenant_id")
-    if not tenant_id and to_number:
-        row = await db.fetchrow(
-            "SELECT id FROM tenants WHERE bot_phone_number = $1 LIMIT 1",
-            to_number,
-        )
-        if row:
-            tenant_id = row["id"]
-
-    if not tenant_id:
-        tenant_id = 1  # Extreme fallback
-
-    # Critical: Ensure tenant_id is int for asyncpg (Spec Database Evolution)
-    tenant_id = int(tenant_id)
+    # Pre-LLM inbound stage (tenant resolution, dedup, blacklist, lead upsert,
+    # sin_respuesta auto-tag, user message append, history) on one connection.
+    # See services/inbound_pipeline.py
+    from services.inbound_pipeline import inbound_pipeline
 
-    logger.info(
-        f"chat_inbound: channel={channel_source} ext_id={external_user_id} from={from_number} tenant={tenant_id}"
+    # For WhatsApp: phone_number is from_number; for IG/FB: phone may be empty, lead identified by PSID
+    _phone_for_lead = (
+        from_number if channel_source == "whatsapp" else (body.get("from_number") or "")
     )
+    # Pass referral + channel info for lead attribution (Spec Meta Attribution + Multi-Channel)
+    referral = body.get("referral")
 
-    is_new = await db.try_insert_inbound(
-        provider, provider_message_id, event_id, conversation_key, body, correlation_id
-    )
-    if not is_new:
-        return {"status": "duplicate", "send": False}
-
-    await db.mark_inbound_processing(provider, provider_message_id)
+    # Prioritize explicit tenant_id from payload; otherwise resolve by bot_phone_number
+    tenant_id = body.get("tenant_id")
     try:
-        # Pass referral + channel info to ensure_lead_exists (Spec Meta Attribution + Multi-Channel)
-        referral = body.get("referral")
-
-        # Determine source label based on channel
-        source_label = {
-            "whatsapp": "whatsapp_inbound",
-            "instagram": "instagram_dm",
-            "facebook": "facebook_messenger",
-        }.get(channel_source, "whatsapp_inbound")
-
-        # For WhatsApp: phone_number is from_number; for IG/FB: phone may be empty, lead identified by PSID
-        _phone_for_lead = (
-            from_number
-            if channel_source == "whatsapp"
-            else (body.get("from_number") or "")
-        )
-
-        lead = await db.ensure_lead_exists(
-            tenant_id,
-            _phone_for_lead,
+        inbound = await inbound_pipeline.run(
+            tenant_id=int(tenant_id) if tenant_id else None,
+            to_number=to_number,
+            provider=provider,
+            provider_message_id=provider_message_id,
+            event_id=event_id,
+            conversation_key=conversation_key,
+            payload=body,
+            correlation_id=correlation_id,
+            text=text,
+            phone_for_lead=_phone_for_lead,
             customer_name=customer_name,
-            source=source_label,
             referral=referral,
             channel_source=channel_source,
             external_user_id=external_user_id,
+            platform_message_id=platform_msg_id,
         )
+    except Exception as e:
+        logger.exception("chat_inbound_error")
+        await db.mark_inbound_failed(provider, provider_message_id, str(e))
+        return {"status": "error", "send": False, "text": None, "error": str(e)}
+
+    tenant_id = inbound.tenant_id
+    logger.info(
+        f"chat_inbound: channel={channel_source} ext_id={external_user_id} from={from_number} "
+        f"tenant={tenant_id} pre_llm_ms={inbound.timings.get('total')}"
+    )
+    if not inbound.is_new:
+        return {"status": "duplicate", "send": False}
+
+    try:
+        lead = inbound.lead
 
         # --- DEV-49: Check for Human Override / Silence ---
         if lead and lead.get("human_override_until"):
@@ -863,23 +552,12 @@ async def chat_inbound(
                 logger.info(
                     f"Chat inbound: Lead {from_number} is silenciated (Human Override) until {until}"
                 )
-                # Append user message so it shows in history, but don't respond
-                await db.append_chat_message(
-                    conversation_key,
-                    "user",
-                    text,
-                    correlation_id,
-                    tenant_id,
-                    platform=channel_source,
-                    platform_message_id=platform_msg_id,
-                    channel_source=channel_source,
-                    external_user_id=external_user_id,
-                )
+                # User message is already in history (appended by the inbound stage), but don't respond
                 await db.mark_inbound_done(provider, provider_message_id)
 
                 # Emit to supervisor even if silenced (monitoring)
                 try:
-                    await sio.emit(
+                    emit_batcher.add(
                         "SUPERVISOR_CHAT_EVENT",
                         {
                             "tenant_id": tenant_id,
@@ -892,7 +570,7 @@ async def chat_inbound(
                             "is_silenced": True,
                             "timestamp": datetime.now(timezone.utc).isoformat(),
                         },
-                        room=f"supervisors:{tenant_id}",
+                        supervisors_room(tenant_id),
                     )
                 except Exception as e:
                     logger.error(f"Error emitting supervisor event (silenced): {e}")
@@ -920,6 +598,7 @@ async def chat_inbound(
                         "headline": referral.get("headline"),
                         "timestamp": datetime.now().isoformat(),
                     },
+                    room=tenant_room(tenant_id),
                 )
                 logger.info(f"Socket META_LEAD_RECEIVED emitted for {conversation_key}")
             except Exception as sio_err:
@@ -927,7 +606,7 @@ async def chat_inbound(
 
         # --- DEV-52: Broadcast to Supervisor Mode ---
         try:
-            await sio.emit(
+            emit_batcher.add(
                 "SUPERVISOR_CHAT_EVENT",
                 {
                     "tenant_id": tenant_id,
@@ -940,114 +619,14 @@ async def chat_inbound(
                     "is_silenced": False,
                     "timestamp": datetime.now(timezone.utc).isoformat(),
                 },
-                room=f"supervisors:{tenant_id}",
+                supervisors_room(tenant_id),
             )
             logger.info(
-                f"Supervisor event emitted for {from_number} in tenant {tenant_id}"
+                f"Supervisor event queued for {from_number} in tenant {tenant_id}"
             )
         except Exception as e:
             logger.error(f"Error emitting supervisor event: {e}")
 
-        # --- DEV-19: Auto-detect "sin_respuesta" tag ---
-        # If the last assistant message was sent >24h ago and no user message since,
-        # the lead was unresponsive. Auto-tag before processing current message.
-        try:
-            # Use channel-aware query for IG/FB, from_number for WhatsApp
-            if channel_source != "whatsapp" and external_user_id:
-                last_msg_row = await db.fetchrow(
-                    """
-                    SELECT role, created_at FROM chat_messages
-                    WHERE tenant_id = $1 AND channel_source = $2 AND external_user_id = $3
-                    ORDER BY created_at DESC LIMIT 1
-                    """,
-                    tenant_id,
-                    channel_source,
-                    external_user_id,
-                )
-            else:
-                last_msg_row = await db.fetchrow(
-                    """
-                    SELECT role, created_at FROM chat_messages
-                    WHERE from_number = $1 AND tenant_id = $2
-                    ORDER BY created_at DESC LIMIT 1
-                    """,
-                    from_number,
-                    tenant_id,
-                )
-            if last_msg_row and last_msg_row["role"] == "assistant":
-                from datetime import timedelta as _td
-
-                gap = (
-                    datetime.now(
-                        last_msg_row["created_at"].tzinfo
-                        if last_msg_row["created_at"].tzinfo
-                        else None
-                    )
-                    - last_msg_row["created_at"]
-                )
-                if gap > _td(hours=24):
-                    # Lead was silent for >24h after our last message -- auto-tag
-                    # Find lead by channel-appropriate lookup
-                    _lead_row = None
-                    if channel_source == "instagram":
-                        _lead_row = await db.fetchrow(
-                            "SELECT id, tags FROM leads WHERE tenant_id = $1 AND instagram_psid = $2",
-                            tenant_id,
-                            external_user_id,
-                        )
-                    elif channel_source == "facebook":
-                        _lead_row = await db.fetchrow(
-                            "SELECT id, tags FROM leads WHERE tenant_id = $1 AND facebook_psid = $2",
-                            tenant_id,
-                            external_user_id,
-                        )
-                    if not _lead_row:
-                        # Fallback to phone lookup (works for WhatsApp or cross-channel leads)
-                        from core.utils import normalize_phone as _norm
-
-                        _phone = _norm(from_number)
-                        if _phone:
-                            _lead_row = await db.fetchrow(
-                                "SELECT id, tags FROM leads WHERE tenant_id = $1 AND phone_number = $2",
-                                tenant_id,
-                                _phone,
-                            )
-                    if _lead_row:
-                        _existing = _lead_row["tags"] if _lead_row["tags"] else []
-                        if isinstance(_existing, str):
-                            _existing = json.loads(_existing)
-                        if "sin_respuesta" not in _existing:
-                            _merged = list(dict.fromkeys(_existing + ["sin_respuesta"]))
-                            await db.execute(
-                                "UPDATE leads SET tags = $1, updated_at = NOW() WHERE id = $2",
-                                json.dumps(_merged),
-                                _lead_row["id"],
-                            )
-                            await db.execute(
-                                "INSERT INTO lead_tag_log (tenant_id, lead_id, tags_added, reason, source) VALUES ($1, $2, $3, $4, 'system_auto')",
-                                tenant_id,
-                                _lead_row["id"],
-                                ["sin_respuesta"],
-                                f"Lead no respondio por {gap.days}d {gap.seconds // 3600}h desde ultimo mensaje del asistente",
-                            )
-                            logger.info(
-                                f"Auto-tagged lead {channel_source}:{external_user_id} as sin_respuesta (gap: {gap})"
-                            )
-        except Exception as tag_err:
-            logger.warning(f"sin_respuesta auto-tag check failed: {tag_err}")
-
-        await db.append_chat_message(
-            conversation_key,
-            "user",
-            text,
-            correlation_id,
-            tenant_id,
-            platform=channel_source,
-            platform_message_id=platform_msg_id,
-            channel_source=channel_source,
-            external_user_id=external_user_id,
-        )
-
         # --- DEV-49: Frustration Detection ---
         try:
             from services.frustration_detection_service import (
@@ -1079,21 +658,8 @@ async def chat_inbound(
         except Exception as frustrate_err:
             logger.error(f"Error in frustration detection: {frustrate_err}")
 
-        # Build history (previous messages only; current turn is "input")
-        history_raw = await db.get_chat_history(
-            conversation_key,
-            limit=15,
-            tenant_id=tenant_id,
-            channel_source=channel_source,
-            external_user_id=external_user_id,
-        )
-        # Exclude the message we just added (last one is current user)
-        if (
-            history_raw
-            and history_raw[-1].get("content") == text
-            and history_raw[-1].get("role") == "user"
-        ):
-            history_raw = history_raw[:-1]
+        # History was fetched by the inbound stage (previous messages only; current turn is "input")
+        history_raw = inbound.history
         from langchain_core.messages import HumanMessage, AIMessage
 
         lc_history = []
@@ -1138,11 +704,84 @@ async def chat_inbound(
 
 
 # --- EVENTOS ---
+def _register_background_jobs(jobs):
+    """Jobs of the scheduler roles that run without APScheduler (core.background_jobs)."""
+    from services.seller_counters_service import seller_counters_service, SELLER_COUNTERS_RECONCILE_HOUR
+    from services.seller_metrics_service import seller_metrics_service
+    from services.search_index_service import search_index_service
+    from services.lead_aggregates_service import lead_aggregates_service, LEAD_AGGREGATES_RECONCILE_INTERVAL_SECONDS
+    from services.deduplication_service import run_incremental_dedup_all, DEDUP_INTERVAL_SECONDS
+
+    jobs.every(
+        "seller_metrics_snapshot",
+        int(os.getenv("METRICS_REFRESH_INTERVAL_MINUTES", "15")) * 60,
+        seller_metrics_service.snapshot_all_tenants,
+    )
+    jobs.daily(
+        "seller_counters_reconciliation",
+        lambda: seller_counters_service.reconcile_all(db.pool),
+        hour=SELLER_COUNTERS_RECONCILE_HOUR,
+        minute=15,
+    )
+    # Dashboard GETs only read lead_aggregate_state.reconciled_at; the writes happen here, on the primary
+    jobs.every(
+        "lead_aggregates_reconciliation",
+        LEAD_AGGREGATES_RECONCILE_INTERVAL_SECONDS,
+        lambda: lead_aggregates_service.reconcile_all(db.pool),
+        initial_delay=45,
+    )
+    # Only leads whose lead_dedup_keys changed since each tenant's dedup_checkpoints watermark
+    jobs.every(
+        "lead_deduplication",
+        DEDUP_INTERVAL_SECONDS,
+        lambda: run_incremental_dedup_all(db.pool),
+        initial_delay=90,
+    )
+    from db.legacy import NOTIFICATIONS_PARTITIONED, NOTIFICATIONS_PARTITION_DAYS_AHEAD
+
+    if NOTIFICATIONS_PARTITIONED:
+        # Upcoming expiry-day partitions (revision 0004 converts the table once)
+        jobs.every(
+            "notifications_partitions",
+            6 * 3600,
+            lambda: db.pool.fetchval(
+                "SELECT notifications_ensure_partitions($1)", NOTIFICATIONS_PARTITION_DAYS_AHEAD
+            ),
+            initial_delay=60,
+        )
+    # Messages that predate Parche 48; a no-op query once the cursor is caught up
+    jobs.every(
+        "search_index_backfill",
+        60,
+        lambda: search_index_service.run_backfill(db.pool),
+        initial_delay=30,
+    )
+
+
 @app.on_event("startup")
 async def startup_event():
     await db.connect()
     logger.info("🚀 Nexus Orchestrator v7.6 Started")
 
+    # Cross-replica invalidation for the credential / tenant-resolution cache
+    try:
+        from core.tenant_cache import tenant_cache
+
+        await tenant_cache.start_pubsub()
+    except Exception as e:
+        logger.error(f"❌ Error starting tenant cache pub/sub: {e}")
+
+    # Pooled keep-alive HTTP clients for outbound provider traffic (one pool per upstream)
+    try:
+        await http_clients.start([
+            "https://api.ycloud.com",
+            "https://graph.facebook.com",
+            "https://api.telegram.org",
+            os.getenv("WHATSAPP_SERVICE_URL", "http://whatsapp_service:8002"),
+        ])
+    except Exception as e:
+        logger.error(f"❌ Error starting HTTP client registry: {e}")
+
     # Initialize notification socket handlers
     try:
         from core.socket_notifications import register_notification_socket_handlers
@@ -1152,14 +791,18 @@ async def startup_event():
     except Exception as e:
         logger.error(f"❌ Error registering notification socket handlers: {e}")
 
-    # Start scheduled tasks if enabled
+    # Start scheduled tasks if enabled (only in the 'all' and 'scheduler' roles)
     try:
-        from services.scheduled_tasks import scheduled_tasks_service
-
         # Check if scheduled tasks should be enabled
         enable_tasks = os.getenv("ENABLE_SCHEDULED_TASKS", "true").lower() == "true"
 
-        if enable_tasks:
+        if not boot_profile.runs_scheduler():
+            logger.info(
+                f"⚠️  Scheduled tasks not started in role '{boot_profile.ORCHESTRATOR_ROLE}'"
+            )
+        elif enable_tasks:
+            from services.scheduled_tasks import scheduled_tasks_service
+
             # Configurar intervalos personalizados si están definidos
             notification_interval = int(
                 os.getenv("NOTIFICATION_CHECK_INTERVAL_MINUTES", "5")
@@ -1203,10 +846,20 @@ async def startup_event():
 
         traceback.print_exc()
 
+    # Projection jobs as plain asyncio tasks: they must not depend on APScheduler
+    if boot_profile.runs_scheduler() and os.getenv("ENABLE_SCHEDULED_TASKS", "true").lower() == "true":
+        try:
+            from core.background_jobs import background_jobs
+
+            _register_background_jobs(background_jobs)
+            await background_jobs.start()
+        except Exception as e:
+            logger.error(f"❌ Error starting background jobs: {e}", exc_info=True)
+
     # DEV-34 Part 2: Start Email Lead Monitor polling if IMAP is configured
     try:
         imap_host = os.getenv("IMAP_HOST", "")
-        if imap_host:
+        if imap_host and boot_profile.runs_scheduler():
             from services.email_lead_monitor import email_lead_monitor
 
             poll_interval = int(os.getenv("EMAIL_MONITOR_INTERVAL_SECONDS", "120"))
@@ -1215,36 +868,95 @@ async def startup_event():
                 f"✅ Email Lead Monitor started (IMAP: {imap_host}, every {poll_interval}s)"
             )
         else:
-            logger.info("⚠️  Email Lead Monitor disabled (IMAP_HOST not set)")
+            logger.info(
+                "⚠️  Email Lead Monitor disabled (IMAP_HOST not set or not a scheduler role)"
+            )
     except Exception as e:
         logger.error(f"❌ Error starting Email Lead Monitor: {e}", exc_info=True)
 
+    # Agent SDK (LangChain) off the request path: import it in a worker thread
+    # after startup so the first /chat does not pay for it
+    if boot_profile.handles_inbound() and boot_profile.BOOT_PRELOAD_AGENT:
+        app.state.agent_preload = asyncio.create_task(boot_profile.preload_modules())
+
+    boot_profile.mark_ready()
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    # Stop email lead monitor
+    if boot_profile.runs_scheduler():
+        # Stop email lead monitor
+        try:
+            from services.email_lead_monitor import email_lead_monitor
+
+            email_lead_monitor.stop_polling()
+        except Exception:
+            pass
+
+        try:
+            from core.background_jobs import background_jobs
+
+            await background_jobs.stop()
+        except Exception as e:
+            logger.error(f"❌ Error stopping background jobs: {e}")
+
+        # Stop scheduled tasks
+        try:
+            from services.scheduled_tasks import scheduled_tasks_service
+
+            scheduled_tasks_service.stop_all_tasks()
+            logger.info("✅ Scheduled tasks stopped")
+        except Exception as e:
+            logger.error(f"❌ Error stopping scheduled tasks: {e}")
+
+    # Flush pending write-behind "new lead message" notifications
+    try:
+        from services.message_notification_queue import message_notification_queue
+
+        await message_notification_queue.stop()
+    except Exception as e:
+        logger.error(f"❌ Error flushing message notification queue: {e}")
+
+    # Flush buffered audit events (spilled to disk if the DB is unavailable)
     try:
-        from services.email_lead_monitor import email_lead_monitor
+        from core.audit_sink import audit_sink
+
+        await audit_sink.stop()
+    except Exception as e:
+        logger.error(f"❌ Error flushing audit sink: {e}")
 
-        email_lead_monitor.stop_polling()
+    try:
+        from core.rate_limiter import rate_limit_engine
+
+        await rate_limit_engine.close()
     except Exception:
         pass
 
-    # Stop scheduled tasks
     try:
-        from services.scheduled_tasks import scheduled_tasks_service
+        from core.tenant_cache import tenant_cache
+
+        await tenant_cache.stop_pubsub()
+    except Exception:
+        pass
 
-        scheduled_tasks_service.stop_all_tasks()
-        logger.info("✅ Scheduled tasks stopped")
+    try:
+        await emit_batcher.stop()
+    except Exception as e:
+        logger.error(f"❌ Error flushing Socket.IO batches: {e}")
+
+    try:
+        await http_clients.aclose()
     except Exception as e:
-        logger.error(f"❌ Error stopping scheduled tasks: {e}")
+        logger.error(f"❌ Error closing HTTP client registry: {e}")
 
     await db.disconnect()
     await engine.dispose()
 
 
-async def emit_event_shim(event: str, data: dict):
-    await sio.emit(event, data)
+async def emit_event_shim(event: str, data: Any, tenant_id: Optional[int] = None):
+    if tenant_id is None and isinstance(data, dict):
+        tenant_id = data.get("tenant_id")
+    await emit_to_tenant(event, data, tenant_id)
 
 
 app.state.emit_appointment_event = emit_event_shim
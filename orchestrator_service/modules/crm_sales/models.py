@@ -384,6 +384,7 @@ class CrmDashboardStats(BaseModel):
     status_distribution: List[dict] = Field(default_factory=list)
     revenue_leads_trend: List[dict] = Field(default_factory=list)
     recent_leads: List[dict] = Field(default_factory=list)
+    aggregates_reconciled_at: Optional[datetime] = None
     
     class Config:
         from_attributes = True
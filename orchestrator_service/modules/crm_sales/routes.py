@@ -6,14 +6,15 @@ import uuid as uuid_lib
 import os
 import json
 import asyncio
-from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks, Request, UploadFile, File
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks, Request, Response, UploadFile, File
 from pydantic import BaseModel
 from typing import List, Optional, Any
 from uuid import UUID
 import httpx
 import logging
 from core.rate_limiter import limiter
+from core.http_clients import http_clients
 
 logger = logging.getLogger("orchestrator")
 
@@ -28,10 +29,13 @@ from modules.crm_sales.models import (
     ProspectingScrapeRequest, ProspectingLeadResponse, ProspectingSendRequest,
     CrmDashboardStats,
 )
+from core.identity import invalidate_identity
 from core.security import get_current_user_context, verify_admin_token, get_resolved_tenant_id, get_allowed_tenant_ids, audit_access
 from core.utils import normalize_phone
 from db import db
 from services.blacklist_service import blacklist_service
+from services.lead_enrichment_service import lead_enrichment_service
+from services.lead_listing_service import build_lead_list_query, next_lead_cursor
 
 router = APIRouter(prefix="", tags=["CRM Sales"])
 APIFY_ACTOR_URL = "https://api.apify.com/v2/acts/compass~crawler-google-places/run-sync-get-dataset-items"
@@ -55,86 +59,60 @@ WHATSAPP_SERVICE_URL = os.getenv("WHATSAPP_SERVICE_URL", "http://whatsapp_servic
 @limiter.limit("100/minute")
 async def list_leads(
     request: Request,
+    response: Response,
     status: Optional[str] = None,
     assigned_seller_id: Optional[UUID] = None,
     search: Optional[str] = Query(None, description="Search by name, phone, email"),
-    limit: int = Query(50, le=500),
+    tags: Optional[List[str]] = Query(None, description="Only leads carrying all these tags"),
+    limit: int = Query(50, ge=1, le=500),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page (keyset mode, offset ignored)"),
     context: dict = Depends(get_current_user_context)
 ):
     """
-    List all leads for the current tenant with optional filters.
+    List all leads for the current tenant with optional filters, newest first.
     Excludes soft-deleted (status='deleted'). Supports search by first_name, last_name, phone_number, email.
+    When more leads exist, the X-Next-Cursor header carries the cursor of the next page.
     """
     tenant_id = context["tenant_id"]
     role = context.get("role") or context.get("user_role") or ""
     user_id = context.get("user_id") or context.get("id")
 
-    query = """
-        SELECT l.id, l.tenant_id, l.phone_number, l.first_name, l.last_name, l.email,
-               l.status, l.stage_id, l.assigned_seller_id, l.source, l.meta_lead_id, l.tags,
-               l.apify_title, l.apify_category_name, l.apify_address, l.apify_city, l.apify_state, l.apify_country_code,
-               l.apify_website, l.apify_place_id, l.apify_total_score, l.apify_reviews_count, l.apify_scraped_at,
-               l.prospecting_niche, l.prospecting_location_query,
-               l.outreach_message_sent, l.outreach_send_requested, l.outreach_last_requested_at, l.outreach_last_sent_at,
-               l.score,
-               l.estimated_value, l.close_probability, l.weighted_revenue,
-               CASE WHEN u.id IS NOT NULL THEN TRIM(COALESCE(u.first_name, '') || ' ' || COALESCE(u.last_name, '')) ELSE NULL END AS seller_name,
-               l.created_at, l.updated_at,
-               COALESCE(l.tags::text, '[]') AS tags_raw
-        FROM leads l
-        LEFT JOIN users u ON u.id = l.assigned_seller_id
-        WHERE l.tenant_id = $1 AND (l.status IS NULL OR l.status != 'deleted')
-    """
-    params: list = [tenant_id]
-    param_idx = 2
-
-    # Role-based filtering: Setters and Closers only see assigned leads
+    seller_scope = None
     if role in ['setter', 'closer']:
-        query += f" AND l.assigned_seller_id = ${param_idx}"
-        params.append(UUID(user_id) if isinstance(user_id, str) else user_id)
-        param_idx += 1
-
-    if status:
-        query += f" AND l.status = ${param_idx}"
-        params.append(status)
-        param_idx += 1
-
-    if assigned_seller_id:
-        query += f" AND l.assigned_seller_id = ${param_idx}"
-        params.append(assigned_seller_id)
-        param_idx += 1
+        seller_scope = UUID(user_id) if isinstance(user_id, str) else user_id
 
-    if search and search.strip():
-        query += f" AND (l.first_name ILIKE ${param_idx} OR l.last_name ILIKE ${param_idx} OR l.phone_number ILIKE ${param_idx} OR l.email ILIKE ${param_idx})"
-        params.append(f"%{search.strip()}%")
-        param_idx += 1
-
-    query += f" ORDER BY l.created_at DESC LIMIT ${param_idx} OFFSET ${param_idx + 1}"
-    params.extend([limit, offset])
+    try:
+        query, params = build_lead_list_query(
+            tenant_id,
+            seller_scope=seller_scope,
+            status=status,
+            assigned_seller_id=assigned_seller_id,
+            search=search,
+            tags=tags,
+            limit=limit,
+            offset=offset,
+            cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    import json as _json
     rows = await db.pool.fetch(query, *params)
+    next_cursor = next_lead_cursor(rows, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
     results = []
-    for row in rows:
+    for row in rows[:limit]:
         d = dict(row)
-        # Parse JSONB fields returned as strings by asyncpg
-        raw = d.pop('tags_raw', None)
-        if raw is not None:
+        # JSONB is decoded by the pool codec; legacy rows may hold a JSON-encoded string
+        if isinstance(d.get('tags'), str):
             try:
-                d['tags'] = _json.loads(raw) if raw else []
+                d['tags'] = json.loads(d['tags'])
             except (ValueError, TypeError):
                 d['tags'] = []
-        elif isinstance(d.get('tags'), str):
-            try:
-                d['tags'] = _json.loads(d['tags'])
-            except (ValueError, TypeError):
-                d['tags'] = []
-        if isinstance(d.get('social_links'), str):
-            try:
-                d['social_links'] = _json.loads(d['social_links'])
-            except (ValueError, TypeError):
-                d['social_links'] = {}
+        elif d.get('tags') is None:
+            d['tags'] = []
         results.append(d)
     return results
 
@@ -770,65 +748,63 @@ async def get_crm_dashboard_stats(
         where_base += " AND assigned_seller_id = $2"
         where_params.append(seller_uid)
 
+    # Counts come from lead_daily_aggregates (per tenant/day/status/seller, trigger-maintained)
+    agg_where = where_base.replace("assigned_seller_id", "seller_id")
+    since_param = f"${len(where_params) + 1}"
+
+    # Dashboard reads go through the read lane so they never compete with webhook ingest
+    pool = db.read_pool or db.pool
+
     try:
-        # Determine days based on range
+        from services.lead_aggregates_service import lead_aggregates_service
+        reconciled_at = await lead_aggregates_service.last_reconciled_at(pool, tenant_id)
+
+        # Determine days based on range (day-granular window, UTC)
         days = 7 if range == "weekly" else 30
-        interval = f"INTERVAL '{days} days'"
+        since_day = (datetime.utcnow() - timedelta(days=days)).date()
         
-        # 1. Total leads (all time)
-        total_leads = await db.pool.fetchval(f"""
-            SELECT COUNT(*) FROM leads 
-            {where_base} AND status != 'deleted'
-        """, *where_params) or 0
+        # 1, 3, 4, 6. Totals (all time) and period counts in a single pass over the buckets
+        totals = await pool.fetchrow(f"""
+            SELECT
+                COALESCE(SUM(lead_count) FILTER (WHERE status != 'deleted'), 0) AS total_leads,
+                COALESCE(SUM(lead_count) FILTER (
+                    WHERE status NOT IN ('closed_won', 'closed_lost', 'deleted') AND day >= {since_param}
+                ), 0) AS active_leads,
+                COALESCE(SUM(lead_count) FILTER (WHERE status = 'closed_won' AND day >= {since_param}), 0) AS converted_leads,
+                COALESCE(SUM(lead_count) FILTER (WHERE status != 'deleted' AND day >= {since_param}), 0) AS period_leads
+            FROM lead_daily_aggregates
+            {agg_where}
+        """, *where_params, since_day)
+        total_leads = totals["total_leads"]
+        active_leads = totals["active_leads"]
+        converted_leads = totals["converted_leads"]
+        period_leads = totals["period_leads"]
         
         # 2. Total clients (all time)
         # Note: clients usually derived from won leads. 
         # For simplicity, if role is seller, we count clients linked to THEIR won leads.
         if role in ['setter', 'closer']:
-            total_clients = await db.pool.fetchval("""
+            total_clients = await pool.fetchval("""
                 SELECT COUNT(DISTINCT phone_number) FROM leads 
                 WHERE tenant_id = $1 AND assigned_seller_id = $2 AND status = 'closed_won'
             """, tenant_id, seller_uid) or 0
         else:
-            total_clients = await db.pool.fetchval("""
+            total_clients = await pool.fetchval("""
                 SELECT COUNT(*) FROM clients 
                 WHERE tenant_id = $1
             """, tenant_id) or 0
         
-        # 3. Active leads (recent, not converted)
-        active_leads = await db.pool.fetchval(f"""
-            SELECT COUNT(*) FROM leads 
-            {where_base} 
-            AND status NOT IN ('closed_won', 'closed_lost', 'deleted')
-            AND created_at >= NOW() - {interval}
-        """, *where_params) or 0
-        
-        # 4. Converted leads (closed won in period)
-        converted_leads = await db.pool.fetchval(f"""
-            SELECT COUNT(*) FROM leads 
-            {where_base} 
-            AND status = 'closed_won'
-            AND created_at >= NOW() - {interval}
-        """, *where_params) or 0
-        
         # 5. Total revenue (estimated from converted leads: $1000 per lead)
         total_revenue = converted_leads * 1000.0
         
-        # 6. Conversion rate (based on period)
-        period_leads = await db.pool.fetchval(f"""
-            SELECT COUNT(*) FROM leads 
-            {where_base} 
-            AND status != 'deleted'
-            AND created_at >= NOW() - {interval}
-        """, *where_params) or 0
-        
         conversion_rate = (converted_leads / period_leads * 100) if period_leads > 0 else 0.0
         
         # 7. Status distribution
-        status_rows = await db.pool.fetch(f"""
-            SELECT status, COUNT(*) as count FROM leads
-            {where_base} AND status != 'deleted'
+        status_rows = await pool.fetch(f"""
+            SELECT status, SUM(lead_count) as count FROM lead_daily_aggregates
+            {agg_where} AND status != 'deleted'
             GROUP BY status
+            HAVING SUM(lead_count) > 0
         """, *where_params)
         
         status_colors = {
@@ -846,8 +822,7 @@ async def get_crm_dashboard_stats(
         ]
 
         # 8. Revenue & Leads Trend (Last 6 months)
-        # Using joins for trend to ensure seller filtering
-        trend_rows = await db.pool.fetch(f"""
+        trend_rows = await pool.fetch(f"""
             WITH months AS (
                 SELECT generate_series(
                     date_trunc('month', CURRENT_DATE - INTERVAL '5 months'),
@@ -857,12 +832,12 @@ async def get_crm_dashboard_stats(
             )
             SELECT 
                 to_char(m.month_start, 'Mon') as month_label,
-                COUNT(l.id) as leads_count,
-                COALESCE(SUM(CASE WHEN l.status = 'closed_won' THEN 1000.0 ELSE 0 END), 0) as revenue
+                COALESCE(SUM(a.lead_count), 0) as leads_count,
+                COALESCE(SUM(CASE WHEN a.status = 'closed_won' THEN a.lead_count * 1000.0 ELSE 0 END), 0) as revenue
             FROM months m
-            LEFT JOIN leads l ON date_trunc('month', l.created_at) = m.month_start 
-              AND l.tenant_id = $1 AND l.status != 'deleted'
-              { "AND l.assigned_seller_id = $2" if role in ['setter', 'closer'] else "" }
+            LEFT JOIN lead_daily_aggregates a ON date_trunc('month', a.day) = m.month_start 
+              AND a.tenant_id = $1 AND a.status != 'deleted'
+              { "AND a.seller_id = $2" if role in ['setter', 'closer'] else "" }
             GROUP BY m.month_start
             ORDER BY m.month_start ASC
         """, *where_params)
@@ -881,7 +856,7 @@ async def get_crm_dashboard_stats(
             ORDER BY created_at DESC
             LIMIT 10
         """
-        recent_leads = await db.pool.fetch(recent_leads_query, *where_params)
+        recent_leads = await pool.fetch(recent_leads_query, *where_params)
         
         formatted_recent_leads = []
         for lead in recent_leads:
@@ -905,7 +880,8 @@ async def get_crm_dashboard_stats(
             conversion_rate=round(conversion_rate, 1),
             status_distribution=status_distribution,
             revenue_leads_trend=revenue_leads_trend,
-            recent_leads=formatted_recent_leads
+            recent_leads=formatted_recent_leads,
+            aggregates_reconciled_at=reconciled_at
         )
         
     except Exception as e:
@@ -1197,7 +1173,7 @@ async def _send_prospecting_outreach_background(
         return
 
     # 3. Send to each lead
-    async with httpx.AsyncClient(timeout=20.0) as client:
+    async with http_clients.session(timeout=20.0) as client:
         for lead in leads:
             phone = normalize_phone(lead["phone_number"])
             first_name = lead["first_name"] or " "
@@ -1298,7 +1274,7 @@ async def run_prospecting_scrape(
         logger.info(f"📡 Iniciando Apify Run: {APIFY_ACTOR_URL.replace('/run-sync-get-dataset-items', '')}")
         # 1. Start Actor Run
         run_url = APIFY_ACTOR_URL.replace("/run-sync-get-dataset-items", "/runs")
-        async with httpx.AsyncClient(timeout=310.0) as client:
+        async with http_clients.session(timeout=310.0) as client:
             resp = await client.post(
                 run_url,
                 params={"token": apify_token},
@@ -1534,7 +1510,7 @@ async def get_prospecting_templates(
     bot_phone = await db.pool.fetchval("SELECT bot_phone_number FROM tenants WHERE id = $1", tenant_id)
     
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with http_clients.session(timeout=10.0) as client:
             resp = await client.get(
                 f"{WHATSAPP_SERVICE_URL}/templates",
                 params={"from_number": bot_phone},
@@ -1957,6 +1933,7 @@ async def create_seller(
         INSERT INTO professionals (tenant_id, user_id, first_name, last_name, email, phone_number, is_active, created_at, updated_at)
         VALUES ($1, $2, $3, $4, $5, $6, TRUE, NOW(), NOW())
     """, tenant_id, uid, first_name, last_name, payload.email, (payload.phone_number or "").strip() or None)
+    invalidate_identity(uid)
     return {"status": "created", "user_id": str(uid)}
 
 
@@ -2036,6 +2013,7 @@ async def create_agenda_event(
         RETURNING id, tenant_id, seller_id, title, start_datetime, end_datetime, lead_id, client_id, notes, source, status, created_at, updated_at
     """, tenant_id, payload.seller_id, payload.title, payload.start_datetime, payload.end_datetime,
         payload.lead_id, payload.client_id, payload.notes, payload.source)
+    lead_enrichment_service.invalidate_tenant(tenant_id)
     return dict(row)
 
 
@@ -2079,6 +2057,7 @@ async def update_agenda_event(
         "UPDATE seller_agenda_events SET " + ", ".join(updates) + f", updated_at = NOW() WHERE id = ${pos} AND tenant_id = ${pos + 1}",
         *params
     )
+    lead_enrichment_service.invalidate_tenant(tenant_id)
     return {"status": "ok"}
 
 
@@ -2098,6 +2077,7 @@ async def delete_agenda_event(
     )
     if result == "UPDATE 0":
         raise HTTPException(status_code=404, detail="Evento no encontrado")
+    lead_enrichment_service.invalidate_tenant(tenant_id)
     return {"status": "cancelled"}
 
 
@@ -2118,13 +2098,13 @@ async def score_lead(lead_id: str, user=Depends(verify_admin_token)):
     return result
 
 
-@router.post("/leads/score/batch")
-async def batch_score_leads(user=Depends(verify_admin_token)):
-    """Recalculate scores for stale leads."""
+@router.post("/leads/score/batch", status_code=202)
+async def batch_score_leads(background_tasks: BackgroundTasks, user=Depends(verify_admin_token)):
+    """Start recalculating scores for leads never scored or with new messages since their last score."""
     from services.lead_scoring_service import batch_calculate_scores
     tenant_id = user.get("tenant_id", 1)
-    await batch_calculate_scores(db.pool, tenant_id, limit=100)
-    return {"status": "ok", "message": "Batch scoring started"}
+    background_tasks.add_task(batch_calculate_scores, db.pool, tenant_id)
+    return {"status": "accepted", "message": "Batch scoring started"}
 
 
 # =============================================================================
@@ -2136,7 +2116,7 @@ async def get_funnel(days: int = 30, user=Depends(verify_admin_token)):
     """Conversion funnel with stage counts and rates."""
     from services.sales_analytics_service import get_funnel_data
     tenant_id = user.get("tenant_id", 1)
-    return await get_funnel_data(db.pool, tenant_id, days)
+    return await get_funnel_data(db.read_pool or db.pool, tenant_id, days)
 
 
 @router.get("/analytics/forecast")
@@ -2144,7 +2124,7 @@ async def get_forecast(user=Depends(verify_admin_token)):
     """Weighted pipeline forecast."""
     from services.sales_analytics_service import get_forecast_data
     tenant_id = user.get("tenant_id", 1)
-    return await get_forecast_data(db.pool, tenant_id)
+    return await get_forecast_data(db.read_pool or db.pool, tenant_id)
 
 
 @router.get("/analytics/velocity")
@@ -2152,7 +2132,7 @@ async def get_velocity(days: int = 90, user=Depends(verify_admin_token)):
     """Sales velocity metrics."""
     from services.sales_analytics_service import get_velocity_data
     tenant_id = user.get("tenant_id", 1)
-    return await get_velocity_data(db.pool, tenant_id, days)
+    return await get_velocity_data(db.read_pool or db.pool, tenant_id, days)
 
 
 # =============================================================================
@@ -2283,7 +2263,7 @@ async def create_task(body: dict, user=Depends(verify_admin_token)):
     # Notificar al asignado si es diferente al creador
     if assigned_to and str(assigned_to) != str(user_id):
         try:
-            from core.socket_manager import sio
+            from core.socket_manager import sio, tenant_room
             import time
             lead_name = ""
             if lead_id:
@@ -2304,7 +2284,7 @@ async def create_task(body: dict, user=Depends(verify_admin_token)):
                 "lead_name": lead_name,
                 "due_date": body.get("due_date"),
                 "priority": body.get("priority", "medium"),
-            })
+            }, room=tenant_room(tenant_id))
 
             # Notificación en DB
             notif_id = f"task_{task['id']}_{int(time.time())}"
@@ -2312,7 +2292,7 @@ async def create_task(body: dict, user=Depends(verify_admin_token)):
                 INSERT INTO notifications (id, tenant_id, type, title, message, priority,
                     recipient_id, related_entity_type, related_entity_id, metadata)
                 VALUES ($1, $2, 'task_assigned', $3, $4, $5, $6, 'task', $7, $8)
-                ON CONFLICT (id) DO NOTHING
+                ON CONFLICT DO NOTHING
             """,
                 notif_id, tenant_id,
                 f"📋 Nueva tarea asignada",
@@ -2351,7 +2331,7 @@ async def complete_task(task_id: int, body: dict, user=Depends(verify_admin_toke
     creator_id = task.get("created_by_user_id")
     if creator_id and str(creator_id) != str(user_id):
         try:
-            from core.socket_manager import sio
+            from core.socket_manager import sio, tenant_room
             import time
             await sio.emit("TASK_COMPLETED", {
                 "task_id": task_id,
@@ -2360,7 +2340,7 @@ async def complete_task(task_id: int, body: dict, user=Depends(verify_admin_toke
                 "completed_by": str(user_id),
                 "title": task.get("title", ""),
                 "completion_comment": comment,
-            })
+            }, room=tenant_room(tenant_id))
         except Exception as e:
             logger.warning(f"DEV-44: Could not emit TASK_COMPLETED: {e}")
 
@@ -2774,8 +2754,9 @@ async def import_preview(file: UploadFile = File(...), user=Depends(verify_admin
 
     if not rows:
         raise HTTPException(status_code=400, detail="El archivo CSV no contiene filas de datos")
-    if len(rows) > 1000:
-        raise HTTPException(status_code=400, detail="Máximo 1000 filas por importación")
+    from services.lead_import_service import LEAD_IMPORT_MAX_ROWS
+    if len(rows) > LEAD_IMPORT_MAX_ROWS:
+        raise HTTPException(status_code=400, detail=f"Máximo {LEAD_IMPORT_MAX_ROWS} filas por importación")
 
     # Map columns
     headers = list(reader.fieldnames or [])
@@ -2826,88 +2807,50 @@ async def import_preview(file: UploadFile = File(...), user=Depends(verify_admin
 
 @router.post("/leads/import/execute")
 async def import_execute(body: dict, user=Depends(verify_admin_token)):
-    """Execute CSV import with mapped columns. Checks duplicates by phone AND email."""
+    """
+    Execute CSV import with mapped columns. Checks duplicates by phone AND email.
+    Rows are staged with COPY and resolved set-based (services/lead_import_service).
+    With "stream": true the response is NDJSON: one progress line per chunk, then the result.
+    """
+    from services.lead_import_service import lead_import_service
+
     tenant_id = user.get("tenant_id", 1)
     rows = body.get("rows", [])
     mapping = body.get("mapping", {})
     on_duplicate = body.get("on_duplicate", "skip")  # "skip" or "update"
 
-    created = 0
-    updated = 0
-    skipped = 0
-    blocked = 0
-    errors: list = []
+    if not body.get("stream"):
+        return await lead_import_service.import_rows(tenant_id, rows, mapping, on_duplicate)
 
-    for idx, row in enumerate(rows[:1000], start=1):
-        try:
-            data: dict = {}
-            for csv_col, db_col in mapping.items():
-                if csv_col in row:
-                    data[db_col] = row[csv_col]
-
-            phone = normalize_phone(data.get("phone_number", "").strip()) if data.get("phone_number") else ""
-            email = (data.get("email") or "").strip().lower()
-
-            if not phone and not email:
-                errors.append({"row": idx, "reason": "Sin teléfono ni email"})
-                skipped += 1
-                continue
-
-            # G3: Blacklist check before inserting
-            is_blk, blk_reason = await blacklist_service.is_blacklisted_normalized(
-                tenant_id, phone=phone or None, email=email or None
-            )
-            if is_blk:
-                errors.append({"row": idx, "reason": f"Bloqueado: {blk_reason or 'blacklist'}"})
-                blocked += 1
-                continue
-
-            # Check duplicate by phone OR email
-            existing_id = None
-            if phone:
-                existing_id = await db.pool.fetchval(
-                    "SELECT id FROM leads WHERE tenant_id = $1 AND phone_number = $2", tenant_id, phone
-                )
-            if not existing_id and email:
-                existing_id = await db.pool.fetchval(
-                    "SELECT id FROM leads WHERE tenant_id = $1 AND LOWER(email) = $2", tenant_id, email
-                )
+    from fastapi.responses import StreamingResponse
 
-            if existing_id:
-                if on_duplicate == "update":
-                    sets = []
-                    params: list = [tenant_id, existing_id]
-                    for field in ["first_name", "last_name", "email", "company", "notes"]:
-                        if field in data and data[field]:
-                            params.append(data[field])
-                            sets.append(f"{field} = COALESCE(NULLIF({field}, ''), ${len(params)})")
-                    if sets:
-                        await db.pool.execute(
-                            f"UPDATE leads SET {', '.join(sets)}, updated_at = NOW() WHERE tenant_id = $1 AND id = $2",
-                            *params
-                        )
-                        updated += 1
-                    else:
-                        skipped += 1
-                else:
-                    skipped += 1
-            else:
-                source = data.get("source", "csv_import") or "csv_import"
-                await db.pool.execute("""
-                    INSERT INTO leads (tenant_id, phone_number, first_name, last_name, email, company, source, notes, estimated_value)
-                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
-                """, tenant_id, phone or None,
-                    data.get("first_name"), data.get("last_name"),
-                    email or None, data.get("company"),
-                    source, data.get("notes"),
-                    float(data.get("estimated_value", 0) or 0),
-                )
-                created += 1
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def _progress(event: dict):
+        await queue.put({"type": "progress", **event})
+
+    async def _run():
+        try:
+            result = await lead_import_service.import_rows(tenant_id, rows, mapping, on_duplicate, progress=_progress)
+            await queue.put({"type": "result", **result})
         except Exception as e:
-            errors.append({"row": idx, "reason": str(e)})
-            skipped += 1
+            logger.error(f"CSV import failed for tenant {tenant_id}: {e}")
+            await queue.put({"type": "error", "detail": str(e)})
+        finally:
+            await queue.put(None)
+
+    async def _stream():
+        task = asyncio.create_task(_run())
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                yield json.dumps(event, default=str) + "\n"
+        finally:
+            await task
 
-    return {"total": len(rows), "created": created, "updated": updated, "skipped": skipped, "blocked": blocked, "errors": errors}
+    return StreamingResponse(_stream(), media_type="application/x-ndjson")
 
 
 # =============================================================================
@@ -3056,6 +2999,7 @@ async def create_post_call_note(
                         f"Seguimiento: {lead_name} ({payload.call_result})",
                         payload.next_contact_date, end_dt, lead_id)
                     agenda_event_id = str(agenda_row["id"]) if agenda_row else None
+    lead_enrichment_service.invalidate_tenant(tenant_id)
 
     # 7. Send notification to the setter (outside transaction)
     if setter_user_id and str(setter_user_id) != str(user_id):
@@ -3100,7 +3044,7 @@ async def create_post_call_note(
 
     # 8. Emit Socket.IO event
     try:
-        from core.socket_manager import sio
+        from core.socket_manager import sio, tenant_room
         await sio.emit("POST_CALL_NOTE_CREATED", {
             "lead_id": str(lead_id),
             "note_id": str(note_row["id"]),
@@ -3111,7 +3055,7 @@ async def create_post_call_note(
             "author_id": str(user_id),
             "tenant_id": tenant_id,
             "agenda_event_id": agenda_event_id,
-        })
+        }, room=tenant_room(tenant_id))
     except Exception as e:
         logger.warning(f"Could not emit POST_CALL_NOTE_CREATED socket event: {e}")
 
@@ -12,6 +12,7 @@ from db import db
 from gcal_service import gcal_service
 from analytics_service import analytics_service
 
+from core.identity import invalidate_identity
 from core.security import verify_admin_token, get_resolved_tenant_id, get_allowed_tenant_ids, audit_access
 from core.rate_limiter import limiter
 from core.utils import normalize_phone, encrypt_credential, ARG_TZ
@@ -36,9 +37,10 @@ def generate_default_working_hours():
     return wh
 
 async def emit_appointment_event(event_type: str, data: Dict[str, Any], request: Request):
-    """Emit appointment events via Socket.IO through the app state."""
+    """Emit appointment events via Socket.IO through the app state (scoped to the caller's tenant room)."""
     if hasattr(request.app.state, 'emit_appointment_event'):
-        await request.app.state.emit_appointment_event(event_type, data)
+        user = getattr(request.state, 'user', None)
+        await request.app.state.emit_appointment_event(event_type, data, tenant_id=getattr(user, 'tenant_id', None))
 
 # --- MODELS ---
 class PatientCreate(BaseModel):
@@ -368,6 +370,7 @@ async def create_professional(professional: ProfessionalCreate, resolved_tenant_
         """, tenant_id, user_id, first_name, last_name, email, professional.phone, professional.specialty, professional.license_number, professional.is_active, wh_json)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    invalidate_identity(user_id)
     return {"status": "created", "user_id": str(user_id)}
 
 @router.put("/professionals/{id}", dependencies=[Depends(verify_admin_token)], tags=["Profesionales"])
@@ -10,7 +10,7 @@ from db import db
 from gcal_service import gcal_service
 from core.context import current_tenant_id, current_customer_phone, current_patient_id
 from core.utils import ARG_TZ, normalize_phone
-from core.socket_manager import sio
+from core.socket_manager import sio, tenant_room
 from core.tools import tool_registry
 
 logger = logging.getLogger(__name__)
@@ -371,7 +371,7 @@ async def book_appointment(date_time: str, treatment_reason: str, first_name: Op
              except: pass
         
         try:
-             await sio.emit("NEW_APPOINTMENT", to_json_safe({"id": apt_id, "patient_name": f"{first_name} {last_name}", "appointment_datetime": apt_datetime.isoformat(), "professional_name": target_prof['first_name']}))
+             await sio.emit("NEW_APPOINTMENT", to_json_safe({"id": apt_id, "patient_name": f"{first_name} {last_name}", "appointment_datetime": apt_datetime.isoformat(), "professional_name": target_prof['first_name']}), room=tenant_room(tenant_id))
         except: pass
         
         return f"✅ Turno confirmado el {apt_datetime.strftime('%d/%m %H:%M')} con Dr/a. {target_prof['first_name']}."
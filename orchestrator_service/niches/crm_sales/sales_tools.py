@@ -869,7 +869,7 @@ async def request_human_handoff(
 
             # Emit Socket.IO event for real-time frontend update
             try:
-                from core.socket_manager import sio
+                from core.socket_manager import sio, tenant_room
                 await sio.emit("HANDOFF_REQUESTED", {
                     "tenant_id": tenant_id,
                     "lead_id": str(lead_id),
@@ -878,7 +878,7 @@ async def request_human_handoff(
                     "reason": reason,
                     "urgency": urgency,
                     "timestamp": datetime.now(ARG_TZ).isoformat(),
-                })
+                }, room=tenant_room(tenant_id))
             except Exception as sio_err:
                 logger.warning(f"Could not emit HANDOFF_REQUESTED socket event: {sio_err}")
 
@@ -1248,7 +1248,7 @@ async def derive_to_setter(
 
             # 8. Emit Socket.IO event LEAD_DERIVED
             try:
-                from core.socket_manager import sio
+                from core.socket_manager import sio, tenant_room
                 await sio.emit("LEAD_DERIVED", {
                     "tenant_id": tenant_id,
                     "lead_id": str(lead_id),
@@ -1258,7 +1258,7 @@ async def derive_to_setter(
                     "reason": reason,
                     "summary": summary[:300],
                     "timestamp": datetime.now(ARG_TZ).isoformat(),
-                })
+                }, room=tenant_room(tenant_id))
             except Exception as sio_err:
                 logger.warning(f"Could not emit LEAD_DERIVED socket event: {sio_err}")
 
@@ -17,6 +17,7 @@ from pydantic import BaseModel, Field
 
 from db import db
 from core.security import verify_admin_token, get_resolved_tenant_id
+from core.agent.executor_cache import agent_executor_cache
 
 logger = logging.getLogger("ai_agent_routes")
 
@@ -214,6 +215,7 @@ async def update_ai_agent_config(
     query = f"UPDATE tenants SET {', '.join(set_parts)}, updated_at = NOW() WHERE id = ${len(params)}"
 
     await db.execute(query, *params)
+    agent_executor_cache.invalidate(tenant_id)
 
     logger.info(f"DEV-36: AI agent config updated for tenant {tenant_id} by user {user_data.user_id} (fields: {list(updates.keys())})")
 
@@ -273,6 +275,7 @@ async def seed_ai_agent_config(x_admin_token: str = Header(None)):
             json.dumps(cfg["ai_objection_responses"]),
             json.dumps(cfg["business_hours"]),
         )
+        agent_executor_cache.invalidate(tid)
         results.append({"tenant_id": tid, "tenant_name": tname, "action": "seeded", "agent_name": cfg["ai_agent_name"]})
 
     seeded_count = sum(1 for r in results if r["action"] == "seeded")
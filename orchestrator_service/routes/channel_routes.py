@@ -13,6 +13,7 @@ from pydantic import BaseModel, Field
 
 from db import db
 from core.security import get_current_user_context
+from core.tenant_cache import tenant_cache
 
 logger = logging.getLogger("channel_routes")
 
@@ -231,6 +232,7 @@ async def create_channel_binding(
             await redis.delete(f"channel_route:{payload.provider}:{payload.channel_id}")
         except Exception:
             pass
+    tenant_cache.invalidate_tenant(tenant_id)
 
     logger.info(f"Channel bound: tenant={tenant_id} provider={payload.provider} channel={payload.channel_id}")
 
@@ -273,6 +275,7 @@ async def delete_channel_binding(
             await redis.delete(f"channel_route:{row['provider']}:{row['channel_id']}")
         except Exception:
             pass
+    tenant_cache.invalidate_tenant(tenant_id)
 
     logger.info(f"Channel unbound: tenant={tenant_id} binding_id={binding_id}")
     return {"ok": True, "detail": f"Channel binding {binding_id} deactivated"}
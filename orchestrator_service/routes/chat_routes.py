@@ -19,7 +19,7 @@ from db import db
 from core.security import verify_admin_token, get_resolved_tenant_id, audit_access
 from core.rate_limiter import limiter
 from core.utils import normalize_phone
-from core.socket_manager import sio
+from core.socket_manager import sio, tenant_room
 from services.message_delivery import unified_message_delivery
 
 logger = logging.getLogger("chat_routes")
@@ -121,7 +121,7 @@ async def send_free_text_message(
                 "message": message_text,
                 "role": "assistant",
                 "tenant_id": tenant_id,
-            })
+            }, room=tenant_room(tenant_id))
         except Exception:
             pass
 
@@ -145,7 +145,7 @@ async def send_free_text_message(
             "message": message_text,
             "role": "assistant",
             "tenant_id": tenant_id,
-        })
+        }, room=tenant_room(tenant_id))
     except Exception as e:
         logger.warning(f"Socket.IO emit failed (non-critical): {e}")
 
@@ -10,6 +10,8 @@ from pydantic import BaseModel
 
 from db import db
 from core.security import verify_admin_token, get_resolved_tenant_id, require_role
+from core.agent.executor_cache import agent_executor_cache
+from core.tenant_cache import tenant_cache
 
 logger = logging.getLogger(__name__)
 
@@ -125,6 +127,24 @@ def _build_update_sets(data: dict) -> tuple:
     return ", ".join(sets), params
 
 
+async def _apply_tenant_update(tenant_id: int, data: dict):
+    """Runs the UPDATE and drops the caches fed by the changed columns."""
+    old_bot_phone = None
+    if "bot_phone_number" in data:
+        old_bot_phone = await db.fetchval("SELECT bot_phone_number FROM tenants WHERE id = $1", tenant_id)
+
+    set_clause, params = _build_update_sets(data)
+    query = f"UPDATE tenants SET {set_clause} WHERE id = $1"
+    await db.execute(query, tenant_id, *params)
+    # clinic_name / ai_agent_name / business hours feed the agent system prompt
+    agent_executor_cache.invalidate(tenant_id)
+
+    if "bot_phone_number" in data:
+        # Webhooks resolve the tenant by the number they were sent to: the old number
+        # must stop resolving here and the new one may be cached as a miss or another tenant
+        tenant_cache.invalidate_bot_phones(old_bot_phone, data["bot_phone_number"])
+
+
 # ── Setup Route ───────────────────────────────────────────────────────────────
 
 @setup_router.post("/configure-tenant")
@@ -142,9 +162,7 @@ async def configure_tenant(
     if not data:
         raise HTTPException(status_code=400, detail="No fields provided")
 
-    set_clause, params = _build_update_sets(data)
-    query = f"UPDATE tenants SET {set_clause} WHERE id = $1"
-    await db.execute(query, tenant_id, *params)
+    await _apply_tenant_update(tenant_id, data)
 
     logger.info(f"DEV-35: Tenant {tenant_id} configured by {user_data.email} — fields: {list(data.keys())}")
     return await _fetch_tenant_profile(tenant_id)
@@ -178,9 +196,7 @@ async def update_company_settings(
     if not data:
         raise HTTPException(status_code=400, detail="No fields provided")
 
-    set_clause, params = _build_update_sets(data)
-    query = f"UPDATE tenants SET {set_clause} WHERE id = $1"
-    await db.execute(query, tenant_id, *params)
+    await _apply_tenant_update(tenant_id, data)
 
     logger.info(f"DEV-35: Tenant {tenant_id} updated by CEO {user_data.email} — fields: {list(data.keys())}")
     return await _fetch_tenant_profile(tenant_id)
@@ -8,8 +8,8 @@ from typing import Dict, Any
 from fastapi import APIRouter, Depends
 from pydantic import BaseModel
 
-from services.scheduled_tasks import scheduled_tasks_service
 from db import get_db
+from core import boot_profile
 
 router = APIRouter(prefix="/health", tags=["health"])
 
@@ -71,12 +71,15 @@ async def health_check():
             "error": str(e)
         }
     
-    # Obtener estado de scheduled tasks
-    tasks_status = scheduled_tasks_service.get_task_status() if hasattr(scheduled_tasks_service, 'get_task_status') else {
+    # Obtener estado de scheduled tasks (sólo los roles que corren el scheduler lo importan)
+    tasks_status = {
         "scheduler_running": False,
         "total_tasks": 0,
         "tasks": []
     }
+    if boot_profile.runs_scheduler():
+        from services.scheduled_tasks import scheduled_tasks_service
+        tasks_status = scheduled_tasks_service.get_task_status()
     
     # Verificar servicios críticos
     services_status = {
@@ -127,6 +130,7 @@ async def get_task_status():
     Obtener estado detallado de scheduled tasks
     """
     try:
+        from services.scheduled_tasks import scheduled_tasks_service
         status = scheduled_tasks_service.get_task_status()
         return TaskStatusResponse(**status)
     except Exception as e:
@@ -142,6 +146,7 @@ async def start_scheduled_tasks():
     Iniciar scheduled tasks manualmente
     """
     try:
+        from services.scheduled_tasks import scheduled_tasks_service
         scheduled_tasks_service.start_all_tasks()
         status = scheduled_tasks_service.get_task_status()
         
@@ -164,6 +169,7 @@ async def stop_scheduled_tasks():
     Detener scheduled tasks manualmente
     """
     try:
+        from services.scheduled_tasks import scheduled_tasks_service
         scheduled_tasks_service.stop_all_tasks()
         
         return {
@@ -258,10 +264,16 @@ async def readiness_probe():
             
             if not row or row.ready != 1:
                 return {"status": "not_ready", "reason": "database_unavailable"}
+
+        # Esquema por detrás de lo que requiere este código: falta correr el job de migraciones
+        from db.schema_version import schema_status
+        if schema_status.get("ok") is False:
+            return {"status": "not_ready", "reason": "schema_behind", "schema": schema_status}
         
-        # Verificar que scheduled tasks están corriendo (si están habilitados)
+        # Verificar que scheduled tasks están corriendo (si están habilitados y el rol los corre)
         import os
-        if os.getenv("ENABLE_SCHEDULED_TASKS", "true").lower() == "true":
+        if os.getenv("ENABLE_SCHEDULED_TASKS", "true").lower() == "true" and boot_profile.runs_scheduler():
+            from services.scheduled_tasks import scheduled_tasks_service
             status = scheduled_tasks_service.get_task_status()
             if not status.get("scheduler_running", False):
                 return {"status": "not_ready", "reason": "scheduler_not_running"}
@@ -281,4 +293,219 @@ async def liveness_probe():
         # Verificación simple de que la aplicación responde
         return {"status": "alive", "timestamp": datetime.utcnow().isoformat()}
     except Exception as e:
-        return {"status": "dead", "error": str(e)}
\ No newline at end of file
+        return {"status": "dead", "error": str(e)}
+
+
+@router.get("/agent-cache")
+async def agent_cache_stats():
+    """
+    Estadísticas del cache de AgentExecutors por tenant (hits, misses, build time)
+    """
+    from core.agent.executor_cache import agent_executor_cache
+
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "agent_executor_cache": agent_executor_cache.get_stats()
+    }
+
+@router.get("/inbound-latency")
+async def inbound_latency_stats(tenant_id: int = None):
+    """
+    Latencia pre-LLM de /chat por tenant y etapa (p50/p99 en ms)
+    """
+    from services.inbound_pipeline import inbound_pipeline
+
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "tenants": inbound_pipeline.get_latency_stats(tenant_id)
+    }
+
+@router.get("/notification-queue")
+async def notification_queue_stats():
+    """
+    Estado del buffer write-behind de notificaciones de mensajes (pendientes, coalescidas, descartadas)
+    """
+    from services.message_notification_queue import message_notification_queue
+
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "message_notification_queue": message_notification_queue.get_stats()
+    }
+
+@router.get("/audit-sink")
+async def audit_sink_stats():
+    """
+    Estado del buffer de auditoría (pendientes, lotes escritos, eventos derramados a disco y reintentados)
+    """
+    from core.audit_sink import audit_sink
+
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "audit_sink": audit_sink.get_stats()
+    }
+
+@router.get("/schema")
+async def schema_version_status():
+    """
+    Versión del esquema verificada al arrancar (ledger schema_migrations vs versión requerida)
+    """
+    from db.schema_version import schema_status
+
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "schema": schema_status
+    }
+
+@router.get("/boot")
+async def boot_profile_stats():
+    """
+    Perfil de arranque de este proceso (rol, routers montados/omitidos/fallidos, imports más lentos, tiempo hasta ready, RSS pico)
+    """
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "boot": boot_profile.get_stats()
+    }
+
+@router.get("/jobs")
+async def background_jobs_stats():
+    """
+    Jobs de proyección en asyncio (reconciliación/snapshot de contadores, ...): corridas, errores, última duración
+    """
+    from core.background_jobs import background_jobs
+
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "jobs": background_jobs.get_stats()
+    }
+
+@router.get("/rate-limiter")
+async def rate_limiter_stats():
+    """
+    Rate limiting compartido (chequeos, rechazos, hits locales por lease, fallback sin Redis, esperas de envíos salientes)
+    """
+    from core.rate_limiter import rate_limit_engine
+
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "rate_limiter": rate_limit_engine.get_stats()
+    }
+
+@router.get("/tenant-cache")
+async def tenant_cache_stats():
+    """
+    Cache de credenciales, channel bindings y resolución webhook -> tenant (hit rate por namespace)
+    """
+    from core.tenant_cache import tenant_cache
+
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "tenant_cache": tenant_cache.get_stats()
+    }
+
+@router.get("/lead-aggregates")
+async def lead_aggregates_stats():
+    """
+    Agregados del dashboard (lead_daily_aggregates): reconciliaciones, tenants con drift y cota de staleness
+    """
+    from services.lead_aggregates_service import lead_aggregates_service
+
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "lead_aggregates": lead_aggregates_service.get_stats()
+    }
+
+@router.get("/seller-counters")
+async def seller_counters_stats():
+    """
+    Proyección de métricas de vendedores: lecturas, reconciliaciones nocturnas y tenants con drift
+    """
+    from services.seller_counters_service import seller_counters_service
+
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "seller_counters": seller_counters_service.get_stats()
+    }
+
+@router.get("/search-index")
+async def search_index_stats():
+    """
+    Índice de búsqueda unificado: progreso del backfill de mensajes previos y lotes procesados
+    """
+    from services.search_index_service import search_index_service
+
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "search_index": search_index_service.get_stats()
+    }
+
+@router.get("/metrics-cache")
+async def metrics_cache_stats():
+    """
+    Caché de métricas en dos niveles: hits L1/L2, stale servidos, cargas coalescidas y estado del circuit breaker de Redis
+    """
+    from services.metrics_cache_service import metrics_cache_service
+
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "metrics_cache": metrics_cache_service.get_stats()
+    }
+
+@router.get("/identity-cache")
+async def identity_cache_stats():
+    """
+    Resolución de identidad (user_id -> tenant, rol, estado): aciertos por request y por proceso, consultas y round trips ahorrados
+    """
+    from core.identity import identity_resolver
+
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "identity_cache": identity_resolver.get_stats()
+    }
+
+@router.get("/lead-panels")
+async def lead_panels_cache_stats():
+    """
+    Caché de respuestas de los paneles de vendedores (mi cola, seguimientos, closer): hits, cargas e invalidaciones
+    """
+    from services.lead_enrichment_service import lead_enrichment_service
+
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "lead_panels": lead_enrichment_service.get_stats()
+    }
+
+@router.get("/db-pool")
+async def db_pool_stats():
+    """
+    Pools de PostgreSQL por lane: conexiones en uso/idle, histograma de espera de acquire y queries lentas por fingerprint
+    """
+    from db.pool import get_pool_stats
+
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "db_pool": get_pool_stats()
+    }
+
+@router.get("/http-clients")
+async def http_clients_stats():
+    """
+    Pools HTTP salientes por upstream: latencia, conexiones nuevas vs reutilizadas y errores
+    """
+    from core.http_clients import http_clients
+
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "http_clients": http_clients.get_stats()
+    }
+
+@router.get("/socketio")
+async def socketio_stats():
+    """
+    Socket.IO: client manager activo (memoria / Redis multi-worker) y batching de eventos de alta frecuencia
+    """
+    from core.socket_manager import get_socket_stats
+
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "socketio": get_socket_stats()
+    }
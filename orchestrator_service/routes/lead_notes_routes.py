@@ -14,6 +14,7 @@ from pydantic import BaseModel, Field
 
 from core.security import verify_admin_token, get_resolved_tenant_id
 from db import db
+from services.lead_enrichment_service import lead_enrichment_service
 
 logger = logging.getLogger("orchestrator")
 
@@ -232,6 +233,7 @@ async def derive_lead_to_closer(
                 updated_at = NOW()
             WHERE id = $4 AND tenant_id = $5
         """, request.closer_id, author_id, str(note_id), lead_id, tenant_id)
+        lead_enrichment_service.invalidate_tenant(tenant_id)
 
         # 8. Add "derivado_a_closer" tag
         existing_tags = lead.get("tags") or []
@@ -486,6 +488,7 @@ async def create_lead_note(
                       structured_data, visibility, is_deleted, created_at, updated_at
         """, tenant_id, lead_id, author_id, request.note_type,
            request.content.strip(), json.dumps(request.structured_data or {}), request.visibility)
+        lead_enrichment_service.invalidate_tenant(tenant_id)
 
         # Get author info
         author = await db.fetchrow(
@@ -613,6 +616,7 @@ async def update_lead_note(
             """,
             request.content.strip(), note_id, lead_id, tenant_id,
         )
+        lead_enrichment_service.invalidate_tenant(tenant_id)
 
         # Get author info
         author = await db.fetchrow(
@@ -695,6 +699,7 @@ async def delete_lead_note(
             """,
             user_id, note_id, lead_id, tenant_id,
         )
+        lead_enrichment_service.invalidate_tenant(tenant_id)
 
         # Emit real-time event (DEV-23)
         await _emit_note_event("LEAD_NOTE_DELETED", lead_id, {
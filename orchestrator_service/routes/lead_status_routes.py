@@ -5,6 +5,7 @@ from uuid import UUID
 from core.security import verify_admin_token, get_resolved_tenant_id
 from db import db
 from core.socket_notifications import sio
+from core.socket_manager import tenant_room
 from services.lead_status_service import LeadStatusService
 from services.lead_history_service import LeadHistoryService
 from modules.crm_sales.status_models import (
@@ -86,7 +87,7 @@ async def update_lead_status(
                 'old_status': old_status,
                 'new_status': status_update.new_status_id,
                 'tenant_id': tenant_id,
-            })
+            }, room=tenant_room(tenant_id))
         except Exception:
             pass  # Don't fail the request if socket emit fails
 
@@ -24,6 +24,7 @@ from core.credentials import (
     encrypt_value,
 )
 from db import db
+from core.tenant_cache import tenant_cache
 from services.meta_graph_client import (
     exchange_code,
     get_long_lived_token,
@@ -402,6 +403,7 @@ async def meta_disconnect(
         "DELETE FROM channel_bindings WHERE tenant_id = $1 AND channel IN ('facebook', 'instagram', 'whatsapp')",
         tenant_id,
     )
+    tenant_cache.invalidate_tenant(tenant_id)
 
     logger.info(f"[AUDIT] meta_disconnect_all: tenant={tenant_id}, user={user_data.user_id}")
 
@@ -481,6 +483,7 @@ async def meta_select_channels(
             "asset_type": asset["asset_type"],
         })
 
+    tenant_cache.invalidate_tenant(tenant_id)
     logger.info(
         f"[AUDIT] meta_select_channels: tenant={tenant_id}, activated={len(activated)}"
     )
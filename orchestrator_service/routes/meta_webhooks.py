@@ -7,10 +7,11 @@ from datetime import datetime
 from typing import Optional, Dict, Any, List, Union
 from fastapi import APIRouter, Request, HTTPException, Query, BackgroundTasks, Header
 
-import httpx
 
 from db import db
-from core.socket_manager import sio
+from core.socket_manager import sio, tenant_room
+from core.tenant_cache import tenant_cache, NS_WEBHOOK_TENANT
+from core.http_clients import http_clients
 
 logger = logging.getLogger("meta_webhooks")
 router = APIRouter()
@@ -85,23 +86,27 @@ async def _verify_signature(request: Request) -> bytes:
 async def _resolve_tenant_by_channel_binding(
     provider: str, channel_id: str
 ) -> Optional[int]:
-    """Resolve tenant_id via channel_bindings table."""
-    try:
+    """Resolve tenant_id via channel_bindings table (cached, see core/tenant_cache)."""
+    async def _load() -> Optional[int]:
         row = await db.fetchrow(
             "SELECT tenant_id FROM channel_bindings "
             "WHERE provider = $1 AND channel_id = $2 AND is_active = true LIMIT 1",
             provider, str(channel_id),
         )
-        if row:
-            return int(row["tenant_id"])
+        return int(row["tenant_id"]) if row else None
+
+    try:
+        return await tenant_cache.get_or_load(
+            NS_WEBHOOK_TENANT, ("binding", provider, str(channel_id)), _load
+        )
     except Exception as e:
         logger.warning(f"channel_bindings lookup failed: {e}")
     return None
 
 
 async def _resolve_tenant_by_page_id(page_id: str) -> Optional[int]:
-    """Resolve tenant via meta_tokens.page_id or business_assets."""
-    try:
+    """Resolve tenant via meta_tokens.page_id or business_assets (cached, see core/tenant_cache)."""
+    async def _load() -> Optional[int]:
         # Try meta_tokens first (backward-compatible)
         row = await db.fetchrow(
             "SELECT tenant_id FROM meta_tokens WHERE page_id = $1 LIMIT 1",
@@ -116,8 +121,10 @@ async def _resolve_tenant_by_page_id(page_id: str) -> Optional[int]:
             "WHERE external_id = $1 AND is_active = true LIMIT 1",
             str(page_id),
         )
-        if row:
-            return int(row["tenant_id"])
+        return int(row["tenant_id"]) if row else None
+
+    try:
+        return await tenant_cache.get_or_load(NS_WEBHOOK_TENANT, ("page", str(page_id)), _load)
     except Exception as e:
         logger.warning(f"page_id tenant resolution failed: {e}")
     return None
@@ -151,7 +158,7 @@ async def _forward_to_chat(normalized: Dict[str, Any], tenant_id: int):
     }
 
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with http_clients.session(timeout=30.0) as client:
             resp = await client.post(
                 f"{ORCHESTRATOR_BASE_URL}/chat",
                 json=chat_payload,
@@ -463,7 +470,7 @@ async def _resolve_sender_name(
 
         access_token = token_row["access_token"]
 
-        async with httpx.AsyncClient(timeout=5.0) as client:
+        async with http_clients.session(timeout=5.0) as client:
             if platform == "instagram":
                 resp = await client.get(
                     f"https://graph.facebook.com/{GRAPH_API_VERSION}/{sender_id}",
@@ -829,7 +836,7 @@ async def process_standard_meta_lead(
         access_token = token_row["access_token"]
 
         # 2. Fetch lead details from Graph API: GET /{leadgen_id}
-        async with httpx.AsyncClient(timeout=15.0) as client:
+        async with http_clients.session(timeout=15.0) as client:
             resp = await client.get(
                 f"https://graph.facebook.com/{GRAPH_API_VERSION}/{leadgen_id}",
                 params={"access_token": access_token},
@@ -923,7 +930,7 @@ async def process_standard_meta_lead(
             "ad_id": ad_id,
             "meta_lead_id": leadgen_id,
             "timestamp": datetime.utcnow().isoformat(),
-        })
+        }, room=tenant_room(tenant_id))
         logger.info(f"Meta lead processed: {phone} (leadgen={leadgen_id}, tenant={tenant_id})")
 
     except Exception as e:
@@ -997,7 +1004,7 @@ async def process_flattened_lead(data: Dict[str, Any], url_tenant_id: Optional[i
             "ad_id": ad_id,
             "meta_lead_id": str(meta_lead_id) if meta_lead_id else None,
             "timestamp": datetime.utcnow().isoformat(),
-        })
+        }, room=tenant_room(tenant_id))
         logger.info(f"Flattened meta lead processed: {phone} (tenant={tenant_id})")
 
     except Exception as e:
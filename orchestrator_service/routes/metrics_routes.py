@@ -87,31 +87,8 @@ async def get_realtime_team_metrics(
         # Only CEO can see team metrics
         await require_role(user_id, ["ceo"])
         
-        from db import db
-        
-        # Get all active sellers
-        sellers = await db.fetch("""
-            SELECT id, first_name, last_name, role
-            FROM users
-            WHERE tenant_id = $1
-            AND status = 'active'
-            AND role IN ('setter', 'closer', 'professional', 'ceo')
-        """, tenant_id)
-        
-        team_metrics = []
-        for seller in sellers:
-            metrics = await metrics_cache_service.get_realtime_conversation_metrics(
-                seller_id=seller['id'],
-                tenant_id=tenant_id
-            )
-            
-            team_metrics.append({
-                "seller_id": str(seller['id']),
-                "first_name": seller['first_name'],
-                "last_name": seller['last_name'],
-                "role": seller['role'],
-                "metrics": metrics
-            })
+        # One projection read for the whole team instead of one per seller
+        team_metrics = await metrics_cache_service.get_realtime_team_metrics(tenant_id)
         
         # Calculate team totals
         totals = {
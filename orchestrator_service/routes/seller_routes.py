@@ -1,6 +1,7 @@
 """
 API Routes for seller assignment and metrics management
 """
+import asyncio
 import json
 import logging
 from enum import Enum
@@ -11,6 +12,8 @@ from fastapi import APIRouter, HTTPException, Depends, Query, Path
 from pydantic import BaseModel, Field
 
 from core.security import verify_admin_token, get_resolved_tenant_id, require_role
+from services.lead_enrichment_service import lead_enrichment_service
+from services.lead_listing_service import build_queue_query
 
 logger = logging.getLogger(__name__)
 
@@ -592,13 +595,7 @@ async def get_conversation_stats(
 
 # ==================== SETTER QUEUE (DEV-20) ====================
 
-PRIORITY_ORDER = {
-    "hot": 0, "caliente": 0,
-    "warm": 1, "tibio": 1,
-    "derivado": 2,
-    "cold": 3, "new": 4,
-}
-
+# Queue priority (PRIORITY_ORDER and tag temperature) is computed in SQL, see services/lead_listing_service.py
 @router.get("/my-queue")
 async def get_my_queue(
     status: Optional[str] = Query(None, description="Filter by lead status, e.g. 'derivado', 'contacted'"),
@@ -610,130 +607,53 @@ async def get_my_queue(
     Returns leads assigned to the current seller (setter) with enriched info:
     lead data, tags, AI summary, upcoming meetings, and last 10 conversation messages.
     Ordered by priority (hot first), then by created_at.
+    Meetings and messages are fetched for the whole queue in two set queries;
+    the response is cached briefly and dropped on lead / message writes.
     """
     try:
         from db import db
 
         seller_id = UUID(user_data.user_id)
+        pool = db.read_pool or db.pool
+
+        async def _build():
+            # Tag filter (GIN idx_leads_tags) and priority ordering run in SQL
+            query, params = build_queue_query(tenant_id, seller_id, status=status, tag=tag)
+            leads_rows = await pool.fetch(query, *params)
+
+            leads = []
+            for row in leads_rows:
+                lead = dict(row)
+                lead.pop("queue_priority", None)
+                lead_tags = lead.get("tags") or []
+                if isinstance(lead_tags, str):
+                    lead_tags = json.loads(lead_tags)
+                lead["tags"] = lead_tags
+
+                # Parse score_breakdown for AI summary
+                breakdown = lead.get("score_breakdown") or {}
+                if isinstance(breakdown, str):
+                    breakdown = json.loads(breakdown)
+                lead["score_breakdown"] = breakdown
+                lead["ai_summary"] = breakdown.get("ai_derivation", {}).get("summary")
+                lead["derivation_reason"] = breakdown.get("ai_derivation", {}).get("reason")
+                lead["derived_at"] = breakdown.get("ai_derivation", {}).get("derived_at")
+
+                leads.append(lead)
+
+            # Upcoming meetings (5) and conversation history (last 10) for all leads at once
+            enriched_leads = await lead_enrichment_service.enrich_queue(pool, tenant_id, leads)
 
-        # Build query with optional filters
-        query = """
-            SELECT
-                l.id,
-                l.phone_number,
-                l.first_name,
-                l.last_name,
-                l.email,
-                l.company,
-                l.status,
-                l.source,
-                l.lead_source,
-                l.score,
-                l.score_breakdown,
-                l.tags,
-                l.estimated_value,
-                l.created_at,
-                l.updated_at,
-                l.status_changed_at,
-                l.assignment_history
-            FROM leads l
-            WHERE l.tenant_id = $1
-            AND l.assigned_seller_id = $2
-        """
-        params: list = [tenant_id, seller_id]
-        param_idx = 3
-
-        if status:
-            query += f" AND l.status = ${param_idx}"
-            params.append(status)
-            param_idx += 1
-
-        query += " ORDER BY l.updated_at DESC"
-
-        leads_rows = await db.fetch(query, *params)
-
-        # Post-process: filter by tag in Python (tags is jsonb array)
-        leads = []
-        for row in leads_rows:
-            lead = dict(row)
-            # Parse tags
-            lead_tags = lead.get("tags") or []
-            if isinstance(lead_tags, str):
-                lead_tags = json.loads(lead_tags)
-            lead["tags"] = lead_tags
-
-            # Filter by tag if specified
-            if tag and tag not in lead_tags:
-                continue
-
-            # Parse score_breakdown for AI summary
-            breakdown = lead.get("score_breakdown") or {}
-            if isinstance(breakdown, str):
-                breakdown = json.loads(breakdown)
-            lead["score_breakdown"] = breakdown
-            lead["ai_summary"] = breakdown.get("ai_derivation", {}).get("summary")
-            lead["derivation_reason"] = breakdown.get("ai_derivation", {}).get("reason")
-            lead["derived_at"] = breakdown.get("ai_derivation", {}).get("derived_at")
-
-            leads.append(lead)
-
-        # Sort by priority (hot first), then by created_at desc
-        def priority_key(lead_item):
-            lead_status = (lead_item.get("status") or "new").lower()
-            tags = lead_item.get("tags") or []
-            # Check tags for temperature
-            if "caliente" in tags or lead_status in ("hot", "caliente"):
-                p = 0
-            elif "urgente" in tags:
-                p = 0
-            elif "tibio" in tags or lead_status in ("warm", "tibio"):
-                p = 1
-            else:
-                p = PRIORITY_ORDER.get(lead_status, 3)
-            return (p, lead_item.get("created_at") or datetime.min)
-
-        leads.sort(key=priority_key)
-
-        # Enrich each lead with upcoming meetings and conversation history (last 10 messages)
-        enriched_leads = []
-        for lead in leads:
-            lead_id = lead["id"]
-            phone = lead["phone_number"]
-
-            # Upcoming meetings
-            meetings = await db.fetch("""
-                SELECT sae.id, sae.title, sae.start_datetime, sae.end_datetime, sae.status,
-                       p.first_name AS seller_first, p.last_name AS seller_last
-                FROM seller_agenda_events sae
-                LEFT JOIN professionals p ON p.id = sae.seller_id
-                WHERE sae.tenant_id = $1 AND sae.lead_id = $2
-                AND sae.status = 'scheduled'
-                AND sae.start_datetime > NOW()
-                ORDER BY sae.start_datetime ASC
-                LIMIT 5
-            """, tenant_id, lead_id)
-
-            lead["upcoming_meetings"] = [dict(m) for m in meetings]
-
-            # Conversation history (last 10 messages)
-            messages = await db.fetch("""
-                SELECT role, content, created_at
-                FROM chat_messages
-                WHERE tenant_id = $1 AND from_number = $2
-                ORDER BY created_at DESC
-                LIMIT 10
-            """, tenant_id, phone)
-
-            # Reverse to chronological order
-            lead["conversation_history"] = [dict(m) for m in reversed(messages)]
-
-            enriched_leads.append(lead)
+            return {
+                "success": True,
+                "leads": enriched_leads,
+                "count": len(enriched_leads),
+            }
 
-        return {
-            "success": True,
-            "leads": enriched_leads,
-            "count": len(enriched_leads),
-        }
+        return await lead_enrichment_service.cached_panel(
+            "my_queue", tenant_id, [seller_id, status, tag], _build,
+            phones_of=lambda result: (l["phone_number"] for l in result["leads"]),
+        )
 
     except HTTPException:
         raise
@@ -826,9 +746,11 @@ async def take_lead_from_queue(
                     ))
         """, tenant_id, seller_id, str(lead_id), phone, str(seller_id), user_data.email)
 
+        lead_enrichment_service.invalidate_tenant(tenant_id)
+
         # 6. Emit Socket.IO event
         try:
-            from core.socket_manager import sio
+            from core.socket_manager import sio, tenant_room
             await sio.emit("LEAD_TAKEN_BY_SETTER", {
                 "tenant_id": tenant_id,
                 "lead_id": str(lead_id),
@@ -836,7 +758,7 @@ async def take_lead_from_queue(
                 "name": name,
                 "setter_id": str(seller_id),
                 "timestamp": datetime.utcnow().isoformat(),
-            })
+            }, room=tenant_room(tenant_id))
         except Exception as sio_err:
             logger.warning(f"Could not emit LEAD_TAKEN_BY_SETTER socket event: {sio_err}")
 
@@ -875,132 +797,137 @@ async def get_follow_up_queue(
       - Has tag 'requiere_seguimiento', OR
       - Has a future seller_agenda_event with status 'scheduled'
     Ordered by next_contact_date ASC (overdue first, then soonest).
+    Post-call notes are fetched for the filtered leads in one query; the
+    response is cached briefly and dropped on lead / message writes.
     """
     try:
         from db import db
 
         seller_id = UUID(user_data.user_id)
+        pool = db.read_pool or db.pool
+        return await lead_enrichment_service.cached_panel(
+            "follow_up_queue", tenant_id, [seller_id, filter],
+            lambda: _build_follow_up_queue(pool, tenant_id, seller_id, filter),
+        )
 
-        # Main query: leads assigned to this seller that need follow-up
-        # We use a CTE to compute next_contact_date from agenda events or lead_notes
-        rows = await db.fetch("""
-            WITH follow_up_leads AS (
-                SELECT DISTINCT l.id
-                FROM leads l
-                WHERE l.tenant_id = $1
-                  AND l.assigned_seller_id = $2
-                  AND (
-                    l.tags::jsonb ? 'requiere_seguimiento'
-                    OR EXISTS (
-                        SELECT 1 FROM seller_agenda_events sae
-                        WHERE sae.lead_id = l.id
-                          AND sae.tenant_id = $1
-                          AND sae.status = 'scheduled'
-                    )
-                  )
-            ),
-            lead_next_contact AS (
-                SELECT
-                    fl.id AS lead_id,
-                    LEAST(
-                        (SELECT MIN(sae.start_datetime) FROM seller_agenda_events sae
-                         WHERE sae.lead_id = fl.id AND sae.tenant_id = $1 AND sae.status = 'scheduled'),
-                        (SELECT (ln.structured_data->>'next_contact_date')::timestamptz
-                         FROM lead_notes ln
-                         WHERE ln.lead_id = fl.id AND ln.tenant_id = $1
-                           AND ln.note_type IN ('post_call', 'follow_up')
-                           AND ln.structured_data->>'next_contact_date' IS NOT NULL
-                         ORDER BY ln.created_at DESC LIMIT 1)
-                    ) AS next_contact_date,
-                    (SELECT ln.content FROM lead_notes ln
-                     WHERE ln.lead_id = fl.id AND ln.tenant_id = $1
-                     ORDER BY ln.created_at DESC LIMIT 1) AS last_note_content,
-                    (SELECT ln.created_at FROM lead_notes ln
-                     WHERE ln.lead_id = fl.id AND ln.tenant_id = $1
-                     ORDER BY ln.created_at DESC LIMIT 1) AS last_note_at
-                FROM follow_up_leads fl
-            )
-            SELECT
-                l.id, l.phone_number, l.first_name, l.last_name, l.email,
-                l.company, l.status, l.source, l.lead_source,
-                l.score, l.tags, l.estimated_value,
-                l.created_at, l.updated_at,
-                lnc.next_contact_date,
-                lnc.last_note_content,
-                lnc.last_note_at,
-                EXTRACT(DAY FROM NOW() - COALESCE(lnc.last_note_at, l.updated_at))::int AS days_since_last_contact,
-                CASE WHEN lnc.next_contact_date < NOW() THEN TRUE ELSE FALSE END AS is_overdue
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting follow-up queue: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def _build_follow_up_queue(pool, tenant_id: int, seller_id: UUID, filter: Optional[str]) -> dict:
+    """Follow-up queue payload (uncached), see get_follow_up_queue."""
+    # Main query: leads assigned to this seller that need follow-up
+    # We use a CTE to compute next_contact_date from agenda events or lead_notes
+    rows = await pool.fetch("""
+        WITH follow_up_leads AS (
+            SELECT DISTINCT l.id
             FROM leads l
-            JOIN lead_next_contact lnc ON lnc.lead_id = l.id
             WHERE l.tenant_id = $1
-            ORDER BY
-                CASE WHEN lnc.next_contact_date < NOW() THEN 0 ELSE 1 END ASC,
-                lnc.next_contact_date ASC NULLS LAST
-        """, tenant_id, seller_id)
-
-        results = []
-        now = datetime.utcnow()
-        for row in rows:
-            item = dict(row)
-
-            # Parse tags
-            lead_tags = item.get("tags") or []
-            if isinstance(lead_tags, str):
-                lead_tags = json.loads(lead_tags)
-            item["tags"] = lead_tags
-
-            # Fetch post-call notes for this lead (DEV-24 enrichment)
-            post_call_notes = await db.fetch("""
-                SELECT ln.id, ln.author_id, ln.note_type, ln.content, ln.structured_data, ln.visibility, ln.created_at,
-                       u.first_name AS author_first_name, u.last_name AS author_last_name, u.role AS author_role
-                FROM lead_notes ln
-                LEFT JOIN users u ON ln.author_id = u.id
-                WHERE ln.lead_id = $1 AND ln.tenant_id = $2 AND ln.note_type = 'post_call'
-                ORDER BY ln.created_at DESC
-                LIMIT 5
-            """, item["id"], tenant_id)
-            item["post_call_notes"] = [dict(n) for n in post_call_notes]
-
-            # Apply filters
-            next_dt = item.get("next_contact_date")
-            is_overdue = item.get("is_overdue", False)
-
-            if filter == "overdue":
-                if not is_overdue:
-                    continue
-            elif filter == "today":
-                if next_dt is None:
-                    continue
-                if hasattr(next_dt, 'date'):
-                    if next_dt.date() != now.date():
-                        continue
-                else:
-                    continue
-            elif filter == "this_week":
-                if next_dt is None:
+              AND l.assigned_seller_id = $2
+              AND (
+                l.tags::jsonb ? 'requiere_seguimiento'
+                OR EXISTS (
+                    SELECT 1 FROM seller_agenda_events sae
+                    WHERE sae.lead_id = l.id
+                      AND sae.tenant_id = $1
+                      AND sae.status = 'scheduled'
+                )
+              )
+        ),
+        lead_next_contact AS (
+            SELECT
+                fl.id AS lead_id,
+                LEAST(
+                    (SELECT MIN(sae.start_datetime) FROM seller_agenda_events sae
+                     WHERE sae.lead_id = fl.id AND sae.tenant_id = $1 AND sae.status = 'scheduled'),
+                    (SELECT (ln.structured_data->>'next_contact_date')::timestamptz
+                     FROM lead_notes ln
+                     WHERE ln.lead_id = fl.id AND ln.tenant_id = $1
+                       AND ln.note_type IN ('post_call', 'follow_up')
+                       AND ln.structured_data->>'next_contact_date' IS NOT NULL
+                     ORDER BY ln.created_at DESC LIMIT 1)
+                ) AS next_contact_date,
+                (SELECT ln.content FROM lead_notes ln
+                 WHERE ln.lead_id = fl.id AND ln.tenant_id = $1
+                 ORDER BY ln.created_at DESC LIMIT 1) AS last_note_content,
+                (SELECT ln.created_at FROM lead_notes ln
+                 WHERE ln.lead_id = fl.id AND ln.tenant_id = $1
+                 ORDER BY ln.created_at DESC LIMIT 1) AS last_note_at
+            FROM follow_up_leads fl
+        )
+        SELECT
+            l.id, l.phone_number, l.first_name, l.last_name, l.email,
+            l.company, l.status, l.source, l.lead_source,
+            l.score, l.tags, l.estimated_value,
+            l.created_at, l.updated_at,
+            lnc.next_contact_date,
+            lnc.last_note_content,
+            lnc.last_note_at,
+            EXTRACT(DAY FROM NOW() - COALESCE(lnc.last_note_at, l.updated_at))::int AS days_since_last_contact,
+            CASE WHEN lnc.next_contact_date < NOW() THEN TRUE ELSE FALSE END AS is_overdue
+        FROM leads l
+        JOIN lead_next_contact lnc ON lnc.lead_id = l.id
+        WHERE l.tenant_id = $1
+        ORDER BY
+            CASE WHEN lnc.next_contact_date < NOW() THEN 0 ELSE 1 END ASC,
+            lnc.next_contact_date ASC NULLS LAST
+    """, tenant_id, seller_id)
+
+    results = []
+    now = datetime.utcnow()
+    for row in rows:
+        item = dict(row)
+
+        # Parse tags
+        lead_tags = item.get("tags") or []
+        if isinstance(lead_tags, str):
+            lead_tags = json.loads(lead_tags)
+        item["tags"] = lead_tags
+
+        # Apply filters
+        next_dt = item.get("next_contact_date")
+        is_overdue = item.get("is_overdue", False)
+
+        if filter == "overdue":
+            if not is_overdue:
+                continue
+        elif filter == "today":
+            if next_dt is None:
+                continue
+            if hasattr(next_dt, 'date'):
+                if next_dt.date() != now.date():
                     continue
-                if hasattr(next_dt, 'date'):
-                    from datetime import timedelta
-                    week_start = now.date() - timedelta(days=now.weekday())
-                    week_end = week_start + timedelta(days=6)
-                    if not (week_start <= next_dt.date() <= week_end):
-                        continue
-                else:
+            else:
+                continue
+        elif filter == "this_week":
+            if next_dt is None:
+                continue
+            if hasattr(next_dt, 'date'):
+                from datetime import timedelta
+                week_start = now.date() - timedelta(days=now.weekday())
+                week_end = week_start + timedelta(days=6)
+                if not (week_start <= next_dt.date() <= week_end):
                     continue
+            else:
+                continue
 
-            results.append(item)
+        results.append(item)
 
-        return {
-            "success": True,
-            "leads": results,
-            "count": len(results),
-        }
+    # Post-call notes (DEV-24 enrichment), last 5 per lead, only for the leads that passed the filter
+    post_call_notes = await lead_enrichment_service.recent_notes(
+        pool, tenant_id, (item["id"] for item in results), ["post_call"], per_lead=5
+    )
+    for item in results:
+        item["post_call_notes"] = post_call_notes.get(item["id"], [])
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error getting follow-up queue: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "success": True,
+        "leads": results,
+        "count": len(results),
+    }
 
 
 @router.post("/follow-up-queue/{lead_id}/complete-followup")
@@ -1118,6 +1045,8 @@ async def complete_follow_up(
                 f"Follow-up {action_desc} by {user_data.email}: {request.result}",
             )
 
+        lead_enrichment_service.invalidate_tenant(tenant_id)
+
         # 8. Log system event
         await db.execute("""
             INSERT INTO system_events
@@ -1178,200 +1107,217 @@ async def get_closer_panel(
     """
     DEV-22: Closer panel — returns all assigned calls grouped by today/tomorrow/this_week/later.
     Each call includes prospect info, setter handoff notes, tags, and last 5 chat messages.
+    The response is cached briefly and dropped on lead / message writes.
     """
     try:
         from db import db
 
         user_id = UUID(user_data.user_id)
-
-        # Resolve the seller's professionals.id (seller_agenda_events.seller_id references professionals.id)
-        seller_id = await db.fetchval(
-            "SELECT id FROM professionals WHERE user_id = $1 AND tenant_id = $2",
-            user_id, tenant_id
+        pool = db.read_pool or db.pool
+        return await lead_enrichment_service.cached_panel(
+            "closer_panel", tenant_id, [user_id, status_filter, date_from, date_to],
+            lambda: _build_closer_panel(pool, tenant_id, user_id, status_filter, date_from, date_to),
+            phones_of=lambda result: (
+                entry["lead"]["phone"]
+                for entries in result["groups"].values() for entry in entries
+                if entry["lead"]
+            ),
         )
-        # Fallback: try sellers table if professionals doesn't have this user
-        if seller_id is None:
-            seller_id = await db.fetchval(
-                "SELECT id FROM sellers WHERE user_id = $1 AND tenant_id = $2",
-                user_id, tenant_id
-            )
-
-        if seller_id is None:
-            return {
-                "success": True,
-                "groups": {"today": [], "tomorrow": [], "this_week": [], "later": []},
-                "total": 0,
-                "summary": {"today": 0, "tomorrow": 0, "this_week": 0, "later": 0},
-            }
 
-        # Build dynamic WHERE clause
-        where_clauses = [
-            "sae.seller_id = $1",
-            "sae.tenant_id = $2",
-        ]
-        params: list = [seller_id, tenant_id]
-        param_idx = 3
-
-        if status_filter:
-            where_clauses.append(f"sae.status = ${param_idx}")
-            params.append(status_filter)
-            param_idx += 1
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting closer panel: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-        if date_from:
-            where_clauses.append(f"sae.start_datetime >= ${param_idx}::date")
-            params.append(date_from)
-            param_idx += 1
 
-        if date_to:
-            where_clauses.append(f"sae.start_datetime < (${param_idx}::date + INTERVAL '1 day')")
-            params.append(date_to)
-            param_idx += 1
+async def _build_closer_panel(
+    pool, tenant_id: int, user_id: UUID,
+    status_filter: Optional[str], date_from: Optional[str], date_to: Optional[str],
+) -> dict:
+    """Closer panel payload (uncached), see get_closer_panel."""
+    # Resolve the seller's professionals.id (seller_agenda_events.seller_id references professionals.id)
+    seller_id = await pool.fetchval(
+        "SELECT id FROM professionals WHERE user_id = $1 AND tenant_id = $2",
+        user_id, tenant_id
+    )
+    # Fallback: try sellers table if professionals doesn't have this user
+    if seller_id is None:
+        seller_id = await pool.fetchval(
+            "SELECT id FROM sellers WHERE user_id = $1 AND tenant_id = $2",
+            user_id, tenant_id
+        )
 
-        where_sql = " AND ".join(where_clauses)
+    if seller_id is None:
+        return {
+            "success": True,
+            "groups": {"today": [], "tomorrow": [], "this_week": [], "later": []},
+            "total": 0,
+            "summary": {"today": 0, "tomorrow": 0, "this_week": 0, "later": 0},
+        }
 
-        # Main query: events + lead info
-        events = await db.fetch(f"""
-            SELECT
-                sae.id AS event_id,
-                sae.title,
-                sae.start_datetime,
-                sae.end_datetime,
-                sae.notes AS event_notes,
-                sae.source,
-                sae.status AS event_status,
-                sae.lead_id,
-                sae.created_at AS event_created_at,
-                -- Lead info
-                l.first_name AS lead_first_name,
-                l.last_name AS lead_last_name,
-                l.phone_number AS lead_phone,
-                l.email AS lead_email,
-                l.tags AS lead_tags,
-                l.score AS lead_score,
-                l.status AS lead_status,
-                l.source AS lead_source,
-                l.company AS lead_company,
-                l.estimated_value AS lead_estimated_value,
-                -- Date grouping
-                CASE
-                    WHEN sae.start_datetime::date = CURRENT_DATE THEN 'today'
-                    WHEN sae.start_datetime::date = CURRENT_DATE + 1 THEN 'tomorrow'
-                    WHEN sae.start_datetime::date <= (CURRENT_DATE + INTERVAL '7 days') THEN 'this_week'
-                    ELSE 'later'
-                END AS date_group
-            FROM seller_agenda_events sae
-            LEFT JOIN leads l ON sae.lead_id = l.id AND l.tenant_id = $2
-            WHERE {where_sql}
-            ORDER BY sae.start_datetime ASC
-        """, *params)
-
-        # Collect lead_ids and event data for enrichment
-        event_list = [dict(e) for e in events]
-        lead_ids = [e["lead_id"] for e in event_list if e.get("lead_id")]
-
-        # Fetch handoff notes for all relevant leads (batch)
-        handoff_notes_map: dict = {}
-        if lead_ids:
-            notes_rows = await db.fetch("""
-                SELECT ln.lead_id, ln.content, ln.note_type, ln.created_at,
-                       u.first_name AS author_first_name,
-                       u.last_name AS author_last_name,
-                       u.role AS author_role
-                FROM lead_notes ln
-                LEFT JOIN users u ON ln.author_id = u.id
-                WHERE ln.lead_id = ANY($1::uuid[])
-                  AND ln.tenant_id = $2
-                  AND ln.note_type IN ('handoff', 'post_call', 'follow_up')
-                ORDER BY ln.created_at DESC
-            """, lead_ids, tenant_id)
-
-            for nr in notes_rows:
-                lid = str(nr["lead_id"])
-                if lid not in handoff_notes_map:
-                    handoff_notes_map[lid] = []
-                handoff_notes_map[lid].append({
-                    "content": nr["content"],
-                    "note_type": nr["note_type"],
-                    "author": f"{nr['author_first_name'] or ''} {nr['author_last_name'] or ''}".strip(),
-                    "author_role": nr["author_role"],
-                    "created_at": nr["created_at"].isoformat() if nr["created_at"] else None,
-                })
-
-        # Fetch last 5 chat messages per lead phone (batch)
-        chat_map: dict = {}
-        phones = list(set(e["lead_phone"] for e in event_list if e.get("lead_phone")))
-        if phones:
-            for phone in phones:
-                msgs = await db.fetch("""
-                    SELECT role, content, created_at
-                    FROM chat_messages
-                    WHERE from_number = $1 AND tenant_id = $2
-                    ORDER BY created_at DESC
-                    LIMIT 5
-                """, phone, tenant_id)
-                chat_map[phone] = [
-                    {
-                        "role": m["role"],
-                        "content": m["content"],
-                        "created_at": m["created_at"].isoformat() if m["created_at"] else None,
-                    }
-                    for m in reversed(msgs)
-                ]
-
-        # Group events
-        groups: dict = {"today": [], "tomorrow": [], "this_week": [], "later": []}
-        for ev in event_list:
-            lead_id_str = str(ev["lead_id"]) if ev.get("lead_id") else None
-            phone = ev.get("lead_phone")
-
-            entry = {
-                "event_id": str(ev["event_id"]),
-                "title": ev["title"],
-                "start_datetime": ev["start_datetime"].isoformat() if ev["start_datetime"] else None,
-                "end_datetime": ev["end_datetime"].isoformat() if ev["end_datetime"] else None,
-                "event_notes": ev["event_notes"],
-                "source": ev["source"],
-                "status": ev["event_status"],
-                "created_at": ev["event_created_at"].isoformat() if ev["event_created_at"] else None,
-                "lead": {
-                    "id": lead_id_str,
-                    "first_name": ev.get("lead_first_name"),
-                    "last_name": ev.get("lead_last_name"),
-                    "phone": phone,
-                    "email": ev.get("lead_email"),
-                    "tags": ev.get("lead_tags") or [],
-                    "score": ev.get("lead_score") or 0,
-                    "status": ev.get("lead_status"),
-                    "source": ev.get("lead_source"),
-                    "company": ev.get("lead_company"),
-                    "estimated_value": float(ev["lead_estimated_value"]) if ev.get("lead_estimated_value") else 0,
-                } if lead_id_str else None,
-                "handoff_notes": handoff_notes_map.get(lead_id_str, []) if lead_id_str else [],
-                "recent_messages": chat_map.get(phone, []) if phone else [],
+    # Build dynamic WHERE clause
+    where_clauses = [
+        "sae.seller_id = $1",
+        "sae.tenant_id = $2",
+    ]
+    params: list = [seller_id, tenant_id]
+    param_idx = 3
+
+    if status_filter:
+        where_clauses.append(f"sae.status = ${param_idx}")
+        params.append(status_filter)
+        param_idx += 1
+
+    if date_from:
+        where_clauses.append(f"sae.start_datetime >= ${param_idx}::date")
+        params.append(date_from)
+        param_idx += 1
+
+    if date_to:
+        where_clauses.append(f"sae.start_datetime < (${param_idx}::date + INTERVAL '1 day')")
+        params.append(date_to)
+        param_idx += 1
+
+    where_sql = " AND ".join(where_clauses)
+
+    # Main query: events + lead info
+    events = await pool.fetch(f"""
+        SELECT
+            sae.id AS event_id,
+            sae.title,
+            sae.start_datetime,
+            sae.end_datetime,
+            sae.notes AS event_notes,
+            sae.source,
+            sae.status AS event_status,
+            sae.lead_id,
+            sae.created_at AS event_created_at,
+            -- Lead info
+            l.first_name AS lead_first_name,
+            l.last_name AS lead_last_name,
+            l.phone_number AS lead_phone,
+            l.email AS lead_email,
+            l.tags AS lead_tags,
+            l.score AS lead_score,
+            l.status AS lead_status,
+            l.source AS lead_source,
+            l.company AS lead_company,
+            l.estimated_value AS lead_estimated_value,
+            -- Date grouping
+            CASE
+                WHEN sae.start_datetime::date = CURRENT_DATE THEN 'today'
+                WHEN sae.start_datetime::date = CURRENT_DATE + 1 THEN 'tomorrow'
+                WHEN sae.start_datetime::date <= (CURRENT_DATE + INTERVAL '7 days') THEN 'this_week'
+                ELSE 'later'
+            END AS date_group
+        FROM seller_agenda_events sae
+        LEFT JOIN leads l ON sae.lead_id = l.id AND l.tenant_id = $2
+        WHERE {where_sql}
+        ORDER BY sae.start_datetime ASC
+    """, *params)
+
+    # Collect lead_ids and event data for enrichment
+    event_list = [dict(e) for e in events]
+    lead_ids = [e["lead_id"] for e in event_list if e.get("lead_id")]
+
+    # Handoff notes and the last 5 chat messages per lead phone, both batched and concurrent
+    async def _handoff_notes() -> dict:
+        notes_map: dict = {}
+        if not lead_ids:
+            return notes_map
+        notes_rows = await pool.fetch("""
+            SELECT ln.lead_id, ln.content, ln.note_type, ln.created_at,
+                   u.first_name AS author_first_name,
+                   u.last_name AS author_last_name,
+                   u.role AS author_role
+            FROM lead_notes ln
+            LEFT JOIN users u ON ln.author_id = u.id
+            WHERE ln.lead_id = ANY($1::uuid[])
+              AND ln.tenant_id = $2
+              AND ln.note_type IN ('handoff', 'post_call', 'follow_up')
+            ORDER BY ln.created_at DESC
+        """, lead_ids, tenant_id)
+
+        for nr in notes_rows:
+            lid = str(nr["lead_id"])
+            if lid not in notes_map:
+                notes_map[lid] = []
+            notes_map[lid].append({
+                "content": nr["content"],
+                "note_type": nr["note_type"],
+                "author": f"{nr['author_first_name'] or ''} {nr['author_last_name'] or ''}".strip(),
+                "author_role": nr["author_role"],
+                "created_at": nr["created_at"].isoformat() if nr["created_at"] else None,
+            })
+        return notes_map
+
+    handoff_notes_map, messages = await asyncio.gather(
+        _handoff_notes(),
+        lead_enrichment_service.recent_messages(
+            pool, tenant_id, (e.get("lead_phone") for e in event_list), per_phone=5
+        ),
+    )
+    chat_map = {
+        phone: [
+            {
+                "role": m["role"],
+                "content": m["content"],
+                "created_at": m["created_at"].isoformat() if m["created_at"] else None,
             }
+            for m in msgs
+        ]
+        for phone, msgs in messages.items()
+    }
+
+    # Group events
+    groups: dict = {"today": [], "tomorrow": [], "this_week": [], "later": []}
+    for ev in event_list:
+        lead_id_str = str(ev["lead_id"]) if ev.get("lead_id") else None
+        phone = ev.get("lead_phone")
+
+        entry = {
+            "event_id": str(ev["event_id"]),
+            "title": ev["title"],
+            "start_datetime": ev["start_datetime"].isoformat() if ev["start_datetime"] else None,
+            "end_datetime": ev["end_datetime"].isoformat() if ev["end_datetime"] else None,
+            "event_notes": ev["event_notes"],
+            "source": ev["source"],
+            "status": ev["event_status"],
+            "created_at": ev["event_created_at"].isoformat() if ev["event_created_at"] else None,
+            "lead": {
+                "id": lead_id_str,
+                "first_name": ev.get("lead_first_name"),
+                "last_name": ev.get("lead_last_name"),
+                "phone": phone,
+                "email": ev.get("lead_email"),
+                "tags": ev.get("lead_tags") or [],
+                "score": ev.get("lead_score") or 0,
+                "status": ev.get("lead_status"),
+                "source": ev.get("lead_source"),
+                "company": ev.get("lead_company"),
+                "estimated_value": float(ev["lead_estimated_value"]) if ev.get("lead_estimated_value") else 0,
+            } if lead_id_str else None,
+            "handoff_notes": handoff_notes_map.get(lead_id_str, []) if lead_id_str else [],
+            "recent_messages": chat_map.get(phone, []) if phone else [],
+        }
 
-            group_key = ev.get("date_group", "later")
-            groups.setdefault(group_key, []).append(entry)
+        group_key = ev.get("date_group", "later")
+        groups.setdefault(group_key, []).append(entry)
 
-        total = sum(len(v) for v in groups.values())
+    total = sum(len(v) for v in groups.values())
 
-        return {
-            "success": True,
-            "groups": groups,
-            "total": total,
-            "summary": {
-                "today": len(groups.get("today", [])),
-                "tomorrow": len(groups.get("tomorrow", [])),
-                "this_week": len(groups.get("this_week", [])),
-                "later": len(groups.get("later", [])),
-            }
+    return {
+        "success": True,
+        "groups": groups,
+        "total": total,
+        "summary": {
+            "today": len(groups.get("today", [])),
+            "tomorrow": len(groups.get("tomorrow", [])),
+            "this_week": len(groups.get("this_week", [])),
+            "later": len(groups.get("later", [])),
         }
-
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error getting closer panel: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    }
 
 
 @router.post("/closer-panel/{event_id}/complete", dependencies=[Depends(require_role(["closer", "ceo"]))])
@@ -1503,6 +1449,7 @@ async def complete_closer_call(
                 except Exception as notif_err:
                     logger.warning(f"Could not send setter notification: {notif_err}")
 
+        lead_enrichment_service.invalidate_tenant(tenant_id)
         return {
             "success": True,
             "message": f"Call marked as completed with result: {call_result}",
@@ -16,6 +16,7 @@ from pydantic import BaseModel, EmailStr
 
 from db import db
 from auth_service import auth_service
+from core.identity import invalidate_identity
 from core.security import verify_admin_token, get_resolved_tenant_id, require_role
 
 logger = logging.getLogger("user_management")
@@ -103,6 +104,8 @@ async def _create_user_and_seller(
         )
     except Exception as e:
         logger.warning(f"Could not create seller record for {email}: {e}")
+    # The seller row decides the resolved tenant
+    invalidate_identity(user_id)
 
     return {
         "id": str(user_id),
@@ -0,0 +1,146 @@
+"""
+DEV-50 — Benchmark de generación de candidatos duplicados (índice lead_dedup_keys).
+
+Siembra N leads sintéticos en un tenant de prueba (el trigger del Parche 43 mantiene
+las claves de bloqueo), y mide:
+  - insert_rows_per_sec: alta de leads incluyendo mantenimiento del índice
+  - single_lead: find_duplicates_for_lead (candidatos/seg)
+  - incremental: run_incremental_dedup sobre una muestra de leads modificados
+
+Uso (contra una base de pruebas, NUNCA producción):
+    POSTGRES_DSN=postgresql://... python scripts/benchmark_dedup.py --tenant-id 999 --sizes 100000 1000000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import asyncpg
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.deduplication_service import (  # noqa: E402
+    DEDUP_WATERMARK_OVERLAP,
+    find_duplicates_for_lead,
+    run_incremental_dedup,
+)
+
+BENCH_SOURCE = "dedup_benchmark"
+
+FIRST_NAMES = [
+    "maria", "juan", "jose", "ana", "carlos", "lucia", "martin", "sofia", "diego", "valentina",
+    "pablo", "camila", "javier", "florencia", "nicolas", "agustina", "matias", "julieta", "lucas", "paula",
+]
+LAST_NAMES = [
+    "gonzalez", "rodriguez", "gomez", "fernandez", "lopez", "diaz", "martinez", "perez", "garcia", "sanchez",
+    "romero", "sosa", "alvarez", "torres", "ruiz", "ramirez", "flores", "benitez", "acosta", "medina",
+    "herrera", "suarez", "aguirre", "gimenez", "gutierrez", "pereyra", "rojas", "molina", "castro", "ortiz",
+]
+
+
+async def _seed(conn, tenant_id: int, size: int) -> float:
+    """Inserta `size` leads sintéticos (~2% de teléfonos y ~7% de emails duplicados). Devuelve filas/seg."""
+    started = time.perf_counter()
+    await conn.execute(
+        """
+        INSERT INTO leads (tenant_id, phone_number, first_name, last_name, email, status, source)
+        SELECT $1,
+               -- cada 50 filas: mismo número que la anterior en otro formato (phone_number es único por tenant)
+               CASE WHEN g % 50 = 0 THEN '+54 9 11 ' || lpad(((g - 1) % 100000000)::text, 8, '0')
+                    ELSE '54911' || lpad((g % 100000000)::text, 8, '0') END,
+               ($2::text[])[1 + (g * 7) % array_length($2::text[], 1)],
+               ($3::text[])[1 + (g * 13) % array_length($3::text[], 1)]
+                   || CASE WHEN g % 3 = 0 THEN ' ' || ($3::text[])[1 + g % array_length($3::text[], 1)] ELSE '' END,
+               CASE WHEN g % 4 = 0 THEN 'lead' || (CASE WHEN g % 60 = 0 THEN g - 4 ELSE g END) || '@example.com' END,
+               'new', $4
+        FROM generate_series(1, $5) AS g
+        """,
+        tenant_id, FIRST_NAMES, LAST_NAMES, BENCH_SOURCE, size,
+    )
+    return size / (time.perf_counter() - started)
+
+
+async def _bench_single(pool, tenant_id: int, samples: int) -> dict:
+    rows = await pool.fetch(
+        "SELECT id, phone_number, email, first_name, last_name FROM leads "
+        "WHERE tenant_id = $1 AND source = $2 ORDER BY random() LIMIT $3",
+        tenant_id, BENCH_SOURCE, samples,
+    )
+    candidates = 0
+    started = time.perf_counter()
+    for r in rows:
+        dups = await find_duplicates_for_lead(
+            tenant_id, str(r["id"]), r["phone_number"], r["email"],
+            r["first_name"] or "", r["last_name"] or "", pool,
+        )
+        candidates += len(dups)
+    elapsed = time.perf_counter() - started
+    return {
+        "leads": len(rows),
+        "candidates": candidates,
+        "leads_per_sec": round(len(rows) / elapsed, 1) if elapsed else None,
+        "candidates_per_sec": round(candidates / elapsed, 1) if elapsed else None,
+        "avg_ms_per_lead": round(elapsed * 1000 / len(rows), 2) if rows else None,
+    }
+
+
+async def _bench_incremental(pool, tenant_id: int, touched: int) -> dict:
+    # Checkpoint "ahora" (compensando el solapamiento del watermark) y luego modifica una muestra
+    await pool.execute(
+        "INSERT INTO dedup_checkpoints (tenant_id, last_run_at) VALUES ($1, NOW() + $2::interval) "
+        "ON CONFLICT (tenant_id) DO UPDATE SET last_run_at = EXCLUDED.last_run_at",
+        tenant_id, DEDUP_WATERMARK_OVERLAP,
+    )
+    await pool.execute(
+        """
+        UPDATE leads SET first_name = first_name || ' '
+        WHERE id IN (SELECT id FROM leads WHERE tenant_id = $1 AND source = $2 ORDER BY random() LIMIT $3)
+        """,
+        tenant_id, BENCH_SOURCE, touched,
+    )
+    started = time.perf_counter()
+    stats = await run_incremental_dedup(tenant_id, pool)
+    elapsed = time.perf_counter() - started
+    return {
+        **stats,
+        "seconds": round(elapsed, 2),
+        "candidate_pairs_per_sec": round(stats["candidate_pairs"] / elapsed, 1) if elapsed else None,
+    }
+
+
+async def _cleanup(pool, tenant_id: int):
+    await pool.execute("DELETE FROM duplicate_candidates WHERE tenant_id = $1", tenant_id)
+    await pool.execute("DELETE FROM leads WHERE tenant_id = $1 AND source = $2", tenant_id, BENCH_SOURCE)
+    await pool.execute("DELETE FROM dedup_checkpoints WHERE tenant_id = $1", tenant_id)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark de deduplicación por índice de bloqueo")
+    parser.add_argument("--tenant-id", type=int, required=True, help="Tenant de pruebas (debe existir)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--samples", type=int, default=500, help="Leads consultados en el modo single")
+    parser.add_argument("--touched", type=int, default=5_000, help="Leads modificados para el modo incremental")
+    parser.add_argument("--dsn", default=os.getenv("POSTGRES_DSN", "").replace("+asyncpg", ""))
+    args = parser.parse_args()
+
+    pool = await asyncpg.create_pool(args.dsn, min_size=1, max_size=4)
+    try:
+        for size in args.sizes:
+            await _cleanup(pool, args.tenant_id)
+            async with pool.acquire() as conn:
+                insert_rate = await _seed(conn, args.tenant_id, size)
+                await conn.execute("ANALYZE leads; ANALYZE lead_dedup_keys;")
+            keys = await pool.fetchval("SELECT COUNT(*) FROM lead_dedup_keys WHERE tenant_id = $1", args.tenant_id)
+
+            print(f"\n=== {size:,} leads (tenant {args.tenant_id}) ===")
+            print(f"insert_rows_per_sec: {insert_rate:,.0f}  dedup_keys: {keys:,}")
+            print(f"single_lead: {await _bench_single(pool, args.tenant_id, args.samples)}")
+            print(f"incremental: {await _bench_incremental(pool, args.tenant_id, args.touched)}")
+    finally:
+        await _cleanup(pool, args.tenant_id)
+        await pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,146 @@
+"""
+Benchmark de paginación de /leads — OFFSET vs keyset (created_at, id) por profundidad de página.
+
+Siembra N leads sintéticos en un tenant de prueba y mide la latencia (mediana de
+--repeats ejecuciones) de la misma página en ambos modos, usando las queries de
+services/lead_listing_service.py:
+  - offset: LIMIT/OFFSET, el costo crece con la profundidad
+  - keyset: cursor de la página anterior, busca la posición por índice (Parche 49)
+También mide el filtro por tags en la base (GIN) y la búsqueda por trigramas.
+
+Con --max-ratio el script termina con código 1 si la página más profunda en modo
+keyset tarda más de max-ratio veces la primera (latencia plana).
+
+Uso (contra una base de pruebas, NUNCA producción):
+    POSTGRES_DSN=postgresql://... python scripts/benchmark_lead_listing.py --tenant-id 999 --size 500000
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+import asyncpg
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.lead_listing_service import build_lead_list_query, encode_lead_cursor  # noqa: E402
+
+BENCH_SOURCE = "listing_benchmark"
+TAGS = ["caliente", "tibio", "frio", "derivado_por_ia", "urgente", "requiere_seguimiento"]
+
+
+async def _init(conn):
+    await conn.set_type_codec("jsonb", encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+
+
+async def _seed(conn, tenant_id: int, size: int) -> float:
+    """Inserta `size` leads sintéticos con created_at repartido en un año y 0-2 tags. Devuelve filas/seg."""
+    started = time.perf_counter()
+    await conn.execute(
+        """
+        INSERT INTO leads (tenant_id, phone_number, first_name, last_name, email, status, source, tags, created_at)
+        SELECT $1, '54900' || lpad(g::text, 9, '0'), 'nombre' || (g % 997), 'apellido' || (g % 991),
+               CASE WHEN g % 3 = 0 THEN 'bench' || g || '@example.com' END,
+               'new', $2,
+               to_jsonb(ARRAY_REMOVE(ARRAY[($3::text[])[1 + g % 6], CASE WHEN g % 4 = 0 THEN ($3::text[])[1 + (g / 7) % 6] END], NULL)),
+               NOW() - (g % 525600) * INTERVAL '1 minute'
+        FROM generate_series(1, $4) AS g
+        """,
+        tenant_id, BENCH_SOURCE, TAGS, size,
+    )
+    return size / (time.perf_counter() - started)
+
+
+async def _timed(pool, query: str, params: list, repeats: int) -> tuple:
+    samples = []
+    rows = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        rows = await pool.fetch(query, *params)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), rows
+
+
+async def _bench_depths(pool, tenant_id: int, page_size: int, pages: list, repeats: int) -> list:
+    results = []
+    for page in pages:
+        offset = page * page_size
+        query, params = build_lead_list_query(tenant_id, limit=page_size, offset=offset)
+        offset_ms, _ = await _timed(pool, query, params, repeats)
+
+        # Cursor = último lead de la página anterior (lo que devolvería X-Next-Cursor)
+        if page == 0:
+            cursor = None
+        else:
+            prev = await pool.fetchrow(
+                """
+                SELECT created_at, id FROM leads
+                WHERE tenant_id = $1 AND status IS DISTINCT FROM 'deleted'
+                ORDER BY created_at DESC, id DESC OFFSET $2 LIMIT 1
+                """,
+                tenant_id, offset - 1,
+            )
+            if prev is None:
+                break
+            cursor = encode_lead_cursor(prev["created_at"], prev["id"])
+        query, params = build_lead_list_query(tenant_id, limit=page_size, cursor=cursor)
+        keyset_ms, _ = await _timed(pool, query, params, repeats)
+        results.append({"page": page, "offset_ms": round(offset_ms, 2), "keyset_ms": round(keyset_ms, 2)})
+    return results
+
+
+async def _bench_filters(pool, tenant_id: int, page_size: int, repeats: int) -> dict:
+    query, params = build_lead_list_query(tenant_id, limit=page_size, tags=["urgente"])
+    tags_ms, _ = await _timed(pool, query, params, repeats)
+    query, params = build_lead_list_query(tenant_id, limit=page_size, search="apellido42")
+    search_ms, _ = await _timed(pool, query, params, repeats)
+    return {"tags_ms": round(tags_ms, 2), "search_ms": round(search_ms, 2)}
+
+
+async def _cleanup(pool, tenant_id: int):
+    await pool.execute("DELETE FROM leads WHERE tenant_id = $1 AND source = $2", tenant_id, BENCH_SOURCE)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark de paginación OFFSET vs keyset en /leads")
+    parser.add_argument("--tenant-id", type=int, required=True, help="Tenant de pruebas (debe existir)")
+    parser.add_argument("--size", type=int, default=500_000)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--pages", type=int, nargs="+", default=[0, 10, 100, 1_000, 5_000])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--max-ratio", type=float, default=None,
+                        help="Falla si keyset en la página más profunda supera max-ratio x la primera")
+    parser.add_argument("--dsn", default=os.getenv("POSTGRES_DSN", "").replace("+asyncpg", ""))
+    args = parser.parse_args()
+
+    pool = await asyncpg.create_pool(args.dsn, min_size=1, max_size=2, init=_init)
+    try:
+        await _cleanup(pool, args.tenant_id)
+        async with pool.acquire() as conn:
+            insert_rate = await _seed(conn, args.tenant_id, args.size)
+            await conn.execute("ANALYZE leads;")
+
+        print(f"\n=== {args.size:,} leads (tenant {args.tenant_id}), page_size {args.page_size} ===")
+        print(f"insert_rows_per_sec: {insert_rate:,.0f}")
+        depths = await _bench_depths(pool, args.tenant_id, args.page_size, args.pages, args.repeats)
+        print(f"{'page':>8} {'offset_ms':>12} {'keyset_ms':>12}")
+        for r in depths:
+            print(f"{r['page']:>8} {r['offset_ms']:>12} {r['keyset_ms']:>12}")
+        print(f"filters: {await _bench_filters(pool, args.tenant_id, args.page_size, args.repeats)}")
+
+        if args.max_ratio and len(depths) > 1:
+            first, deepest = depths[0]["keyset_ms"], depths[-1]["keyset_ms"]
+            ratio = deepest / first if first else 0
+            print(f"keyset deepest/first ratio: {ratio:.2f} (max {args.max_ratio})")
+            if ratio > args.max_ratio:
+                sys.exit(1)
+    finally:
+        await _cleanup(pool, args.tenant_id)
+        await pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
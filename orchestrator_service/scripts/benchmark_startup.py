@@ -0,0 +1,96 @@
+"""
+Benchmark de arranque — Maintenance Robot en cada boot vs chequeo de versión del esquema.
+
+Mide, por arranque simulado (conexión nueva cada vez, mediana de --repeats):
+  - antes:   lo que hacía Database.connect → _run_auto_migrations: chequeo de
+             tablas críticas + los parches de Database.evolution_patches() en una
+             transacción + los de MigrationRunner uno por uno
+  - después: Database.connect → check_schema_version: una query a schema_migrations
+Reporta además los locks ACCESS EXCLUSIVE que tomó una pasada del Robot (los que
+bloquean lecturas de las otras réplicas durante un rolling deploy).
+
+Los parches son idempotentes, pero igual corren DDL: usar una base de pruebas con
+el esquema ya migrado (alembic upgrade head), NUNCA producción.
+    POSTGRES_DSN=postgresql://... python scripts/benchmark_startup.py --repeats 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import asyncpg
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.legacy import CRITICAL_TABLES, Database  # noqa: E402
+from db.migrations import MigrationRunner  # noqa: E402
+from db.schema_version import CURRENT_VERSION_SQL, REQUIRED_SCHEMA_VERSION  # noqa: E402
+
+EXCLUSIVE_LOCKS_SQL = """
+    SELECT COUNT(*) FROM pg_locks
+    WHERE pid = pg_backend_pid() AND mode = 'AccessExclusiveLock' AND locktype = 'relation'
+"""
+
+
+async def _robot_boot(dsn: str) -> tuple:
+    """Una pasada del Maintenance Robot como en cada arranque. Devuelve (ms, locks exclusivos)."""
+    conn = await asyncpg.connect(dsn)
+    try:
+        started = time.perf_counter()
+        await conn.fetch(
+            "SELECT table_name FROM information_schema.tables WHERE table_schema = 'public' AND table_name = ANY($1)",
+            CRITICAL_TABLES,
+        )
+        async with conn.transaction():
+            for patch in Database.evolution_patches():
+                await conn.execute(patch)
+            locks = await conn.fetchval(EXCLUSIVE_LOCKS_SQL)
+        for patch in MigrationRunner(None)._get_patches():
+            try:
+                await conn.execute(patch)
+            except Exception:
+                pass  # Como en MigrationRunner: best-effort
+        return (time.perf_counter() - started) * 1000, locks
+    finally:
+        await conn.close()
+
+
+async def _version_check_boot(dsn: str) -> tuple:
+    """El chequeo que hace Database.connect ahora. Devuelve (ms, versión)."""
+    conn = await asyncpg.connect(dsn)
+    try:
+        started = time.perf_counter()
+        version = await conn.fetchval(CURRENT_VERSION_SQL)
+        return (time.perf_counter() - started) * 1000, version
+    finally:
+        await conn.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark de arranque: Maintenance Robot vs chequeo de versión")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--dsn", default=os.getenv("POSTGRES_DSN", "").replace("+asyncpg", ""))
+    args = parser.parse_args()
+
+    robot = [await _robot_boot(args.dsn) for _ in range(args.repeats)]
+    check = [await _version_check_boot(args.dsn) for _ in range(args.repeats)]
+
+    robot_ms = statistics.median(ms for ms, _ in robot)
+    check_ms = statistics.median(ms for ms, _ in check)
+    version = check[-1][1]
+    patches = len(Database.evolution_patches()) + len(MigrationRunner(None)._get_patches())
+
+    print(f"\n=== Arranque: esquema en versión {version} (requerida {REQUIRED_SCHEMA_VERSION}), {args.repeats} repeticiones ===")
+    print(f"{'':>26} {'median_ms':>12}")
+    print(f"{'antes (Robot, ' + str(patches) + ' parches)':>26} {robot_ms:>12.2f}")
+    print(f"{'después (version check)':>26} {check_ms:>12.2f}")
+    print(f"speedup: {robot_ms / check_ms if check_ms else 0:.0f}x")
+    print(f"AccessExclusive locks por arranque (antes): {robot[-1][1]} → después: 0")
+    if version is None or version < REQUIRED_SCHEMA_VERSION:
+        print("⚠️ La base no está migrada: correr `alembic upgrade head` antes de comparar")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
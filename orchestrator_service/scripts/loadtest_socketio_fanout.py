@@ -0,0 +1,144 @@
+"""
+Load test de fan-out de Socket.IO multi-worker (SOCKETIO_MANAGER=redis).
+
+Levanta N workers uvicorn que comparten el AsyncRedisManager de core.socket_manager,
+conecta M clientes repartidos round-robin entre los workers (todos en el mismo room)
+y publica eventos desde un emisor externo write-only (como lo haría otro proceso).
+Cada evento lleva su timestamp de publicación; se mide la latencia publicación -> recepción
+en cada cliente y se reporta p50/p95/p99 y los eventos perdidos.
+
+Uso (requiere Redis; NUNCA contra el Redis de producción):
+    REDIS_URL=redis://localhost:6379/15 python scripts/loadtest_socketio_fanout.py --workers 4 --clients 1000 --events 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import socketio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_EVENT = "FANOUT_BENCH"
+BENCH_ROOM = "loadtest:fanout"
+
+
+def _serve(port: int):
+    """Worker: el sio real del orquestador + un handler para entrar al room del benchmark."""
+    os.environ["SOCKETIO_MANAGER"] = "redis"
+    import uvicorn
+
+    from core.socket_manager import sio
+
+    @sio.on("bench_join")
+    async def bench_join(sid, room):
+        await sio.enter_room(sid, room)
+        return True
+
+    uvicorn.run(socketio.ASGIApp(sio), host="127.0.0.1", port=port, log_level="warning")
+
+
+def _spawn_workers(count: int, base_port: int):
+    procs = []
+    for i in range(count):
+        procs.append(subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(base_port + i)],
+            env={**os.environ, "SOCKETIO_MANAGER": "redis"},
+        ))
+    return procs
+
+
+async def _connect_clients(count: int, ports, latencies, received):
+    clients = []
+    for i in range(count):
+        client = socketio.AsyncClient(reconnection=False)
+
+        async def on_event(data, _i=i):
+            latencies.append((time.time() - data["ts"]) * 1000)
+            received[_i] += 1
+
+        client.on(BENCH_EVENT, on_event)
+        for attempt in range(50):
+            try:
+                await client.connect(f"http://127.0.0.1:{ports[i % len(ports)]}", transports=["websocket"])
+                break
+            except socketio.exceptions.ConnectionError:
+                await asyncio.sleep(0.2)
+        else:
+            raise RuntimeError(f"client {i} could not connect")
+        await client.call("bench_join", BENCH_ROOM)
+        clients.append(client)
+    return clients
+
+
+async def _run(args):
+    from core.socket_manager import SOCKETIO_CHANNEL, SOCKETIO_REDIS_URL
+
+    if not SOCKETIO_REDIS_URL:
+        sys.exit("REDIS_URL / SOCKETIO_REDIS_URL es obligatorio")
+
+    ports = [args.base_port + i for i in range(args.workers)]
+    procs = _spawn_workers(args.workers, args.base_port)
+    latencies, received = [], [0] * args.clients
+    clients = []
+    try:
+        clients = await _connect_clients(args.clients, ports, latencies, received)
+        print(f"{len(clients)} clients connected to {args.workers} workers")
+
+        publisher = socketio.AsyncRedisManager(SOCKETIO_REDIS_URL, channel=SOCKETIO_CHANNEL, write_only=True)
+        started = time.perf_counter()
+        for seq in range(args.events):
+            await publisher.emit(BENCH_EVENT, {"seq": seq, "ts": time.time()}, room=BENCH_ROOM)
+            if args.interval_ms:
+                await asyncio.sleep(args.interval_ms / 1000)
+        publish_seconds = time.perf_counter() - started
+
+        expected = args.events * args.clients
+        deadline = time.monotonic() + args.drain_seconds
+        while sum(received) < expected and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+    finally:
+        await asyncio.gather(*(c.disconnect() for c in clients), return_exceptions=True)
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait(timeout=10)
+
+    if not latencies:
+        sys.exit("no events received")
+    ordered = sorted(latencies)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+    print(f"published {args.events} events in {publish_seconds:.2f}s ({args.events / publish_seconds:.0f} ev/s)")
+    print(f"deliveries: {len(latencies)}/{expected} (lost {expected - len(latencies)})")
+    print(
+        f"fan-out latency ms: p50={pct(50):.1f} p95={pct(95):.1f} p99={pct(99):.1f} "
+        f"max={ordered[-1]:.1f} mean={statistics.fmean(ordered):.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--events", type=int, default=100)
+    parser.add_argument("--interval-ms", type=float, default=10, help="pausa entre publicaciones")
+    parser.add_argument("--drain-seconds", type=float, default=15, help="espera máxima por entregas pendientes")
+    parser.add_argument("--base-port", type=int, default=18100)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        _serve(args.port)
+    else:
+        asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Perfil de imports por rol — `python -X importtime` sobre `import main`.
+
+Para cada rol (ORCHESTRATOR_ROLE) importa main.py en un proceso nuevo con
+-X importtime y reporta:
+  - tiempo total de import y cantidad de módulos
+  - los módulos más lentos (tiempo acumulado, incluye sus sub-imports)
+  - el tiempo propio agregado por paquete top-level (langchain, google, ...)
+  - routers montados / omitidos y RSS pico al terminar el import
+
+No hace falta base de datos: importar main no conecta (eso pasa en startup).
+
+    python scripts/profile_imports.py                       # los cuatro roles, comparados
+    python scripts/profile_imports.py --role webhook --top 30
+    python scripts/profile_imports.py --role admin --raw importtime.txt   # salida cruda (tuna, etc.)
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from core.boot_profile import ROLES, parse_importtime, summarize_importtime  # noqa: E402
+
+# Corre dentro del proceso hijo: importa main y devuelve lo que montó + RSS pico
+_CHILD = """
+import json, logging
+logging.disable(logging.CRITICAL)
+import main
+from core import boot_profile
+stats = boot_profile.get_stats()
+print("BOOT_PROFILE " + json.dumps({
+    "mounted": len(stats["mounted"]),
+    "skipped": len(stats["skipped"]),
+    "failed": sorted(stats["failed"]),
+    "max_rss_mb": stats["max_rss_mb"],
+}))
+"""
+
+
+def profile_role(role: str) -> dict:
+    """Importa main con -X importtime en un subproceso para un rol. Devuelve el resumen."""
+    env = {**os.environ, "ORCHESTRATOR_ROLE": role, "PYTHONDONTWRITEBYTECODE": "1"}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    boot = {}
+    for line in proc.stdout.splitlines():
+        if line.startswith("BOOT_PROFILE "):
+            boot = json.loads(line[len("BOOT_PROFILE "):])
+    if proc.returncode != 0:
+        tail = [l for l in proc.stderr.splitlines() if not l.startswith("import time:")][-5:]
+        raise RuntimeError(f"import main falló con ORCHESTRATOR_ROLE={role}:\n" + "\n".join(tail))
+    return {"role": role, "stderr": proc.stderr, "boot": boot}
+
+
+def _print_role(result: dict, top: int):
+    summary = summarize_importtime(parse_importtime(result["stderr"]), top=top)
+    boot = result["boot"]
+    print(f"\n=== Rol {result['role']}: {summary['total_ms']:.0f} ms, {summary['modules']} módulos, "
+          f"RSS pico {boot.get('max_rss_mb')} MB, routers {boot.get('mounted')} montados / {boot.get('skipped')} omitidos ===")
+    if boot.get("failed"):
+        print(f"⚠️ Routers que no montaron: {', '.join(boot['failed'])}")
+    print(f"{'cumulative_ms':>14} {'self_ms':>9}  módulo")
+    for entry in summary["slowest"]:
+        print(f"{entry['cumulative_us'] / 1000:>14.1f} {entry['self_us'] / 1000:>9.1f}  {entry['module']}")
+    print(f"\n{'self_ms':>14}  paquete")
+    for package, self_us in summary["packages"]:
+        print(f"{self_us / 1000:>14.1f}  {package}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perfil de imports de main.py por rol (-X importtime)")
+    parser.add_argument("--role", choices=ROLES, help="un solo rol (por defecto: todos)")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--raw", help="guardar la salida cruda de -X importtime en este archivo (con --role)")
+    args = parser.parse_args()
+
+    roles = [args.role] if args.role else list(ROLES)
+    totals = []
+    for role in roles:
+        result = profile_role(role)
+        if args.raw and args.role:
+            with open(args.raw, "w", encoding="utf-8") as f:
+                f.write(result["stderr"])
+        summary = _print_role(result, args.top)
+        totals.append((role, summary["total_ms"], summary["modules"], result["boot"].get("max_rss_mb")))
+
+    if len(totals) > 1:
+        print(f"\n=== Comparación ===\n{'rol':>10} {'import_ms':>10} {'módulos':>8} {'rss_mb':>8}")
+        for role, total_ms, modules, rss in totals:
+            print(f"{role:>10} {total_ms:>10.0f} {modules:>8} {rss if rss is not None else '-':>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,9 +8,10 @@ import json
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
-import httpx
 from fastapi import HTTPException
 
+from core.http_clients import http_clients
+
 logger = logging.getLogger(__name__)
 
 # Google OAuth configuration
@@ -55,7 +56,7 @@ class GoogleOAuthService:
         }
 
         try:
-            async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT) as client:
+            async with http_clients.session(timeout=REQUEST_TIMEOUT) as client:
                 response = await client.post(GOOGLE_OAUTH_TOKEN_URL, data=data)
 
             if response.status_code != 200:
@@ -89,7 +90,7 @@ class GoogleOAuthService:
         }
 
         try:
-            async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT) as client:
+            async with http_clients.session(timeout=REQUEST_TIMEOUT) as client:
                 response = await client.get(GOOGLE_USERINFO_URL, headers=headers)
 
             if response.status_code != 200:
@@ -273,7 +274,7 @@ class GoogleOAuthService:
             # For now, we'll use a simple approach
             validation_url = "https://oauth2.googleapis.com/tokeninfo"
             
-            async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT) as client:
+            async with http_clients.session(timeout=REQUEST_TIMEOUT) as client:
                 response = await client.get(validation_url, params={"id_token": id_token})
             
             if response.status_code != 200:
@@ -2,6 +2,7 @@
 DEV-50 — Lead Deduplication Service
 Normalización de teléfonos, detección de duplicados y fusión atómica de leads.
 """
+import os
 import re
 import json
 import logging
@@ -59,6 +60,22 @@ def normalize_phone(phone: str, country_code: str = "54") -> str:
     return raw
 
 
+_ACCENTS = str.maketrans("áéíóúüñ", "aeiouun")
+
+
+def phonetic_fold(text: str) -> str:
+    """
+    Plegado fonético simple para nombres en español (qu/c/k, z/s, v/b, ll/y, h muda,
+    letras repetidas). Espejo de la función SQL lead_dedup_phonetic (Parche 43).
+    """
+    s = (text or "").lower().translate(_ACCENTS)
+    s = re.sub(r"[^a-z ]", "", s)
+    s = s.replace("qu", "k")
+    s = re.sub(r"c([ei])", r"s\1", s)
+    s = s.replace("c", "k").replace("z", "s").replace("v", "b").replace("ll", "y").replace("h", "")
+    return re.sub(r"(.)\1+", r"\1", s)
+
+
 def _name_similarity(name_a: str, name_b: str) -> float:
     """Similitud aproximada entre nombres (0.0 - 1.0)."""
     if not name_a or not name_b:
@@ -77,6 +94,54 @@ def _name_similarity(name_a: str, name_b: str) -> float:
     return len(intersection) / len(union)
 
 
+# Máximo de candidatos por lead devueltos por el índice de bloqueo
+# (claves muy frecuentes como "maria gonzalez" no deben explotar el scoring)
+MAX_CANDIDATES_PER_LEAD = 50
+
+def _score_candidate(
+    phone: Optional[str],
+    email: Optional[str],
+    first_name: Optional[str],
+    last_name: Optional[str],
+    row,
+) -> Optional[dict]:
+    """Calcula confianza y motivos para un candidato salido del índice de bloqueo."""
+    confidence = 0
+    reasons = []
+
+    # 1. Match exacto por teléfono normalizado (confianza 90)
+    normalized = normalize_phone(phone)
+    if normalized and normalize_phone(row["phone_number"] or "") == normalized:
+        confidence = max(confidence, 90)
+        reasons.append("phone_normalized_exact")
+
+    # 2. Match exacto por email (confianza 85)
+    if email and row["email"] and row["email"].strip().lower() == email.strip().lower():
+        confidence = max(confidence, 85)
+        reasons.append("email_exact")
+
+    # 3. Fuzzy match por nombre (literal o fonético)
+    if first_name and last_name:
+        full_name = f"{first_name} {last_name}".lower()
+        candidate_name = f"{row['first_name'] or ''} {row['last_name'] or ''}".lower()
+        similarity = max(
+            _name_similarity(full_name, candidate_name),
+            _name_similarity(phonetic_fold(full_name), phonetic_fold(candidate_name)),
+        )
+        if similarity >= 0.7:
+            name_conf = int(similarity * 70)  # max 70 por nombre solo
+            confidence = max(confidence, name_conf)
+            reasons.append(f"name_fuzzy_{int(similarity * 100)}pct")
+
+    if confidence < CANDIDATE_THRESHOLD:
+        return None
+    return {
+        "lead_id": str(row["id"]),
+        "confidence": confidence,
+        "match_reasons": list(set(reasons)),
+    }
+
+
 async def find_duplicates_for_lead(
     tenant_id: int,
     lead_id: str,
@@ -89,88 +154,142 @@ async def find_duplicates_for_lead(
 ) -> list:
     """
     Busca duplicados candidatos para un lead dado.
+    Los candidatos salen solo del índice lead_dedup_keys (teléfono, email,
+    pares de tokens fonéticos del nombre); la confianza se calcula en Python.
     Retorna lista de {lead_id, confidence, match_reasons}.
     """
-    candidates = {}
     lead_uuid = uuid_lib.UUID(lead_id) if isinstance(lead_id, str) else lead_id
-    normalized = normalize_phone(phone)
 
-    # 1. Match exacto por teléfono normalizado (confianza 90)
-    if normalized:
-        rows = await pool.fetch(
-            """
-            SELECT id, first_name, last_name, email, phone_number
-            FROM leads
-            WHERE tenant_id = $1 AND phone_number = $2 AND id != $3
-            LIMIT 10
-            """,
-            tenant_id, normalized, lead_uuid,
+    rows = await pool.fetch(
+        """
+        SELECT l.id, l.first_name, l.last_name, l.email, l.phone_number
+        FROM leads l
+        WHERE l.id IN (
+            SELECT k.lead_id
+            FROM lead_dedup_keys_for($3, $4, $5, $6) p
+            JOIN lead_dedup_keys k
+              ON k.tenant_id = $1 AND k.key_type = p.key_type AND k.key_value = p.key_value
+            WHERE k.lead_id != $2
+            LIMIT $7
         )
-        for r in rows:
-            lid = str(r["id"])
-            if lid not in candidates:
-                candidates[lid] = {"lead_id": lid, "confidence": 0, "match_reasons": [], "row": dict(r)}
-            candidates[lid]["confidence"] = max(candidates[lid]["confidence"], 90)
-            candidates[lid]["match_reasons"].append("phone_normalized_exact")
+        AND l.tenant_id = $1
+        """,
+        tenant_id, lead_uuid, phone, email, first_name, last_name, MAX_CANDIDATES_PER_LEAD,
+    )
 
-    # 2. Match exacto por email (confianza 85)
-    if email:
-        rows = await pool.fetch(
-            """
-            SELECT id, first_name, last_name, email, phone_number
-            FROM leads
-            WHERE tenant_id = $1 AND LOWER(email) = LOWER($2) AND id != $3
-            LIMIT 10
-            """,
-            tenant_id, email, lead_uuid,
-        )
-        for r in rows:
-            lid = str(r["id"])
-            if lid not in candidates:
-                candidates[lid] = {"lead_id": lid, "confidence": 0, "match_reasons": [], "row": dict(r)}
-            candidates[lid]["confidence"] = max(candidates[lid]["confidence"], 85)
-            candidates[lid]["match_reasons"].append("email_exact")
-
-    # 3. Fuzzy match por nombre (si confidence ya existe o nombre muy similar)
-    if first_name and last_name:
-        full_name = f"{first_name} {last_name}".lower()
-        rows = await pool.fetch(
-            """
-            SELECT id, first_name, last_name, email, phone_number
-            FROM leads
-            WHERE tenant_id = $1 AND id != $2
-              AND (LOWER(first_name) LIKE $3 OR LOWER(last_name) LIKE $4)
-            LIMIT 20
-            """,
-            tenant_id, lead_uuid,
-            f"%{first_name.lower()}%",
-            f"%{last_name.lower()}%",
-        )
-        for r in rows:
-            lid = str(r["id"])
-            candidate_name = f"{r['first_name'] or ''} {r['last_name'] or ''}".lower()
-            similarity = _name_similarity(full_name, candidate_name)
-            if similarity >= 0.7:
-                if lid not in candidates:
-                    candidates[lid] = {"lead_id": lid, "confidence": 0, "match_reasons": [], "row": dict(r)}
-                name_conf = int(similarity * 70)  # max 70 por nombre solo
-                candidates[lid]["confidence"] = max(candidates[lid]["confidence"], name_conf)
-                candidates[lid]["match_reasons"].append(f"name_fuzzy_{int(similarity * 100)}pct")
-
-    # Filtrar por umbral mínimo
     result = [
-        {
-            "lead_id": v["lead_id"],
-            "confidence": v["confidence"],
-            "match_reasons": list(set(v["match_reasons"])),
-        }
-        for v in candidates.values()
-        if v["confidence"] >= CANDIDATE_THRESHOLD
+        c for c in (_score_candidate(phone, email, first_name, last_name, r) for r in rows) if c
     ]
     result.sort(key=lambda x: x["confidence"], reverse=True)
     return result[:limit]
 
 
+# Solapamiento del watermark para no perder leads de transacciones largas
+DEDUP_WATERMARK_OVERLAP = datetime.timedelta(minutes=1)
+DEDUP_CHUNK_SIZE = 500
+# Intervalo del job lead_deduplication (core.background_jobs, registrado en main.py)
+DEDUP_INTERVAL_SECONDS = float(os.getenv("DEDUP_INTERVAL_SECONDS", "7200"))
+
+
+async def run_incremental_dedup(tenant_id: int, pool) -> dict:
+    """
+    Revisa solo los leads cuyas claves de deduplicación cambiaron desde la última
+    corrida (lead_dedup_keys.indexed_at > dedup_checkpoints.last_run_at).
+    La generación de candidatos es un único join sobre el índice por bloque de leads.
+    """
+    run_started = await pool.fetchval("SELECT NOW()")
+    last_run = await pool.fetchval(
+        "SELECT last_run_at FROM dedup_checkpoints WHERE tenant_id = $1", tenant_id
+    )
+    since = (last_run - DEDUP_WATERMARK_OVERLAP) if last_run else None
+
+    changed = await pool.fetch(
+        """
+        SELECT DISTINCT lead_id FROM lead_dedup_keys
+        WHERE tenant_id = $1 AND ($2::timestamptz IS NULL OR indexed_at > $2)
+        """,
+        tenant_id, since,
+    )
+    changed_ids = [r["lead_id"] for r in changed]
+    stats = {"leads_checked": len(changed_ids), "candidate_pairs": 0, "duplicates": 0}
+
+    for i in range(0, len(changed_ids), DEDUP_CHUNK_SIZE):
+        chunk = changed_ids[i:i + DEDUP_CHUNK_SIZE]
+        pairs = await pool.fetch(
+            """
+            SELECT probe_id, candidate_id FROM (
+                SELECT p.lead_id AS probe_id, k.lead_id AS candidate_id,
+                       ROW_NUMBER() OVER (PARTITION BY p.lead_id ORDER BY k.lead_id) AS rn
+                FROM lead_dedup_keys p
+                JOIN lead_dedup_keys k
+                  ON k.tenant_id = p.tenant_id AND k.key_type = p.key_type
+                 AND k.key_value = p.key_value AND k.lead_id != p.lead_id
+                WHERE p.tenant_id = $1 AND p.lead_id = ANY($2::uuid[])
+                GROUP BY p.lead_id, k.lead_id
+            ) c
+            WHERE rn <= $3
+            """,
+            tenant_id, chunk, MAX_CANDIDATES_PER_LEAD,
+        )
+        if not pairs:
+            continue
+        stats["candidate_pairs"] += len(pairs)
+
+        ids = list({r["probe_id"] for r in pairs} | {r["candidate_id"] for r in pairs})
+        lead_rows = {
+            r["id"]: r
+            for r in await pool.fetch(
+                "SELECT id, first_name, last_name, email, phone_number FROM leads "
+                "WHERE tenant_id = $1 AND id = ANY($2::uuid[])",
+                tenant_id, ids,
+            )
+        }
+
+        by_probe: dict = {}
+        for r in pairs:
+            probe, cand = lead_rows.get(r["probe_id"]), lead_rows.get(r["candidate_id"])
+            if not probe or not cand:
+                continue
+            scored = _score_candidate(
+                probe["phone_number"], probe["email"], probe["first_name"], probe["last_name"], cand
+            )
+            if scored:
+                by_probe.setdefault(r["probe_id"], []).append(scored)
+
+        for probe_id, duplicates in by_probe.items():
+            duplicates.sort(key=lambda x: x["confidence"], reverse=True)
+            probe = lead_rows[probe_id]
+            lead_name = f"{probe['first_name'] or ''} {probe['last_name'] or ''}".strip() or probe["phone_number"]
+            await create_duplicate_candidates(
+                tenant_id, str(probe_id), duplicates[:5], pool,
+                lead_name=lead_name, lead_phone=probe["phone_number"],
+            )
+            stats["duplicates"] += len(duplicates[:5])
+
+    await pool.execute(
+        """
+        INSERT INTO dedup_checkpoints (tenant_id, last_run_at) VALUES ($1, $2)
+        ON CONFLICT (tenant_id) DO UPDATE SET last_run_at = EXCLUDED.last_run_at
+        """,
+        tenant_id, run_started,
+    )
+    logger.info(f"DEV-50: Incremental dedup tenant={tenant_id} {stats}")
+    return stats
+
+
+async def run_incremental_dedup_all(pool) -> dict:
+    """Job en background: run_incremental_dedup para cada tenant activo, uno por vez."""
+    tenants = await pool.fetch("SELECT id FROM tenants WHERE status = 'active'")
+    failed = 0
+    for t in tenants:
+        try:
+            await run_incremental_dedup(t["id"], pool)
+        except Exception as e:
+            failed += 1
+            logger.error(f"DEV-50: Incremental dedup failed for tenant {t['id']}: {e}")
+    return {"tenants": len(tenants), "failed": failed}
+
+
 async def create_duplicate_candidates(
     tenant_id: int,
     lead_id: str,
@@ -1,7 +1,7 @@
 import os
-import httpx
 import logging
 from db import db
+from core.http_clients import http_clients
 
 logger = logging.getLogger("dentalogic_sync_service")
 
@@ -20,7 +20,7 @@ class DentalogicSyncService:
             headers = {"X-Bridge-Token": BRIDGE_API_TOKEN}
             url = f"{DENTALOGIC_API_URL}/api/bridge/v1/leads?min_score=5.0&status=new"
             
-            async with httpx.AsyncClient() as client:
+            async with http_clients.session() as client:
                 response = await client.get(url, headers=headers, timeout=10.0)
                 if response.status_code != 200:
                     logger.error(f"Error consultando Dentalogic: {response.text}")
@@ -8,6 +8,8 @@ import json
 import logging
 from typing import Optional
 
+from core.socket_manager import tenant_room
+
 logger = logging.getLogger("frustration_detection")
 
 # ─── Patrones de frustración (score léxico) ───────────────────────────────────
@@ -284,7 +286,7 @@ async def handle_escalation(
                         INSERT INTO notifications (id, tenant_id, type, title, message, priority,
                             recipient_id, related_entity_type, related_entity_id, metadata)
                         VALUES ($1, $2, 'frustration_alert', $3, $4, 'critical', $5, 'lead', $6, $7)
-                        ON CONFLICT (id) DO NOTHING
+                        ON CONFLICT DO NOTHING
                         """,
                         notif_id, tenant_id,
                         f"⚠️ Lead {lead_name} — Frustración detectada",
@@ -305,7 +307,7 @@ async def handle_escalation(
                     "score": score,
                     "message": message[:200],
                     "seller_id": str(seller_id) if seller_id else None,
-                })
+                }, room=tenant_room(tenant_id))
             except Exception as e:
                 logger.warning(f"DEV-49: Socket.IO emit error: {e}")
 
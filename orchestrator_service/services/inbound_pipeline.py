@@ -0,0 +1,394 @@
+"""
+Consolidated pre-LLM inbound stage for /chat (chat_inbound).
+
+Replaces the serial chain of round trips (tenant lookup, try_insert_inbound,
+mark_inbound_processing, blacklist checks, ensure_lead_exists, sin_respuesta
+probe, second lead lookup, append_chat_message, get_chat_history) with:
+
+  1. tenant      — bot_phone_number -> tenant_id (only when not in payload, cached)
+  2. dedup       — inbound_messages insert straight into 'processing'
+  3. context     — blacklist + lead lookup + last message, one statement
+  4. write       — lead upsert + sin_respuesta tag/log + chat message (or
+                   blacklist attempt), one statement in one transaction
+  5. history     — chat history on a second pooled connection, in parallel
+                   with stages 3-4
+
+Stages 1-4 share one acquired connection. Per-stage timings are kept per
+tenant so /health/inbound-latency can report p50/p99 pre-LLM latency.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Deque, Dict, List, Optional
+
+from db import db
+from core.tenant_cache import tenant_cache, NS_WEBHOOK_TENANT
+from services.lead_enrichment_service import lead_enrichment_service
+from services.metrics_cache_service import metrics_cache_service
+
+logger = logging.getLogger(__name__)
+
+SIN_RESPUESTA_GAP = timedelta(hours=24)
+HISTORY_LIMIT = 15
+LATENCY_SAMPLES_PER_STAGE = 512
+
+SOURCE_LABELS = {
+    "whatsapp": "whatsapp_inbound",
+    "instagram": "instagram_dm",
+    "facebook": "facebook_messenger",
+}
+
+
+# ─── Latency Tracker ─────────────────────────────────────────────────────────
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[idx]
+
+
+class StageLatencyTracker:
+    """Keeps the last N stage timings (ms) per tenant and reports p50/p99."""
+
+    def __init__(self, max_samples: int = LATENCY_SAMPLES_PER_STAGE):
+        self.max_samples = max_samples
+        self._samples: Dict[int, Dict[str, Deque[float]]] = {}
+
+    def record(self, tenant_id: int, timings: Dict[str, float]):
+        stages = self._samples.setdefault(tenant_id, {})
+        for stage, ms in timings.items():
+            stages.setdefault(stage, deque(maxlen=self.max_samples)).append(ms)
+
+    def summary(self, tenant_id: Optional[int] = None) -> Dict[str, Any]:
+        tenants = [tenant_id] if tenant_id is not None else sorted(self._samples)
+        out = {}
+        for tid in tenants:
+            stages = self._samples.get(tid, {})
+            out[str(tid)] = {
+                stage: {
+                    "count": len(values),
+                    "p50_ms": round(_percentile(sorted(values), 50), 2),
+                    "p99_ms": round(_percentile(sorted(values), 99), 2),
+                }
+                for stage, values in stages.items()
+            }
+        return out
+
+
+# ─── Pipeline ────────────────────────────────────────────────────────────────
+
+@dataclass
+class InboundContext:
+    """Result of the pre-LLM inbound stage."""
+    tenant_id: int
+    is_new: bool
+    lead: Optional[Dict[str, Any]] = None
+    blacklisted: bool = False
+    history: List[Dict[str, Any]] = field(default_factory=list)
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
+class InboundPipeline:
+    def __init__(self):
+        self.latency = StageLatencyTracker()
+
+    async def resolve_tenant(self, conn, to_number: Optional[str]) -> Optional[int]:
+        if not to_number:
+            return None
+
+        async def _load() -> Optional[int]:
+            return await conn.fetchval(
+                "SELECT id FROM tenants WHERE bot_phone_number = $1 LIMIT 1", to_number
+            )
+
+        return await tenant_cache.get_or_load(NS_WEBHOOK_TENANT, ("bot_phone", to_number), _load)
+
+    async def run(
+        self,
+        *,
+        tenant_id: Optional[int],
+        to_number: Optional[str],
+        provider: str,
+        provider_message_id: str,
+        event_id: str,
+        conversation_key: str,
+        payload: dict,
+        correlation_id: str,
+        text: str,
+        phone_for_lead: str,
+        customer_name: Optional[str],
+        referral: Optional[dict],
+        channel_source: str,
+        external_user_id: str,
+        platform_message_id: Optional[str],
+    ) -> InboundContext:
+        timings: Dict[str, float] = {}
+        started = time.perf_counter()
+        history_task: Optional[asyncio.Task] = None
+
+        def _mark(stage: str, since: float) -> float:
+            now = time.perf_counter()
+            timings[stage] = round((now - since) * 1000, 2)
+            return now
+
+        async with db.pool.acquire() as conn:
+            t = time.perf_counter()
+            if not tenant_id:
+                tenant_id = await self.resolve_tenant(conn, to_number)
+                t = _mark("tenant", t)
+            # Critical: Ensure tenant_id is int for asyncpg (Spec Database Evolution)
+            tenant_id = int(tenant_id or 1)  # Extreme fallback: tenant 1
+
+            # Dedup + mark processing in a single insert (committed on its own so a
+            # later failure can still be recorded by mark_inbound_failed)
+            inserted = await conn.fetchval(
+                """INSERT INTO inbound_messages
+                       (provider, provider_message_id, event_id, from_number, payload, status, correlation_id)
+                   VALUES ($1, $2, $3, $4, $5, 'processing', $6)
+                   ON CONFLICT (provider, provider_message_id) DO NOTHING RETURNING id""",
+                provider, provider_message_id, event_id, conversation_key, json.dumps(payload), correlation_id,
+            )
+            t = _mark("dedup", t)
+            if inserted is None:
+                timings["total"] = round((time.perf_counter() - started) * 1000, 2)
+                return InboundContext(tenant_id=tenant_id, is_new=False, timings=timings)
+
+            # History only depends on data already committed: read it on another
+            # pooled connection while this one runs the context/write statements
+            history_task = asyncio.create_task(
+                db.get_chat_history(
+                    conversation_key,
+                    limit=HISTORY_LIMIT,
+                    tenant_id=tenant_id,
+                    channel_source=channel_source,
+                    external_user_id=external_user_id,
+                )
+            )
+            try:
+                ctx = await self._fetch_context(
+                    conn, tenant_id, phone_for_lead, channel_source, external_user_id, conversation_key
+                )
+                t = _mark("context", t)
+
+                async with conn.transaction():
+                    lead = await self._write(
+                        conn, ctx,
+                        tenant_id=tenant_id,
+                        conversation_key=conversation_key,
+                        correlation_id=correlation_id,
+                        text=text,
+                        phone_for_lead=phone_for_lead,
+                        customer_name=customer_name,
+                        referral=referral,
+                        channel_source=channel_source,
+                        external_user_id=external_user_id,
+                        platform_message_id=platform_message_id,
+                    )
+                t = _mark("write", t)
+            except BaseException:
+                history_task.cancel()
+                raise
+
+        # Seller/CEO notification fan-out is write-behind (services/message_notification_queue.py)
+        db.notify_user_message(conversation_key, text, tenant_id)
+        metrics_cache_service.invalidate_tenant(tenant_id)
+        lead_enrichment_service.invalidate_conversation(tenant_id, conversation_key, phone_for_lead)
+
+        history = await history_task
+        _mark("history_wait", t)
+        # Exclude the message we just added if the read already saw it
+        if history and history[-1].get("content") == text and history[-1].get("role") == "user":
+            history = history[:-1]
+        history = history[-(HISTORY_LIMIT - 1):]
+
+        timings["total"] = round((time.perf_counter() - started) * 1000, 2)
+        self.latency.record(tenant_id, timings)
+        return InboundContext(
+            tenant_id=tenant_id,
+            is_new=True,
+            lead=lead,
+            blacklisted=ctx["is_blacklisted"],
+            history=history,
+            timings=timings,
+        )
+
+    async def _fetch_context(
+        self, conn, tenant_id: int, phone: str, channel: str, ext_id: str, conversation_key: str
+    ):
+        """Blacklist match, existing lead and last conversation message in one round trip."""
+        blacklist_values = [v for v in dict.fromkeys([phone, ext_id]) if v]
+        # IG/FB conversations are keyed by PSID; WhatsApp keeps the from_number lookup
+        last_message_filter = (
+            "channel_source = $3 AND external_user_id = $4"
+            if channel != "whatsapp" and ext_id
+            else "from_number = $6"
+        )
+        return await conn.fetchrow(
+            f"""
+            SELECT COALESCE(bl.matched, FALSE) AS is_blacklisted,
+                   bl.reason AS blacklist_reason,
+                   ld.id AS lead_id, ld.first_name, ld.last_name, ld.lead_source,
+                   ld.tags, ld.human_override_until,
+                   lm.role AS last_role, lm.created_at AS last_at
+            FROM (SELECT 1) AS one
+            LEFT JOIN LATERAL (
+                SELECT TRUE AS matched, reason FROM blacklist
+                WHERE tenant_id = $1 AND value = ANY($2::text[])
+                LIMIT 1
+            ) bl ON TRUE
+            LEFT JOIN LATERAL (
+                SELECT * FROM (
+                    SELECT 0 AS prio, id, first_name, last_name, lead_source, tags, human_override_until
+                    FROM leads WHERE tenant_id = $1 AND $3 = 'instagram' AND instagram_psid = $4
+                    UNION ALL
+                    SELECT 0, id, first_name, last_name, lead_source, tags, human_override_until
+                    FROM leads WHERE tenant_id = $1 AND $3 = 'facebook' AND facebook_psid = $4
+                    UNION ALL
+                    SELECT 1, id, first_name, last_name, lead_source, tags, human_override_until
+                    FROM leads WHERE tenant_id = $1 AND $5 <> '' AND phone_number = $5
+                ) candidates
+                ORDER BY prio
+                LIMIT 1
+            ) ld ON TRUE
+            LEFT JOIN LATERAL (
+                SELECT role, created_at FROM chat_messages
+                WHERE tenant_id = $1 AND {last_message_filter}
+                ORDER BY created_at DESC
+                LIMIT 1
+            ) lm ON TRUE
+            """,
+            tenant_id, blacklist_values, channel, ext_id, phone or "", conversation_key,
+        )
+
+    @staticmethod
+    def _sin_respuesta_reason(ctx) -> Optional[str]:
+        """DEV-19: last assistant message >24h ago with no user reply since -> auto-tag."""
+        last_at = ctx["last_at"]
+        if ctx["last_role"] != "assistant" or last_at is None:
+            return None
+        gap = datetime.now(last_at.tzinfo if last_at.tzinfo else None) - last_at
+        if gap <= SIN_RESPUESTA_GAP:
+            return None
+        existing = ctx["tags"] or []
+        if isinstance(existing, list) and "sin_respuesta" in existing:
+            return None
+        return f"Lead no respondio por {gap.days}d {gap.seconds // 3600}h desde ultimo mensaje del asistente"
+
+    async def _write(
+        self, conn, ctx, *, tenant_id, conversation_key, correlation_id, text, phone_for_lead,
+        customer_name, referral, channel_source, external_user_id, platform_message_id,
+    ) -> Optional[Dict[str, Any]]:
+        # $1..$9 are always the chat message columns (same order as CHAT_MESSAGE_INSERT)
+        message_args = [
+            conversation_key, "user", text, correlation_id, tenant_id,
+            channel_source, platform_message_id, channel_source, external_user_id,
+        ]
+        message_cte = """msg AS (
+                INSERT INTO chat_messages
+                    (from_number, role, content, correlation_id, tenant_id,
+                     platform, platform_message_id, channel_source, external_user_id)
+                VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+            )"""
+        source = SOURCE_LABELS.get(channel_source, "whatsapp_inbound")
+
+        if ctx["is_blacklisted"]:
+            logger.warning(
+                f"🚫 Blocked lead creation for {phone_for_lead}/{external_user_id} "
+                f"(Tenant {tenant_id}): {ctx['blacklist_reason']}"
+            )
+            await conn.execute(
+                f"""
+                WITH {message_cte}
+                INSERT INTO blacklist_attempts (tenant_id, value, type, source, payload)
+                VALUES ($5, $9, $10, $11, $12)
+                """,
+                *message_args,
+                "phone" if channel_source == "whatsapp" else "external_id",
+                source,
+                json.dumps({"phone": phone_for_lead, "name": customer_name, "channel": channel_source, "referral": referral}),
+            )
+            return None
+
+        parts = (customer_name or "").strip().split(None, 1)
+        first_name = parts[0] if parts else "Lead"
+        last_name = parts[1] if len(parts) > 1 else ""
+
+        ad_id = (referral or {}).get("ad_id")
+        campaign_id = (referral or {}).get("campaign_id") if ad_id else None
+        instagram_psid = external_user_id if channel_source == "instagram" and external_user_id else None
+        facebook_psid = external_user_id if channel_source == "facebook" and external_user_id else None
+        tag_reason = self._sin_respuesta_reason(ctx)
+
+        lead_args = [
+            first_name, last_name, "META_ADS" if ad_id else None, ad_id, campaign_id,
+            instagram_psid, facebook_psid, channel_source, tag_reason is not None, tag_reason,
+        ]  # $10..$19
+        tag_log_cte = """tag_log AS (
+                INSERT INTO lead_tag_log (tenant_id, lead_id, tags_added, reason, source)
+                SELECT $5, id, ARRAY['sin_respuesta'], $19, 'system_auto' FROM lead WHERE $18
+            )"""
+        returning = "id, tenant_id, phone_number, first_name, last_name, status, source, lead_source, human_override_until"
+
+        if ctx["lead_id"]:
+            row = await conn.fetchrow(
+                f"""
+                WITH lead AS (
+                    UPDATE leads SET
+                        first_name = CASE WHEN $10 <> 'Lead' THEN $10 ELSE first_name END,
+                        last_name = COALESCE(NULLIF($11, ''), last_name),
+                        lead_source = COALESCE($12, lead_source),
+                        meta_ad_id = COALESCE($13, meta_ad_id),
+                        meta_campaign_id = CASE WHEN $13 IS NOT NULL THEN $14 ELSE meta_campaign_id END,
+                        instagram_psid = COALESCE($15, instagram_psid),
+                        facebook_psid = COALESCE($16, facebook_psid),
+                        channel_source = $17,
+                        tags = CASE
+                            WHEN $18 AND jsonb_typeof(COALESCE(tags, '[]'::jsonb)) = 'array'
+                            THEN COALESCE(tags, '[]'::jsonb) || '["sin_respuesta"]'::jsonb
+                            ELSE tags END,
+                        updated_at = NOW()
+                    WHERE id = $20
+                    RETURNING {returning}
+                ), {tag_log_cte}, {message_cte}
+                SELECT * FROM lead
+                """,
+                *message_args, *lead_args, ctx["lead_id"],
+            )
+        else:
+            # Only leads with a phone share the (tenant_id, phone_number) conflict target.
+            # Phoneless IG/FB contacts were already looked up by PSID above and are
+            # inserted with a NULL phone, so two of them never merge into one lead.
+            on_conflict = (
+                "ON CONFLICT (tenant_id, phone_number) DO UPDATE SET updated_at = NOW()"
+                if phone_for_lead else ""
+            )
+            row = await conn.fetchrow(
+                f"""
+                WITH lead AS (
+                    INSERT INTO leads
+                        (tenant_id, phone_number, first_name, last_name, source, lead_source,
+                         meta_ad_id, meta_campaign_id, instagram_psid, facebook_psid, channel_source, tags)
+                    VALUES ($5, $20, $10, $11, $21, COALESCE($12, 'ORGANIC'), $13, $14, $15, $16, $17,
+                            CASE WHEN $18 THEN '["sin_respuesta"]'::jsonb ELSE '[]'::jsonb END)
+                    {on_conflict}
+                    RETURNING {returning}
+                ), {tag_log_cte}, {message_cte}
+                SELECT * FROM lead
+                """,
+                *message_args, *lead_args, phone_for_lead or None, source,
+            )
+
+        if tag_reason:
+            logger.info(f"Auto-tagged lead {channel_source}:{external_user_id} as sin_respuesta")
+        return dict(row) if row else None
+
+    def get_latency_stats(self, tenant_id: Optional[int] = None) -> Dict[str, Any]:
+        return self.latency.summary(tenant_id)
+
+
+inbound_pipeline = InboundPipeline()
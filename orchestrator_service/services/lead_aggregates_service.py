@@ -0,0 +1,148 @@
+"""
+Dashboard aggregates — lead counts and pipeline values per (tenant, day, status, seller).
+
+`lead_daily_aggregates` is maintained incrementally by the trg_lead_aggregates
+trigger (Parche 44): every insert/delete and every change of status, seller,
+estimated_value or close_probability moves one lead's contribution between
+buckets. /stats/summary and the sales analytics endpoints read these rows
+instead of scanning `leads` on every dashboard load.
+
+Reconciliation recomputes a tenant's buckets from `leads` on a REPEATABLE READ
+snapshot, diffs them against the buckets of the same snapshot and adds the
+difference to the live rows (manual SQL, trigger disabled during a restore,
+...). Corrections are deltas, so they commute with the trigger's increments
+and neither side takes a lock (revision 0005 removed the shared lock from
+lead_aggregates_bump). It runs as the lead_aggregates_reconciliation background
+job on the primary and stamps lead_aggregate_state.reconciled_at. Readers only
+read that stamp (last_reconciled_at) and return it next to the data; a GET
+never reconciles or writes.
+"""
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+LEAD_AGGREGATES_MAX_STALENESS_SECONDS = float(os.getenv("LEAD_AGGREGATES_MAX_STALENESS_SECONDS", "7200"))
+# Interval of the lead_aggregates_reconciliation job (core.background_jobs)
+LEAD_AGGREGATES_RECONCILE_INTERVAL_SECONDS = float(os.getenv("LEAD_AGGREGATES_RECONCILE_INTERVAL_SECONDS", "1800"))
+
+UNASSIGNED_SELLER = "00000000-0000-0000-0000-000000000000"
+
+_ADDITIVE_COLUMNS = ("lead_count", "value_sum", "prob_count", "prob_value_sum", "prob_sum", "weighted_value_sum")
+_AGGREGATE_COLUMNS = "day, status, seller_id, " + ", ".join(_ADDITIVE_COLUMNS)
+
+# Must stay in sync with lead_aggregates_bump() / the Parche 44 backfill
+_EXPECTED_SQL = f"""
+    SELECT (COALESCE(created_at, NOW()) AT TIME ZONE 'UTC')::date AS day,
+           COALESCE(status, 'new') AS status,
+           COALESCE(assigned_seller_id, '{UNASSIGNED_SELLER}'::uuid) AS seller_id,
+           COUNT(*)::int AS lead_count,
+           SUM(COALESCE(estimated_value, 0))::numeric AS value_sum,
+           (COUNT(*) FILTER (WHERE close_probability > 0))::int AS prob_count,
+           COALESCE(SUM(COALESCE(estimated_value, 0)) FILTER (WHERE close_probability > 0), 0)::numeric AS prob_value_sum,
+           SUM(COALESCE(close_probability, 0) / 100)::numeric AS prob_sum,
+           SUM(COALESCE(estimated_value, 0) * COALESCE(close_probability, 0) / 100)::numeric AS weighted_value_sum
+    FROM leads
+    WHERE tenant_id = $1
+    GROUP BY 1, 2, 3
+"""
+
+
+_DELTA = ", ".join(f"COALESCE(e.{c}, 0) - COALESCE(a.{c}, 0) AS {c}" for c in _ADDITIVE_COLUMNS)
+_EXPECTED_ROW = ", ".join(f"COALESCE(e.{c}, 0)" for c in _ADDITIVE_COLUMNS)
+_ACTUAL_ROW = ", ".join(f"COALESCE(a.{c}, 0)" for c in _ADDITIVE_COLUMNS)
+
+# Expected minus stored, per bucket, on one snapshot; only buckets that differ
+_CORRECTIONS_SQL = f"""
+    WITH expected AS ({_EXPECTED_SQL}),
+    actual AS (
+        SELECT {_AGGREGATE_COLUMNS}
+        FROM lead_daily_aggregates
+        WHERE tenant_id = $1
+    )
+    SELECT day, status, seller_id, {_DELTA}
+    FROM expected e
+    FULL JOIN actual a USING (day, status, seller_id)
+    WHERE ({_EXPECTED_ROW}) IS DISTINCT FROM ({_ACTUAL_ROW})
+"""
+
+_APPLY_CORRECTION_SQL = f"""
+    INSERT INTO lead_daily_aggregates AS a (tenant_id, {_AGGREGATE_COLUMNS})
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
+    ON CONFLICT (tenant_id, day, status, seller_id) DO UPDATE SET
+        {", ".join(f"{c} = a.{c} + EXCLUDED.{c}" for c in _ADDITIVE_COLUMNS)},
+        updated_at = NOW()
+"""
+
+
+class LeadAggregatesService:
+    """Reconciliation and staleness reporting for lead_daily_aggregates."""
+
+    def __init__(self, max_staleness_seconds: float = LEAD_AGGREGATES_MAX_STALENESS_SECONDS):
+        self.max_staleness_seconds = max_staleness_seconds
+        self._stats = {"reconciled": 0, "drifted": 0, "stale_reads": 0, "errors": 0}
+
+    def is_stale(self, reconciled_at: Optional[datetime], now: Optional[datetime] = None) -> bool:
+        if reconciled_at is None:
+            return True
+        now = now or datetime.now(timezone.utc)
+        return (now - reconciled_at).total_seconds() > self.max_staleness_seconds
+
+    async def reconcile_tenant(self, pool, tenant_id: int) -> int:
+        """Corrects the tenant's buckets from leads (primary pool). Returns the number of drifted rows."""
+        async with pool.acquire() as conn:
+            async with conn.transaction(isolation="repeatable_read", readonly=True):
+                corrections = await conn.fetch(_CORRECTIONS_SQL, tenant_id)
+            async with conn.transaction():
+                if corrections:
+                    await conn.executemany(_APPLY_CORRECTION_SQL, [
+                        (tenant_id, r["day"], r["status"], r["seller_id"], *(r[c] for c in _ADDITIVE_COLUMNS))
+                        for r in corrections
+                    ])
+                    logger.warning(f"Lead aggregates drifted for tenant {tenant_id}: {len(corrections)} rows corrected")
+                # Buckets emptied by status moves are dead weight for every read
+                await conn.execute(
+                    "DELETE FROM lead_daily_aggregates WHERE tenant_id = $1 AND lead_count = 0",
+                    tenant_id,
+                )
+                await conn.execute("""
+                    INSERT INTO lead_aggregate_state (tenant_id, reconciled_at, drift_rows)
+                    VALUES ($1, NOW(), $2)
+                    ON CONFLICT (tenant_id) DO UPDATE
+                    SET reconciled_at = EXCLUDED.reconciled_at, drift_rows = EXCLUDED.drift_rows
+                """, tenant_id, len(corrections))
+        self._stats["reconciled"] += 1
+        if corrections:
+            self._stats["drifted"] += 1
+        return len(corrections)
+
+    async def reconcile_all(self, pool) -> Dict[str, int]:
+        """Background job: reconciles every active tenant, one tenant at a time."""
+        tenants = await pool.fetch("SELECT id FROM tenants WHERE status = 'active'")
+        drifted = 0
+        for t in tenants:
+            try:
+                if await self.reconcile_tenant(pool, t["id"]):
+                    drifted += 1
+            except Exception as e:
+                self._stats["errors"] += 1
+                logger.error(f"Lead aggregates reconciliation failed for tenant {t['id']}: {e}")
+        return {"tenants": len(tenants), "drifted": drifted}
+
+    async def last_reconciled_at(self, pool, tenant_id: int) -> Optional[datetime]:
+        """Read-only: when the tenant's aggregates were last reconciled (None = never). Safe on the read pool."""
+        reconciled_at = await pool.fetchval(
+            "SELECT reconciled_at FROM lead_aggregate_state WHERE tenant_id = $1", tenant_id
+        )
+        if self.is_stale(reconciled_at):
+            self._stats["stale_reads"] += 1
+        return reconciled_at
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self._stats, "max_staleness_seconds": self.max_staleness_seconds}
+
+
+# Global instance
+lead_aggregates_service = LeadAggregatesService()
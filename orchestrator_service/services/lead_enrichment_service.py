@@ -0,0 +1,205 @@
+"""
+Lead enrichment for the seller panels — batched meetings, messages and notes.
+
+/my-queue, /follow-up-queue and /closer-panel used to run one or two queries
+per lead (upcoming meetings, last N chat messages, post-call notes), so a
+queue of 50 leads cost ~100 round trips. Each enrichment is now one set query
+for the whole page:
+
+- Meetings and notes: `lead_id = ANY($2)` with ROW_NUMBER() per lead, capped
+  at N rows per lead.
+- Messages: unnest(phones) CROSS JOIN LATERAL (... ORDER BY created_at DESC
+  LIMIT N), so each phone still seeks idx_chat_messages_tenant_from_created.
+
+Callers run the enrichments of a page concurrently on the read lane.
+
+Full panel responses are cached per seller and filters in a short-lived
+process cache (core/two_tier_cache.py, L1 only). Entries are tagged with the
+tenant and with every conversation they show: a chat message write
+invalidates the panels showing that phone, lead writes (status, assignment,
+take / follow-up / closer actions) and the note and agenda routes
+(lead_notes_routes, crm_sales agenda and post-call notes) invalidate the
+tenant. Invalidated panels are dropped, never served stale; the TTL bounds
+staleness for writes made by other replicas or by background agents.
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence
+
+from core.two_tier_cache import TwoTierCache
+
+logger = logging.getLogger(__name__)
+
+LEAD_PANEL_CACHE_TTL_SECONDS = float(os.getenv("LEAD_PANEL_CACHE_TTL_SECONDS", "20"))
+LEAD_PANEL_CACHE_MAX_ENTRIES = int(os.getenv("LEAD_PANEL_CACHE_MAX_ENTRIES", "1024"))
+
+UPCOMING_MEETINGS_SQL = """
+    SELECT lead_id, id, title, start_datetime, end_datetime, status, seller_first, seller_last
+    FROM (
+        SELECT sae.lead_id, sae.id, sae.title, sae.start_datetime, sae.end_datetime, sae.status,
+               p.first_name AS seller_first, p.last_name AS seller_last,
+               ROW_NUMBER() OVER (PARTITION BY sae.lead_id ORDER BY sae.start_datetime ASC) AS rn
+        FROM seller_agenda_events sae
+        LEFT JOIN professionals p ON p.id = sae.seller_id
+        WHERE sae.tenant_id = $1 AND sae.lead_id = ANY($2::uuid[])
+          AND sae.status = 'scheduled'
+          AND sae.start_datetime > NOW()
+    ) m
+    WHERE rn <= $3
+    ORDER BY lead_id, start_datetime ASC
+"""
+
+RECENT_MESSAGES_SQL = """
+    SELECT p.phone, m.role, m.content, m.created_at
+    FROM unnest($2::text[]) AS p(phone)
+    CROSS JOIN LATERAL (
+        SELECT cm.role, cm.content, cm.created_at
+        FROM chat_messages cm
+        WHERE cm.tenant_id = $1 AND cm.from_number = p.phone
+        ORDER BY cm.created_at DESC
+        LIMIT $3
+    ) m
+    ORDER BY p.phone, m.created_at ASC
+"""
+
+RECENT_NOTES_SQL = """
+    SELECT lead_id, id, author_id, note_type, content, structured_data, visibility, created_at,
+           author_first_name, author_last_name, author_role
+    FROM (
+        SELECT ln.lead_id, ln.id, ln.author_id, ln.note_type, ln.content, ln.structured_data,
+               ln.visibility, ln.created_at,
+               u.first_name AS author_first_name, u.last_name AS author_last_name, u.role AS author_role,
+               ROW_NUMBER() OVER (PARTITION BY ln.lead_id ORDER BY ln.created_at DESC) AS rn
+        FROM lead_notes ln
+        LEFT JOIN users u ON ln.author_id = u.id
+        WHERE ln.tenant_id = $1 AND ln.lead_id = ANY($2::uuid[])
+          AND ln.note_type = ANY($3::text[])
+    ) n
+    WHERE rn <= $4
+    ORDER BY lead_id, created_at DESC
+"""
+
+
+def panel_tenant_tag(tenant_id: int) -> str:
+    return f"tenant:{tenant_id}"
+
+
+def conversation_tag(tenant_id: int, phone: str) -> str:
+    return f"conv:{tenant_id}:{phone}"
+
+
+def _unique(values: Iterable[Any]) -> List[Any]:
+    return list(dict.fromkeys(v for v in values if v))
+
+
+def _group(rows: Sequence[Any], key: str) -> Dict[Any, List[Dict[str, Any]]]:
+    """Rows (already ordered per group) -> {key: [row without the key column]}."""
+    grouped: Dict[Any, List[Dict[str, Any]]] = {}
+    for row in rows:
+        item = dict(row)
+        grouped.setdefault(item.pop(key), []).append(item)
+    return grouped
+
+
+class LeadEnrichmentService:
+    """Set-based enrichment queries and the panel response cache."""
+
+    def __init__(self):
+        self.cache = TwoTierCache(
+            prefix="lead_panels",
+            max_entries=LEAD_PANEL_CACHE_MAX_ENTRIES,
+            l1_ttl_seconds=LEAD_PANEL_CACHE_TTL_SECONDS,
+            stale_seconds=0,
+            jitter=0,
+            serve_stale_on_invalidate=False,
+        )
+
+    # ------------------------------------------------------------------
+    # Batched enrichment
+    # ------------------------------------------------------------------
+    async def upcoming_meetings(
+        self, pool, tenant_id: int, lead_ids: Iterable[Any], per_lead: int = 5
+    ) -> Dict[Any, List[Dict[str, Any]]]:
+        """Next scheduled meetings per lead (soonest first), at most per_lead each."""
+        ids = _unique(lead_ids)
+        if not ids:
+            return {}
+        rows = await pool.fetch(UPCOMING_MEETINGS_SQL, tenant_id, ids, per_lead)
+        return _group(rows, "lead_id")
+
+    async def recent_messages(
+        self, pool, tenant_id: int, phones: Iterable[str], per_phone: int = 10
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Last per_phone chat messages per conversation, in chronological order."""
+        unique_phones = _unique(phones)
+        if not unique_phones:
+            return {}
+        rows = await pool.fetch(RECENT_MESSAGES_SQL, tenant_id, unique_phones, per_phone)
+        return _group(rows, "phone")
+
+    async def recent_notes(
+        self, pool, tenant_id: int, lead_ids: Iterable[Any], note_types: Sequence[str], per_lead: int = 5
+    ) -> Dict[Any, List[Dict[str, Any]]]:
+        """Latest notes of the given types per lead (newest first), with author name and role."""
+        ids = _unique(lead_ids)
+        if not ids:
+            return {}
+        rows = await pool.fetch(RECENT_NOTES_SQL, tenant_id, ids, list(note_types), per_lead)
+        return _group(rows, "lead_id")
+
+    async def enrich_queue(
+        self, pool, tenant_id: int, leads: List[Dict[str, Any]],
+        meetings_per_lead: int = 5, messages_per_lead: int = 10,
+    ) -> List[Dict[str, Any]]:
+        """Adds upcoming_meetings and conversation_history to setter queue leads (two concurrent queries)."""
+        meetings, messages = await asyncio.gather(
+            self.upcoming_meetings(pool, tenant_id, (l["id"] for l in leads), meetings_per_lead),
+            self.recent_messages(pool, tenant_id, (l["phone_number"] for l in leads), messages_per_lead),
+        )
+        for lead in leads:
+            lead["upcoming_meetings"] = meetings.get(lead["id"], [])
+            lead["conversation_history"] = messages.get(lead["phone_number"], [])
+        return leads
+
+    # ------------------------------------------------------------------
+    # Panel response cache
+    # ------------------------------------------------------------------
+    async def cached_panel(
+        self,
+        panel: str,
+        tenant_id: int,
+        key_parts: Sequence[Any],
+        loader: Callable[[], Awaitable[Any]],
+        phones_of: Optional[Callable[[Any], Iterable[str]]] = None,
+    ) -> Any:
+        """
+        Serves a panel response from cache or builds it with loader().
+        phones_of(response) lists the conversations shown, so message writes
+        to any of them drop the entry.
+        """
+        key = ":".join([panel, str(tenant_id), *("" if p is None else str(p) for p in key_parts)])
+        value_tags = None
+        if phones_of is not None:
+            value_tags = lambda value: [conversation_tag(tenant_id, p) for p in _unique(phones_of(value))]
+        return await self.cache.get_or_load(
+            key,
+            loader,
+            ttl_seconds=LEAD_PANEL_CACHE_TTL_SECONDS,
+            tags=[panel_tenant_tag(tenant_id)],
+            value_tags=value_tags,
+        )
+
+    def invalidate_tenant(self, tenant_id: int):
+        """Drops every cached panel of the tenant (lead status, tags, assignment, agenda or note writes)."""
+        self.cache.invalidate_tags([panel_tenant_tag(tenant_id)])
+
+    def invalidate_conversation(self, tenant_id: int, *phones: Optional[str]):
+        """Drops the cached panels that show any of these conversations (chat message writes)."""
+        self.cache.invalidate_tags([conversation_tag(tenant_id, p) for p in _unique(phones)])
+
+    def get_stats(self) -> Dict[str, Any]:
+        return self.cache.get_stats()
+
+
+lead_enrichment_service = LeadEnrichmentService()
@@ -0,0 +1,193 @@
+"""
+Lead listing queries — keyset pagination for /leads and the setter queue ordering.
+
+/leads used to page with OFFSET (cost grows with the page number) and filter
+search with four ILIKEs. Listing now orders by (created_at DESC, id DESC):
+
+- Offset mode is still accepted for existing clients; every page returns an
+  opaque X-Next-Cursor that continues in keyset mode, which seeks straight to
+  the position through idx_leads_tenant_created_keyset (Parche 49) so deep pages
+  cost the same as the first one.
+- Tag filters run in the database (`tags @> '["a","b"]'`, GIN idx_leads_tags)
+  instead of re-parsing `tags` in Python per row.
+- Search is one ILIKE over name/phone/email concatenated, backed by a trigram
+  expression index when pg_trgm is available.
+
+The setter queue (GET /my-queue) gets its priority ordering (hot/urgent tags
+first, then warm, then PRIORITY_ORDER by status, oldest first) from SQL.
+
+See scripts/benchmark_lead_listing.py for offset vs keyset latency by page depth.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+LEAD_LIST_COLUMNS = """
+    l.id, l.tenant_id, l.phone_number, l.first_name, l.last_name, l.email,
+    l.status, l.stage_id, l.assigned_seller_id, l.source, l.meta_lead_id, l.tags,
+    l.apify_title, l.apify_category_name, l.apify_address, l.apify_city, l.apify_state, l.apify_country_code,
+    l.apify_website, l.apify_place_id, l.apify_total_score, l.apify_reviews_count, l.apify_scraped_at,
+    l.prospecting_niche, l.prospecting_location_query,
+    l.outreach_message_sent, l.outreach_send_requested, l.outreach_last_requested_at, l.outreach_last_sent_at,
+    l.score,
+    l.estimated_value, l.close_probability, l.weighted_revenue,
+    CASE WHEN u.id IS NOT NULL THEN TRIM(COALESCE(u.first_name, '') || ' ' || COALESCE(u.last_name, '')) ELSE NULL END AS seller_name,
+    l.created_at, l.updated_at
+"""
+
+# Must match the idx_leads_search_trgm expression (Parche 49) for the index to be used
+LEAD_SEARCH_EXPR = (
+    "(COALESCE(l.first_name, '') || ' ' || COALESCE(l.last_name, '') || ' ' || "
+    "COALESCE(l.phone_number, '') || ' ' || COALESCE(l.email, ''))"
+)
+
+# Queue priority by status when no temperature tag applies (lower = first)
+PRIORITY_ORDER = {
+    "hot": 0, "caliente": 0,
+    "warm": 1, "tibio": 1,
+    "derivado": 2,
+    "cold": 3, "new": 4,
+}
+HOT_TAGS = ("caliente", "urgente")
+WARM_TAGS = ("tibio",)
+DEFAULT_QUEUE_PRIORITY = 3
+
+
+def encode_lead_cursor(created_at: datetime, lead_id: Any) -> str:
+    payload = json.dumps([created_at.isoformat(), str(lead_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_lead_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """Opaque cursor -> (created_at, id) of the last lead of the previous page. Raises ValueError if malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, lead_id = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        return datetime.fromisoformat(created_at), UUID(lead_id)
+    except Exception:
+        raise ValueError("Invalid leads cursor")
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def build_lead_list_query(
+    tenant_id: int,
+    *,
+    seller_scope: Optional[UUID] = None,
+    status: Optional[str] = None,
+    assigned_seller_id: Optional[UUID] = None,
+    search: Optional[str] = None,
+    tags: Optional[Sequence[str]] = None,
+    limit: int = 50,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+) -> Tuple[str, List[Any]]:
+    """
+    SQL + params for one page of leads, ordered by (created_at DESC, id DESC).
+    Fetches limit + 1 rows so the caller can tell whether another page exists.
+    With a cursor the page starts right after it and offset is ignored.
+    """
+    where = ["l.tenant_id = $1", "l.status IS DISTINCT FROM 'deleted'"]
+    params: List[Any] = [tenant_id]
+
+    def _param(value: Any) -> str:
+        params.append(value)
+        return f"${len(params)}"
+
+    # Setters and closers only see their own leads
+    if seller_scope is not None:
+        where.append(f"l.assigned_seller_id = {_param(seller_scope)}")
+    if status:
+        where.append(f"l.status = {_param(status)}")
+    if assigned_seller_id:
+        where.append(f"l.assigned_seller_id = {_param(assigned_seller_id)}")
+    if search and search.strip():
+        where.append(f"{LEAD_SEARCH_EXPR} ILIKE {_param('%' + _escape_like(search.strip()) + '%')}")
+    tag_list = [t for t in (tags or []) if t]
+    if tag_list:
+        # The pool's jsonb codec encodes the list itself (json.dumps here would double-encode)
+        where.append(f"l.tags @> {_param(tag_list)}::jsonb")
+    if cursor:
+        created_at, lead_id = decode_lead_cursor(cursor)
+        where.append(f"(l.created_at, l.id) < ({_param(created_at)}, {_param(lead_id)})")
+
+    query = f"""
+        SELECT {LEAD_LIST_COLUMNS}
+        FROM leads l
+        LEFT JOIN users u ON u.id = l.assigned_seller_id
+        WHERE {' AND '.join(where)}
+        ORDER BY l.created_at DESC, l.id DESC
+        LIMIT {_param(limit + 1)}
+    """
+    if offset and not cursor:
+        query += f" OFFSET {_param(offset)}"
+    return query, params
+
+
+def next_lead_cursor(rows: Sequence[Dict[str, Any]], limit: int) -> Optional[str]:
+    """Cursor after the last row of the page, or None when rows (limit + 1 fetched) fit in one page."""
+    if len(rows) <= limit:
+        return None
+    last = rows[limit - 1]
+    return encode_lead_cursor(last["created_at"], last["id"])
+
+
+def _in_list(values: Sequence[str]) -> str:
+    return ", ".join("'" + v.replace("'", "''") + "'" for v in values)
+
+
+def queue_priority_sql(alias: str = "l") -> str:
+    """CASE expression with the setter queue priority (0 = hottest); mirrors the former Python sort key."""
+    status = f"lower(COALESCE({alias}.status, 'new'))"
+    hot_status = [s for s, p in PRIORITY_ORDER.items() if p == 0]
+    warm_status = [s for s, p in PRIORITY_ORDER.items() if p == 1]
+    by_status = " ".join(f"WHEN '{s}' THEN {p}" for s, p in PRIORITY_ORDER.items())
+    return f"""CASE
+        WHEN {alias}.tags ?| ARRAY[{_in_list(HOT_TAGS)}] OR {status} IN ({_in_list(hot_status)}) THEN 0
+        WHEN {alias}.tags ?| ARRAY[{_in_list(WARM_TAGS)}] OR {status} IN ({_in_list(warm_status)}) THEN 1
+        ELSE CASE {status} {by_status} ELSE {DEFAULT_QUEUE_PRIORITY} END
+    END"""
+
+
+def build_queue_query(
+    tenant_id: int, seller_id: UUID, status: Optional[str] = None, tag: Optional[str] = None
+) -> Tuple[str, List[Any]]:
+    """Leads assigned to the seller, tag-filtered and priority-ordered in SQL."""
+    where = ["l.tenant_id = $1", "l.assigned_seller_id = $2"]
+    params: List[Any] = [tenant_id, seller_id]
+    if status:
+        params.append(status)
+        where.append(f"l.status = ${len(params)}")
+    if tag:
+        params.append([tag])
+        where.append(f"l.tags @> ${len(params)}::jsonb")
+
+    query = f"""
+        SELECT
+            l.id,
+            l.phone_number,
+            l.first_name,
+            l.last_name,
+            l.email,
+            l.company,
+            l.status,
+            l.source,
+            l.lead_source,
+            l.score,
+            l.score_breakdown,
+            l.tags,
+            l.estimated_value,
+            l.created_at,
+            l.updated_at,
+            l.status_changed_at,
+            l.assignment_history,
+            {queue_priority_sql()} AS queue_priority
+        FROM leads l
+        WHERE {' AND '.join(where)}
+        ORDER BY queue_priority ASC, l.created_at ASC NULLS FIRST, l.id ASC
+    """
+    return query, params
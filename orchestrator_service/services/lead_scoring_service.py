@@ -4,41 +4,80 @@ Calculates a 0-100 score for each lead based on:
   - Engagement (0-40): message activity, response speed, recency
   - Fit (0-30): source quality, tags, completeness
   - Behavior (0-30): urgency signals, pricing mentions, demo requests
+
+Scoring is set-based: for a chunk of leads the engagement stats and the last
+20 user messages are fetched with one grouped query each, keywords are matched
+with a single precompiled pattern and results are written back with one
+UPDATE ... FROM unnest(...). calculate_lead_score is the same path for one lead.
 """
 
 import json
 import logging
-from datetime import datetime, timedelta, timezone
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 logger = logging.getLogger(__name__)
 
+BEHAVIOR_MESSAGES_PER_LEAD = 20
+BULK_SCORING_CHUNK_SIZE = 2000
+
+URGENCY_WORDS = ["urgente", "rapido", "necesito ya", "cuanto antes", "hoy", "ahora", "inmediato"]
+PRICING_WORDS = ["precio", "costo", "cuanto sale", "presupuesto", "cotizacion", "descuento", "plan", "paquete"]
+DEMO_WORDS = ["demo", "reunion", "llamada", "agendar", "cita", "conocer", "probar", "presentacion"]
+
+
+class KeywordMatcher:
+    """
+    Precompiled multi-pattern matcher: one regex scan per text instead of one
+    substring search per keyword. Same semantics as `word in text` (substring,
+    each keyword counted once): the lookahead lets matches overlap, and keywords
+    that are a prefix of a longer keyword are implied by its match.
+    """
+
+    def __init__(self, categories: Dict[str, Sequence[str]]):
+        self._category_of = {w: cat for cat, words in categories.items() for w in words}
+        self._categories = list(categories)
+        self._implied = {
+            w: {p for p in self._category_of if p != w and w.startswith(p)}
+            for w in self._category_of
+        }
+        alternation = "|".join(re.escape(w) for w in sorted(self._category_of, key=len, reverse=True))
+        self._pattern = re.compile(f"(?=({alternation}))")
+
+    def count(self, text: str) -> Dict[str, int]:
+        found = set()
+        for m in self._pattern.finditer(text):
+            word = m.group(1)
+            found.add(word)
+            found |= self._implied[word]
+        counts = {cat: 0 for cat in self._categories}
+        for word in found:
+            counts[self._category_of[word]] += 1
+        return counts
+
+
+BEHAVIOR_MATCHER = KeywordMatcher({
+    "urgency": URGENCY_WORDS,
+    "pricing": PRICING_WORDS,
+    "demo": DEMO_WORDS,
+})
+
 
 async def calculate_lead_score(pool, lead_id, tenant_id: int) -> dict:
     """Calculate and store lead score. Returns { score, breakdown }."""
     try:
         lead = await pool.fetchrow(
-            "SELECT * FROM leads WHERE id = $1 AND tenant_id = $2",
+            """SELECT id, phone_number, source, first_name, last_name, email, company, tags
+               FROM leads WHERE id = $1 AND tenant_id = $2""",
             lead_id, tenant_id
         )
         if not lead:
             return {"score": 0, "breakdown": {}}
 
-        engagement = await _score_engagement(pool, lead, tenant_id)
-        fit = _score_fit(lead)
-        behavior = await _score_behavior(pool, lead, tenant_id)
-
-        total = min(100, engagement["score"] + fit["score"] + behavior["score"])
-        breakdown = {
-            "engagement": engagement,
-            "fit": fit,
-            "behavior": behavior,
-            "calculated_at": datetime.now(timezone.utc).isoformat(),
-        }
-
-        await pool.execute(
-            "UPDATE leads SET score = $1, score_breakdown = $2::jsonb, score_updated_at = NOW() WHERE id = $3 AND tenant_id = $4",
-            total, json.dumps(breakdown), lead_id, tenant_id
-        )
+        scores = await _compute_scores(pool, tenant_id, [lead])
+        total, breakdown = scores[lead["id"]]
+        await _write_scores(pool, tenant_id, scores)
 
         return {"score": total, "breakdown": breakdown}
 
@@ -47,22 +86,86 @@ async def calculate_lead_score(pool, lead_id, tenant_id: int) -> dict:
         return {"score": 0, "breakdown": {"error": str(e)}}
 
 
-async def _score_engagement(pool, lead, tenant_id: int) -> dict:
+async def _compute_scores(pool, tenant_id: int, leads: List[Any]) -> Dict[Any, Tuple[int, dict]]:
+    """Scores a chunk of leads with two grouped queries. Returns {lead_id: (total, breakdown)}."""
+    phones = list({l["phone_number"] for l in leads if l["phone_number"]})
+    stats: Dict[str, Any] = {}
+    texts: Dict[str, List[str]] = {}
+
+    if phones:
+        for row in await pool.fetch(
+            """SELECT cc.external_user_id AS phone,
+                      COUNT(DISTINCT cc.id) AS conv_count,
+                      COUNT(cm.id) AS msg_count,
+                      MAX(cm.created_at) AS last_msg
+               FROM chat_conversations cc
+               LEFT JOIN chat_messages cm ON cm.conversation_id = cc.id
+               WHERE cc.tenant_id = $1 AND cc.external_user_id = ANY($2::text[])
+               GROUP BY cc.external_user_id""",
+            tenant_id, phones
+        ):
+            stats[row["phone"]] = row
+
+        for row in await pool.fetch(
+            """SELECT phone, content FROM (
+                   SELECT cc.external_user_id AS phone, cm.content,
+                          ROW_NUMBER() OVER (PARTITION BY cc.external_user_id ORDER BY cm.created_at DESC) AS rn
+                   FROM chat_messages cm
+                   JOIN chat_conversations cc ON cm.conversation_id = cc.id
+                   WHERE cc.tenant_id = $1 AND cc.external_user_id = ANY($2::text[])
+                   AND cm.role = 'user'
+               ) recent
+               WHERE rn <= $3""",
+            tenant_id, phones, BEHAVIOR_MESSAGES_PER_LEAD
+        ):
+            texts.setdefault(row["phone"], []).append((row["content"] or "").lower())
+
+    now = datetime.now(timezone.utc)
+    calculated_at = now.isoformat()
+    results: Dict[Any, Tuple[int, dict]] = {}
+    for lead in leads:
+        phone = lead["phone_number"]
+        engagement = _score_engagement(phone, stats.get(phone), now)
+        fit = _score_fit(lead)
+        behavior = _score_behavior(phone, " ".join(texts.get(phone, [])))
+
+        total = min(100, engagement["score"] + fit["score"] + behavior["score"])
+        results[lead["id"]] = (total, {
+            "engagement": engagement,
+            "fit": fit,
+            "behavior": behavior,
+            "calculated_at": calculated_at,
+        })
+    return results
+
+
+async def _write_scores(pool, tenant_id: int, scores: Dict[Any, Tuple[int, dict]]) -> None:
+    """Single set-based write-back for a chunk of scored leads."""
+    if not scores:
+        return
+    ids = list(scores)
+    await pool.execute(
+        """UPDATE leads l
+           SET score = u.score, score_breakdown = u.breakdown::jsonb, score_updated_at = NOW()
+           FROM unnest($1::uuid[], $2::int[], $3::text[]) AS u(id, score, breakdown)
+           WHERE l.id = u.id AND l.tenant_id = $4""",
+        ids,
+        [scores[i][0] for i in ids],
+        [json.dumps(scores[i][1]) for i in ids],
+        tenant_id,
+    )
+
+
+def _score_engagement(phone: Optional[str], stats, now: datetime) -> dict:
     """Engagement Score (0-40): message frequency, recency, conversation depth."""
     score = 0
     details = {}
 
-    phone = lead.get("phone_number", "")
     if not phone:
         return {"score": 0, "details": {"no_phone": True}}
 
     # Message count (0-15)
-    msg_count = await pool.fetchval(
-        """SELECT COUNT(*) FROM chat_messages cm
-           JOIN chat_conversations cc ON cm.conversation_id = cc.id
-           WHERE cc.external_user_id = $1 AND cc.tenant_id = $2""",
-        phone, tenant_id
-    ) or 0
+    msg_count = (stats["msg_count"] if stats else 0) or 0
 
     if msg_count >= 20:
         score += 15
@@ -75,15 +178,10 @@ async def _score_engagement(pool, lead, tenant_id: int) -> dict:
     details["messages"] = msg_count
 
     # Recency — last message (0-15)
-    last_msg = await pool.fetchval(
-        """SELECT MAX(cm.created_at) FROM chat_messages cm
-           JOIN chat_conversations cc ON cm.conversation_id = cc.id
-           WHERE cc.external_user_id = $1 AND cc.tenant_id = $2""",
-        phone, tenant_id
-    )
+    last_msg = stats["last_msg"] if stats else None
 
     if last_msg:
-        days_ago = (datetime.now(timezone.utc) - last_msg.replace(tzinfo=timezone.utc)).days
+        days_ago = (now - last_msg.replace(tzinfo=timezone.utc)).days
         if days_ago <= 1:
             score += 15
         elif days_ago <= 3:
@@ -99,11 +197,7 @@ async def _score_engagement(pool, lead, tenant_id: int) -> dict:
         details["last_message_days_ago"] = None
 
     # Conversation depth — multiple sessions (0-10)
-    conv_count = await pool.fetchval(
-        """SELECT COUNT(*) FROM chat_conversations
-           WHERE external_user_id = $1 AND tenant_id = $2""",
-        phone, tenant_id
-    ) or 0
+    conv_count = (stats["conv_count"] if stats else 0) or 0
     if conv_count >= 3:
         score += 10
     elif conv_count >= 2:
@@ -114,7 +208,6 @@ async def _score_engagement(pool, lead, tenant_id: int) -> dict:
 
     return {"score": min(40, score), "details": details}
 
-
 def _score_fit(lead) -> dict:
     """Fit Score (0-30): source quality, data completeness, tags."""
     score = 0
@@ -155,44 +248,30 @@ def _score_fit(lead) -> dict:
     return {"score": min(30, score), "details": details}
 
 
-async def _score_behavior(pool, lead, tenant_id: int) -> dict:
-    """Behavior Score (0-30): urgency signals in messages."""
+def _score_behavior(phone: Optional[str], all_text: str) -> dict:
+    """Behavior Score (0-30): urgency signals in the last user messages."""
     score = 0
     details = {}
 
-    phone = lead.get("phone_number", "")
     if not phone:
         return {"score": 0, "details": {}}
 
-    # Get recent messages content
-    messages = await pool.fetch(
-        """SELECT cm.content FROM chat_messages cm
-           JOIN chat_conversations cc ON cm.conversation_id = cc.id
-           WHERE cc.external_user_id = $1 AND cc.tenant_id = $2
-           AND cm.role = 'user'
-           ORDER BY cm.created_at DESC LIMIT 20""",
-        phone, tenant_id
-    )
-
-    all_text = " ".join((m["content"] or "").lower() for m in messages)
+    hits = BEHAVIOR_MATCHER.count(all_text)
 
     # Urgency keywords (0-10)
-    urgency_words = ["urgente", "rapido", "necesito ya", "cuanto antes", "hoy", "ahora", "inmediato"]
-    urgency_hits = sum(1 for w in urgency_words if w in all_text)
+    urgency_hits = hits["urgency"]
     urgency_score = min(10, urgency_hits * 3)
     score += urgency_score
     details["urgency_signals"] = urgency_hits
 
     # Pricing/value interest (0-10)
-    pricing_words = ["precio", "costo", "cuanto sale", "presupuesto", "cotizacion", "descuento", "plan", "paquete"]
-    pricing_hits = sum(1 for w in pricing_words if w in all_text)
+    pricing_hits = hits["pricing"]
     pricing_score = min(10, pricing_hits * 3)
     score += pricing_score
     details["pricing_interest"] = pricing_hits
 
     # Demo/meeting request (0-10)
-    demo_words = ["demo", "reunion", "llamada", "agendar", "cita", "conocer", "probar", "presentacion"]
-    demo_hits = sum(1 for w in demo_words if w in all_text)
+    demo_hits = hits["demo"]
     demo_score = min(10, demo_hits * 4)
     score += demo_score
     details["demo_interest"] = demo_hits
@@ -220,19 +299,59 @@ async def decay_scores(pool, tenant_id: int):
         logger.error(f"Error in score decay: {e}")
 
 
-async def batch_calculate_scores(pool, tenant_id: int, limit: int = 50):
-    """Calculate scores for leads that don't have one yet or are stale."""
-    try:
+async def bulk_calculate_scores(
+    pool,
+    tenant_id: int,
+    only_changed: bool = True,
+    max_leads: Optional[int] = None,
+    chunk_size: int = BULK_SCORING_CHUNK_SIZE,
+) -> int:
+    """
+    Scores every lead of a tenant in chunks (keyset on id). With only_changed, only
+    leads never scored or with messages newer than score_updated_at are processed.
+    Returns the number of leads scored.
+    """
+    scored = 0
+    last_id = None
+    while max_leads is None or scored < max_leads:
+        batch_size = chunk_size if max_leads is None else min(chunk_size, max_leads - scored)
         leads = await pool.fetch("""
-            SELECT id FROM leads
-            WHERE tenant_id = $1
-            AND (score IS NULL OR score = 0 OR score_updated_at IS NULL OR score_updated_at < NOW() - INTERVAL '1 hour')
-            ORDER BY updated_at DESC LIMIT $2
-        """, tenant_id, limit)
+            SELECT l.id, l.phone_number, l.source, l.first_name, l.last_name, l.email, l.company, l.tags
+            FROM leads l
+            WHERE l.tenant_id = $1
+            AND ($2::uuid IS NULL OR l.id > $2::uuid)
+            AND (
+                NOT $3::boolean
+                OR l.score_updated_at IS NULL
+                OR EXISTS (
+                    SELECT 1 FROM chat_conversations cc
+                    JOIN chat_messages cm ON cm.conversation_id = cc.id
+                    WHERE cc.tenant_id = l.tenant_id
+                    AND cc.external_user_id = l.phone_number
+                    AND cm.created_at > l.score_updated_at
+                )
+            )
+            ORDER BY l.id
+            LIMIT $4
+        """, tenant_id, last_id, only_changed, batch_size)
+        if not leads:
+            break
+
+        scores = await _compute_scores(pool, tenant_id, leads)
+        await _write_scores(pool, tenant_id, scores)
+        scored += len(leads)
+        last_id = leads[-1]["id"]
+        if len(leads) < batch_size:
+            break
 
-        for lead in leads:
-            await calculate_lead_score(pool, lead["id"], tenant_id)
+    logger.info(f"Bulk scored {scored} leads for tenant {tenant_id} (only_changed={only_changed})")
+    return scored
 
-        logger.info(f"Batch scored {len(leads)} leads for tenant {tenant_id}")
+
+async def batch_calculate_scores(pool, tenant_id: int, limit: Optional[int] = None) -> int:
+    """Calculate scores for leads that were never scored or have new messages."""
+    try:
+        return await bulk_calculate_scores(pool, tenant_id, only_changed=True, max_leads=limit)
     except Exception as e:
         logger.error(f"Error in batch scoring: {e}")
+        return 0
@@ -119,6 +119,12 @@ class LeadStatusService:
                 VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
             """, lead_id, tenant_id, current_status, new_status, user_id, user_name, comment, '{}')
             
+            # Conversiones del día: los tableros cacheados del tenant quedan stale
+            from services.metrics_cache_service import metrics_cache_service
+            from services.lead_enrichment_service import lead_enrichment_service
+            metrics_cache_service.invalidate_tenant(tenant_id)
+            lead_enrichment_service.invalidate_tenant(tenant_id)
+            
             # 5. Fase 5 Automatizaciones: Despachar Action Triggers
             # Import aquí para evitar dependencias cruzadas costosas al startup si LeadAutomationService crece
             from services.lead_automation_service import LeadAutomationService
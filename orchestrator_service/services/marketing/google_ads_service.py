@@ -13,6 +13,8 @@ from typing import Dict, Any, Optional, List
 import httpx
 from fastapi import HTTPException
 
+from core.http_clients import http_clients
+
 logger = logging.getLogger(__name__)
 
 # Google Ads API configuration
@@ -102,7 +104,7 @@ class GoogleAdsClient:
         }
 
         try:
-            async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT) as client:
+            async with http_clients.session(timeout=REQUEST_TIMEOUT) as client:
                 response = await client.post(url, headers=headers, json=data)
 
             if response.status_code == 401:
@@ -203,7 +205,7 @@ class GoogleAdsClient:
         }
 
         try:
-            async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT) as client:
+            async with http_clients.session(timeout=REQUEST_TIMEOUT) as client:
                 response = await client.post(url, headers=headers, json=data)
 
             if response.status_code != 200:
@@ -277,7 +279,7 @@ class GoogleAdsClient:
         }
 
         try:
-            async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT) as client:
+            async with http_clients.session(timeout=REQUEST_TIMEOUT) as client:
                 response = await client.get(url, headers=headers)
 
             if response.status_code != 200:
@@ -340,7 +342,7 @@ class GoogleAdsService:
         }
 
         try:
-            async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT) as client:
+            async with http_clients.session(timeout=REQUEST_TIMEOUT) as client:
                 response = await client.post(GOOGLE_OAUTH_TOKEN_URL, data=data)
 
             if response.status_code != 200:
@@ -405,7 +407,7 @@ class GoogleAdsService:
                 "grant_type": "refresh_token"
             }
 
-            async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT) as client:
+            async with http_clients.session(timeout=REQUEST_TIMEOUT) as client:
                 response = await client.post(GOOGLE_OAUTH_TOKEN_URL, data=data)
 
             if response.status_code != 200:
@@ -462,7 +464,7 @@ class GoogleAdsService:
         }
 
         try:
-            async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT) as client:
+            async with http_clients.session(timeout=REQUEST_TIMEOUT) as client:
                 response = await client.get(GOOGLE_USERINFO_URL, headers=headers)
 
             if response.status_code != 200:
@@ -13,6 +13,8 @@ from typing import Optional, Dict, Any, List
 import httpx
 from fastapi import HTTPException
 
+from core.http_clients import http_clients
+
 logger = logging.getLogger(__name__)
 
 GRAPH_API_VERSION = os.getenv("META_GRAPH_API_VERSION", "v21.0")
@@ -74,7 +76,7 @@ class MetaAdsClient:
         }
 
         try:
-            async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT) as client:
+            async with http_clients.session(timeout=REQUEST_TIMEOUT) as client:
                 response = await client.get(url, params=params)
 
             if response.status_code == 401:
@@ -175,7 +177,7 @@ class MetaAdsClient:
 
         try:
             all_insights = []
-            async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT * 2) as client:
+            async with http_clients.session(timeout=REQUEST_TIMEOUT * 2) as client:
                 current_url = url
                 while current_url:
                     response = await client.get(current_url, params=params if current_url == url else None)
@@ -211,7 +213,7 @@ class MetaAdsClient:
             "access_token": self.access_token,
         }
         try:
-            async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT) as client:
+            async with http_clients.session(timeout=REQUEST_TIMEOUT) as client:
                 response = await client.get(url, params=params)
                 response.raise_for_status()
                 return response.json().get("data", [])
@@ -231,7 +233,7 @@ class MetaAdsClient:
         all_accounts = []
         
         try:
-            async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT) as client:
+            async with http_clients.session(timeout=REQUEST_TIMEOUT) as client:
                 if portfolio_id:
                     # 1. Intentar client_ad_accounts
                     url_client = f"{GRAPH_API_BASE}/{portfolio_id}/client_ad_accounts"
@@ -293,7 +295,7 @@ class MetaAdsClient:
 
         try:
             all_campaigns = []
-            async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT * 2) as client:
+            async with http_clients.session(timeout=REQUEST_TIMEOUT * 2) as client:
                 current_url = url
                 while current_url:
                     response = await client.get(current_url, params=params if current_url == url else None)
@@ -344,7 +346,7 @@ class MetaAdsClient:
 
         try:
             all_ads = []
-            async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT * 2) as client:
+            async with http_clients.session(timeout=REQUEST_TIMEOUT * 2) as client:
                 current_url = url
                 while current_url:
                     response = await client.get(current_url, params=params if current_url == url else None)
@@ -400,7 +402,7 @@ class MetaOAuthService:
         }
         
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
+            async with http_clients.session(timeout=10.0) as client:
                 response = await client.get(url, params=params)
                 
                 if response.status_code != 200:
@@ -456,7 +458,7 @@ class MetaOAuthService:
         }
         
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
+            async with http_clients.session(timeout=10.0) as client:
                 response = await client.get(url, params=params)
                 
                 if response.status_code != 200:
@@ -502,7 +504,7 @@ class MetaOAuthService:
         }
         
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
+            async with http_clients.session(timeout=10.0) as client:
                 response = await client.get(url, params=params)
                 
                 if response.status_code != 200:
@@ -627,6 +629,8 @@ class MetaOAuthService:
                 "DELETE FROM credentials WHERE tenant_id = $1 AND name IN ('META_USER_LONG_TOKEN', 'META_CONNECTION_INFO', 'META_AD_ACCOUNT_ID')",
                 tenant_id
             )
+            from core.tenant_cache import tenant_cache
+            tenant_cache.invalidate_tenant(tenant_id)
             
             logger.info(f"Removed Meta credentials from Vault for tenant {tenant_id}")
             return True
@@ -654,7 +658,7 @@ class MetaOAuthService:
         }
         
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
+            async with http_clients.session(timeout=5.0) as client:
                 response = await client.get(url, params=params)
                 
                 if response.status_code == 200:
@@ -730,7 +734,7 @@ class MetaOAuthService:
                 "access_token": token,
                 "limit": 50
             }
-            async with httpx.AsyncClient(timeout=10.0) as client:
+            async with http_clients.session(timeout=10.0) as client:
                 response = await client.get(url, params=params)
                 if response.status_code == 200:
                     return response.json().get("data", [])
@@ -797,7 +801,7 @@ class MetaOAuthService:
                 "access_token": access_token
             }
             
-            async with httpx.AsyncClient(timeout=5.0) as client:
+            async with http_clients.session(timeout=5.0) as client:
                 response = await client.get(url, params=params)
                 
                 if response.status_code == 200:
@@ -29,6 +29,9 @@ import httpx
 
 from db import db
 from core.credentials import get_tenant_credential
+from core.tenant_cache import tenant_cache, NS_CHANNEL_BINDING
+from core.http_clients import http_clients
+from core.rate_limiter import Rate, rate_limit_engine
 from services.meta_messaging_client import meta_client
 
 logger = logging.getLogger(__name__)
@@ -36,6 +39,24 @@ logger = logging.getLogger(__name__)
 WHATSAPP_SERVICE_URL = os.getenv("WHATSAPP_SERVICE_URL", "http://whatsapp_service:8002")
 INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN", "internal-secret-token")
 
+# Per sender number quotas, shared by every worker (core/rate_limiter.py).
+# Over the quota a send waits for a token; after the max wait it fails.
+YCLOUD_SEND_RATE = Rate.parse(os.getenv("YCLOUD_SEND_RATE_LIMIT", "20/second"))
+META_SEND_RATE = Rate.parse(os.getenv("META_SEND_RATE_LIMIT", "80/second"))
+OUTBOUND_SEND_MAX_WAIT_SECONDS = float(os.getenv("OUTBOUND_SEND_MAX_WAIT_SECONDS", "10"))
+
+
+async def _throttle(provider: str, sender: str, rate: Rate, messages: int):
+    """Waits until the sender number has quota for this many provider calls."""
+    if messages <= 0:
+        return
+    waited = await rate_limit_engine.acquire(
+        f"outbound:{provider}:{sender}", rate, cost=messages,
+        max_wait_seconds=OUTBOUND_SEND_MAX_WAIT_SECONDS,
+    )
+    if waited:
+        logger.info("outbound_throttled provider=%s sender=%s waited=%.2fs", provider, sender, waited)
+
 
 class UnifiedMessageDelivery:
     """Thin router that decides *how* to send each outbound message."""
@@ -116,7 +137,7 @@ class UnifiedMessageDelivery:
         2. Heuristic based on available credentials
         """
         # 1. Check channel_bindings for an active binding
-        try:
+        async def _load_binding_provider() -> Optional[str]:
             row = await db.fetchrow(
                 """
                 SELECT provider
@@ -130,8 +151,15 @@ class UnifiedMessageDelivery:
                 tenant_id,
                 channel,
             )
-            if row and row["provider"]:
-                return row["provider"]
+            return row["provider"] if row and row["provider"] else None
+
+        try:
+            provider = await tenant_cache.get_or_load(
+                NS_CHANNEL_BINDING, (int(tenant_id), channel, "provider"),
+                _load_binding_provider, tenant_id=int(tenant_id),
+            )
+            if provider:
+                return provider
         except Exception as exc:
             logger.warning(
                 "channel_binding_lookup_failed tenant=%s channel=%s error=%s",
@@ -176,6 +204,10 @@ class UnifiedMessageDelivery:
         """
         results: List[dict] = []
 
+        sender = await get_tenant_credential(tenant_id, "YCLOUD_WHATSAPP_NUMBER") or \
+            os.getenv("YCLOUD_WHATSAPP_NUMBER") or f"tenant-{tenant_id}"
+        await _throttle("ycloud", sender, YCLOUD_SEND_RATE, len(images) + (1 if text else 0))
+
         # Send images first (if any)
         for img_url in images:
             res = await self._ycloud_direct_image(
@@ -230,7 +262,7 @@ class UnifiedMessageDelivery:
             "Content-Type": "application/json",
         }
         try:
-            async with httpx.AsyncClient(timeout=httpx.Timeout(20.0, connect=5.0)) as client:
+            async with http_clients.session(timeout=httpx.Timeout(20.0, connect=5.0)) as client:
                 resp = await client.post(url, json=payload, headers=headers)
                 resp.raise_for_status()
                 return resp.json()
@@ -257,7 +289,7 @@ class UnifiedMessageDelivery:
             "type": "text",
             "text": {"body": text, "preview_url": True},
         }
-        async with httpx.AsyncClient(timeout=httpx.Timeout(20.0, connect=5.0)) as client:
+        async with http_clients.session(timeout=httpx.Timeout(20.0, connect=5.0)) as client:
             resp = await client.post(url, json=payload, headers=headers)
             resp.raise_for_status()
             return resp.json()
@@ -279,7 +311,7 @@ class UnifiedMessageDelivery:
             "type": "image",
             "image": {"link": image_url},
         }
-        async with httpx.AsyncClient(timeout=httpx.Timeout(20.0, connect=5.0)) as client:
+        async with http_clients.session(timeout=httpx.Timeout(20.0, connect=5.0)) as client:
             resp = await client.post(url, json=payload, headers=headers)
             resp.raise_for_status()
             return resp.json()
@@ -350,6 +382,7 @@ class UnifiedMessageDelivery:
             )
 
         results: List[dict] = []
+        await _throttle("meta", phone_number_id, META_SEND_RATE, len(images) + (1 if text else 0))
 
         # Images first
         for img_url in images:
@@ -384,7 +417,7 @@ class UnifiedMessageDelivery:
 
         if not page_id or not page_token:
             # Try channel_bindings to get the channel_id (= page_id)
-            try:
+            async def _load_binding_channel_id() -> Optional[str]:
                 binding = await db.fetchrow(
                     """
                     SELECT channel_id
@@ -399,8 +432,15 @@ class UnifiedMessageDelivery:
                     tenant_id,
                     channel,
                 )
-                if binding:
-                    page_id = page_id or binding["channel_id"]
+                return binding["channel_id"] if binding else None
+
+            try:
+                bound_channel_id = await tenant_cache.get_or_load(
+                    NS_CHANNEL_BINDING, (int(tenant_id), channel, "meta_channel_id"),
+                    _load_binding_channel_id, tenant_id=int(tenant_id),
+                )
+                if bound_channel_id:
+                    page_id = page_id or bound_channel_id
             except Exception as exc:
                 logger.warning("channel_binding_fetch_error: %s", exc)
 
@@ -423,6 +463,7 @@ class UnifiedMessageDelivery:
             )
 
         results: List[dict] = []
+        await _throttle("meta", page_id, META_SEND_RATE, len(images) + (1 if text else 0))
 
         # Pick the right sender based on channel
         if channel == "instagram":
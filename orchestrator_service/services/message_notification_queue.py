@@ -0,0 +1,215 @@
+"""
+Write-behind queue for "new lead message" notifications.
+
+append_chat_message used to resolve the assigned seller and the CEO and then
+save + broadcast notifications while holding its pool connection. Now it only
+enqueues (tenant_id, from_number, preview); a background worker flushes the
+buffer every window, coalescing bursts per conversation so a lead that sends
+five messages in a window produces one notification per recipient.
+Seller and CEO resolution is done set-based, once per tenant per flush.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from db import db
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_WINDOW_SECONDS = float(os.getenv("MESSAGE_NOTIFICATION_WINDOW_SECONDS", "10"))
+NOTIFICATION_QUEUE_MAX_PENDING = int(os.getenv("MESSAGE_NOTIFICATION_QUEUE_MAX_PENDING", "5000"))
+
+
+@dataclass
+class _PendingConversation:
+    tenant_id: int
+    from_number: str
+    last_preview: str
+    message_count: int
+    first_seen: float
+
+
+class MessageNotificationQueue:
+    """Bounded, per-conversation coalescing buffer flushed by a background task."""
+
+    def __init__(
+        self,
+        window_seconds: float = NOTIFICATION_WINDOW_SECONDS,
+        max_pending: int = NOTIFICATION_QUEUE_MAX_PENDING,
+    ):
+        self.window_seconds = window_seconds
+        self.max_pending = max_pending
+        self._pending: "OrderedDict[Tuple[int, str], _PendingConversation]" = OrderedDict()
+        self._worker: Optional[asyncio.Task] = None
+        self._stats = {
+            "enqueued": 0,
+            "coalesced": 0,
+            "dropped": 0,
+            "flushes": 0,
+            "notifications_sent": 0,
+            "flush_errors": 0,
+        }
+
+    def enqueue(self, tenant_id: int, from_number: str, content: str) -> bool:
+        """Registers a user message; never touches the DB. Returns False if the buffer is full."""
+        key = (int(tenant_id), from_number)
+        self._stats["enqueued"] += 1
+        pending = self._pending.get(key)
+        if pending:
+            pending.last_preview = content or ""
+            pending.message_count += 1
+            self._stats["coalesced"] += 1
+        elif len(self._pending) >= self.max_pending:
+            self._stats["dropped"] += 1
+            logger.warning(f"Message notification buffer full ({self.max_pending}); dropping {from_number}")
+            return False
+        else:
+            self._pending[key] = _PendingConversation(
+                tenant_id=int(tenant_id),
+                from_number=from_number,
+                last_preview=content or "",
+                message_count=1,
+                first_seen=time.monotonic(),
+            )
+        self._ensure_worker()
+        return True
+
+    def _ensure_worker(self):
+        if self._worker and not self._worker.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # No loop (sync context): the next enqueue from the app will start it
+        self._worker = loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.window_seconds)
+            if self._pending:
+                await self.flush()
+
+    def _drain(self) -> List[_PendingConversation]:
+        batch = list(self._pending.values())
+        self._pending.clear()
+        return batch
+
+    async def flush(self) -> int:
+        """Builds and delivers notifications for everything buffered so far."""
+        batch = self._drain()
+        if not batch:
+            return 0
+
+        by_tenant: Dict[int, List[_PendingConversation]] = {}
+        for item in batch:
+            by_tenant.setdefault(item.tenant_id, []).append(item)
+
+        sent = 0
+        for tenant_id, items in by_tenant.items():
+            try:
+                sent += await self._flush_tenant(tenant_id, items)
+            except Exception as e:
+                self._stats["flush_errors"] += 1
+                logger.error(f"Error triggering message notifications for tenant {tenant_id}: {e}")
+
+        self._stats["flushes"] += 1
+        self._stats["notifications_sent"] += sent
+        return sent
+
+    async def _flush_tenant(self, tenant_id: int, items: List[_PendingConversation]) -> int:
+        from services.seller_notification_service import seller_notification_service, Notification
+
+        numbers = [i.from_number for i in items]
+        async with db.pool.acquire() as conn:
+            # Latest assigned seller per conversation + lead name, in one pass
+            rows = await conn.fetch("""
+                SELECT DISTINCT ON (cm.from_number)
+                    cm.from_number, cm.assigned_seller_id, l.first_name, l.last_name
+                FROM chat_messages cm
+                LEFT JOIN leads l ON cm.from_number = l.phone_number AND cm.tenant_id = l.tenant_id
+                WHERE cm.tenant_id = $1 AND cm.from_number = ANY($2::text[])
+                AND cm.assigned_seller_id IS NOT NULL
+                ORDER BY cm.from_number, cm.created_at DESC
+            """, tenant_id, numbers)
+            if not rows:
+                return 0
+            ceo = await conn.fetchrow(
+                "SELECT id FROM users WHERE tenant_id = $1 AND role = 'ceo' AND status = 'active' LIMIT 1",
+                tenant_id,
+            )
+
+        assigned = {r["from_number"]: r for r in rows}
+        timestamp = datetime.utcnow().timestamp()
+        notifications = []
+        for item in items:
+            row = assigned.get(item.from_number)
+            if not row:
+                continue
+            from_number = item.from_number
+            content = item.last_preview
+            lead_name = f"{row['first_name'] or ''} {row['last_name'] or ''}".strip() or from_number
+            burst = f" (+{item.message_count - 1} mensajes)" if item.message_count > 1 else ""
+
+            # Notification for Seller
+            notifications.append(Notification(
+                id=f"msg_{from_number}_{timestamp}",
+                tenant_id=tenant_id,
+                type="unanswered",
+                title="💬 Nuevo mensaje de Lead",
+                message=f"{lead_name}: {content[:50]}...{burst}",
+                priority="high",
+                recipient_id=str(row['assigned_seller_id']),
+                related_entity_type="conversation",
+                related_entity_id=from_number,
+                metadata={"phone": from_number, "preview": content[:100], "message_count": item.message_count}
+            ))
+
+            # Notification for CEO
+            if ceo and str(ceo['id']) != str(row['assigned_seller_id']):
+                notifications.append(Notification(
+                    id=f"msg_ceo_{from_number}_{timestamp}",
+                    tenant_id=tenant_id,
+                    type="unanswered",
+                    title="📢 Actividad Lead (Global)",
+                    message=f"{lead_name} envió un mensaje. Asignado a: (Seller ID: {row['assigned_seller_id']})",
+                    priority="medium",
+                    recipient_id=str(ceo['id']),
+                    related_entity_type="conversation",
+                    related_entity_id=from_number,
+                    metadata={"phone": from_number, "seller_id": str(row['assigned_seller_id']), "message_count": item.message_count}
+                ))
+
+        if notifications:
+            await seller_notification_service.save_notifications(notifications)
+            await seller_notification_service.broadcast_notifications(notifications)
+        return len(notifications)
+
+    async def stop(self):
+        """Stops the worker and flushes whatever is still buffered (app shutdown)."""
+        if self._worker and not self._worker.done():
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._worker = None
+        await self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        oldest = min((p.first_seen for p in self._pending.values()), default=None)
+        return {
+            **self._stats,
+            "pending": len(self._pending),
+            "max_pending": self.max_pending,
+            "window_seconds": self.window_seconds,
+            "oldest_pending_age_seconds": round(time.monotonic() - oldest, 2) if oldest else 0,
+        }
+
+
+# Global instance
+message_notification_queue = MessageNotificationQueue()
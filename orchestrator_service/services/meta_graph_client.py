@@ -8,7 +8,7 @@ import os
 import logging
 from typing import Any, Dict, List, Optional
 
-import httpx
+from core.http_clients import http_clients
 
 logger = logging.getLogger(__name__)
 
@@ -35,7 +35,7 @@ class MetaGraphClientError(Exception):
 # ---------------------------------------------------------------------------
 
 async def _get(url: str, params: Dict[str, Any] | None = None) -> Dict[str, Any]:
-    async with httpx.AsyncClient(timeout=TIMEOUT) as client:
+    async with http_clients.session(timeout=TIMEOUT) as client:
         resp = await client.get(url, params=params)
         data = resp.json()
         if "error" in data:
@@ -49,7 +49,7 @@ async def _get(url: str, params: Dict[str, Any] | None = None) -> Dict[str, Any]
 
 
 async def _post(url: str, data: Dict[str, Any] | None = None, params: Dict[str, Any] | None = None) -> Dict[str, Any]:
-    async with httpx.AsyncClient(timeout=TIMEOUT) as client:
+    async with http_clients.session(timeout=TIMEOUT) as client:
         resp = await client.post(url, data=data, params=params)
         result = resp.json()
         if "error" in result:
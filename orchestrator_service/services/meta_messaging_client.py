@@ -12,6 +12,8 @@ from typing import Optional
 import httpx
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 
+from core.http_clients import http_clients
+
 logger = logging.getLogger(__name__)
 
 GRAPH_API_VERSION = "v21.0"
@@ -33,7 +35,7 @@ class MetaMessagingClient:
         retry=retry_if_exception_type(httpx.HTTPError),
     )
     async def _post(self, url: str, json_data: dict, headers: dict) -> dict:
-        async with httpx.AsyncClient(timeout=self._timeout) as client:
+        async with http_clients.session(timeout=self._timeout) as client:
             response = await client.post(url, json=json_data, headers=headers)
             response.raise_for_status()
             return response.json()
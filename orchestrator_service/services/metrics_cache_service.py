@@ -1,98 +1,102 @@
 """
-Metrics Cache Service - Optimized real-time metrics with Redis caching
+Metrics Cache Service - Optimized real-time metrics with a two-tier cache
+
+Process LRU in front of Redis (core/two_tier_cache.py): per-key single-flight,
+stale-while-revalidate, jittered TTLs and a circuit breaker, so a Redis outage
+degrades to process-local caching instead of reconnecting on every call.
+Entries are tagged per tenant / per seller and invalidated by message and lead writes.
 """
 import logging
-import json
-import asyncio
+import os
 from typing import Dict, List, Optional, Any
 from uuid import UUID
-from datetime import datetime, timedelta
-import redis.asyncio as redis
+from datetime import datetime
 from db import db
+from core.two_tier_cache import RedisCircuitBreaker, TwoTierCache
+from services.seller_counters_service import seller_counters_service
 
 logger = logging.getLogger(__name__)
 
+METRICS_CACHE_TTL_SECONDS = float(os.getenv("METRICS_CACHE_TTL_SECONDS", "300"))
+METRICS_CACHE_STALE_SECONDS = float(os.getenv("METRICS_CACHE_STALE_SECONDS", "60"))
+METRICS_CACHE_L1_TTL_SECONDS = float(os.getenv("METRICS_CACHE_L1_TTL_SECONDS", "15"))
+METRICS_CACHE_L1_MAX_ENTRIES = int(os.getenv("METRICS_CACHE_L1_MAX_ENTRIES", "2048"))
+METRICS_CACHE_TTL_JITTER = float(os.getenv("METRICS_CACHE_TTL_JITTER", "0.1"))
+METRICS_CACHE_REDIS_FAILURE_THRESHOLD = int(os.getenv("METRICS_CACHE_REDIS_FAILURE_THRESHOLD", "3"))
+METRICS_CACHE_REDIS_COOLDOWN_SECONDS = float(os.getenv("METRICS_CACHE_REDIS_COOLDOWN_SECONDS", "30"))
+METRICS_CACHE_REDIS_TIMEOUT_SECONDS = float(os.getenv("METRICS_CACHE_REDIS_TIMEOUT_SECONDS", "0.5"))
+DAILY_SUMMARY_TTL_SECONDS = 3600
+
+
+def tenant_tag(tenant_id: int) -> str:
+    return f"tenant:{tenant_id}"
+
+
+def seller_tag(tenant_id: int, seller_id: Any) -> str:
+    return f"seller:{tenant_id}:{seller_id}"
+
+
 class MetricsCacheService:
     """
     Service for caching and optimizing seller metrics calculations
-    Uses Redis for fast access and reduces database load
+    Serves from process memory / Redis and reduces database load
     """
     
     def __init__(self, redis_url: Optional[str] = None):
-        self.redis_url = redis_url or "redis://localhost:6379"
-        self.redis_client = None
-        self.cache_ttl = 300  # 5 minutes cache TTL
-        self.metrics_lock = asyncio.Lock()
+        if redis_url is None:
+            from config import Settings
+            settings = Settings()
+            redis_url, redis_password = settings.REDIS_URL, settings.REDIS_PASSWORD
+        else:
+            redis_password = None
+        self.redis_url = redis_url
+        self.cache_ttl = METRICS_CACHE_TTL_SECONDS
+        self.cache = TwoTierCache(
+            prefix="metrics",
+            redis_factory=self._redis_factory(redis_url, redis_password) if redis_url else None,
+            max_entries=METRICS_CACHE_L1_MAX_ENTRIES,
+            l1_ttl_seconds=METRICS_CACHE_L1_TTL_SECONDS,
+            stale_seconds=METRICS_CACHE_STALE_SECONDS,
+            jitter=METRICS_CACHE_TTL_JITTER,
+            breaker=RedisCircuitBreaker(
+                failure_threshold=METRICS_CACHE_REDIS_FAILURE_THRESHOLD,
+                cooldown_seconds=METRICS_CACHE_REDIS_COOLDOWN_SECONDS,
+            ),
+        )
+        if not redis_url:
+            logger.info("Metrics cache: no REDIS_URL, caching stays process-local")
+    
+    @staticmethod
+    def _redis_factory(redis_url: str, redis_password: Optional[str]):
+        def _connect():
+            import redis.asyncio as redis
+            return redis.from_url(
+                redis_url,
+                password=redis_password,
+                encoding="utf-8",
+                decode_responses=True,
+                socket_timeout=METRICS_CACHE_REDIS_TIMEOUT_SECONDS,
+                socket_connect_timeout=METRICS_CACHE_REDIS_TIMEOUT_SECONDS,
+            )
+        return _connect
     
     async def get_redis_client(self):
-        """Get or create Redis client"""
-        if self.redis_client is None:
-            try:
-                self.redis_client = redis.from_url(
-                    self.redis_url,
-                    encoding="utf-8",
-                    decode_responses=True
-                )
-                await self.redis_client.ping()
-                logger.info("✅ Redis client connected successfully")
-            except Exception as e:
-                logger.error(f"❌ Failed to connect to Redis: {e}")
-                self.redis_client = None
-        return self.redis_client
+        """Redis client, or None when Redis is not configured or its circuit is open"""
+        return await self.cache.get_redis()
     
-    async def get_cached_metrics(self, seller_id: UUID, tenant_id: int) -> Optional[Dict]:
-        """Get metrics from Redis cache"""
-        try:
-            redis_client = await self.get_redis_client()
-            if not redis_client:
-                return None
-            
-            cache_key = f"metrics:seller:{seller_id}:tenant:{tenant_id}"
-            cached_data = await redis_client.get(cache_key)
-            
-            if cached_data:
-                metrics = json.loads(cached_data)
-                # Check if cache is still valid (not too old)
-                cached_at = datetime.fromisoformat(metrics.get('cached_at', '2000-01-01'))
-                if datetime.now() - cached_at < timedelta(seconds=self.cache_ttl):
-                    logger.debug(f"✅ Cache hit for seller {seller_id}")
-                    return metrics
-            
-            return None
-            
-        except Exception as e:
-            logger.error(f"Error getting cached metrics: {e}")
-            return None
+    def invalidate_seller(self, tenant_id: int, seller_id: Any):
+        """Marks a seller's cached metrics stale (Redis delete is coalesced in the background)"""
+        self.cache.invalidate_tags([seller_tag(tenant_id, seller_id)])
     
-    async def set_cached_metrics(self, seller_id: UUID, tenant_id: int, metrics: Dict):
-        """Store metrics in Redis cache"""
-        try:
-            redis_client = await self.get_redis_client()
-            if not redis_client:
-                return
-            
-            cache_key = f"metrics:seller:{seller_id}:tenant:{tenant_id}"
-            metrics['cached_at'] = datetime.now().isoformat()
-            
-            await redis_client.setex(
-                cache_key,
-                self.cache_ttl,
-                json.dumps(metrics, default=str)
-            )
-            logger.debug(f"✅ Cache set for seller {seller_id}")
-            
-        except Exception as e:
-            logger.error(f"Error setting cached metrics: {e}")
+    def invalidate_tenant(self, tenant_id: int):
+        """Marks every cached metric of the tenant stale (team views, summaries, sellers)"""
+        self.cache.invalidate_tags([tenant_tag(tenant_id)])
     
     async def invalidate_metrics_cache(self, seller_id: UUID, tenant_id: int):
         """Invalidate cache for specific seller"""
         try:
-            redis_client = await self.get_redis_client()
-            if not redis_client:
-                return
-            
-            cache_key = f"metrics:seller:{seller_id}:tenant:{tenant_id}"
-            await redis_client.delete(cache_key)
+            self.invalidate_seller(tenant_id, seller_id)
+            await self.cache.flush_invalidations()
             logger.debug(f"✅ Cache invalidated for seller {seller_id}")
             
         except Exception as e:
@@ -103,112 +107,30 @@ class MetricsCacheService:
         Get real-time conversation metrics with caching
         Optimized for frequent access
         """
-        cache_key = f"realtime:conv:{seller_id}:tenant:{tenant_id}"
-        
         try:
-            # Try cache first
-            cached = await self.get_cached_metrics(seller_id, tenant_id)
-            if cached and 'realtime_conversations' in cached:
-                return cached['realtime_conversations']
-            
-            async with self.metrics_lock:
-                # Calculate fresh metrics
-                metrics = await self._calculate_realtime_conversation_metrics(seller_id, tenant_id)
-                
-                # Update cache
-                await self.set_cached_metrics(seller_id, tenant_id, {
-                    'realtime_conversations': metrics,
-                    'calculated_at': datetime.now().isoformat()
-                })
-                
-                return metrics
-                
+            return await self.cache.get_or_load(
+                f"realtime:conv:{tenant_id}:{seller_id}",
+                lambda: self._compute_realtime_conversation_metrics(seller_id, tenant_id),
+                ttl_seconds=self.cache_ttl,
+                tags=[tenant_tag(tenant_id), seller_tag(tenant_id, seller_id)],
+            )
         except Exception as e:
             logger.error(f"Error getting realtime conversation metrics: {e}")
             return await self._calculate_realtime_conversation_metrics(seller_id, tenant_id)
     
+    async def _compute_realtime_conversation_metrics(self, seller_id: UUID, tenant_id: int) -> Dict:
+        """Real-time conversation metrics from the seller counters projection (raises, so errors are never cached)"""
+        team = await seller_counters_service.fetch_window(
+            db.read_pool or db.pool, tenant_id, period_days=1, seller_id=seller_id
+        )
+        unread = await self._count_unread_messages(tenant_id, [seller_id])
+        row = team[0] if team else {"seller_id": seller_id}
+        return self._realtime_from_projection(row, unread.get(seller_id, 0))
+    
     async def _calculate_realtime_conversation_metrics(self, seller_id: UUID, tenant_id: int) -> Dict:
-        """Calculate real-time conversation metrics (optimized query)"""
+        """Calculate real-time conversation metrics from the seller counters projection"""
         try:
-            # Get active conversations (last 24 hours)
-            active_convs = await db.fetchval("""
-                SELECT COUNT(DISTINCT from_number)
-                FROM chat_messages
-                WHERE assigned_seller_id = $1
-                AND tenant_id = $2
-                AND assigned_at >= NOW() - INTERVAL '24 hours'
-            """, seller_id, tenant_id) or 0
-            
-            # Get today's assignments
-            today_assignments = await db.fetchval("""
-                SELECT COUNT(DISTINCT from_number)
-                FROM chat_messages
-                WHERE assigned_seller_id = $1
-                AND tenant_id = $2
-                AND assigned_at::date = CURRENT_DATE
-            """, seller_id, tenant_id) or 0
-            
-            # Get unread messages
-            unread_messages = await db.fetchval("""
-                SELECT COUNT(*)
-                FROM chat_messages cm
-                WHERE cm.assigned_seller_id = $1
-                AND cm.tenant_id = $2
-                AND cm.role = 'user'
-                AND cm.created_at >= NOW() - INTERVAL '24 hours'
-                AND NOT EXISTS (
-                    SELECT 1 FROM message_reads mr 
-                    WHERE mr.message_id = cm.id 
-                    AND mr.user_id = $1
-                )
-            """, seller_id, tenant_id) or 0
-            
-            # Get response time for last 10 conversations
-            response_times = await db.fetch("""
-                WITH seller_responses AS (
-                    SELECT 
-                        from_number,
-                        MIN(created_at) as first_response
-                    FROM chat_messages
-                    WHERE assigned_seller_id = $1
-                    AND tenant_id = $2
-                    AND role = 'assistant'
-                    AND created_at >= NOW() - INTERVAL '24 hours'
-                    GROUP BY from_number
-                ),
-                user_messages AS (
-                    SELECT 
-                        from_number,
-                        MIN(created_at) as first_message
-                    FROM chat_messages
-                    WHERE assigned_seller_id = $1
-                    AND tenant_id = $2
-                    AND role = 'user'
-                    AND created_at >= NOW() - INTERVAL '24 hours'
-                    GROUP BY from_number
-                )
-                SELECT 
-                    EXTRACT(EPOCH FROM (sr.first_response - um.first_message)) as response_seconds
-                FROM seller_responses sr
-                JOIN user_messages um ON sr.from_number = um.from_number
-                WHERE sr.first_response > um.first_message
-                ORDER BY sr.first_response DESC
-                LIMIT 10
-            """, seller_id, tenant_id)
-            
-            avg_response_seconds = 0
-            if response_times:
-                times = [rt['response_seconds'] for rt in response_times if rt['response_seconds']]
-                if times:
-                    avg_response_seconds = sum(times) / len(times)
-            
-            return {
-                "active_conversations": int(active_convs),
-                "today_assignments": int(today_assignments),
-                "unread_messages": int(unread_messages),
-                "avg_response_seconds": round(avg_response_seconds, 1),
-                "calculated_at": datetime.now().isoformat()
-            }
+            return await self._compute_realtime_conversation_metrics(seller_id, tenant_id)
             
         except Exception as e:
             logger.error(f"Error calculating realtime metrics: {e}")
@@ -221,68 +143,102 @@ class MetricsCacheService:
                 "error": str(e)
             }
     
+    async def get_realtime_team_metrics(self, tenant_id: int) -> List[Dict]:
+        """Real-time metrics for every active seller of the tenant (two queries for the whole team)"""
+        return await self.cache.get_or_load(
+            f"realtime:team:{tenant_id}",
+            lambda: self._compute_realtime_team_metrics(tenant_id),
+            ttl_seconds=self.cache_ttl,
+            tags=[tenant_tag(tenant_id)],
+        )
+    
+    async def _compute_realtime_team_metrics(self, tenant_id: int) -> List[Dict]:
+        team = await seller_counters_service.fetch_window(db.read_pool or db.pool, tenant_id, period_days=1)
+        unread = await self._count_unread_messages(tenant_id, [r["seller_id"] for r in team])
+        return [
+            {
+                "seller_id": str(r["seller_id"]),
+                "first_name": r["first_name"],
+                "last_name": r["last_name"],
+                "role": r["role"],
+                "metrics": self._realtime_from_projection(r, unread.get(r["seller_id"], 0))
+            }
+            for r in team
+        ]
+    
+    def _realtime_from_projection(self, row: Dict, unread_messages: int) -> Dict:
+        responses = int(row.get("responses") or 0)
+        return {
+            "active_conversations": int(row.get("active_conversations") or 0),
+            "today_assignments": int(row.get("conversations_assigned_today") or 0),
+            "unread_messages": int(unread_messages),
+            "avg_response_seconds": round(int(row.get("response_seconds_sum") or 0) / responses, 1) if responses else 0,
+            "calculated_at": datetime.now().isoformat()
+        }
+    
+    async def _count_unread_messages(self, tenant_id: int, seller_ids: List[UUID]) -> Dict[UUID, int]:
+        """Unread inbound messages of the last 24h per seller"""
+        if not seller_ids:
+            return {}
+        rows = await db.fetch("""
+            SELECT cm.assigned_seller_id AS seller_id, COUNT(*) AS unread
+            FROM chat_messages cm
+            WHERE cm.assigned_seller_id = ANY($1::uuid[])
+            AND cm.tenant_id = $2
+            AND cm.role = 'user'
+            AND cm.created_at >= NOW() - INTERVAL '24 hours'
+            AND NOT EXISTS (
+                SELECT 1 FROM message_reads mr 
+                WHERE mr.message_id = cm.id 
+                AND mr.user_id = cm.assigned_seller_id
+            )
+            GROUP BY cm.assigned_seller_id
+        """, seller_ids, tenant_id)
+        return {r["seller_id"]: int(r["unread"]) for r in rows}
+    
     async def get_performance_trends(self, seller_id: UUID, tenant_id: int, days: int = 7) -> Dict:
         """Get performance trends over time"""
         try:
-            trends = await db.fetch("""
-                SELECT 
-                    DATE(metrics_period_start) as date,
-                    total_conversations,
-                    leads_converted,
-                    conversion_rate,
-                    avg_response_time_seconds
-                FROM seller_metrics
-                WHERE seller_id = $1
-                AND tenant_id = $2
-                AND metrics_period_start >= NOW() - INTERVAL '$3 days'
-                ORDER BY metrics_period_start ASC
-            """, seller_id, tenant_id, days)
-            
-            return {
-                "trends": [dict(trend) for trend in trends],
-                "period_days": days,
-                "seller_id": str(seller_id)
-            }
+            return await self.cache.get_or_load(
+                f"trends:{tenant_id}:{seller_id}:{days}",
+                lambda: self._calculate_performance_trends(seller_id, tenant_id, days),
+                ttl_seconds=self.cache_ttl,
+                tags=[tenant_tag(tenant_id), seller_tag(tenant_id, seller_id)],
+            )
             
         except Exception as e:
             logger.error(f"Error getting performance trends: {e}")
             return {"trends": [], "period_days": days, "error": str(e)}
     
+    async def _calculate_performance_trends(self, seller_id: UUID, tenant_id: int, days: int) -> Dict:
+        trends = await db.fetch("""
+            SELECT 
+                DATE(metrics_period_start) as date,
+                total_conversations,
+                leads_converted,
+                conversion_rate,
+                avg_response_time_seconds
+            FROM seller_metrics
+            WHERE seller_id = $1
+            AND tenant_id = $2
+            AND metrics_period_start >= NOW() - make_interval(days => $3)
+            ORDER BY metrics_period_start ASC
+        """, seller_id, tenant_id, days)
+        
+        return {
+            "trends": [dict(trend) for trend in trends],
+            "period_days": days,
+            "seller_id": str(seller_id)
+        }
+    
     async def update_metrics_on_message(self, seller_id: UUID, tenant_id: int, message_type: str):
         """
-        Update metrics in real-time when a message is sent/received
-        Optimized for high frequency updates
+        Invalidate cached metrics when a message is sent/received
+        The per-day counters themselves live in the seller counters projection
         """
         try:
-            # Invalidate cache to force recalculation
-            await self.invalidate_metrics_cache(seller_id, tenant_id)
-            
-            # Update real-time counters in Redis for immediate access
-            redis_client = await self.get_redis_client()
-            if redis_client:
-                today = datetime.now().strftime("%Y-%m-%d")
-                
-                if message_type == 'sent':
-                    await redis_client.hincrby(
-                        f"daily:metrics:{seller_id}:{tenant_id}:{today}",
-                        "messages_sent",
-                        1
-                    )
-                elif message_type == 'received':
-                    await redis_client.hincrby(
-                        f"daily:metrics:{seller_id}:{tenant_id}:{today}",
-                        "messages_received",
-                        1
-                    )
-                
-                # Update last activity timestamp
-                await redis_client.hset(
-                    f"daily:metrics:{seller_id}:{tenant_id}:{today}",
-                    "last_activity",
-                    datetime.now().isoformat()
-                )
-            
-            logger.debug(f"✅ Metrics updated for seller {seller_id} - {message_type}")
+            self.cache.invalidate_tags([seller_tag(tenant_id, seller_id), tenant_tag(tenant_id)])
+            logger.debug(f"✅ Metrics invalidated for seller {seller_id} - {message_type}")
             
         except Exception as e:
             logger.error(f"Error updating metrics on message: {e}")
@@ -293,26 +249,12 @@ class MetricsCacheService:
             date = datetime.now().strftime("%Y-%m-%d")
         
         try:
-            # Try Redis cache first
-            redis_client = await self.get_redis_client()
-            if redis_client:
-                cache_key = f"daily:summary:tenant:{tenant_id}:{date}"
-                cached = await redis_client.get(cache_key)
-                if cached:
-                    return json.loads(cached)
-            
-            # Calculate fresh summary
-            summary = await self._calculate_daily_summary(tenant_id, date)
-            
-            # Cache for 1 hour
-            if redis_client:
-                await redis_client.setex(
-                    cache_key,
-                    3600,  # 1 hour
-                    json.dumps(summary, default=str)
-                )
-            
-            return summary
+            return await self.cache.get_or_load(
+                f"daily:summary:{tenant_id}:{date}",
+                lambda: self._calculate_daily_summary(tenant_id, date),
+                ttl_seconds=DAILY_SUMMARY_TTL_SECONDS,
+                tags=[tenant_tag(tenant_id)],
+            )
             
         except Exception as e:
             logger.error(f"Error getting daily metrics summary: {e}")
@@ -410,14 +352,14 @@ class MetricsCacheService:
             # Database health
             db_health = await db.fetchval("SELECT 1") == 1
             
-            # Redis health
+            # Redis health (through the breaker: an open circuit reports False without a connection attempt)
             redis_health = False
             redis_client = await self.get_redis_client()
             if redis_client:
                 try:
                     await redis_client.ping()
                     redis_health = True
-                except:
+                except Exception:
                     redis_health = False
             
             # Metrics calculation health
@@ -430,9 +372,10 @@ class MetricsCacheService:
             return {
                 "database": db_health,
                 "redis": redis_health,
+                "redis_circuit": self.cache.breaker.state,
                 "metrics_calculation": bool(metrics_health),
                 "timestamp": datetime.now().isoformat(),
-                "cache_hit_rate": await self._calculate_cache_hit_rate() if redis_health else 0
+                "cache_hit_rate": self._calculate_cache_hit_rate()
             }
             
         except Exception as e:
@@ -445,49 +388,20 @@ class MetricsCacheService:
                 "error": str(e)
             }
     
-    async def _calculate_cache_hit_rate(self) -> float:
-        """Calculate cache hit rate (simplified)"""
-        try:
-            redis_client = await self.get_redis_client()
-            if not redis_client:
-                return 0.0
-            
-            # This is a simplified calculation
-            # In production, you'd want more sophisticated tracking
-            info = await redis_client.info('stats')
-            hits = info.get('keyspace_hits', 0)
-            misses = info.get('keyspace_misses', 0)
-            total = hits + misses
-            
-            if total > 0:
-                return round((hits / total) * 100, 2)
-            return 0.0
-            
-        except Exception as e:
-            logger.error(f"Error calculating cache hit rate: {e}")
-            return 0.0
+    def _calculate_cache_hit_rate(self) -> float:
+        """Hit rate (percent) of this process' metrics cache, stale hits included"""
+        return round(self.cache.hit_rate() * 100, 2)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return self.cache.get_stats()
     
     async def cleanup_old_cache(self, days: int = 7):
         """Cleanup old cache entries"""
         try:
-            redis_client = await self.get_redis_client()
-            if not redis_client:
-                return
-            
-            # This is a simplified cleanup
-            # In production, use Redis TTL or scheduled cleanup
-            pattern = "metrics:seller:*"
-            keys = await redis_client.keys(pattern)
-            
-            old_keys = []
-            for key in keys:
-                ttl = await redis_client.ttl(key)
-                if ttl < 0:  # No TTL or expired
-                    old_keys.append(key)
-            
-            if old_keys:
-                await redis_client.delete(*old_keys)
-                logger.info(f"✅ Cleaned up {len(old_keys)} old cache entries")
+            # Every entry the cache writes carries a TTL; this only sweeps keys without one
+            removed = await self.cache.clear_l2_orphans()
+            if removed:
+                logger.info(f"✅ Cleaned up {removed} old cache entries")
             
         except Exception as e:
             logger.error(f"Error cleaning up old cache: {e}")
@@ -31,8 +31,9 @@ logger = logging.getLogger(__name__)
 async def _nova_emit(event: str, data: Dict[str, Any]):
     """Emit a Socket.IO event so the frontend updates in real-time."""
     try:
-        from main import sio, to_json_safe
-        await sio.emit(event, to_json_safe(data))
+        from main import to_json_safe
+        from core.socket_manager import emit_to_tenant
+        await emit_to_tenant(event, to_json_safe(data), data.get("tenant_id"))
         logger.info(f"NOVA Socket: {event}")
     except Exception as e:
         logger.warning(f"NOVA Socket emit failed ({event}): {e}")
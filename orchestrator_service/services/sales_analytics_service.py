@@ -1,11 +1,16 @@
 """
 Sales Analytics Service — CRM VENTAS
 Provides funnel analysis, revenue forecast, and sales velocity calculations.
+
+Funnel and forecast read the per-tenant lead_daily_aggregates buckets (see
+lead_aggregates_service); velocity is a single aggregate query over closed deals.
 """
 
 import logging
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Iterable, Optional
+
+from services.lead_aggregates_service import lead_aggregates_service
 
 logger = logging.getLogger(__name__)
 
@@ -21,25 +26,30 @@ STAGE_PROBABILITIES = {
 }
 
 
+def _as_of(reconciled_at) -> Optional[str]:
+    return reconciled_at.isoformat() if reconciled_at else None
+
+
 async def get_funnel_data(pool, tenant_id: int, days: int = 30) -> dict:
     """Conversion funnel: leads per stage with conversion rates."""
     try:
-        since = datetime.now(timezone.utc) - timedelta(days=days)
+        reconciled_at = await lead_aggregates_service.last_reconciled_at(pool, tenant_id)
+        since_day = (datetime.now(timezone.utc) - timedelta(days=days)).date()
 
         stages = await pool.fetch("""
             SELECT ls.code, ls.name, ls.color, ls.sort_order, ls.is_final,
-                   COUNT(l.id) AS lead_count
+                   COALESCE(SUM(a.lead_count), 0) AS lead_count
             FROM lead_statuses ls
-            LEFT JOIN leads l ON l.status = ls.code AND l.tenant_id = $1
-                AND l.created_at >= $2
+            LEFT JOIN lead_daily_aggregates a ON a.tenant_id = $1 AND a.status = ls.code
+                AND a.day >= $2
             WHERE ls.tenant_id = $1
             GROUP BY ls.id, ls.code, ls.name, ls.color, ls.sort_order, ls.is_final
             ORDER BY ls.sort_order ASC
-        """, tenant_id, since)
+        """, tenant_id, since_day)
 
         total_leads = await pool.fetchval(
-            "SELECT COUNT(*) FROM leads WHERE tenant_id = $1 AND created_at >= $2",
-            tenant_id, since
+            "SELECT SUM(lead_count) FROM lead_daily_aggregates WHERE tenant_id = $1 AND day >= $2",
+            tenant_id, since_day
         ) or 1
 
         funnel = []
@@ -70,65 +80,67 @@ async def get_funnel_data(pool, tenant_id: int, days: int = 30) -> dict:
             "lost": lost,
             "win_rate": win_rate,
             "period_days": days,
+            "aggregates_reconciled_at": _as_of(reconciled_at),
         }
     except Exception as e:
         logger.error(f"Funnel error: {e}")
         return {"funnel": [], "total_leads": 0, "won": 0, "lost": 0, "win_rate": 0}
 
 
+def _forecast_pipeline(buckets: Iterable) -> list:
+    """
+    Per-stage forecast from aggregate buckets. Leads with an explicit close_probability
+    (> 0) contribute their own weighting; the rest use the stage default.
+    """
+    pipeline = []
+    for b in buckets:
+        code = b["status"] or "new"
+        count = int(b["lead_count"] or 0)
+        if count <= 0:
+            continue
+        default_prob = STAGE_PROBABILITIES.get(code, 0.1)
+        prob_count = int(b["prob_count"] or 0)
+        value = float(b["value_sum"] or 0)
+        default_value = value - float(b["prob_value_sum"] or 0)
+        weighted = float(b["weighted_value_sum"] or 0) + default_value * default_prob
+        prob_sum = float(b["prob_sum"] or 0) + (count - prob_count) * default_prob
+
+        pipeline.append({
+            "stage": code,
+            "count": count,
+            "total_value": round(value, 2),
+            "probability": round(prob_sum / count, 4),
+            "weighted_value": round(weighted, 2),
+        })
+    return pipeline
+
+
 async def get_forecast_data(pool, tenant_id: int) -> dict:
     """Revenue forecast: weighted pipeline value using per-lead close_probability when available."""
     try:
-        leads = await pool.fetch("""
-            SELECT l.status,
-                   COALESCE(l.estimated_value, 0) AS estimated_value,
-                   COALESCE(l.close_probability, 0) AS close_probability
-            FROM leads l
-            WHERE l.tenant_id = $1
-            AND l.status NOT IN ('won', 'lost')
+        reconciled_at = await lead_aggregates_service.last_reconciled_at(pool, tenant_id)
+
+        buckets = await pool.fetch("""
+            SELECT status,
+                   SUM(lead_count) AS lead_count,
+                   SUM(value_sum) AS value_sum,
+                   SUM(prob_count) AS prob_count,
+                   SUM(prob_value_sum) AS prob_value_sum,
+                   SUM(prob_sum) AS prob_sum,
+                   SUM(weighted_value_sum) AS weighted_value_sum
+            FROM lead_daily_aggregates
+            WHERE tenant_id = $1
+            AND status NOT IN ('won', 'lost')
+            GROUP BY status
         """, tenant_id)
+        pipeline = _forecast_pipeline(buckets)
 
-        # Aggregate per-stage using per-lead probability (fallback to STAGE_PROBABILITIES)
-        stage_buckets: dict = {}
-        for lead in leads:
-            code = lead["status"] or "new"
-            ev = float(lead["estimated_value"] or 0)
-            cp = float(lead["close_probability"] or 0)
-            # Use per-lead probability if explicitly set (> 0), else stage default
-            prob = (cp / 100) if cp > 0 else STAGE_PROBABILITIES.get(code, 0.1)
-            weighted = ev * prob
-
-            if code not in stage_buckets:
-                stage_buckets[code] = {"count": 0, "total_value": 0.0, "total_weighted": 0.0, "prob_sum": 0.0}
-            stage_buckets[code]["count"] += 1
-            stage_buckets[code]["total_value"] += ev
-            stage_buckets[code]["total_weighted"] += weighted
-            stage_buckets[code]["prob_sum"] += prob
-
-        pipeline = []
-        total_weighted = 0.0
-        total_unweighted = 0.0
-
-        for code, bucket in stage_buckets.items():
-            count = bucket["count"]
-            value = bucket["total_value"]
-            weighted = bucket["total_weighted"]
-            avg_prob = round(bucket["prob_sum"] / count, 4) if count > 0 else 0.0
-
-            pipeline.append({
-                "stage": code,
-                "count": count,
-                "total_value": round(value, 2),
-                "probability": avg_prob,
-                "weighted_value": round(weighted, 2),
-            })
-
-            total_weighted += weighted
-            total_unweighted += value
+        total_weighted = sum(p["weighted_value"] for p in pipeline)
+        total_unweighted = sum(p["total_value"] for p in pipeline)
 
         # Won revenue (actual)
         won_revenue = await pool.fetchval("""
-            SELECT COALESCE(SUM(estimated_value), 0) FROM leads
+            SELECT COALESCE(SUM(value_sum), 0) FROM lead_daily_aggregates
             WHERE tenant_id = $1 AND status = 'won'
         """, tenant_id) or 0
 
@@ -138,6 +150,7 @@ async def get_forecast_data(pool, tenant_id: int) -> dict:
             "weighted_forecast": round(total_weighted, 2),
             "won_revenue": float(won_revenue),
             "total_expected": round(total_weighted + float(won_revenue), 2),
+            "aggregates_reconciled_at": _as_of(reconciled_at),
         }
     except Exception as e:
         logger.error(f"Forecast error: {e}")
@@ -149,34 +162,25 @@ async def get_velocity_data(pool, tenant_id: int, days: int = 90) -> dict:
     try:
         since = datetime.now(timezone.utc) - timedelta(days=days)
 
-        # Won deals in period
-        won = await pool.fetch("""
-            SELECT id, estimated_value, created_at, updated_at
-            FROM leads WHERE tenant_id = $1 AND status = 'won' AND updated_at >= $2
+        # Closed deals in period, aggregated in the database (cycle = whole days created_at -> updated_at)
+        row = await pool.fetchrow("""
+            SELECT COUNT(*) FILTER (WHERE status = 'won') AS won,
+                   COUNT(*) AS closed,
+                   COALESCE(SUM(estimated_value) FILTER (WHERE status = 'won'), 0) AS won_value,
+                   AVG(EXTRACT(DAY FROM updated_at - created_at))
+                       FILTER (WHERE status = 'won' AND updated_at >= created_at) AS avg_cycle
+            FROM leads
+            WHERE tenant_id = $1 AND status IN ('won', 'lost') AND updated_at >= $2
         """, tenant_id, since)
 
-        total_won = len(won)
+        total_won = row["won"] or 0
         months = max(1, days / 30)
         deals_per_month = round(total_won / months, 1)
-
-        # Avg deal size
-        values = [float(w["estimated_value"] or 0) for w in won]
-        avg_deal_size = round(sum(values) / max(1, len(values)), 2)
-
-        # Avg cycle length (created_at to updated_at for won deals)
-        cycles = []
-        for w in won:
-            if w["created_at"] and w["updated_at"]:
-                delta = (w["updated_at"] - w["created_at"]).days
-                if delta >= 0:
-                    cycles.append(delta)
-        avg_cycle = round(sum(cycles) / max(1, len(cycles)), 1)
+        avg_deal_size = round(float(row["won_value"] or 0) / max(1, total_won), 2)
+        avg_cycle = round(float(row["avg_cycle"] or 0), 1)
 
         # Win rate
-        total_closed = await pool.fetchval("""
-            SELECT COUNT(*) FROM leads
-            WHERE tenant_id = $1 AND status IN ('won', 'lost') AND updated_at >= $2
-        """, tenant_id, since) or 1
+        total_closed = row["closed"] or 1
         win_rate = round((total_won / total_closed) * 100, 1) if total_closed > 0 else 0
 
         # Velocity formula: (deals/month × avg_size × win_rate) / avg_cycle
@@ -12,12 +12,15 @@ from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.triggers.cron import CronTrigger
 
 from .seller_notification_service import notification_service
-from .seller_metrics_service import seller_metrics_service
 from db import get_db
 from config import settings
 
 logger = logging.getLogger(__name__)
 
+# La reconciliación y el snapshot de contadores de vendedores, el backfill del
+# índice de búsqueda y la deduplicación incremental de leads corren en
+# core.background_jobs (registrados en main.py), no dependen de este scheduler
+
 class ScheduledTasksService:
     """Servicio para tareas programadas en background"""
     
@@ -69,43 +72,6 @@ class ScheduledTasksService:
         except Exception as e:
             logger.error(f"Error in scheduled notification checks: {e}")
     
-    async def refresh_seller_metrics(self):
-        """Refrescar métricas de vendedores para todos los tenants"""
-        logger.info("Running scheduled seller metrics refresh")
-        
-        try:
-            async with get_db() as db:
-                # Obtener todos los tenants activos
-                result = await db.execute(
-                    "SELECT id FROM tenants WHERE status = 'active'"
-                )
-                tenants = result.fetchall()
-                
-                tasks = []
-                for tenant in tenants:
-                    task = seller_metrics_service.refresh_all_metrics(tenant.id)
-                    tasks.append(task)
-                
-                # Ejecutar en paralelo
-                if tasks:
-                    results = await asyncio.gather(*tasks, return_exceptions=True)
-                    
-                    success_count = 0
-                    error_count = 0
-                    for i, result in enumerate(results):
-                        if isinstance(result, Exception):
-                            logger.error(f"Error refreshing metrics for tenant {tenants[i].id}: {result}")
-                            error_count += 1
-                        else:
-                            success_count += 1
-                    
-                    logger.info(f"Scheduled metrics refresh completed: {success_count} successful, {error_count} errors")
-                else:
-                    logger.info("No active tenants found for metrics refresh")
-                    
-        except Exception as e:
-            logger.error(f"Error in scheduled metrics refresh: {e}")
-    
     async def cleanup_expired_data(self):
         """Limpiar datos expirados"""
         logger.info("Running scheduled data cleanup")
@@ -178,34 +144,6 @@ class ScheduledTasksService:
         except Exception as e:
             logger.error(f"Error in scheduled pending reactivations: {e}")
 
-    async def run_deduplication_checks(self):
-        """DEV-50: Buscar candidatos duplicados para todos los leads activos"""
-        logger.info("Running scheduled deduplication checks")
-        try:
-            from services.deduplication_service import find_duplicates_for_lead, create_duplicate_candidates
-            from db import db as pg_db
-            
-            async with get_db() as db_session:
-                result = await db_session.execute("SELECT id FROM tenants WHERE status = 'active'")
-                tenants = result.fetchall()
-                
-                for tenant in tenants:
-                    # Buscar leads actualizados recientemente (últimas 3 horas) para no procesar todo siempre
-                    leads = await pg_db.pool.fetch(
-                        "SELECT id, phone_number, email, first_name, last_name FROM leads WHERE tenant_id = $1 AND updated_at > NOW() - INTERVAL '3 hours'",
-                        tenant.id
-                    )
-                    for lead in leads:
-                        duplicates = await find_duplicates_for_lead(
-                            tenant.id, str(lead['id']), lead['phone_number'], 
-                            lead['email'], lead['first_name'], lead['last_name'], pg_db.pool
-                        )
-                        if duplicates:
-                            await create_duplicate_candidates(tenant.id, str(lead['id']), duplicates, pg_db.pool)
-            logger.info("Deduplication checks completed")
-        except Exception as e:
-            logger.error(f"Error in scheduled deduplication checks: {e}")
-
     async def run_sla_checks(self):
         """DEV-42: Verificar violaciones de SLA y generar notificaciones"""
         logger.info("Running scheduled SLA checks")
@@ -259,15 +197,6 @@ class ScheduledTasksService:
                 replace_existing=True
             )
             
-            # 2. Refresh de métricas cada 15 minutos
-            self.scheduler.add_job(
-                self.refresh_seller_metrics,
-                IntervalTrigger(minutes=15),
-                id='metrics_refresh',
-                name='Seller Metrics Refresh',
-                replace_existing=True
-            )
-            
             # 3. Limpieza de datos cada hora
             self.scheduler.add_job(
                 self.cleanup_expired_data,
@@ -313,16 +242,7 @@ class ScheduledTasksService:
                 replace_existing=True
             )
 
-            # 8. Deduplication Checks (Frecuencia: 2 horas)
-            self.scheduler.add_job(
-                self.run_deduplication_checks,
-                IntervalTrigger(hours=2),
-                id='deduplication_checks',
-                name='Lead Deduplication Checks',
-                replace_existing=True
-            )
-
-            # 9. SLA Checks (Frecuencia: 5 minutos) — DEV-42
+            # 8. SLA Checks (Frecuencia: 5 minutos) — DEV-42
             self.scheduler.add_job(
                 self.run_sla_checks,
                 IntervalTrigger(minutes=5),
@@ -0,0 +1,153 @@
+"""
+Unified search index — persisted tsvectors for leads, lead notes and chat messages.
+
+`search_documents` (Parche 48) holds one row per searchable document, maintained
+by the trg_search_documents_* triggers on every insert/delete and every change
+of the indexed columns. Global search matches against the stored vectors (GIN)
+instead of calling to_tsvector() per row at query time, and partial phone/email
+matches run against `contact` (digits of the phone + lowercased email, trigram
+GIN when pg_trgm is available). Message documents carry the lead id resolved at
+write time, so results no longer join chat_messages to leads on phone numbers.
+
+Messages that existed before the patch are indexed in batches by the
+search_index_backfill job (cursor in search_index_state) rather than inside the
+startup migration. The job runs on core.background_jobs, registered by main.py
+in the scheduler roles.
+
+Relevance is tunable per tenant through tenants.config -> 'search':
+    type_weights           {"leads": 1.0, "notes": 1.0, "messages": 1.0}
+    field_weights          ts_rank_cd weights {D, C, B, A}; names are A, email/phone B
+    recency_half_life_days rank halves every N days of document age (0 = off)
+    contact_match_score    score added by a partial phone/email match
+"""
+import json
+import logging
+import os
+from typing import Any, Dict, Optional
+
+from core.tenant_cache import tenant_cache, NS_SEARCH_CONFIG
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_BACKFILL_BATCH = int(os.getenv("SEARCH_INDEX_BACKFILL_BATCH", "5000"))
+
+# Serializes backfill batches across replicas
+SEARCH_INDEX_LOCK_KEY = 7346
+
+SEARCH_SECTIONS = ("leads", "notes", "messages")
+
+DEFAULT_SEARCH_CONFIG: Dict[str, Any] = {
+    "type_weights": {"leads": 1.0, "notes": 1.0, "messages": 1.0},
+    "field_weights": [0.1, 0.2, 0.4, 1.0],
+    "recency_half_life_days": 0.0,
+    "contact_match_score": 1.0,
+}
+
+# Must stay in sync with search_documents_message() (Parche 48)
+_BACKFILL_MESSAGES_SQL = """
+    INSERT INTO search_documents (tenant_id, doc_type, doc_id, lead_id, phone, contact, search_vector, created_at)
+    SELECT cm.tenant_id, 'message', cm.id::text, l.id, cm.from_number,
+           search_contact_text(cm.from_number, NULL),
+           to_tsvector('spanish', coalesce(cm.content, '')), COALESCE(cm.created_at, NOW())
+    FROM chat_messages cm
+    LEFT JOIN leads l ON l.tenant_id = cm.tenant_id AND l.phone_number = cm.from_number
+    WHERE cm.id > $1 AND cm.id <= $2 AND cm.tenant_id IS NOT NULL
+    ON CONFLICT DO NOTHING
+"""
+
+
+def _as_float(value: Any, default: float, minimum: float = 0.0, maximum: float = 100.0) -> float:
+    try:
+        return min(max(float(value), minimum), maximum)
+    except (TypeError, ValueError):
+        return default
+
+
+def normalize_search_config(raw: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merges a tenant's search settings over the defaults, clamping values to sane ranges."""
+    raw = raw if isinstance(raw, dict) else {}
+    type_weights = raw.get("type_weights") if isinstance(raw.get("type_weights"), dict) else {}
+    field_weights = raw.get("field_weights")
+    if not (isinstance(field_weights, (list, tuple)) and len(field_weights) == 4):
+        field_weights = DEFAULT_SEARCH_CONFIG["field_weights"]
+    return {
+        "type_weights": {
+            section: _as_float(type_weights.get(section), 1.0, maximum=10.0) for section in SEARCH_SECTIONS
+        },
+        # ts_rank_cd expects weights in [0, 1]
+        "field_weights": [_as_float(w, d, maximum=1.0) for w, d in zip(field_weights, DEFAULT_SEARCH_CONFIG["field_weights"])],
+        "recency_half_life_days": _as_float(raw.get("recency_half_life_days"), 0.0, maximum=3650.0),
+        "contact_match_score": _as_float(raw.get("contact_match_score"), 1.0, maximum=10.0),
+    }
+
+
+class SearchIndexService:
+    """Per-tenant relevance settings and the batched backfill of pre-existing messages."""
+
+    def __init__(self, backfill_batch: int = SEARCH_INDEX_BACKFILL_BATCH):
+        self.backfill_batch = backfill_batch
+        self._stats = {"backfill_batches": 0, "backfilled_messages": 0, "backfill_remaining": None, "errors": 0}
+
+    async def get_config(self, pool, tenant_id: int) -> Dict[str, Any]:
+        """Relevance settings of the tenant (cached; tenant updates invalidate NS_SEARCH_CONFIG)."""
+        async def _load():
+            raw = await pool.fetchval("SELECT config -> 'search' FROM tenants WHERE id = $1", tenant_id)
+            if isinstance(raw, str):
+                try:
+                    raw = json.loads(raw)
+                except ValueError:
+                    raw = None
+            return normalize_search_config(raw)
+
+        return await tenant_cache.get_or_load(NS_SEARCH_CONFIG, tenant_id, _load, tenant_id=tenant_id)
+
+    async def backfill_messages(self, pool, batch_size: Optional[int] = None) -> Dict[str, Any]:
+        """Indexes the next batch of messages that predate Parche 48. Returns indexed/remaining counts."""
+        batch_size = batch_size or self.backfill_batch
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                if not await conn.fetchval("SELECT pg_try_advisory_xact_lock($1)", SEARCH_INDEX_LOCK_KEY):
+                    return {"indexed": 0, "remaining": self._stats["backfill_remaining"], "skipped": True}
+                state = await conn.fetchrow(
+                    "SELECT messages_backfill_upto, messages_backfill_cursor FROM search_index_state FOR UPDATE"
+                )
+                if state is None or state["messages_backfill_cursor"] >= state["messages_backfill_upto"]:
+                    self._stats["backfill_remaining"] = 0
+                    return {"indexed": 0, "remaining": 0}
+
+                upto = state["messages_backfill_upto"]
+                start = state["messages_backfill_cursor"]
+                end = min(start + batch_size, upto)
+                status = await conn.execute(_BACKFILL_MESSAGES_SQL, start, end)
+                await conn.execute(
+                    "UPDATE search_index_state SET messages_backfill_cursor = $1, updated_at = NOW()", end
+                )
+
+        indexed = int(status.split()[-1]) if status else 0
+        remaining = upto - end
+        self._stats["backfill_batches"] += 1
+        self._stats["backfilled_messages"] += indexed
+        self._stats["backfill_remaining"] = remaining
+        return {"indexed": indexed, "remaining": remaining}
+
+    async def run_backfill(self, pool, max_batches: int = 20) -> Dict[str, Any]:
+        """Runs backfill batches until caught up or max_batches (one scheduler tick)."""
+        total = 0
+        result: Dict[str, Any] = {"indexed": 0, "remaining": 0}
+        try:
+            for _ in range(max_batches):
+                result = await self.backfill_messages(pool)
+                total += result["indexed"]
+                if not result.get("remaining") or result.get("skipped"):
+                    break
+        except Exception as e:
+            self._stats["errors"] += 1
+            logger.error(f"Search index backfill failed: {e}")
+            raise
+        return {"indexed": total, "remaining": result.get("remaining")}
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self._stats, "backfill_batch": self.backfill_batch}
+
+
+search_index_service = SearchIndexService()
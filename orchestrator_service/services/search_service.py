@@ -1,61 +1,159 @@
+import asyncio
+import base64
+import json
 import logging
-from typing import List, Dict
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
 from db import db
+from services.search_index_service import search_index_service, SEARCH_SECTIONS
 
 logger = logging.getLogger(__name__)
 
+MAX_SEARCH_LIMIT = 100
+
+# Score shared by the three sections; params: $1 tenant, $2 tsquery text, $3 contact pattern,
+# $4 field weights, $5 type weight, $6 contact score, $7 recency half-life (days), $8 as-of epoch
+_SCORE_SQL = """
+    SELECT sd.doc_id, sd.lead_id,
+           ((CASE WHEN sd.search_vector @@ q.tsq THEN ts_rank_cd($4::float4[], sd.search_vector, q.tsq) ELSE 0 END)::float8
+            + CASE WHEN $3::text IS NOT NULL AND sd.contact ILIKE $3 THEN $6::float8 ELSE 0 END)
+           * $5::float8
+           * CASE WHEN $7::float8 > 0
+                  THEN power(0.5, GREATEST(EXTRACT(EPOCH FROM to_timestamp($8::float8) - sd.created_at), 0) / 86400.0 / $7::float8)
+                  ELSE 1 END AS rank
+    FROM search_documents sd
+    CROSS JOIN (SELECT to_tsquery('spanish', $2::text) AS tsq) q
+    WHERE sd.tenant_id = $1 AND sd.doc_type = '{doc_type}'
+      AND (sd.search_vector @@ q.tsq OR ($3::text IS NOT NULL AND sd.contact ILIKE $3))
+"""
+
+# Keyset page over (rank, doc_id); params: $9 cursor rank, $10 cursor doc_id, $11 limit + 1
+_PAGE_SQL = """
+    WHERE ($9::float8 IS NULL OR (s.rank, s.doc_id) < ($9::float8, $10::text))
+    ORDER BY s.rank DESC, s.doc_id DESC
+    LIMIT $11
+"""
+
+_SECTION_SQL = {
+    "leads": f"""
+        SELECT l.id, l.first_name, l.last_name, l.email, l.phone_number, l.status, s.rank, s.doc_id
+        FROM ({_SCORE_SQL.format(doc_type='lead')}) s
+        JOIN leads l ON l.id = s.lead_id
+        {_PAGE_SQL}
+    """,
+    "notes": f"""
+        SELECT ln.id, ln.lead_id, ln.content, ln.note_type, l.first_name, l.last_name, s.rank, s.doc_id
+        FROM ({_SCORE_SQL.format(doc_type='note')}) s
+        JOIN lead_notes ln ON ln.id = s.doc_id::uuid
+        JOIN leads l ON l.id = ln.lead_id
+        {_PAGE_SQL}
+    """,
+    "messages": f"""
+        SELECT cm.id, cm.from_number, cm.content, cm.role, l.first_name, l.last_name, s.rank, s.doc_id
+        FROM ({_SCORE_SQL.format(doc_type='message')}) s
+        JOIN chat_messages cm ON cm.id = s.doc_id::bigint
+        LEFT JOIN leads l ON l.id = s.lead_id
+        {_PAGE_SQL}
+    """,
+}
+
+_PHONE_CHARS = re.compile(r"^[\d\s+().-]+$")
+
+
+def build_tsquery(query: str) -> Optional[str]:
+    """Prefix AND query from the word tokens of the input (tsquery operators in user input are dropped)."""
+    terms = re.findall(r"\w+", query or "")
+    if not terms:
+        return None
+    return " & ".join(f"{t}:*" for t in terms)
+
+
+def contact_pattern(query: str) -> Optional[str]:
+    """ILIKE pattern for partial phone/email matches, or None when the query is neither."""
+    query = (query or "").strip()
+    if "@" in query and " " not in query:
+        needle = query.lower()
+    elif _PHONE_CHARS.match(query):
+        needle = re.sub(r"\D", "", query)
+        if len(needle) < 3:
+            return None
+    else:
+        return None
+    escaped = needle.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def encode_cursor(state: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Opaque cursor -> {"as_of": epoch, "<section>": [rank, doc_id] | "end"}. Raises ValueError if malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except Exception:
+        raise ValueError("Invalid search cursor")
+    if not isinstance(state, dict) or not isinstance(state.get("as_of"), (int, float)):
+        raise ValueError("Invalid search cursor")
+    for section in SEARCH_SECTIONS:
+        position = state.get(section)
+        if position is None or position == "end":
+            continue
+        if not (isinstance(position, list) and len(position) == 2
+                and isinstance(position[0], (int, float)) and isinstance(position[1], str)):
+            raise ValueError("Invalid search cursor")
+    return state
+
+
 class SearchService:
-    async def global_search(self, tenant_id: int, query: str, limit: int = 20):
+    async def global_search(self, tenant_id: int, query: str, limit: int = 20, cursor: Optional[str] = None):
         """
         Performs a full-text search across Leads, Notes, and Messages.
-        Uses PostgreSQL FTS (indexes created in Patch 38).
+        Uses the search_documents index (Parche 48); the three sections run concurrently
+        and page independently behind one opaque cursor.
         """
         if not query or len(query) < 2:
-            return {"leads": [], "notes": [], "messages": []}
-            
-        # Clean query for Postgres
-        query_parts = query.split()
-        fts_query = " & ".join([f"{p}:*" for p in query_parts]) # Prefix search
-        
-        # 1. Search Leads
-        leads_query = """
-            SELECT id, first_name, last_name, email, phone_number, status, 
-                   ts_rank_cd(to_tsvector('spanish', coalesce(first_name, '') || ' ' || coalesce(last_name, '') || ' ' || coalesce(email, '') || ' ' || coalesce(phone_number, '')), to_tsquery('spanish', $2)) as rank
-            FROM leads
-            WHERE tenant_id = $1 AND to_tsvector('spanish', coalesce(first_name, '') || ' ' || coalesce(last_name, '') || ' ' || coalesce(email, '') || ' ' || coalesce(phone_number, '')) @@ to_tsquery('spanish', $2)
-            ORDER BY rank DESC
-            LIMIT $3
-        """
-        lead_rows = await db.fetch(leads_query, tenant_id, fts_query, limit)
-        
-        # 2. Search Notes
-        notes_query = """
-            SELECT ln.id, ln.lead_id, ln.content, ln.note_type, l.first_name, l.last_name, 
-                   ts_rank_cd(to_tsvector('spanish', coalesce(ln.content, '')), to_tsquery('spanish', $2)) as rank
-            FROM lead_notes ln
-            JOIN leads l ON ln.lead_id = l.id
-            WHERE ln.tenant_id = $1 AND to_tsvector('spanish', coalesce(ln.content, '')) @@ to_tsquery('spanish', $2)
-            ORDER BY rank DESC
-            LIMIT $3
-        """
-        note_rows = await db.fetch(notes_query, tenant_id, fts_query, limit)
-        
-        # 3. Search Chat Messages
-        messages_query = """
-            SELECT cm.id, cm.from_number, cm.content, cm.role, l.first_name, l.last_name, 
-                   ts_rank_cd(to_tsvector('spanish', coalesce(cm.content, '')), to_tsquery('spanish', $2)) as rank
-            FROM chat_messages cm
-            LEFT JOIN leads l ON (cm.from_number = l.phone_number AND cm.tenant_id = l.tenant_id)
-            WHERE cm.tenant_id = $1 AND to_tsvector('spanish', coalesce(cm.content, '')) @@ to_tsquery('spanish', $2)
-            ORDER BY rank DESC
-            LIMIT $3
-        """
-        message_rows = await db.fetch(messages_query, tenant_id, fts_query, limit)
+            return {"leads": [], "notes": [], "messages": [], "next_cursor": None}
+
+        limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+        state = decode_cursor(cursor) if cursor else {"as_of": time.time()}
+        fts_query = build_tsquery(query)
+        pattern = contact_pattern(query)
+        if fts_query is None and pattern is None:
+            return {"leads": [], "notes": [], "messages": [], "next_cursor": None}
+
+        pool = db.read_pool or db.pool
+        config = await search_index_service.get_config(pool, tenant_id)
+
+        async def _section(section: str) -> Tuple[List[Dict[str, Any]], Any]:
+            position = state.get(section)
+            if position == "end":
+                return [], "end"
+            after_rank, after_id = position if position else (None, None)
+            rows = await pool.fetch(
+                _SECTION_SQL[section], tenant_id, fts_query, pattern,
+                config["field_weights"], config["type_weights"][section],
+                config["contact_match_score"], config["recency_half_life_days"], state["as_of"],
+                after_rank, after_id, limit + 1,
+            )
+            page = [dict(r) for r in rows[:limit]]
+            next_position = [page[-1]["rank"], page[-1]["doc_id"]] if len(rows) > limit else "end"
+            for item in page:
+                item.pop("doc_id", None)
+            return page, next_position
+
+        results = await asyncio.gather(*(_section(s) for s in SEARCH_SECTIONS))
+
+        next_state = {"as_of": state["as_of"]}
+        for section, (_, position) in zip(SEARCH_SECTIONS, results):
+            next_state[section] = position
+        has_more = any(next_state[s] != "end" for s in SEARCH_SECTIONS)
 
         return {
-            "leads": [dict(r) for r in lead_rows],
-            "notes": [dict(r) for r in note_rows],
-            "messages": [dict(r) for r in message_rows]
+            **{section: page for section, (page, _) in zip(SEARCH_SECTIONS, results)},
+            "next_cursor": encode_cursor(next_state) if has_more else None,
         }
 
 search_service = SearchService()
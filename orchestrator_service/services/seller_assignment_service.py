@@ -7,6 +7,8 @@ from uuid import UUID
 from datetime import datetime, timedelta
 from db import db
 from core.security import get_resolved_tenant_id
+from services.lead_enrichment_service import lead_enrichment_service
+from services.metrics_cache_service import metrics_cache_service
 
 logger = logging.getLogger(__name__)
 
@@ -84,6 +86,8 @@ class SellerAssignmentService:
             
             # 6. Update seller metrics
             await self._update_seller_metrics(seller_id, tenant_id)
+            metrics_cache_service.invalidate_tenant(tenant_id)
+            lead_enrichment_service.invalidate_tenant(tenant_id)
             
             # 7. Log assignment event
             await db.execute("""
@@ -427,12 +431,12 @@ class SellerAssignmentService:
     ):
         """Update seller metrics after assignment"""
         try:
-            # Calculate active conversations
+            # Active conversations from the projection kept by trg_seller_counters_reassign
             active_convs = await db.fetchval("""
-                SELECT COUNT(DISTINCT from_number)
-                FROM chat_messages
-                WHERE assigned_seller_id = $1 
-                AND tenant_id = $2
+                SELECT COUNT(*)
+                FROM seller_conversation_state
+                WHERE tenant_id = $2
+                AND seller_id = $1
                 AND assigned_at >= NOW() - INTERVAL '24 hours'
             """, seller_id, tenant_id)
             
@@ -0,0 +1,382 @@
+"""
+Seller metrics projection — per-seller rolling counters maintained from events.
+
+Three triggers (Parche 47) keep the projection current:
+- trg_seller_counters_message (chat_messages INSERT): messages sent/received and
+  response latency of the assigned seller, plus seller_conversation_state
+  (current assignment, conversation lifetime, oldest unanswered user message).
+- trg_seller_counters_reassign (chat_messages UPDATE OF assigned_seller_id,
+  assigned_at, per row since revision 0003): moves the message counts of a
+  reassigned row to the new seller and stamps the assignment.
+- trg_seller_counters_lead (leads): leads assigned/converted and prospecting
+  counts, bucketed by the UTC day the lead was created.
+
+Leaderboard, team metrics and /metrics/realtime/* read seller_daily_counters
+and seller_conversation_state instead of aggregating chat_messages/leads per
+seller. The full recompute survives only as the nightly reconciliation: it
+compares each tenant against seller_counters_expected() /
+seller_conversations_expected() on a snapshot and swaps the result in on
+drift, a few tenants at a time (SELLER_COUNTERS_RECONCILE_CONCURRENCY). The
+reconcile and the 15-minute snapshot run from run_reconcile_loop(), started
+by main.py in the roles that run background jobs.
+"""
+import asyncio
+import logging
+import os
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+logger = logging.getLogger(__name__)
+
+SELLER_COUNTERS_RECONCILE_CONCURRENCY = int(os.getenv("SELLER_COUNTERS_RECONCILE_CONCURRENCY", "2"))
+# UTC hour of the nightly reconciliation (core.background_jobs, minute 15)
+SELLER_COUNTERS_RECONCILE_HOUR = int(os.getenv("SELLER_COUNTERS_RECONCILE_HOUR", "3"))
+
+# Same key as the Parche 47 triggers: writers lock shared, reconciliation exclusive
+COUNTERS_LOCK_KEY = 7345
+SELLER_ROLES = ["setter", "closer", "professional", "ceo"]
+
+# last_message_at is a MAX and is not moved on reassignment, so it is rewritten but never counted as drift
+_ADDITIVE_COLUMNS = (
+    "messages_sent", "messages_received", "responses", "response_seconds_sum",
+    "leads_assigned", "leads_converted", "prospects_generated", "prospects_converted",
+)
+_DRIFT_COLUMNS = "seller_id, day, " + ", ".join(_ADDITIVE_COLUMNS)
+_COUNTER_COLUMNS = f"{_DRIFT_COLUMNS}, last_message_at"
+_CONVERSATION_COLUMNS = "from_number, seller_id, assigned_at, first_message_at, last_message_at, pending_since"
+
+LEADERBOARD_METRICS = [
+    "conversion_rate", "leads_converted", "total_conversations",
+    "total_messages_sent", "avg_response_time_seconds",
+]
+
+_WINDOW_SQL = """
+    WITH c AS (
+        SELECT seller_id,
+               SUM(messages_sent)::int AS messages_sent,
+               SUM(messages_received)::int AS messages_received,
+               SUM(responses)::int AS responses,
+               SUM(response_seconds_sum)::bigint AS response_seconds_sum,
+               SUM(leads_assigned)::int AS leads_assigned,
+               SUM(leads_converted)::int AS leads_converted,
+               SUM(prospects_generated)::int AS prospects_generated,
+               SUM(prospects_converted)::int AS prospects_converted,
+               (COUNT(*) FILTER (WHERE messages_sent + messages_received > 0))::int AS active_days,
+               MAX(last_message_at) AS last_message_at
+        FROM seller_daily_counters
+        WHERE tenant_id = $1 AND day >= $2
+        GROUP BY seller_id
+    ),
+    v AS (
+        SELECT seller_id,
+               (COUNT(*) FILTER (WHERE assigned_at >= $3))::int AS total_conversations,
+               (COUNT(*) FILTER (WHERE assigned_at >= NOW() - INTERVAL '24 hours'))::int AS active_conversations,
+               (COUNT(*) FILTER (WHERE assigned_at >= $4))::int AS conversations_assigned_today,
+               (COALESCE(SUM(EXTRACT(EPOCH FROM (last_message_at - first_message_at)))
+                    FILTER (WHERE assigned_at >= $3), 0) / 60)::float AS chat_minutes
+        FROM seller_conversation_state
+        WHERE tenant_id = $1 AND seller_id IS NOT NULL
+          AND assigned_at >= LEAST($3, $4, NOW() - INTERVAL '24 hours')
+        GROUP BY seller_id
+    )
+    SELECT u.id AS seller_id, u.first_name, u.last_name, u.role,
+           COALESCE(c.messages_sent, 0) AS messages_sent,
+           COALESCE(c.messages_received, 0) AS messages_received,
+           COALESCE(c.responses, 0) AS responses,
+           COALESCE(c.response_seconds_sum, 0) AS response_seconds_sum,
+           COALESCE(c.leads_assigned, 0) AS leads_assigned,
+           COALESCE(c.leads_converted, 0) AS leads_converted,
+           COALESCE(c.prospects_generated, 0) AS prospects_generated,
+           COALESCE(c.prospects_converted, 0) AS prospects_converted,
+           COALESCE(c.active_days, 0) AS active_days,
+           c.last_message_at,
+           COALESCE(v.total_conversations, 0) AS total_conversations,
+           COALESCE(v.active_conversations, 0) AS active_conversations,
+           COALESCE(v.conversations_assigned_today, 0) AS conversations_assigned_today,
+           COALESCE(v.chat_minutes, 0) AS chat_minutes
+    FROM users u
+    LEFT JOIN c ON c.seller_id = u.id
+    LEFT JOIN v ON v.seller_id = u.id
+    WHERE u.tenant_id = $1
+      AND u.status = 'active'
+      AND u.role = ANY($5::text[])
+      AND ($6::uuid IS NULL OR u.id = $6)
+    ORDER BY u.first_name, u.last_name
+"""
+
+
+def period_bounds(period_days: int, today: Optional[date] = None) -> Dict[str, Any]:
+    """Day-granular UTC window: today plus the previous period_days - 1 days."""
+    today = today or datetime.now(timezone.utc).date()
+    since_day = today - timedelta(days=max(period_days, 1) - 1)
+    return {
+        "since_day": since_day,
+        "start": datetime.combine(since_day, time.min, tzinfo=timezone.utc),
+        "today_start": datetime.combine(today, time.min, tzinfo=timezone.utc),
+    }
+
+
+def build_seller_metrics(row: Dict[str, Any], period_days: int) -> Dict[str, Any]:
+    """Maps one projection row (see _WINDOW_SQL) to the keys calculate_seller_metrics returns."""
+    sent = int(row.get("messages_sent") or 0)
+    received = int(row.get("messages_received") or 0)
+    responses = int(row.get("responses") or 0)
+    conversations = int(row.get("total_conversations") or 0)
+    chat_minutes = float(row.get("chat_minutes") or 0)
+    leads_assigned = int(row.get("leads_assigned") or 0)
+    leads_converted = int(row.get("leads_converted") or 0)
+    prospects_generated = int(row.get("prospects_generated") or 0)
+    prospects_converted = int(row.get("prospects_converted") or 0)
+    active_days = int(row.get("active_days") or 0)
+    total_days = max(period_days, 1)
+    last_activity = row.get("last_message_at")
+
+    return {
+        "total_conversations": conversations,
+        "active_conversations": int(row.get("active_conversations") or 0),
+        "conversations_assigned_today": int(row.get("conversations_assigned_today") or 0),
+        "avg_conversation_duration_minutes": round(chat_minutes / conversations, 1) if conversations else 0,
+        "total_messages_sent": sent,
+        "total_messages_received": received,
+        "total_chat_minutes": round(chat_minutes, 1),
+        "message_ratio": round(sent / max(received, 1), 2),
+        "leads_assigned": leads_assigned,
+        "leads_converted": leads_converted,
+        "conversion_rate": round((leads_converted / max(leads_assigned, 1)) * 100, 2),
+        "prospects_generated": prospects_generated,
+        "prospects_converted": prospects_converted,
+        "prospect_conversion_rate": round((prospects_converted / max(prospects_generated, 1)) * 100, 2),
+        "avg_response_time_seconds": round(int(row.get("response_seconds_sum") or 0) / responses, 1) if responses else 0,
+        "total_responses_analyzed": responses,
+        "active_days_in_period": active_days,
+        "last_activity_at": last_activity.isoformat() if last_activity else None,
+        "avg_messages_per_day": round((sent + received) / total_days, 1),
+        "activity_rate_percent": round((active_days / total_days) * 100, 1),
+    }
+
+
+def rank_leaderboard(entries: List[Dict[str, Any]], metric: str, limit: int) -> List[Dict[str, Any]]:
+    """Orders sellers by one metric; response time ranks ascending and skips sellers without responses."""
+    if metric not in LEADERBOARD_METRICS:
+        metric = "conversion_rate"
+    if metric == "avg_response_time_seconds":
+        ranked = sorted(
+            (e for e in entries if e["metrics"].get("total_responses_analyzed")),
+            key=lambda e: e["metrics"][metric],
+        )
+    else:
+        ranked = sorted(entries, key=lambda e: e["metrics"].get(metric, 0), reverse=True)
+    return [
+        {
+            "seller_id": e["seller_id"],
+            metric: e["metrics"].get(metric, 0),
+            "first_name": e.get("first_name"),
+            "last_name": e.get("last_name"),
+            "role": e.get("role"),
+        }
+        for e in ranked[:limit]
+    ]
+
+
+class SellerCountersService:
+    """Reads and nightly reconciliation of the seller metrics projection."""
+
+    def __init__(self, reconcile_concurrency: int = SELLER_COUNTERS_RECONCILE_CONCURRENCY):
+        self.reconcile_concurrency = max(reconcile_concurrency, 1)
+        self._stats = {"reads": 0, "reconciled": 0, "drifted": 0, "errors": 0, "last_reconcile_seconds": None}
+
+    async def fetch_window(
+        self,
+        pool,
+        tenant_id: int,
+        period_days: int,
+        seller_id: Optional[UUID] = None,
+        roles: Optional[List[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """One row per active seller of the tenant with the counters of the window (one query)."""
+        bounds = period_bounds(period_days)
+        rows = await pool.fetch(
+            _WINDOW_SQL, tenant_id, bounds["since_day"], bounds["start"], bounds["today_start"],
+            roles or SELLER_ROLES, seller_id,
+        )
+        self._stats["reads"] += 1
+        return [dict(r) for r in rows]
+
+    async def get_team(
+        self,
+        pool,
+        tenant_id: int,
+        period_days: int,
+        seller_id: Optional[UUID] = None,
+        roles: Optional[List[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """fetch_window shaped like get_team_metrics entries: seller identity + metrics dict."""
+        rows = await self.fetch_window(pool, tenant_id, period_days, seller_id=seller_id, roles=roles)
+        return [
+            {
+                "seller_id": str(r["seller_id"]),
+                "first_name": r["first_name"],
+                "last_name": r["last_name"],
+                "role": r["role"],
+                "metrics": build_seller_metrics(r, period_days),
+            }
+            for r in rows
+        ]
+
+    async def reconcile_tenant(self, pool, tenant_id: int) -> int:
+        """
+        Recomputes the tenant's projection from chat_messages/leads. Returns the number of drifted rows.
+
+        The full-history recompute runs on a REPEATABLE READ snapshot while the
+        triggers keep writing. Only when it drifted is the exclusive advisory
+        lock taken, just to swap the result in: counter deltas written after
+        the snapshot are carried over, and conversations updated since then
+        keep their live row.
+        """
+        async with pool.acquire() as conn:
+            try:
+                async with conn.transaction(isolation="repeatable_read"):
+                    await conn.execute(
+                        "CREATE TEMP TABLE _expected_counters AS SELECT * FROM seller_counters_expected($1)", tenant_id
+                    )
+                    await conn.execute(
+                        "CREATE TEMP TABLE _expected_conversations AS SELECT * FROM seller_conversations_expected($1)",
+                        tenant_id,
+                    )
+                    await conn.execute(
+                        f"CREATE TEMP TABLE _snapshot_counters AS "
+                        f"SELECT {_COUNTER_COLUMNS} FROM seller_daily_counters WHERE tenant_id = $1", tenant_id
+                    )
+                    await conn.execute(
+                        f"CREATE TEMP TABLE _snapshot_conversations AS "
+                        f"SELECT {_CONVERSATION_COLUMNS} FROM seller_conversation_state WHERE tenant_id = $1", tenant_id
+                    )
+                    counter_drift = await conn.fetchval(f"""
+                        WITH actual AS (
+                            SELECT {_DRIFT_COLUMNS} FROM _snapshot_counters
+                            WHERE (messages_sent, messages_received, responses, leads_assigned) <> (0, 0, 0, 0)
+                        ),
+                        expected AS (SELECT {_DRIFT_COLUMNS} FROM _expected_counters)
+                        SELECT (SELECT COUNT(*) FROM (SELECT * FROM expected EXCEPT SELECT * FROM actual) a)
+                             + (SELECT COUNT(*) FROM (SELECT * FROM actual EXCEPT SELECT * FROM expected) b)
+                    """) or 0
+                    conversation_drift = await conn.fetchval(f"""
+                        WITH actual AS (SELECT {_CONVERSATION_COLUMNS} FROM _snapshot_conversations),
+                        expected AS (SELECT {_CONVERSATION_COLUMNS} FROM _expected_conversations)
+                        SELECT (SELECT COUNT(*) FROM (SELECT * FROM expected EXCEPT SELECT * FROM actual) a)
+                             + (SELECT COUNT(*) FROM (SELECT * FROM actual EXCEPT SELECT * FROM expected) b)
+                    """) or 0
+
+                async with conn.transaction():
+                    if counter_drift or conversation_drift:
+                        # Waits for in-flight message/lead writes of this tenant; held only for the swap
+                        await conn.execute("SELECT pg_advisory_xact_lock($1, $2)", COUNTERS_LOCK_KEY, tenant_id)
+                    if counter_drift:
+                        await self._swap_counters(conn, tenant_id)
+                    else:
+                        # Rows emptied by reassignments / status moves are dead weight for every read
+                        await conn.execute("""
+                            DELETE FROM seller_daily_counters
+                            WHERE tenant_id = $1
+                              AND messages_sent = 0 AND messages_received = 0 AND responses = 0 AND leads_assigned = 0
+                        """, tenant_id)
+                    if conversation_drift:
+                        await self._swap_conversations(conn, tenant_id)
+
+                    drift = counter_drift + conversation_drift
+                    await conn.execute("""
+                        INSERT INTO seller_counters_state (tenant_id, reconciled_at, drift_rows)
+                        VALUES ($1, NOW(), $2)
+                        ON CONFLICT (tenant_id) DO UPDATE
+                        SET reconciled_at = EXCLUDED.reconciled_at, drift_rows = EXCLUDED.drift_rows
+                    """, tenant_id, drift)
+            finally:
+                await conn.execute(
+                    "DROP TABLE IF EXISTS _expected_counters, _expected_conversations, "
+                    "_snapshot_counters, _snapshot_conversations"
+                )
+        self._stats["reconciled"] += 1
+        if drift:
+            self._stats["drifted"] += 1
+            logger.warning(f"Seller counters drifted for tenant {tenant_id}: {drift} rows rewritten")
+        return drift
+
+    @staticmethod
+    async def _swap_counters(conn, tenant_id: int):
+        """expected (snapshot) + what the triggers added since the snapshot (live - snapshot), per seller/day."""
+        summed = ", ".join(f"SUM({c}) AS {c}" for c in _ADDITIVE_COLUMNS)
+        negated = ", ".join(f"-{c}" for c in _ADDITIVE_COLUMNS)
+        merged = ", ".join(f"COALESCE(e.{c}, 0) + COALESCE(d.{c}, 0)" for c in _ADDITIVE_COLUMNS)
+        await conn.execute(f"""
+            CREATE TEMP TABLE _final_counters ON COMMIT DROP AS
+            SELECT COALESCE(e.seller_id, d.seller_id) AS seller_id, COALESCE(e.day, d.day) AS day,
+                   {merged}, GREATEST(e.last_message_at, d.last_message_at) AS last_message_at
+            FROM _expected_counters e
+            FULL JOIN (
+                SELECT seller_id, day, {summed}, MAX(last_message_at) AS last_message_at
+                FROM (
+                    SELECT {_COUNTER_COLUMNS} FROM seller_daily_counters WHERE tenant_id = $1
+                    UNION ALL
+                    SELECT seller_id, day, {negated}, NULL FROM _snapshot_counters
+                ) since_snapshot
+                GROUP BY seller_id, day
+            ) d ON d.seller_id = e.seller_id AND d.day = e.day
+        """, tenant_id)
+        await conn.execute("DELETE FROM seller_daily_counters WHERE tenant_id = $1", tenant_id)
+        await conn.execute(f"""
+            INSERT INTO seller_daily_counters (tenant_id, {_COUNTER_COLUMNS})
+            SELECT $1, {_COUNTER_COLUMNS} FROM _final_counters
+            WHERE (messages_sent, messages_received, responses, leads_assigned) <> (0, 0, 0, 0)
+        """, tenant_id)
+
+    @staticmethod
+    async def _swap_conversations(conn, tenant_id: int):
+        """Expected rows for every conversation the triggers did not touch after the snapshot."""
+        await conn.execute(f"""
+            CREATE TEMP TABLE _touched_conversations ON COMMIT DROP AS
+            SELECT from_number FROM (
+                (SELECT {_CONVERSATION_COLUMNS} FROM seller_conversation_state WHERE tenant_id = $1
+                 EXCEPT SELECT {_CONVERSATION_COLUMNS} FROM _snapshot_conversations)
+                UNION ALL
+                (SELECT {_CONVERSATION_COLUMNS} FROM _snapshot_conversations
+                 EXCEPT SELECT {_CONVERSATION_COLUMNS} FROM seller_conversation_state WHERE tenant_id = $1)
+            ) changed
+        """, tenant_id)
+        await conn.execute("""
+            DELETE FROM seller_conversation_state s
+            WHERE s.tenant_id = $1
+              AND NOT EXISTS (SELECT 1 FROM _touched_conversations t WHERE t.from_number = s.from_number)
+        """, tenant_id)
+        await conn.execute(f"""
+            INSERT INTO seller_conversation_state (tenant_id, {_CONVERSATION_COLUMNS})
+            SELECT $1, {_CONVERSATION_COLUMNS} FROM _expected_conversations e
+            WHERE NOT EXISTS (SELECT 1 FROM _touched_conversations t WHERE t.from_number = e.from_number)
+            ON CONFLICT (tenant_id, from_number) DO NOTHING
+        """, tenant_id)
+
+    async def reconcile_all(self, pool, concurrency: Optional[int] = None) -> Dict[str, int]:
+        """Nightly job: reconciles every active tenant, at most `concurrency` tenants at a time."""
+        started = datetime.now(timezone.utc)
+        tenants = await pool.fetch("SELECT id FROM tenants WHERE status = 'active'")
+        semaphore = asyncio.Semaphore(max(concurrency or self.reconcile_concurrency, 1))
+
+        async def _one(tenant_id: int) -> int:
+            async with semaphore:
+                try:
+                    return 1 if await self.reconcile_tenant(pool, tenant_id) else 0
+                except Exception as e:
+                    self._stats["errors"] += 1
+                    logger.error(f"Seller counters reconciliation failed for tenant {tenant_id}: {e}")
+                    return 0
+
+        drifted = sum(await asyncio.gather(*(_one(t["id"]) for t in tenants)))
+        self._stats["last_reconcile_seconds"] = round((datetime.now(timezone.utc) - started).total_seconds(), 2)
+        return {"tenants": len(tenants), "drifted": drifted}
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self._stats, "reconcile_concurrency": self.reconcile_concurrency}
+
+
+# Global instance
+seller_counters_service = SellerCountersService()
@@ -1,14 +1,50 @@
 """
 Service for calculating and managing seller performance metrics
 """
+import asyncio
 import logging
 from typing import Dict, List, Optional, Tuple
 from uuid import UUID
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from db import db
+from services.seller_counters_service import seller_counters_service, rank_leaderboard, SELLER_COUNTERS_RECONCILE_CONCURRENCY
 
 logger = logging.getLogger(__name__)
 
+_SELLER_METRICS_UPSERT = """
+    INSERT INTO seller_metrics (
+        seller_id, tenant_id,
+        total_conversations, active_conversations, conversations_assigned_today,
+        total_messages_sent, total_messages_received, avg_response_time_seconds,
+        leads_assigned, leads_converted, conversion_rate,
+        prospects_generated, prospects_converted,
+        total_chat_minutes, avg_session_duration_minutes,
+        last_activity_at, metrics_calculated_at,
+        metrics_period_start, metrics_period_end
+    ) VALUES (
+        $1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11,
+        $12, $13, $14, $15, $16, $17, $18, $19
+    )
+    ON CONFLICT (seller_id, tenant_id, metrics_period_start) 
+    DO UPDATE SET
+        total_conversations = EXCLUDED.total_conversations,
+        active_conversations = EXCLUDED.active_conversations,
+        conversations_assigned_today = EXCLUDED.conversations_assigned_today,
+        total_messages_sent = EXCLUDED.total_messages_sent,
+        total_messages_received = EXCLUDED.total_messages_received,
+        avg_response_time_seconds = EXCLUDED.avg_response_time_seconds,
+        leads_assigned = EXCLUDED.leads_assigned,
+        leads_converted = EXCLUDED.leads_converted,
+        conversion_rate = EXCLUDED.conversion_rate,
+        prospects_generated = EXCLUDED.prospects_generated,
+        prospects_converted = EXCLUDED.prospects_converted,
+        total_chat_minutes = EXCLUDED.total_chat_minutes,
+        avg_session_duration_minutes = EXCLUDED.avg_session_duration_minutes,
+        last_activity_at = EXCLUDED.last_activity_at,
+        metrics_calculated_at = EXCLUDED.metrics_calculated_at,
+        metrics_period_end = EXCLUDED.metrics_period_end
+"""
+
 class SellerMetricsService:
     
     async def calculate_seller_metrics(
@@ -408,39 +444,7 @@ class SellerMetricsService:
     ):
         """Save calculated metrics to database"""
         try:
-            await db.execute("""
-                INSERT INTO seller_metrics (
-                    seller_id, tenant_id,
-                    total_conversations, active_conversations, conversations_assigned_today,
-                    total_messages_sent, total_messages_received, avg_response_time_seconds,
-                    leads_assigned, leads_converted, conversion_rate,
-                    prospects_generated, prospects_converted,
-                    total_chat_minutes, avg_session_duration_minutes,
-                    last_activity_at, metrics_calculated_at,
-                    metrics_period_start, metrics_period_end
-                ) VALUES (
-                    $1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11,
-                    $12, $13, $14, $15, $16, $17, $18, $19
-                )
-                ON CONFLICT (seller_id, tenant_id, metrics_period_start) 
-                DO UPDATE SET
-                    total_conversations = EXCLUDED.total_conversations,
-                    active_conversations = EXCLUDED.active_conversations,
-                    conversations_assigned_today = EXCLUDED.conversations_assigned_today,
-                    total_messages_sent = EXCLUDED.total_messages_sent,
-                    total_messages_received = EXCLUDED.total_messages_received,
-                    avg_response_time_seconds = EXCLUDED.avg_response_time_seconds,
-                    leads_assigned = EXCLUDED.leads_assigned,
-                    leads_converted = EXCLUDED.leads_converted,
-                    conversion_rate = EXCLUDED.conversion_rate,
-                    prospects_generated = EXCLUDED.prospects_generated,
-                    prospects_converted = EXCLUDED.prospects_converted,
-                    total_chat_minutes = EXCLUDED.total_chat_minutes,
-                    avg_session_duration_minutes = EXCLUDED.avg_session_duration_minutes,
-                    last_activity_at = EXCLUDED.last_activity_at,
-                    metrics_calculated_at = EXCLUDED.metrics_calculated_at,
-                    metrics_period_end = EXCLUDED.metrics_period_end
-            """,
+            await db.execute(_SELLER_METRICS_UPSERT,
                 seller_id, tenant_id,
                 metrics.get('total_conversations', 0),
                 metrics.get('active_conversations', 0),
@@ -470,29 +474,25 @@ class SellerMetricsService:
         tenant_id: int,
         period_days: int = 7
     ) -> Dict:
-        """Get seller metrics from database or calculate if not exists"""
+        """Get seller metrics from the counters projection (full calculation only for non-seller users)"""
         try:
-            period_start = datetime.now() - timedelta(days=period_days)
-            
-            # Try to get from database first
-            metrics = await db.fetchrow("""
-                SELECT * FROM seller_metrics
-                WHERE seller_id = $1
-                AND tenant_id = $2
-                AND metrics_period_start >= $3
-                ORDER BY metrics_period_start DESC
-                LIMIT 1
-            """, seller_id, tenant_id, period_start)
+            team = await seller_counters_service.get_team(
+                db.read_pool or db.pool, tenant_id, period_days, seller_id=seller_id
+            )
             
-            if metrics:
+            if team:
                 return {
                     "success": True,
-                    "metrics": dict(metrics),
-                    "source": "database",
-                    "cached": True
+                    "metrics": {
+                        **team[0]["metrics"],
+                        "seller_id": str(seller_id),
+                        "tenant_id": tenant_id
+                    },
+                    "source": "projection",
+                    "cached": False
                 }
             
-            # Calculate fresh metrics
+            # Inactive user or role outside the projection: calculate fresh metrics
             return await self.calculate_seller_metrics(seller_id, tenant_id, period_days)
             
         except Exception as e:
@@ -504,32 +504,11 @@ class SellerMetricsService:
         tenant_id: int,
         period_days: int = 7
     ) -> Dict:
-        """Get metrics for all sellers in a team"""
+        """Get metrics for all sellers in a team (one projection query for the whole team)"""
         try:
-            # Get all active sellers
-            sellers = await db.fetch("""
-                SELECT id, first_name, last_name, role
-                FROM users
-                WHERE tenant_id = $1
-                AND status = 'active'
-                AND role IN ('setter', 'closer', 'professional', 'ceo')
-            """, tenant_id)
-            
-            team_metrics = []
-            for seller in sellers:
-                metrics_result = await self.get_seller_metrics(
-                    seller['id'], tenant_id, period_days
-                )
-                
-                if metrics_result['success']:
-                    seller_data = {
-                        "seller_id": str(seller['id']),
-                        "first_name": seller['first_name'],
-                        "last_name": seller['last_name'],
-                        "role": seller['role'],
-                        "metrics": metrics_result.get('metrics', {})
-                    }
-                    team_metrics.append(seller_data)
+            team_metrics = await seller_counters_service.get_team(
+                db.read_pool or db.pool, tenant_id, period_days
+            )
             
             # Calculate team totals
             totals = self._calculate_team_totals(team_metrics)
@@ -559,6 +538,8 @@ class SellerMetricsService:
             "prospects_converted": 0,
             "seller_count": len(team_metrics)
         }
+        response_seconds = 0.0
+        responses = 0
         
         for seller in team_metrics:
             metrics = seller.get('metrics', {})
@@ -570,13 +551,16 @@ class SellerMetricsService:
             totals['leads_converted'] += metrics.get('leads_converted', 0)
             totals['prospects_generated'] += metrics.get('prospects_generated', 0)
             totals['prospects_converted'] += metrics.get('prospects_converted', 0)
+            seller_responses = metrics.get('total_responses_analyzed', 0)
+            responses += seller_responses
+            response_seconds += metrics.get('avg_response_time_seconds', 0) * seller_responses
         
         # Calculate team averages
         if totals['seller_count'] > 0:
             totals['avg_conversion_rate'] = round(
                 (totals['leads_converted'] / max(totals['leads_assigned'], 1)) * 100, 2
             )
-            totals['avg_response_time'] = "N/A"  # Would need individual response times
+            totals['avg_response_time'] = round(response_seconds / responses, 1) if responses else "N/A"
             totals['avg_conversations_per_seller'] = round(
                 totals['total_conversations'] / totals['seller_count'], 1
             )
@@ -633,35 +617,12 @@ class SellerMetricsService:
         metric: str = "conversion_rate",
         limit: int = 10
     ) -> List[Dict]:
-        """Get leaderboard of top performing sellers"""
+        """Get leaderboard of top performing sellers (last 30 days of the counters projection)"""
         try:
-            valid_metrics = ["conversion_rate", "leads_converted", "total_conversations", 
-                           "total_messages_sent", "avg_response_time_seconds"]
-            
-            if metric not in valid_metrics:
-                metric = "conversion_rate"
-            
-            order_by = f"{metric} DESC" if metric != "avg_response_time_seconds" else "avg_response_time_seconds ASC"
-            
-            query = f"""
-                SELECT 
-                    sm.seller_id,
-                    sm.{metric},
-                    u.first_name,
-                    u.last_name,
-                    u.role,
-                    sm.metrics_period_start
-                FROM seller_metrics sm
-                JOIN users u ON sm.seller_id = u.id
-                WHERE sm.tenant_id = $1
-                AND sm.metrics_period_start >= NOW() - INTERVAL '30 days'
-                AND u.status = 'active'
-                ORDER BY {order_by}
-                LIMIT $2
-            """
-            
-            leaderboard = await db.fetch(query, tenant_id, limit)
-            return [dict(row) for row in leaderboard]
+            team = await seller_counters_service.get_team(
+                db.read_pool or db.pool, tenant_id, period_days=30
+            )
+            return rank_leaderboard(team, metric, limit)
             
         except Exception as e:
             logger.error(f"Error getting performance leaderboard: {e}")
@@ -715,38 +676,35 @@ class SellerMetricsService:
             }
     
     async def refresh_all_metrics(self, tenant_id: int) -> Dict:
-        """Refrescar métricas para todos los vendedores de un tenant"""
+        """Copia el día actual de la proyección de contadores a seller_metrics (lectores legacy), sin recalcular"""
         try:
-            # Obtener todos los vendedores activos del tenant
-            query = """
-                SELECT id FROM users 
-                WHERE tenant_id = $1 
-                    AND status = 'active' 
-                    AND role IN ('setter', 'closer', 'ceo', 'professional')
-            """
-            
-            sellers = await db.fetch(query, tenant_id)
-            
-            refreshed_count = 0
-            error_count = 0
-            
-            for seller in sellers:
-                try:
-                    await self.calculate_seller_metrics(
-                        seller_id=seller["id"],
-                        tenant_id=tenant_id,
-                        period_days=1  # Solo hoy
-                    )
-                    refreshed_count += 1
-                except Exception as e:
-                    logger.error(f"Error refreshing metrics for seller {seller['id']}: {e}")
-                    error_count += 1
+            period_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+            period_end = period_start + timedelta(days=1)
+            now = datetime.now(timezone.utc)
+            team = await seller_counters_service.get_team(db.pool, tenant_id, period_days=1)
+            
+            rows = []
+            for seller in team:
+                m = seller["metrics"]
+                rows.append((
+                    UUID(seller["seller_id"]), tenant_id,
+                    m["total_conversations"], m["active_conversations"], m["conversations_assigned_today"],
+                    m["total_messages_sent"], m["total_messages_received"], int(m["avg_response_time_seconds"]),
+                    m["leads_assigned"], m["leads_converted"], m["conversion_rate"],
+                    m["prospects_generated"], m["prospects_converted"],
+                    int(m["total_chat_minutes"]), int(m["avg_conversation_duration_minutes"]),
+                    datetime.fromisoformat(m["last_activity_at"]) if m["last_activity_at"] else None,
+                    now, period_start, period_end
+                ))
+            
+            if rows:
+                await db.pool.executemany(_SELLER_METRICS_UPSERT, rows)
             
             return {
                 "success": True,
-                "refreshed_count": refreshed_count,
-                "error_count": error_count,
-                "total_sellers": len(sellers)
+                "refreshed_count": len(rows),
+                "error_count": 0,
+                "total_sellers": len(team)
             }
             
         except Exception as e:
@@ -759,5 +717,26 @@ class SellerMetricsService:
                 "total_sellers": 0
             }
 
+    async def snapshot_all_tenants(self) -> Dict:
+        """Job de 15 minutos: refresh_all_metrics de cada tenant activo, con concurrencia acotada"""
+        tenants = await db.pool.fetch("SELECT id FROM tenants WHERE status = 'active'")
+        semaphore = asyncio.Semaphore(SELLER_COUNTERS_RECONCILE_CONCURRENCY)
+
+        async def _refresh(tenant_id: int):
+            async with semaphore:
+                return await self.refresh_all_metrics(tenant_id)
+
+        results = await asyncio.gather(*(_refresh(t["id"]) for t in tenants), return_exceptions=True)
+        success_count = 0
+        error_count = 0
+        for tenant, result in zip(tenants, results):
+            if isinstance(result, Exception) or not result.get("success"):
+                logger.error(f"Error refreshing metrics for tenant {tenant['id']}: {result}")
+                error_count += 1
+            else:
+                success_count += 1
+        logger.info(f"Seller metrics snapshot completed: {success_count} successful, {error_count} errors")
+        return {"tenants": len(tenants), "successful": success_count, "errors": error_count}
+
 # Singleton instance
 seller_metrics_service = SellerMetricsService()
\ No newline at end of file
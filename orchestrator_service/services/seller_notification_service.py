@@ -6,7 +6,8 @@ Sistema de notificaciones avanzado para vendedores y CEO
 import asyncio
 import json
 import logging
-from datetime import datetime, timedelta
+import os
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass, asdict
 
@@ -25,6 +26,41 @@ from sqlalchemy import text
 from db import get_db
 from config import settings
 
+NOTIFICATIONS_MAX_PER_USER = int(os.getenv("NOTIFICATIONS_MAX_PER_USER", "1000"))
+NOTIFICATIONS_PARTITION_DAYS_AHEAD = int(os.getenv("NOTIFICATIONS_PARTITION_DAYS_AHEAD", "14"))
+
+_INSERT_COLUMNS = """
+    id, tenant_id, type, title, message, priority, recipient_id, sender_id,
+    related_entity_type, related_entity_id, metadata, read,
+    created_at, expires_at"""
+_INSERT_VALUES = """
+    :id, :tenant_id, :type, :title, :message, :priority, :recipient_id, :sender_id,
+    :related_entity_type, :related_entity_id, :metadata, :read,
+    :created_at, :expires_at"""
+_INSERT_PLAIN = f"""
+    INSERT INTO notifications ({_INSERT_COLUMNS}) VALUES ({_INSERT_VALUES})
+    ON CONFLICT (id) DO UPDATE SET
+        read = EXCLUDED.read,
+        expires_at = EXCLUDED.expires_at
+"""
+# Particionada (Parche 46): la PK es (id, expires_on), así que el id solo es único por
+# día de vencimiento. mark_as_read y las rutas buscan por id: un id re-guardado con otro
+# expires_on borra antes su fila anterior (_DROP_MOVED_PARTITIONED) y queda una sola.
+_DROP_MOVED_PARTITIONED = """
+    DELETE FROM notifications n
+    USING (
+        SELECT UNNEST(CAST(:ids AS varchar[])) AS id, UNNEST(CAST(:days AS date[])) AS expires_on
+    ) saved
+    WHERE n.id = saved.id AND n.expires_on <> COALESCE(saved.expires_on, 'infinity'::date)
+"""
+_INSERT_PARTITIONED = f"""
+    INSERT INTO notifications ({_INSERT_COLUMNS}, expires_on)
+    VALUES ({_INSERT_VALUES}, COALESCE(CAST(:expires_on AS date), 'infinity'::date))
+    ON CONFLICT (id, expires_on) DO UPDATE SET
+        read = EXCLUDED.read,
+        expires_at = EXCLUDED.expires_at
+"""
+
 @dataclass
 class Notification:
     """Estructura de una notificación"""
@@ -54,6 +90,7 @@ class SellerNotificationService:
     
     def __init__(self):
         self.redis_client = None
+        self._partitioned: Optional[bool] = None
         self._init_redis()
     
     def _init_redis(self):
@@ -483,37 +520,41 @@ class SellerNotificationService:
     
     async def check_sla_violations(self, tenant_id: int) -> List[Notification]:
         """
-        Verificar violaciones de SLA y crear notificaciones
+        Verificar violaciones de SLA y crear notificaciones (sólo umbrales recién cruzados).
+        run_all_checks las marca como notificadas después de guardarlas.
         """
         notifications = []
         
         try:
-            from services.sla_service import check_sla_violations as get_violations
+            from services.sla_service import collect_new_sla_violations
             
-            violations = await get_violations(tenant_id)
+            violations = await collect_new_sla_violations(tenant_id)
+            if not violations:
+                return notifications
+            
+            # Buscar CEO del tenant para notificar
+            async with get_db() as db:
+                ceo_query = text("""
+                    SELECT id, email FROM users 
+                    WHERE tenant_id = :tenant_id AND role = 'ceo' AND status = 'active'
+                    LIMIT 1
+                """)
+                ceo_result = await db.execute(ceo_query, {"tenant_id": tenant_id})
+                ceo = ceo_result.fetchone()
+            
+            if not ceo:
+                return notifications
             
             for v in violations:
-                # Buscar CEO del tenant para notificar
-                async with get_db() as db:
-                    ceo_query = text("""
-                        SELECT id, email FROM users 
-                        WHERE tenant_id = :tenant_id AND role = 'ceo' AND status = 'active'
-                        LIMIT 1
-                    """)
-                    ceo_result = await db.execute(ceo_query, {"tenant_id": tenant_id})
-                    ceo = ceo_result.fetchone()
-                
-                if not ceo:
-                    continue
-                
                 priority = "critical" if v.get("should_escalate") else "high"
                 trigger_label = "primera respuesta" if v["trigger_type"] == "first_response" else "seguimiento"
+                title = "SLA Escalado" if v.get("crossed") == "escalation" else "SLA Vencido"
                 
                 notification = Notification(
                     id=f"sla_violation_{v['lead_id']}_{v['rule_id']}_{datetime.utcnow().timestamp()}",
                     tenant_id=tenant_id,
                     type="sla_violation",
-                    title="SLA Vencido",
+                    title=title,
                     message=f"Lead {v['lead_name']} — SLA de {trigger_label} excedido por {v['minutes_exceeded']} min (límite: {v['threshold_minutes']} min)",
                     priority=priority,
                     recipient_id=ceo.id,
@@ -524,7 +565,7 @@ class SellerNotificationService:
                 )
                 notifications.append(notification)
             
-            logger.info(f"Found {len(notifications)} SLA violations for tenant {tenant_id}")
+            logger.info(f"Found {len(notifications)} new SLA violations for tenant {tenant_id}")
         
         except Exception as e:
             logger.error(f"Error checking SLA violations: {e}")
@@ -557,7 +598,8 @@ class SellerNotificationService:
             
             # Guardar notificaciones en base de datos
             if all_notifications:
-                await self.save_notifications(all_notifications)
+                if await self.save_notifications(all_notifications):
+                    await self._mark_sla_notified(tenant_id, all_notifications)
                 
                 # Enviar notificaciones en tiempo real via Redis/Socket.IO
                 await self.broadcast_notifications(all_notifications)
@@ -569,66 +611,103 @@ class SellerNotificationService:
         
         return all_notifications
     
-    async def save_notifications(self, notifications: List[Notification]):
+    async def _mark_sla_notified(self, tenant_id: int, notifications: List[Notification]):
+        """Registra como notificadas las violaciones de SLA del lote, una vez guardado"""
+        violations = [n.metadata for n in notifications if n.type == "sla_violation" and n.metadata]
+        if not violations:
+            return
+        try:
+            from services.sla_service import mark_sla_violations_notified
+
+            await mark_sla_violations_notified(tenant_id, violations)
+        except Exception as e:
+            logger.error(f"Error recording notified SLA violations: {e}")
+
+    async def _is_partitioned(self, db) -> bool:
+        """Layout de la tabla (Parche 46): plana, o particionada por día de expiración. Se resuelve una vez."""
+        if self._partitioned is None:
+            result = await db.execute(text("""
+                SELECT EXISTS (
+                    SELECT 1 FROM pg_partitioned_table pt
+                    JOIN pg_class c ON c.oid = pt.partrelid
+                    WHERE c.relname = 'notifications'
+                )
+            """))
+            self._partitioned = bool(result.scalar())
+        return self._partitioned
+
+    @staticmethod
+    def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+        """timestamptz guarda un datetime naive como UTC (utcnow()); uno aware se convierte a UTC."""
+        if value is None:
+            return None
+        return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+    @classmethod
+    def _row_params(cls, notification: Notification) -> Dict[str, Any]:
+        expires_at = cls._as_utc(notification.expires_at)
+        return {
+            "id": notification.id,
+            "tenant_id": notification.tenant_id,
+            "type": notification.type,
+            "title": notification.title,
+            "message": notification.message,
+            "priority": notification.priority,
+            "recipient_id": notification.recipient_id,
+            "sender_id": notification.sender_id,
+            "related_entity_type": notification.related_entity_type,
+            "related_entity_id": notification.related_entity_id,
+            "metadata": json.dumps(notification.metadata) if notification.metadata else None,
+            "read": notification.read,
+            "created_at": notification.created_at,
+            "expires_at": expires_at,
+            # Clave de partición: día UTC de expiración ('infinity' = no expira), igual que
+            # (expires_at AT TIME ZONE 'UTC')::date en la conversión de Parche 46
+            "expires_on": expires_at.date() if expires_at else None,
+        }
+
+    async def save_notifications(self, notifications: List[Notification]) -> bool:
         """
-        Guardar notificaciones en base de datos con límite de 1000 por usuario
+        Guardar notificaciones en base de datos con límite de NOTIFICATIONS_MAX_PER_USER por usuario.
+        Un solo executemany para todo el lote y un único recorte FIFO para los destinatarios del lote.
+        Devuelve False si el guardado falló.
         """
         if not notifications:
-            return
+            return True
         
         try:
             async with get_db() as db:
-                for notification in notifications:
-                    # Insertar en tabla de notificaciones
-                    query = text("""
-                        INSERT INTO notifications (
-                            id, tenant_id, type, title, message, priority, recipient_id, sender_id,
-                            related_entity_type, related_entity_id, metadata, read,
-                            created_at, expires_at
-                        ) VALUES (
-                            :id, :tenant_id, :type, :title, :message, :priority, :recipient_id, :sender_id,
-                            :related_entity_type, :related_entity_id, :metadata, :read,
-                            :created_at, :expires_at
-                        )
-                        ON CONFLICT (id) DO UPDATE SET
-                            read = EXCLUDED.read,
-                            expires_at = EXCLUDED.expires_at
-                    """)
-                    
-                    await db.execute(query, {
-                        "id": notification.id,
-                        "tenant_id": notification.tenant_id,
-                        "type": notification.type,
-                        "title": notification.title,
-                        "message": notification.message,
-                        "priority": notification.priority,
-                        "recipient_id": notification.recipient_id,
-                        "sender_id": notification.sender_id,
-                        "related_entity_type": notification.related_entity_type,
-                        "related_entity_id": notification.related_entity_id,
-                        "metadata": json.dumps(notification.metadata) if notification.metadata else None,
-                        "read": notification.read,
-                        "created_at": notification.created_at,
-                        "expires_at": notification.expires_at
+                partitioned = await self._is_partitioned(db)
+                rows = [self._row_params(n) for n in notifications]
+                if partitioned:
+                    await db.execute(text(_DROP_MOVED_PARTITIONED), {
+                        "ids": [r["id"] for r in rows],
+                        "days": [r["expires_on"] for r in rows],
                     })
+                await db.execute(text(_INSERT_PARTITIONED if partitioned else _INSERT_PLAIN), rows)
 
-                    # Enforce 1000 message limit (FIFO)
-                    limit_query = text("""
-                        DELETE FROM notifications
-                        WHERE id IN (
-                            SELECT id FROM notifications
-                            WHERE recipient_id = :user_id
-                            ORDER BY created_at DESC
-                            OFFSET 1000
-                        )
-                    """)
-                    await db.execute(limit_query, {"user_id": notification.recipient_id})
+                # Enforce per-recipient limit (FIFO), once per batch
+                recipients = sorted({str(n.recipient_id) for n in notifications})
+                await db.execute(text("""
+                    DELETE FROM notifications n
+                    USING (
+                        SELECT id, ROW_NUMBER() OVER (PARTITION BY recipient_id ORDER BY created_at DESC) AS rn
+                        FROM notifications
+                        WHERE recipient_id = ANY(CAST(:recipient_ids AS uuid[]))
+                    ) ranked
+                    WHERE n.id = ranked.id AND ranked.rn > :keep
+                """), {"recipient_ids": recipients, "keep": NOTIFICATIONS_MAX_PER_USER})
                 
                 await db.commit()
-                logger.info(f"Saved {len(notifications)} notifications to database (FIFO check applied)")
+                logger.info(
+                    f"Saved {len(notifications)} notifications to database "
+                    f"(FIFO check applied to {len(recipients)} recipients)"
+                )
+            return True
                 
         except Exception as e:
             logger.error(f"Error saving notifications: {e}")
+            return False
     
     async def broadcast_notifications(self, notifications: List[Notification]):
         """
@@ -827,23 +906,31 @@ class SellerNotificationService:
     
     async def delete_expired_notifications(self) -> int:
         """
-        Eliminar notificaciones expiradas
+        Eliminar notificaciones expiradas.
+        Con la tabla particionada se descartan las particiones de días ya vencidos (sin DELETE fila a fila)
+        y se crean las de los próximos NOTIFICATIONS_PARTITION_DAYS_AHEAD días.
         """
         try:
             async with get_db() as db:
-                query = text("""
-                    DELETE FROM notifications 
-                    WHERE expires_at IS NOT NULL 
-                        AND expires_at < NOW()
-                    RETURNING COUNT(*) as count
-                """)
-                
-                result = await db.execute(query)
+                if await self._is_partitioned(db):
+                    await db.execute(
+                        text("SELECT notifications_ensure_partitions(:days)"),
+                        {"days": NOTIFICATIONS_PARTITION_DAYS_AHEAD},
+                    )
+                    result = await db.execute(text("SELECT notifications_drop_expired_partitions()"))
+                else:
+                    result = await db.execute(text("""
+                        WITH deleted AS (
+                            DELETE FROM notifications
+                            WHERE expires_at IS NOT NULL
+                                AND expires_at < NOW()
+                            RETURNING 1
+                        )
+                        SELECT COUNT(*) FROM deleted
+                    """))
+                count = result.scalar() or 0
                 await db.commit()
                 
-                row = result.fetchone()
-                count = row.count if row else 0
-                
                 if count > 0:
                     logger.info(f"Deleted {count} expired notifications")
                 
@@ -111,104 +111,162 @@ async def delete_sla_rule(tenant_id: int, rule_id: UUID) -> bool:
 # SLA VIOLATION CHECK (Background Job)
 # ============================================
 
+CLOSED_STATUSES = ["won", "lost", "closed_won", "closed_lost"]
+
+
+def _aware(ts: Optional[datetime]) -> Optional[datetime]:
+    if ts is not None and ts.tzinfo is None:
+        return ts.replace(tzinfo=timezone.utc)
+    return ts
+
+
+def evaluate_rules(rules: list, leads: list, now: datetime) -> list:
+    """
+    Evalúa todas las reglas activas sobre la proyección lead_sla_state en una sola pasada.
+
+    Cada lead trae: assigned_at (created_at), responded (el vendedor asignado ya actuó)
+    y last_activity_at (última actividad de cualquier actor).
+    """
+    violations = []
+    for l in leads:
+        assigned_at = _aware(l["assigned_at"])
+        last_act = _aware(l["last_activity_at"])
+        lead_name = f"{l['first_name'] or ''} {l['last_name'] or ''}".strip() or l["phone_number"]
+        seller_name = f"{l['seller_first'] or ''} {l['seller_last'] or ''}".strip()
+
+        for rule in rules:
+            trigger_type = rule["trigger_type"]
+            cutoff = now - timedelta(minutes=rule["threshold_minutes"])
+            if assigned_at is None or assigned_at >= cutoff:
+                continue
+
+            if trigger_type == "first_response":
+                # Leads asignados sin ninguna actividad del vendedor
+                if l["responded"]:
+                    continue
+                minutes_exceeded = int((now - assigned_at).total_seconds() / 60)
+            elif trigger_type == "follow_up":
+                # Leads con última actividad mayor al threshold
+                if last_act is not None and last_act > cutoff:
+                    continue
+                minutes_exceeded = int((now - last_act).total_seconds() / 60) if last_act else 999
+            else:
+                continue
+
+            violations.append({
+                "rule_id": str(rule["id"]),
+                "rule_name": rule["name"],
+                "trigger_type": trigger_type,
+                "lead_id": str(l["id"]),
+                "lead_name": lead_name,
+                "seller_id": str(l["assigned_seller_id"]) if l["assigned_seller_id"] else None,
+                "seller_name": seller_name,
+                "threshold_minutes": rule["threshold_minutes"],
+                "minutes_exceeded": minutes_exceeded,
+                "escalate_to_ceo": rule["escalate_to_ceo"],
+                "should_escalate": minutes_exceeded >= (rule["threshold_minutes"] + (rule["escalate_after_minutes"] or 30)),
+            })
+    return violations
+
+
 async def check_sla_violations(tenant_id: int) -> list:
-    """Verifica violaciones de SLA para un tenant. Llamado por background job."""
+    """Verifica violaciones de SLA para un tenant (lista completa). Una sola consulta para todas las reglas."""
     rules = await db.pool.fetch(
-        "SELECT * FROM sla_rules WHERE tenant_id = $1 AND is_active = true",
+        "SELECT * FROM sla_rules WHERE tenant_id = $1 AND is_active = true "
+        "AND trigger_type IN ('first_response', 'follow_up')",
         tenant_id,
     )
+    if not rules:
+        return []
 
-    violations = []
     now = datetime.now(timezone.utc)
+    min_threshold = min(r["threshold_minutes"] for r in rules)
+    follow_up = [r["threshold_minutes"] for r in rules if r["trigger_type"] == "follow_up"]
+    # Sin reglas de seguimiento, sólo interesan los leads sin respuesta del vendedor
+    follow_up_cutoff = now - timedelta(minutes=min(follow_up)) if follow_up else None
 
-    for rule in rules:
-        trigger_type = rule["trigger_type"]
-        threshold = timedelta(minutes=rule["threshold_minutes"])
-
-        if trigger_type == "first_response":
-            # Leads asignados sin ninguna actividad del vendedor
-            leads = await db.pool.fetch(
-                """SELECT l.id, l.first_name, l.last_name, l.phone_number,
-                          l.assigned_seller_id, l.created_at AS assigned_at,
-                          u.first_name AS seller_first, u.last_name AS seller_last
-                   FROM leads l
-                   LEFT JOIN users u ON u.id = l.assigned_seller_id
-                   WHERE l.tenant_id = $1
-                     AND l.assigned_seller_id IS NOT NULL
-                     AND l.status NOT IN ('won', 'lost', 'closed_won', 'closed_lost')
-                     AND l.created_at < $2
-                     AND NOT EXISTS (
-                         SELECT 1 FROM activity_events ae
-                         WHERE ae.entity_id = l.id::text AND ae.tenant_id = $1
-                           AND ae.actor_id = l.assigned_seller_id
-                     )""",
-                tenant_id, now - threshold,
-            )
-
-            for l in leads:
-                lead_name = f"{l['first_name'] or ''} {l['last_name'] or ''}".strip() or l["phone_number"]
-                seller_name = f"{l['seller_first'] or ''} {l['seller_last'] or ''}".strip()
-                minutes_exceeded = int((now - l["assigned_at"].replace(tzinfo=timezone.utc)).total_seconds() / 60) if l["assigned_at"].tzinfo is None else int((now - l["assigned_at"]).total_seconds() / 60)
-
-                violations.append({
-                    "rule_id": str(rule["id"]),
-                    "rule_name": rule["name"],
-                    "trigger_type": trigger_type,
-                    "lead_id": str(l["id"]),
-                    "lead_name": lead_name,
-                    "seller_id": str(l["assigned_seller_id"]) if l["assigned_seller_id"] else None,
-                    "seller_name": seller_name,
-                    "threshold_minutes": rule["threshold_minutes"],
-                    "minutes_exceeded": minutes_exceeded,
-                    "escalate_to_ceo": rule["escalate_to_ceo"],
-                    "should_escalate": minutes_exceeded >= (rule["threshold_minutes"] + (rule["escalate_after_minutes"] or 30)),
-                })
-
-        elif trigger_type == "follow_up":
-            # Leads con última actividad mayor al threshold
-            leads = await db.pool.fetch(
-                """SELECT l.id, l.first_name, l.last_name, l.phone_number,
-                          l.assigned_seller_id,
-                          u.first_name AS seller_first, u.last_name AS seller_last,
-                          (SELECT MAX(ae.created_at) FROM activity_events ae
-                           WHERE ae.entity_id = l.id::text AND ae.tenant_id = $1) AS last_activity
-                   FROM leads l
-                   LEFT JOIN users u ON u.id = l.assigned_seller_id
-                   WHERE l.tenant_id = $1
-                     AND l.assigned_seller_id IS NOT NULL
-                     AND l.status NOT IN ('won', 'lost', 'closed_won', 'closed_lost')
-                     AND NOT EXISTS (
-                         SELECT 1 FROM activity_events ae
-                         WHERE ae.entity_id = l.id::text AND ae.tenant_id = $1
-                           AND ae.created_at > $2
-                     )
-                     AND l.created_at < $2""",
-                tenant_id, now - threshold,
-            )
-
-            for l in leads:
-                lead_name = f"{l['first_name'] or ''} {l['last_name'] or ''}".strip() or l["phone_number"]
-                seller_name = f"{l['seller_first'] or ''} {l['seller_last'] or ''}".strip()
-                last_act = l["last_activity"]
-                if last_act and last_act.tzinfo is None:
-                    last_act = last_act.replace(tzinfo=timezone.utc)
-                minutes_exceeded = int((now - last_act).total_seconds() / 60) if last_act else 999
+    leads = await db.pool.fetch(
+        """SELECT l.id, l.first_name, l.last_name, l.phone_number,
+                  l.assigned_seller_id, l.created_at AS assigned_at,
+                  u.first_name AS seller_first, u.last_name AS seller_last,
+                  s.last_activity_at,
+                  COALESCE(s.seller_id = l.assigned_seller_id AND s.first_response_at IS NOT NULL, false) AS responded
+           FROM leads l
+           LEFT JOIN lead_sla_state s ON s.lead_id = l.id
+           LEFT JOIN users u ON u.id = l.assigned_seller_id
+           WHERE l.tenant_id = $1
+             AND l.assigned_seller_id IS NOT NULL
+             AND l.status <> ALL($2::text[])
+             AND l.created_at < $3
+             AND (
+                 s.lead_id IS NULL
+                 OR s.seller_id IS DISTINCT FROM l.assigned_seller_id
+                 OR s.first_response_at IS NULL
+                 OR ($4::timestamptz IS NOT NULL AND (s.last_activity_at IS NULL OR s.last_activity_at <= $4))
+             )""",
+        tenant_id, CLOSED_STATUSES, now - timedelta(minutes=min_threshold), follow_up_cutoff,
+    )
+    return evaluate_rules(rules, leads, now)
 
-                violations.append({
-                    "rule_id": str(rule["id"]),
-                    "rule_name": rule["name"],
-                    "trigger_type": trigger_type,
-                    "lead_id": str(l["id"]),
-                    "lead_name": lead_name,
-                    "seller_id": str(l["assigned_seller_id"]) if l["assigned_seller_id"] else None,
-                    "seller_name": seller_name,
-                    "threshold_minutes": rule["threshold_minutes"],
-                    "minutes_exceeded": minutes_exceeded,
-                    "escalate_to_ceo": rule["escalate_to_ceo"],
-                    "should_escalate": minutes_exceeded >= (rule["threshold_minutes"] + (rule["escalate_after_minutes"] or 30)),
-                })
 
-    return violations
+async def collect_new_sla_violations(tenant_id: int) -> list:
+    """
+    Devuelve sólo los umbrales cruzados desde la última notificación: violaciones nuevas
+    (crossed='breach') y violaciones ya notificadas que pasaron a escalamiento (crossed='escalation').
+    sla_violation_state recuerda lo ya notificado pero acá sólo se lee: se escribe con
+    mark_sla_violations_notified una vez guardadas las notificaciones. Las violaciones
+    resueltas sí se borran para que un nuevo incumplimiento vuelva a notificarse.
+    """
+    violations = await check_sla_violations(tenant_id)
+    by_key = {(v["rule_id"], v["lead_id"]): v for v in violations}
+
+    rows = await db.pool.fetch(
+        """WITH cur AS (
+               SELECT * FROM unnest($2::uuid[], $3::uuid[], $4::bool[]) AS c(rule_id, lead_id, escalated)
+           ),
+           resolved AS (
+               DELETE FROM sla_violation_state st
+               WHERE st.tenant_id = $1
+                 AND NOT EXISTS (SELECT 1 FROM cur WHERE cur.rule_id = st.rule_id AND cur.lead_id = st.lead_id)
+           )
+           SELECT cur.rule_id, cur.lead_id,
+                  CASE WHEN st.rule_id IS NULL THEN 'breach' ELSE 'escalation' END AS crossed
+           FROM cur
+           LEFT JOIN sla_violation_state st ON st.rule_id = cur.rule_id AND st.lead_id = cur.lead_id
+           WHERE st.rule_id IS NULL OR (NOT st.escalated AND cur.escalated)""",
+        tenant_id,
+        [UUID(v["rule_id"]) for v in violations],
+        [UUID(v["lead_id"]) for v in violations],
+        [bool(v["should_escalate"]) for v in violations],
+    )
+
+    crossed = []
+    for r in rows:
+        v = by_key.get((str(r["rule_id"]), str(r["lead_id"])))
+        if v:
+            crossed.append({**v, "crossed": r["crossed"]})
+    return crossed
+
+
+async def mark_sla_violations_notified(tenant_id: int, violations: list) -> None:
+    """
+    Registra en sla_violation_state las violaciones ya notificadas (las de
+    collect_new_sla_violations). Se llama después de guardar las notificaciones:
+    si no hay a quién notificar o el guardado falla, se vuelven a detectar en la próxima corrida.
+    """
+    if not violations:
+        return
+    await db.pool.execute(
+        """INSERT INTO sla_violation_state AS st (rule_id, lead_id, tenant_id, escalated)
+           SELECT rule_id, lead_id, $1, escalated
+           FROM unnest($2::uuid[], $3::uuid[], $4::bool[]) AS c(rule_id, lead_id, escalated)
+           ON CONFLICT (rule_id, lead_id) DO UPDATE SET escalated = TRUE
+           WHERE NOT st.escalated AND EXCLUDED.escalated""",
+        tenant_id,
+        [UUID(v["rule_id"]) for v in violations],
+        [UUID(v["lead_id"]) for v in violations],
+        [bool(v["should_escalate"]) for v in violations],
+    )
 
 
 async def get_active_violations(tenant_id: int) -> list:
@@ -14,6 +14,9 @@ import httpx
 import bleach
 from pydantic import BaseModel
 
+from core.http_clients import http_clients
+from core.rate_limiter import KeyedLimit, Rate, rate_limit_engine
+
 logger = logging.getLogger(__name__)
 
 # ─── Configuration ────────────────────────────────────────────────────────────
@@ -69,7 +72,7 @@ def sanitize_html(text: str) -> str:
 # ─── Sliding Window Rate Limiter ─────────────────────────────────────────────
 
 class SlidingWindowRateLimiter:
-    """In-memory sliding window rate limiter per chat_id."""
+    """In-memory sliding window rate limiter per chat_id (single process; tests and local tools)."""
 
     def __init__(self, max_requests: int = 10, window_seconds: int = 60):
         self.max_requests = max_requests
@@ -93,6 +96,10 @@ class SlidingWindowRateLimiter:
         self._requests[key].append(now)
         return True
 
+    async def allow(self, key: str) -> bool:
+        """Same interface as core.rate_limiter.KeyedLimit."""
+        return self.is_allowed(key)
+
 
 # ─── Telegram Service ────────────────────────────────────────────────────────
 
@@ -103,9 +110,9 @@ class TelegramService:
         self.bot_token = TELEGRAM_BOT_TOKEN
         self.default_chat_id = TELEGRAM_CHAT_ID
         self.ceo_chat_id = TELEGRAM_CEO_CHAT_ID or TELEGRAM_CHAT_ID
-        self.rate_limiter = SlidingWindowRateLimiter(
-            max_requests=TELEGRAM_RATE_LIMIT_PER_MIN,
-            window_seconds=60,
+        # Shared across workers (Redis token bucket); falls back to per-process buckets
+        self.rate_limiter = KeyedLimit(
+            rate_limit_engine, "telegram", Rate(TELEGRAM_RATE_LIMIT_PER_MIN, 60)
         )
 
     async def send_message(
@@ -124,7 +131,7 @@ class TelegramService:
             )
 
         # Rate limit check
-        if not self.rate_limiter.is_allowed(target_chat_id):
+        if not await self.rate_limiter.allow(target_chat_id):
             raise TelegramRateLimitError(
                 f"Rate limit exceeded for chat_id {target_chat_id}. Retry after 60s"
             )
@@ -141,7 +148,7 @@ class TelegramService:
         }
 
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
+            async with http_clients.session(timeout=10.0) as client:
                 response = await client.post(url, json=payload)
                 data = response.json()
 
@@ -3,6 +3,8 @@ from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_excep
 from typing import Optional
 import logging
 
+from core.http_clients import http_clients
+
 logger = logging.getLogger("ycloud_client")
 
 class YCloudClient:
@@ -22,7 +24,7 @@ class YCloudClient:
         retry=retry_if_exception_type(httpx.HTTPError)
     )
     async def _post(self, endpoint: str, json_data: dict, correlation_id: str):
-        async with httpx.AsyncClient(timeout=httpx.Timeout(20.0, connect=5.0)) as client:
+        async with http_clients.session(timeout=httpx.Timeout(20.0, connect=5.0)) as client:
             url = f"{self.BASE_URL}{endpoint}"
             response = await client.post(url, json=json_data, headers=self.headers)
             response.raise_for_status()
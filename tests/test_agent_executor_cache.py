@@ -0,0 +1,102 @@
+"""
+Tests for the per-tenant AgentExecutor cache (core/agent/executor_cache.py).
+
+Covers:
+- Cache hit skips config load and build
+- Explicit invalidation forces a rebuild
+- TTL expiry with unchanged fingerprint reuses the compiled executor
+- TTL expiry with changed config rebuilds
+- LRU bound evicts the least recently used tenant
+"""
+
+import pytest
+from types import SimpleNamespace
+
+from core.agent.executor_cache import AgentExecutorCache, compute_fingerprint
+
+
+def _tools(*names):
+    return [SimpleNamespace(name=n) for n in names]
+
+
+class _Harness:
+    """Counts config loads and builds; config per tenant can be mutated."""
+
+    def __init__(self):
+        self.configs = {}
+        self.loads = 0
+        self.builds = 0
+
+    async def load(self, tenant_id):
+        self.loads += 1
+        return self.configs.get(tenant_id, {"ai_agent_name": "Mati"}), _tools("qualify_lead", "book_sales_meeting")
+
+    def build(self, config, tools):
+        self.builds += 1
+        return object()
+
+
+def test_fingerprint_ignores_tool_order():
+    cfg = {"ai_tone": "formal_neutro"}
+    assert compute_fingerprint(cfg, _tools("a", "b")) == compute_fingerprint(cfg, _tools("b", "a"))
+    assert compute_fingerprint(cfg, _tools("a")) != compute_fingerprint({"ai_tone": "x"}, _tools("a"))
+
+
+@pytest.mark.asyncio
+async def test_hit_skips_load_and_build():
+    cache, h = AgentExecutorCache(max_size=4, ttl_seconds=60), _Harness()
+    first = await cache.get_or_build(1, h.load, h.build)
+    second = await cache.get_or_build(1, h.load, h.build)
+
+    assert first is second
+    assert h.loads == 1 and h.builds == 1
+    stats = cache.get_stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["builds"] == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidate_forces_rebuild():
+    cache, h = AgentExecutorCache(max_size=4, ttl_seconds=60), _Harness()
+    first = await cache.get_or_build(1, h.load, h.build)
+    cache.invalidate(1)
+    second = await cache.get_or_build(1, h.load, h.build)
+
+    assert first is not second
+    assert h.builds == 2
+    assert cache.get_stats()["invalidations"] == 1
+
+
+@pytest.mark.asyncio
+async def test_expired_entry_with_same_config_is_revalidated():
+    cache, h = AgentExecutorCache(max_size=4, ttl_seconds=0), _Harness()
+    first = await cache.get_or_build(1, h.load, h.build)
+    second = await cache.get_or_build(1, h.load, h.build)
+
+    assert first is second
+    assert h.loads == 2 and h.builds == 1
+    assert cache.get_stats()["revalidations"] == 1
+
+
+@pytest.mark.asyncio
+async def test_expired_entry_with_new_config_is_rebuilt():
+    cache, h = AgentExecutorCache(max_size=4, ttl_seconds=0), _Harness()
+    first = await cache.get_or_build(1, h.load, h.build)
+    h.configs[1] = {"ai_agent_name": "Sofi"}
+    second = await cache.get_or_build(1, h.load, h.build)
+
+    assert first is not second
+    assert h.builds == 2
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction():
+    cache, h = AgentExecutorCache(max_size=2, ttl_seconds=60), _Harness()
+    await cache.get_or_build(1, h.load, h.build)
+    await cache.get_or_build(2, h.load, h.build)
+    await cache.get_or_build(1, h.load, h.build)  # tenant 1 becomes most recent
+    await cache.get_or_build(3, h.load, h.build)  # evicts tenant 2
+
+    stats = cache.get_stats()
+    assert stats["size"] == 2 and stats["evictions"] == 1
+    await cache.get_or_build(2, h.load, h.build)
+    assert h.builds == 4
@@ -0,0 +1,104 @@
+"""
+Tests for the buffered audit sink (core/audit_sink.py).
+
+Covers:
+- record() never touches the DB; a flush writes one multi-row INSERT per batch
+- Reaching the batch size wakes the worker before the interval
+- A failing or slow flush spills the events to disk; they are replayed later
+- A full queue spills instead of growing
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from core.audit_sink import AuditSink
+
+
+class _Pool:
+    def __init__(self, fail=False, delay=0.0):
+        self.fail = fail
+        self.delay = delay
+        self.batches = []
+
+    async def execute(self, sql, *columns):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("db down")
+        self.batches.append(columns)
+
+
+def _sink(tmp_path, pool, **kwargs):
+    kwargs.setdefault("flush_interval_seconds", 60)
+    return AuditSink(spill_dir=str(tmp_path), pool_getter=lambda: pool, **kwargs)
+
+
+def _record(sink, n=1, event_type="list_leads"):
+    for i in range(n):
+        sink.record(event_type, "info", f"ceo@x: {event_type}", {"path": "/leads", "i": i}, tenant_id=1)
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_batches_with_one_statement_each(tmp_path):
+    pool = _Pool()
+    sink = _sink(tmp_path, pool, batch_size=2)
+    _record(sink, 3)
+    assert pool.batches == []
+
+    assert await sink.flush() == 3
+    assert [len(b[0]) for b in pool.batches] == [2, 1]
+    tenant_ids, event_types, _, _, payloads, _ = pool.batches[0]
+    assert tenant_ids == [1, 1] and event_types == ["list_leads", "list_leads"]
+    assert json.loads(payloads[1]) == {"path": "/leads", "i": 1}
+    await sink.stop()
+
+
+@pytest.mark.asyncio
+async def test_batch_size_wakes_worker(tmp_path):
+    pool = _Pool()
+    sink = _sink(tmp_path, pool, batch_size=3)
+    _record(sink, 3)
+    await asyncio.sleep(0.05)
+    assert sink.get_stats()["flushed"] == 3
+    await sink.stop()
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_spills_and_replays(tmp_path):
+    pool = _Pool(fail=True)
+    sink = _sink(tmp_path, pool, batch_size=2)
+    _record(sink, 5)
+
+    assert await sink.flush() == 0
+    stats = sink.get_stats()
+    assert stats["pending"] == 0 and stats["spilled"] == 5 and stats["spill_backlog"] == 5
+
+    # Still down: nothing replayed, nothing lost
+    assert await sink.replay_spill() == 0
+    assert sink.get_stats()["spill_backlog"] == 5
+
+    pool.fail = False
+    assert await sink.replay_spill() == 5
+    assert sink.get_stats()["spill_backlog"] == 0
+    assert sum(len(b[0]) for b in pool.batches) == 5
+    await sink.stop()
+
+
+@pytest.mark.asyncio
+async def test_slow_flush_times_out_and_spills(tmp_path):
+    pool = _Pool(delay=0.2)
+    sink = _sink(tmp_path, pool, flush_timeout_seconds=0.01)
+    _record(sink, 2)
+    await sink.flush()
+    assert sink.get_stats()["spilled"] == 2
+    await sink.stop()
+
+
+def test_full_queue_spills_instead_of_growing(tmp_path):
+    sink = _sink(tmp_path, _Pool(), max_pending=2)
+    _record(sink, 4)
+    stats = sink.get_stats()
+    assert stats["pending"] == 2 and stats["high_watermark"] == 2
+    assert stats["spilled"] == 2 and stats["enqueued"] == 4
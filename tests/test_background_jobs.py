@@ -0,0 +1,67 @@
+"""
+Tests for the asyncio background job runner (core/background_jobs.py).
+
+Covers:
+- daily jobs: next run today or tomorrow (UTC)
+- a failing run is counted and does not stop the job
+- start/stop: interval jobs run without overlapping and are cancelled on stop
+"""
+
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from core.background_jobs import BackgroundJobs
+
+
+async def _noop():
+    return None
+
+
+def test_daily_next_delay():
+    jobs = BackgroundJobs()
+    job = jobs.daily("nightly", _noop, hour=3, minute=15)
+    assert job.next_delay(datetime(2026, 1, 1, 3, 0, tzinfo=timezone.utc)) == 15 * 60
+    assert job.next_delay(datetime(2026, 1, 1, 3, 15, tzinfo=timezone.utc)) == 24 * 3600
+
+
+@pytest.mark.asyncio
+async def test_failing_run_is_counted():
+    async def boom():
+        raise RuntimeError("db down")
+
+    jobs = BackgroundJobs()
+    job = jobs.every("boom", 60, boom)
+    await jobs.run_once(job)
+    await jobs.run_once(job)
+    stats = jobs.get_stats()["boom"]
+    assert stats["runs"] == 2 and stats["errors"] == 2
+    assert stats["last_error"] == "db down"
+
+
+@pytest.mark.asyncio
+async def test_interval_job_runs_until_stopped():
+    active = 0
+    overlaps = 0
+    calls = 0
+
+    async def tick():
+        nonlocal active, overlaps, calls
+        active += 1
+        overlaps += active > 1
+        calls += 1
+        await asyncio.sleep(0.01)
+        active -= 1
+
+    jobs = BackgroundJobs()
+    jobs.every("tick", 0.001, tick)
+    await jobs.start()
+    await asyncio.sleep(0.08)
+    await jobs.stop()
+    ran = calls
+    await asyncio.sleep(0.03)
+
+    assert ran >= 2 and overlaps == 0
+    assert calls == ran
+    assert jobs.get_stats()["tick"]["running"] is False
@@ -0,0 +1,130 @@
+"""
+Tests for the role-based boot profile (core/boot_profile.py).
+
+Covers:
+- ORCHESTRATOR_ROLE normalization and which roles run the scheduler / answer /chat
+- mount_routers: only the role's routers are imported; prefix/tags forwarded; a broken module does not stop the rest,
+  a broken required module aborts startup
+- ROUTER_MOUNTS: unique names, health in every role, admin API not in the webhook role (only its internal router)
+- `-X importtime` parsing and summary
+"""
+
+import sys
+import types
+
+import pytest
+
+from core import boot_profile
+from core.boot_profile import (
+    ADMIN,
+    EVERY_ROLE,
+    ROUTER_MOUNTS,
+    WEBHOOK,
+    RouterMount,
+    mount_routers,
+    parse_importtime,
+    summarize_importtime,
+)
+
+
+class _App:
+    def __init__(self):
+        self.included = []
+
+    def include_router(self, router, **kwargs):
+        self.included.append((router, kwargs))
+
+
+@pytest.fixture
+def fake_routes(monkeypatch):
+    admin = types.ModuleType("fake_admin_routes")
+    admin.router = "admin-router"
+    hooks = types.ModuleType("fake_webhook_routes")
+    hooks.router = "webhook-router"
+    hooks.public_router = "public-router"
+    monkeypatch.setitem(sys.modules, "fake_admin_routes", admin)
+    monkeypatch.setitem(sys.modules, "fake_webhook_routes", hooks)
+    return (
+        RouterMount("admin", "fake_admin_routes", tags=("Admin",)),
+        RouterMount("webhooks", "fake_webhook_routes", prefix="/webhooks", tags=("Webhooks",), roles=WEBHOOK),
+        RouterMount("public", "fake_webhook_routes", attr="public_router", roles=ADMIN | WEBHOOK),
+    )
+
+
+def test_resolve_role():
+    assert boot_profile.resolve_role(" Webhook ") == "webhook"
+    assert boot_profile.resolve_role(None) == "all"
+    assert boot_profile.resolve_role("workers") == "all"
+
+
+def test_role_predicates():
+    assert boot_profile.runs_scheduler("all") and boot_profile.runs_scheduler("scheduler")
+    assert not boot_profile.runs_scheduler("webhook") and not boot_profile.runs_scheduler("admin")
+    assert boot_profile.handles_inbound("webhook") and boot_profile.handles_inbound("all")
+    assert not boot_profile.handles_inbound("admin")
+
+
+def test_mount_only_role_routers(fake_routes):
+    app = _App()
+    stats = mount_routers(app, fake_routes, role="webhook")
+    assert app.included == [
+        ("webhook-router", {"prefix": "/webhooks", "tags": ["Webhooks"]}),
+        ("public-router", {}),
+    ]
+    assert stats["mounted"] == ["webhooks", "public"] and stats["skipped"] == ["admin"]
+    assert "fake_admin_routes" not in stats["module_import_ms"]
+
+
+def test_role_all_mounts_everything(fake_routes):
+    app = _App()
+    stats = mount_routers(app, fake_routes, role="all")
+    assert [router for router, _ in app.included] == ["admin-router", "webhook-router", "public-router"]
+    assert stats["skipped"] == [] and stats["failed"] == {}
+
+
+def test_broken_module_is_skipped(fake_routes):
+    app = _App()
+    mounts = (RouterMount("missing", "fake_module_that_does_not_exist", optional=True),) + fake_routes
+    stats = mount_routers(app, mounts, role="admin")
+    assert "missing" in stats["failed"]
+    assert stats["mounted"] == ["admin", "public"]
+
+
+def test_broken_required_module_aborts(fake_routes):
+    mounts = fake_routes + (RouterMount("auth", "fake_module_that_does_not_exist", required=True),)
+    with pytest.raises(ImportError):
+        mount_routers(_App(), mounts, role="admin")
+
+
+def test_router_mounts_table():
+    names = [m.name for m in ROUTER_MOUNTS]
+    assert len(names) == len(set(names))
+    health = next(m for m in ROUTER_MOUNTS if m.name == "health")
+    assert health.roles == EVERY_ROLE
+    webhook_mounts = [m for m in ROUTER_MOUNTS if boot_profile.serves(m.roles, "webhook")]
+    webhook_modules = {m.module for m in webhook_mounts}
+    assert "routes.meta_webhooks" in webhook_modules
+    assert not webhook_modules & {"auth_routes", "routes.marketing", "routes.google_ads_routes"}
+    # whatsapp_service reads /admin/core/internal/credentials/* from the webhook role
+    assert [(m.module, m.attr) for m in webhook_mounts if m.module == "admin_routes"] == [("admin_routes", "internal_router")]
+    required = {m.name for m in ROUTER_MOUNTS if m.required}
+    assert {"auth", "admin", "admin_internal"} <= required
+
+
+def test_parse_importtime():
+    stderr = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       139 |        139 |   _io",
+        "import time:       323 |        812 | _frozen_importlib_external",
+        "import time:      2000 |       5000 |     langchain_core.prompts",
+        "import time:      1000 |       9000 | langchain_openai",
+        "some other warning on stderr",
+    ])
+    entries = parse_importtime(stderr)
+    assert [e["module"] for e in entries] == ["_io", "_frozen_importlib_external", "langchain_core.prompts", "langchain_openai"]
+    assert [e["depth"] for e in entries] == [1, 0, 2, 0]
+
+    summary = summarize_importtime(entries, top=2)
+    assert summary["modules"] == 4 and summary["total_ms"] == 3.5
+    assert [e["module"] for e in summary["slowest"]] == ["langchain_openai", "langchain_core.prompts"]
+    assert summary["packages"][0] == ("langchain_core", 2000)
@@ -0,0 +1,97 @@
+"""
+Tests for index-based duplicate detection (services/deduplication_service.py).
+
+Covers:
+- phonetic_fold collapses common Spanish spelling variants
+- _score_candidate keeps phone/email/name confidences and threshold
+- find_duplicates_for_lead scores only rows returned by the blocking-key lookup
+- run_incremental_dedup_all (background job) keeps going when one tenant fails
+"""
+
+import uuid
+import pytest
+
+from services import deduplication_service
+from services.deduplication_service import (
+    _score_candidate,
+    find_duplicates_for_lead,
+    phonetic_fold,
+    run_incremental_dedup_all,
+)
+
+
+def _row(**kw):
+    base = {"id": uuid.uuid4(), "first_name": None, "last_name": None, "email": None, "phone_number": ""}
+    base.update(kw)
+    return base
+
+
+def test_phonetic_fold_variants():
+    assert phonetic_fold("González") == phonetic_fold("Gonzales")
+    assert phonetic_fold("Villalba") == phonetic_fold("Biyalba")
+    assert phonetic_fold("Quiroga") == phonetic_fold("Kiroga")
+    assert phonetic_fold("Hernán") == phonetic_fold("Ernan")
+
+
+def test_score_phone_in_different_format():
+    cand = _score_candidate("+54 9 11 1234-5678", None, "", "", _row(phone_number="5491112345678"))
+    assert cand["confidence"] == 90
+    assert cand["match_reasons"] == ["phone_normalized_exact"]
+
+
+def test_score_email_case_insensitive():
+    cand = _score_candidate("", "Ana@Mail.com", "", "", _row(email="ana@mail.com"))
+    assert cand["confidence"] == 85
+
+
+def test_score_phonetic_name_variant():
+    cand = _score_candidate("", None, "Juan", "Gonzalez", _row(first_name="Juan", last_name="Gonzales"))
+    assert cand["confidence"] == 70
+    assert cand["match_reasons"] == ["name_fuzzy_100pct"]
+
+
+def test_score_below_threshold_is_dropped():
+    assert _score_candidate("", None, "Juan", "Perez", _row(first_name="Juan", last_name="Gomez")) is None
+
+
+class _FakePool:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    async def fetch(self, query, *args):
+        self.calls.append((query, args))
+        return self.rows
+
+
+@pytest.mark.asyncio
+async def test_find_duplicates_uses_single_index_query():
+    phone_dup = _row(phone_number="5491112345678", first_name="Otro", last_name="Nombre")
+    noise = _row(first_name="Juan", last_name="Gomez")
+    pool = _FakePool([phone_dup, noise])
+
+    result = await find_duplicates_for_lead(
+        1, str(uuid.uuid4()), "01112345678", None, "Juan", "Perez", pool
+    )
+
+    assert len(pool.calls) == 1
+    assert "lead_dedup_keys_for" in pool.calls[0][0]
+    assert [r["lead_id"] for r in result] == [str(phone_dup["id"])]
+
+
+@pytest.mark.asyncio
+async def test_dedup_job_runs_every_active_tenant(monkeypatch):
+    seen = []
+
+    async def _incremental(tenant_id, pool):
+        seen.append(tenant_id)
+        if tenant_id == 1:
+            raise RuntimeError("boom")
+        return {}
+
+    monkeypatch.setattr(deduplication_service, "run_incremental_dedup", _incremental)
+    pool = _FakePool([{"id": 1}, {"id": 2}])
+
+    assert await run_incremental_dedup_all(pool) == {"tenants": 2, "failed": 1}
+    assert seen == [1, 2]
+    assert "status = 'active'" in pool.calls[0][0]
@@ -0,0 +1,97 @@
+"""
+Tests for the shared outbound HTTP client registry (core/http_clients.py).
+
+Covers:
+- One pooled client per origin; session() routes each request by URL and applies its default timeout
+- Per-origin stats: latency histogram, errors, new vs reused connections (httpcore trace hook)
+- aclose() drops the pools; the next request recreates them lazily
+"""
+
+import httpx
+import pytest
+
+from core.http_clients import HttpClientRegistry, origin_of
+
+
+def _registry(handler):
+    return HttpClientRegistry(transport_factory=lambda origin: httpx.MockTransport(handler))
+
+
+def test_origin_of():
+    assert origin_of("https://graph.facebook.com/v21.0/me?x=1") == "https://graph.facebook.com"
+    assert origin_of("http://whatsapp_service:8002/send") == "http://whatsapp_service:8002"
+    with pytest.raises(ValueError):
+        origin_of("/relative/path")
+
+
+@pytest.mark.asyncio
+async def test_session_routes_by_origin_and_applies_timeout():
+    seen = []
+
+    def handler(request):
+        seen.append((request.url.host, request.extensions["timeout"]["read"]))
+        return httpx.Response(200, json={"ok": True})
+
+    registry = _registry(handler)
+    async with registry.session(timeout=7.0) as client:
+        await client.get("https://graph.facebook.com/v21.0/me")
+        await client.post("https://api.ycloud.com/v2/whatsapp/messages", json={})
+        await client.get("https://graph.facebook.com/v21.0/123", timeout=2.0)
+
+    assert seen == [("graph.facebook.com", 7.0), ("api.ycloud.com", 7.0), ("graph.facebook.com", 2.0)]
+    assert registry.get("https://graph.facebook.com/x") is registry.get("https://graph.facebook.com/y")
+    stats = registry.get_stats()
+    assert stats["open_pools"] == ["https://api.ycloud.com", "https://graph.facebook.com"]
+    assert stats["origins"]["https://graph.facebook.com"]["requests"] == 2
+    assert stats["origins"]["https://graph.facebook.com"]["latency_histogram_ms"]["le_+Inf"] == 2
+
+    # No timeout given: same 5s a bare httpx.AsyncClient() used
+    async with registry.session() as client:
+        await client.get("https://api.ycloud.com/v2/ping")
+    assert seen[-1] == ("api.ycloud.com", 5.0)
+
+
+@pytest.mark.asyncio
+async def test_connection_reuse_and_errors_are_counted():
+    class _Transport(httpx.AsyncBaseTransport):
+        def __init__(self):
+            self.connected = False
+
+        async def handle_async_request(self, request):
+            if request.url.path == "/boom":
+                raise httpx.ConnectError("refused", request=request)
+            if not self.connected:
+                await request.extensions["trace"]("connection.connect_tcp.complete", {})
+                self.connected = True
+            return httpx.Response(200, extensions={"http_version": b"HTTP/2"})
+
+    transport = _Transport()
+    registry = HttpClientRegistry(transport_factory=lambda origin: transport)
+    async with registry.session() as client:
+        for _ in range(3):
+            await client.get("https://api.telegram.org/bot/sendMessage")
+        with pytest.raises(httpx.ConnectError):
+            await client.get("https://api.telegram.org/boom")
+
+    stats = registry.get_stats()["origins"]["https://api.telegram.org"]
+    assert stats["requests"] == 3
+    assert stats["errors"] == 1
+    assert stats["new_connections"] == 1
+    assert stats["reused_connections"] == 3
+    assert stats["http_versions"] == {"HTTP/2": 3}
+    assert stats["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_aclose_drops_pools_and_recreates_lazily():
+    registry = _registry(lambda request: httpx.Response(204))
+    first = registry.get("https://api.ycloud.com/v2")
+
+    await registry.aclose()
+
+    assert first.is_closed
+    assert registry.get_stats()["open_pools"] == []
+    async with registry.session() as client:
+        resp = await client.get("https://api.ycloud.com/v2/ping")
+    assert resp.status_code == 204
+    assert registry.get("https://api.ycloud.com") is not first
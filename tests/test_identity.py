@@ -0,0 +1,117 @@
+"""
+Tests for cached identity resolution (core/identity.py).
+
+Covers:
+- One statement resolves sellers -> professionals -> first tenant priority
+- Process cache and per-request memo skip the database; saved round trips are counted
+- invalidate() forces a reload
+- A failing single statement (legacy schema) falls back to the sequential lookups
+"""
+
+import uuid
+
+import pytest
+
+from core import identity as identity_module
+from core.identity import IdentityResolver, IDENTITY_SQL
+from core.tenant_cache import tenant_cache, NS_USER_IDENTITY
+
+
+class _Pool:
+    def __init__(self, row=None, fail_single=False, sellers=None, professionals=None):
+        self.row = row
+        self.fail_single = fail_single
+        self.sellers = sellers
+        self.professionals = professionals
+        self.calls = []
+
+    async def fetchrow(self, sql, *args):
+        self.calls.append(sql)
+        if sql == IDENTITY_SQL:
+            if self.fail_single:
+                raise RuntimeError('relation "sellers" does not exist')
+            return self.row
+        return {"role": "setter", "status": "active"}
+
+    async def fetchval(self, sql, *args):
+        self.calls.append(sql)
+        if "FROM sellers" in sql:
+            raise RuntimeError('relation "sellers" does not exist')
+        if "FROM professionals" in sql:
+            return self.professionals
+        return 1
+
+
+def _row(seller=None, professional=None, first=1):
+    return {
+        "role": "closer", "status": "active",
+        "seller_tenant_id": seller, "professional_tenant_id": professional, "first_tenant_id": first,
+    }
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    tenant_cache.invalidate_namespace(NS_USER_IDENTITY, _publish=False)
+    yield
+    tenant_cache.invalidate_namespace(NS_USER_IDENTITY, _publish=False)
+
+
+def _use_pool(monkeypatch, pool):
+    monkeypatch.setattr(identity_module.db, "pool", pool, raising=False)
+
+
+@pytest.mark.asyncio
+async def test_single_query_priority(monkeypatch):
+    resolver = IdentityResolver()
+    _use_pool(monkeypatch, _Pool(row=_row(seller=None, professional=4, first=1)))
+    identity = await resolver.resolve(uuid.uuid4())
+    assert identity == {"tenant_id": 4, "role": "closer", "status": "active", "source": "professional"}
+    # Sequential path would have needed sellers + professionals
+    assert resolver.get_stats()["db_round_trips"] == 1
+    assert resolver.get_stats()["round_trips_saved"] == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_and_request_memo_skip_database(monkeypatch):
+    resolver = IdentityResolver()
+    pool = _Pool(row=_row(seller=None, professional=None, first=2))
+    _use_pool(monkeypatch, pool)
+    uid = uuid.uuid4()
+
+    resolver.begin_request()
+    assert (await resolver.resolve(uid))["tenant_id"] == 2
+    assert (await resolver.resolve(uid))["tenant_id"] == 2
+    resolver.begin_request()
+    assert (await resolver.resolve(uid))["tenant_id"] == 2
+
+    stats = resolver.get_stats()
+    assert len(pool.calls) == 1
+    assert stats["request_hits"] == 1 and stats["cache_hits"] == 1
+    # Fallback identity costs 3 sequential lookups: 2 saved on load + 3 + 3 on hits
+    assert stats["round_trips_saved"] == 8
+    assert stats["round_trips_saved_per_request"] == 4.0
+
+
+@pytest.mark.asyncio
+async def test_invalidate_reloads(monkeypatch):
+    resolver = IdentityResolver()
+    pool = _Pool(row=_row(seller=3))
+    _use_pool(monkeypatch, pool)
+    uid = uuid.uuid4()
+
+    resolver.begin_request()
+    await resolver.resolve(uid)
+    pool.row = _row(seller=5)
+    resolver.invalidate(uid)
+    assert (await resolver.resolve(uid))["tenant_id"] == 5
+    assert len(pool.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_falls_back_to_sequential_lookups(monkeypatch):
+    resolver = IdentityResolver()
+    pool = _Pool(fail_single=True, professionals=9)
+    _use_pool(monkeypatch, pool)
+    identity = await resolver.resolve(uuid.uuid4())
+    assert identity == {"tenant_id": 9, "role": "setter", "status": "active", "source": "professional"}
+    assert resolver.get_stats()["single_query_failures"] == 1
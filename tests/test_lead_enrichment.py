@@ -0,0 +1,121 @@
+"""
+Tests for the seller panel enrichment (services/lead_enrichment_service.py).
+
+Covers:
+- One set query per enrichment for the whole page, grouped per lead / phone
+- No query when there is nothing to enrich; duplicate ids and phones collapse
+- Queue enrichment runs meetings and messages concurrently
+- Panel cache: hits skip the loader, message writes drop only the panels
+  showing that conversation, lead writes drop the tenant, never served stale
+"""
+
+import asyncio
+import uuid
+
+import pytest
+
+from services.lead_enrichment_service import LeadEnrichmentService
+
+
+class _Pool:
+    """Answers the enrichment queries from canned rows and tracks concurrency."""
+
+    def __init__(self, meetings=(), messages=(), notes=()):
+        self.rows = {"meetings": list(meetings), "messages": list(messages), "notes": list(notes)}
+        self.calls = []
+        self.running = 0
+        self.peak = 0
+
+    async def fetch(self, sql, *args):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        kind = "messages" if "chat_messages" in sql else "notes" if "lead_notes" in sql else "meetings"
+        self.calls.append((kind, args))
+        return self.rows[kind]
+
+
+@pytest.mark.asyncio
+async def test_messages_one_query_grouped_per_phone():
+    pool = _Pool(messages=[
+        {"phone": "111", "role": "user", "content": "hola", "created_at": 1},
+        {"phone": "111", "role": "assistant", "content": "buenas", "created_at": 2},
+        {"phone": "222", "role": "user", "content": "precio?", "created_at": 3},
+    ])
+    result = await LeadEnrichmentService().recent_messages(pool, 7, ["111", "222", "111", None], per_phone=5)
+
+    assert pool.calls == [("messages", (7, ["111", "222"], 5))]
+    assert [m["content"] for m in result["111"]] == ["hola", "buenas"]
+    assert "phone" not in result["222"][0]
+
+
+@pytest.mark.asyncio
+async def test_no_query_without_leads():
+    pool = _Pool()
+    service = LeadEnrichmentService()
+    assert await service.upcoming_meetings(pool, 1, []) == {}
+    assert await service.recent_notes(pool, 1, [None], ["post_call"]) == {}
+    assert pool.calls == []
+
+
+@pytest.mark.asyncio
+async def test_notes_filtered_by_type_and_capped():
+    lead = uuid.uuid4()
+    pool = _Pool(notes=[{"lead_id": lead, "id": 1, "note_type": "post_call", "content": "llamar el lunes"}])
+    result = await LeadEnrichmentService().recent_notes(pool, 3, [lead], ["post_call"], per_lead=5)
+    assert pool.calls == [("notes", (3, [lead], ["post_call"], 5))]
+    assert result == {lead: [{"id": 1, "note_type": "post_call", "content": "llamar el lunes"}]}
+
+
+@pytest.mark.asyncio
+async def test_enrich_queue_runs_both_queries_concurrently():
+    lead_a, lead_b = uuid.uuid4(), uuid.uuid4()
+    pool = _Pool(
+        meetings=[{"lead_id": lead_a, "id": "m1", "title": "Demo"}],
+        messages=[{"phone": "222", "role": "user", "content": "hola", "created_at": 1}],
+    )
+    leads = [{"id": lead_a, "phone_number": "111"}, {"id": lead_b, "phone_number": "222"}]
+    enriched = await LeadEnrichmentService().enrich_queue(pool, 1, leads)
+
+    assert pool.peak == 2 and len(pool.calls) == 2
+    assert enriched[0]["upcoming_meetings"] == [{"id": "m1", "title": "Demo"}]
+    assert enriched[0]["conversation_history"] == []
+    assert enriched[1]["upcoming_meetings"] == []
+    assert enriched[1]["conversation_history"][0]["content"] == "hola"
+
+
+@pytest.mark.asyncio
+async def test_panel_cache_invalidated_by_conversation_and_tenant():
+    service = LeadEnrichmentService()
+    builds = {"n": 0}
+
+    async def _build():
+        builds["n"] += 1
+        return {"leads": [{"phone_number": "111"}], "build": builds["n"]}
+
+    async def _panel(seller="s1"):
+        return await service.cached_panel(
+            "my_queue", 1, [seller, None, None], _build,
+            phones_of=lambda result: (l["phone_number"] for l in result["leads"]),
+        )
+
+    assert (await _panel())["build"] == 1
+    assert (await _panel())["build"] == 1
+
+    # A message in a conversation the panel does not show keeps it cached
+    service.invalidate_conversation(1, "999")
+    assert (await _panel())["build"] == 1
+
+    # A message in a shown conversation drops it; the next read rebuilds instead of serving stale
+    service.invalidate_conversation(1, "111")
+    assert (await _panel())["build"] == 2
+
+    # Other tenants' writes do not touch it; a lead write in the tenant does
+    service.invalidate_tenant(2)
+    assert (await _panel())["build"] == 2
+    service.invalidate_tenant(1)
+    assert (await _panel())["build"] == 3
+
+    # Keys are per seller and filters
+    assert (await _panel("s2"))["build"] == 4
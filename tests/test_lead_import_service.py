@@ -0,0 +1,178 @@
+"""
+Tests for the COPY-based bulk lead import (services/lead_import_service.py).
+
+Covers:
+- Row normalization (phone E.164, lowercased email, invalid value, no contact)
+- import_rows stages every row via COPY in chunks (invalid ones with blocked_reason) and reports progress
+- A row that fails to apply is retried alone and reported; the rest of the import goes on
+- Result accounting (created / updated from RETURNING / blocked / skipped / errors)
+"""
+
+import pytest
+
+import services.lead_import_service as lis
+
+
+MAPPING = {"telefono": "phone_number", "email": "email", "nombre": "first_name", "valor": "estimated_value"}
+
+
+def test_normalize_row():
+    record, reason = lis._normalize_row(1, {"telefono": "+54 9 11 5555-1234", "email": " Ana@X.com ", "nombre": "Ana"}, MAPPING)
+    assert reason is None
+    assert record[:4] == (1, "+5491155551234", "ana@x.com", "Ana")
+    assert record[6] == "csv_import"
+
+
+def test_normalize_row_errors():
+    assert lis._normalize_row(2, {"nombre": "Sin contacto"}, MAPPING) == (None, "Sin teléfono ni email")
+    record, reason = lis._normalize_row(3, {"telefono": "1155551234", "valor": "mucho"}, MAPPING)
+    assert record is None and reason.startswith("Valor inválido")
+
+
+class _Tx:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _FakeConn:
+    """Routes the import statements; INSERT/UPDATE answer per row_no range like the staged SQL."""
+
+    def __init__(self, blacklisted=(2,), failing_rows=(), merged=()):
+        self.copied = []
+        self.blacklisted = set(blacklisted)
+        self.failing_rows = set(failing_rows)
+        self.merged = list(merged)
+        self.row_errors = {}
+        self.insert_calls = []
+
+    def transaction(self):
+        return _Tx()
+
+    def _staged(self):
+        return [r for chunk in self.copied for r in chunk]
+
+    def _valid_rows(self):
+        return [r[0] for r in self._staged() if r[-1] is None and r[0] not in self.blacklisted]
+
+    async def execute(self, query, *args):
+        if "SET blocked_reason = $2 WHERE row_no = $1" in query:
+            self.row_errors[args[0]] = args[1]
+        return "OK"
+
+    async def copy_records_to_table(self, table, records, columns):
+        assert columns[-1] == "blocked_reason" and all(len(r) == len(columns) for r in records)
+        self.copied.append(list(records))
+
+    async def fetch(self, query, *args):
+        if "JOIN blacklist" in query:
+            return [{"row_no": n} for n in sorted(self.blacklisted)]
+        if "INSERT INTO leads" in query:
+            lo, hi = args[1], args[2]
+            self.insert_calls.append((lo, hi))
+            rows = [n for n in self._valid_rows() if lo <= n <= hi]
+            if self.failing_rows & set(rows):
+                raise ValueError("value too long for type character varying(50)")
+            return [{"row_no": n} for n in rows]
+        if "merged_rows" in query:
+            lo, hi = args[1], args[2]
+            return [{"merged_rows": m} for n, m in self.merged if lo <= n <= hi]
+        if "SELECT row_no, blocked_reason" in query:
+            reasons = {r[0]: r[-1] for r in self._staged() if r[-1]}
+            reasons.update({n: "Bloqueado: spam" for n in self.blacklisted})
+            reasons.update(self.row_errors)
+            return [{"row_no": n, "blocked_reason": reason} for n, reason in reasons.items()]
+        return []
+
+    async def fetchval(self, query, *args):
+        return 0
+
+
+class _Acquire:
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def __aenter__(self):
+        return self.conn
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def acquire(self):
+        return _Acquire(self.conn)
+
+
+class _FakeDb:
+    def __init__(self, conn):
+        self.pool = _FakePool(conn)
+
+
+@pytest.mark.asyncio
+async def test_import_rows_stages_in_chunks_and_counts(monkeypatch):
+    conn = _FakeConn()
+    monkeypatch.setattr(lis, "db", _FakeDb(conn))
+    monkeypatch.setattr(lis, "LEAD_IMPORT_COPY_CHUNK", 2)
+
+    rows = [
+        {"telefono": "1155550001"},
+        {"telefono": "1155550002"},
+        {"telefono": "1155550003"},
+        {"nombre": "sin contacto"},
+    ]
+    events = []
+
+    async def _progress(e):
+        events.append(e)
+
+    result = await lis.lead_import_service.import_rows(1, rows, MAPPING, progress=_progress)
+
+    # Invalid rows are staged too, with their reason in blocked_reason
+    assert [len(c) for c in conn.copied] == [2, 2]
+    assert conn.copied[1][1][-1] == "Sin teléfono ni email"
+    assert [e["processed"] for e in events if e["stage"] == "staging"] == [2, 4]
+    assert result["total"] == 4
+    assert result["created"] == 2
+    assert result["blocked"] == 1
+    assert result["skipped"] == 1
+    assert [e["row"] for e in result["errors"]] == [2, 4]
+
+
+@pytest.mark.asyncio
+async def test_failing_row_does_not_abort_the_import(monkeypatch):
+    conn = _FakeConn(blacklisted=(), failing_rows=(2,))
+    monkeypatch.setattr(lis, "db", _FakeDb(conn))
+    monkeypatch.setattr(lis, "LEAD_IMPORT_COPY_CHUNK", 2)
+
+    rows = [{"telefono": f"115555000{i}"} for i in range(1, 5)]
+    result = await lis.lead_import_service.import_rows(1, rows, MAPPING)
+
+    # The failing chunk is retried row by row; only row 2 is reported
+    assert conn.insert_calls == [(1, 2), (1, 1), (2, 2), (3, 4)]
+    assert result["created"] == 3
+    assert [e["row"] for e in result["errors"]] == [2]
+    assert result["errors"][0]["reason"].startswith("Error: value too long")
+
+
+@pytest.mark.asyncio
+async def test_updated_counts_the_merged_rows_returned(monkeypatch):
+    # Rows 1 and 3 (an in-file duplicate) fill blanks on one lead, row 2 on another
+    conn = _FakeConn(blacklisted=(), merged=[(1, 2), (2, 1)])
+    monkeypatch.setattr(lis, "db", _FakeDb(conn))
+
+    async def _no_inserts(query, *args):
+        if "INSERT INTO leads" in query:
+            return []
+        return await _FakeConn.fetch(conn, query, *args)
+
+    conn.fetch = _no_inserts
+    rows = [{"telefono": "1155550001", "nombre": "Ana"}, {"email": "b@x.com"}, {"telefono": "1155550001", "email": "a@x.com"}]
+    result = await lis.lead_import_service.import_rows(1, rows, MAPPING, on_duplicate="update")
+
+    assert result["created"] == 0 and result["updated"] == 3 and result["skipped"] == 0
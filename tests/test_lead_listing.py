@@ -0,0 +1,77 @@
+"""
+Tests for lead listing queries (services/lead_listing_service.py).
+
+Covers:
+- Keyset cursor round-trip and rejection of malformed cursors
+- Cursor mode seeks on (created_at, id) and ignores offset; offset mode still works
+- Tags filter as a JSONB containment parameter; search input is LIKE-escaped
+- next cursor only when more rows than the page size came back
+- Queue priority CASE mirrors the former Python ordering
+"""
+
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+from services.lead_listing_service import (
+    build_lead_list_query,
+    build_queue_query,
+    decode_lead_cursor,
+    encode_lead_cursor,
+    next_lead_cursor,
+    queue_priority_sql,
+)
+
+NOW = datetime(2026, 3, 1, 12, 30, tzinfo=timezone.utc)
+
+
+def test_cursor_round_trip():
+    lead_id = uuid.uuid4()
+    assert decode_lead_cursor(encode_lead_cursor(NOW, lead_id)) == (NOW, lead_id)
+    with pytest.raises(ValueError):
+        decode_lead_cursor("garbage")
+
+
+def test_cursor_mode_seeks_and_ignores_offset():
+    lead_id = uuid.uuid4()
+    query, params = build_lead_list_query(1, limit=50, offset=500, cursor=encode_lead_cursor(NOW, lead_id))
+    assert "(l.created_at, l.id) < ($2, $3)" in query
+    assert "OFFSET" not in query
+    assert params == [1, NOW, lead_id, 51]
+    assert "ORDER BY l.created_at DESC, l.id DESC" in query
+
+
+def test_offset_mode_kept_for_existing_clients():
+    query, params = build_lead_list_query(1, limit=20, offset=40)
+    assert query.rstrip().endswith("OFFSET $3")
+    assert params == [1, 21, 40]
+
+
+def test_filters_in_database():
+    seller = uuid.uuid4()
+    query, params = build_lead_list_query(
+        7, seller_scope=seller, status="new", search="50%_off", tags=["caliente", "urgente"],
+    )
+    assert "l.assigned_seller_id = $2" in query and "l.status = $3" in query
+    assert "ILIKE $4" in query and params[3] == "%50\\%\\_off%"
+    assert "l.tags @> $5::jsonb" in query and params[4] == ["caliente", "urgente"]
+    assert "tags_raw" not in query
+
+
+def test_next_cursor_only_when_more_rows():
+    rows = [{"created_at": NOW, "id": uuid.uuid4()} for _ in range(3)]
+    assert next_lead_cursor(rows[:2], limit=2) is None
+    created_at, lead_id = decode_lead_cursor(next_lead_cursor(rows, limit=2))
+    assert (created_at, lead_id) == (NOW, rows[1]["id"])
+
+
+def test_queue_query_filters_tag_and_orders_by_priority():
+    query, params = build_queue_query(1, uuid.uuid4(), status="derivado", tag="caliente")
+    assert "l.tags @> $4::jsonb" in query and params[3] == ["caliente"]
+    assert "ORDER BY queue_priority ASC, l.created_at ASC" in query
+
+    case = queue_priority_sql()
+    assert "ARRAY['caliente', 'urgente']" in case and "THEN 0" in case
+    assert "ARRAY['tibio']" in case
+    assert "WHEN 'derivado' THEN 2" in case and "ELSE 3" in case
@@ -0,0 +1,88 @@
+"""
+Tests for the set-based lead scoring engine (services/lead_scoring_service.py).
+
+Covers:
+- KeywordMatcher keeps `word in text` semantics (overlaps, prefixes, repeats)
+- _compute_scores builds the same breakdown shape for a chunk of leads
+- Leads without phone only get fit score
+"""
+
+import uuid
+import pytest
+from datetime import datetime, timedelta, timezone
+
+from services.lead_scoring_service import (
+    BEHAVIOR_MATCHER,
+    DEMO_WORDS,
+    KeywordMatcher,
+    PRICING_WORDS,
+    URGENCY_WORDS,
+    _compute_scores,
+)
+
+
+def _naive_counts(text):
+    return {
+        "urgency": sum(1 for w in URGENCY_WORDS if w in text),
+        "pricing": sum(1 for w in PRICING_WORDS if w in text),
+        "demo": sum(1 for w in DEMO_WORDS if w in text),
+    }
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    "hola, cual es el precio del plan? necesito ya una demo",
+    "precio precio precio",
+    "quiero agendar una reunion hoy o ahora, es urgente",
+    "planilla de presupuesto y presentacion",
+    "ahoy",
+])
+def test_matcher_matches_substring_semantics(text):
+    assert BEHAVIOR_MATCHER.count(text) == _naive_counts(text)
+
+
+def test_matcher_prefix_keywords_are_implied():
+    matcher = KeywordMatcher({"a": ["plan", "planes"]})
+    assert matcher.count("planes") == {"a": 2}
+
+
+class _FakePool:
+    def __init__(self, stats, messages):
+        self.stats = stats
+        self.messages = messages
+        self.queries = 0
+
+    async def fetch(self, query, *args):
+        self.queries += 1
+        if "GROUP BY" in query:
+            return self.stats
+        return self.messages
+
+
+@pytest.mark.asyncio
+async def test_compute_scores_for_chunk():
+    now = datetime.now(timezone.utc)
+    lead_a, lead_b = uuid.uuid4(), uuid.uuid4()
+    leads = [
+        {"id": lead_a, "phone_number": "+541", "source": "meta_ads", "first_name": "Ana",
+         "last_name": None, "email": "a@x.com", "company": None, "tags": '["vip"]'},
+        {"id": lead_b, "phone_number": None, "source": "manual", "first_name": None,
+         "last_name": None, "email": None, "company": None, "tags": None},
+    ]
+    pool = _FakePool(
+        stats=[{"phone": "+541", "conv_count": 2, "msg_count": 12, "last_msg": now - timedelta(hours=2)}],
+        messages=[{"phone": "+541", "content": "Precio del plan?"}, {"phone": "+541", "content": "Agendar demo"}],
+    )
+
+    scores = await _compute_scores(pool, 1, leads)
+
+    assert pool.queries == 2
+    total_a, breakdown_a = scores[lead_a]
+    assert breakdown_a["engagement"]["details"] == {"messages": 12, "last_message_days_ago": 0, "conversations": 2}
+    assert breakdown_a["engagement"]["score"] == 12 + 15 + 6
+    assert breakdown_a["behavior"]["details"] == {"urgency_signals": 0, "pricing_interest": 2, "demo_interest": 2}
+    assert total_a == breakdown_a["engagement"]["score"] + breakdown_a["fit"]["score"] + breakdown_a["behavior"]["score"]
+
+    total_b, breakdown_b = scores[lead_b]
+    assert breakdown_b["engagement"] == {"score": 0, "details": {"no_phone": True}}
+    assert total_b == breakdown_b["fit"]["score"] == 4
@@ -0,0 +1,206 @@
+"""
+Tests for the versioned schema ledger (db/schema_version.py).
+
+Covers:
+- REQUIRED_SCHEMA_VERSION matches the newest ledger revision in alembic/versions
+- Boot check: one query, behind schema is reported (not migrated) unless SCHEMA_AUTO_MIGRATE
+- SCHEMA_AUTO_MIGRATE re-reads the version afterwards; migrate_ledger records every applied version
+- The app's Database (db/__init__) runs exactly revision 0001's statements as version 1
+- A missing ledger counts as version 0
+- Checksums are order sensitive and ignore surrounding whitespace
+"""
+
+import os
+import re
+
+import pytest
+
+from db import schema_version
+from db.schema_version import REQUIRED_SCHEMA_VERSION, check_schema_version, migrate_ledger, statements_checksum
+
+VERSIONS_DIR = os.path.join(os.path.dirname(__file__), "..", "orchestrator_service", "alembic", "versions")
+
+
+class _Pool:
+    def __init__(self, version=None, error=None):
+        self.version = version
+        self.error = error
+        self.calls = 0
+
+    async def fetchval(self, sql, *args):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return self.version
+
+
+class _UndefinedTable(Exception):
+    sqlstate = "42P01"
+
+
+def test_required_version_matches_newest_revision():
+    versions = []
+    for name in os.listdir(VERSIONS_DIR):
+        if name.endswith(".py"):
+            with open(os.path.join(VERSIONS_DIR, name), encoding="utf-8") as f:
+                match = re.search(r"^schema_version: int = (\d+)", f.read(), re.M)
+            if match:
+                versions.append(int(match.group(1)))
+    assert sorted(versions) == list(range(1, len(versions) + 1))
+    assert REQUIRED_SCHEMA_VERSION == max(versions)
+
+
+@pytest.mark.asyncio
+async def test_current_schema_is_one_query():
+    pool = _Pool(version=REQUIRED_SCHEMA_VERSION)
+    status = await check_schema_version(pool)
+    assert status["ok"] and pool.calls == 1
+    assert schema_version.schema_status["ok"] is True
+
+
+@pytest.mark.asyncio
+async def test_behind_schema_is_reported_not_migrated(monkeypatch):
+    monkeypatch.setattr(schema_version, "SCHEMA_AUTO_MIGRATE", False)
+    migrated = []
+
+    async def _robot():
+        migrated.append(True)
+
+    status = await check_schema_version(_Pool(error=_UndefinedTable()), auto_migrate=_robot)
+    assert status["current"] == 0 and status["ok"] is False
+    assert migrated == [] and schema_version.schema_status["ok"] is False
+
+
+@pytest.mark.asyncio
+async def test_auto_migrate_opt_in(monkeypatch):
+    monkeypatch.setattr(schema_version, "SCHEMA_AUTO_MIGRATE", True)
+    migrated = []
+    pool = _Pool(version=0)
+
+    async def _migrate():
+        migrated.append(True)
+        pool.version = REQUIRED_SCHEMA_VERSION
+
+    status = await check_schema_version(pool, auto_migrate=_migrate)
+    assert migrated == [True] and status["auto_migrated"]
+    # The version is read again after migrating: readiness does not stay schema_behind
+    assert status["current"] == REQUIRED_SCHEMA_VERSION and status["ok"] is True
+    assert schema_version.schema_status["ok"] is True
+
+
+class _Revision:
+    def __init__(self, version, statements):
+        self.schema_version = version
+        self.revision = f"{version:04d}"
+        self.__doc__ = f"revision_{version}\n\nDescription."
+        self._statements = statements
+
+    def statements(self):
+        return self._statements
+
+
+class _LedgerConn:
+    def __init__(self, applied):
+        self.applied = set(applied)
+        self.executed = []
+        self.recorded = []
+
+    def transaction(self):
+        class _Tx:
+            async def __aenter__(self):
+                return None
+
+            async def __aexit__(self, *exc):
+                return None
+
+        return _Tx()
+
+    async def execute(self, sql, *args):
+        if sql is schema_version.RECORD_MIGRATION_SQL:
+            self.recorded.append(args[:3])
+        elif sql is not schema_version.SET_SETTING_SQL:
+            self.executed.append(sql)
+
+    async def fetch(self, sql, *args):
+        return [{"version": v} for v in sorted(self.applied)]
+
+    async def fetchval(self, sql, *args):
+        return 3  # critical tables present: no Foundation
+
+
+class _LedgerPool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def acquire(self):
+        conn = self.conn
+
+        class _Acquire:
+            async def __aenter__(self):
+                return conn
+
+            async def __aexit__(self, *exc):
+                return None
+
+        return _Acquire()
+
+
+@pytest.mark.asyncio
+async def test_migrate_ledger_applies_and_records_pending_versions():
+    conn = _LedgerConn(applied=[1])
+    robot = []
+
+    async def _robot():
+        robot.append(True)
+        return True
+
+    revisions = [_Revision(1, ["legacy"]), _Revision(2, ["ALTER a"]), _Revision(3, ["ALTER b", "ALTER c"])]
+    reached = await migrate_ledger(_LedgerPool(conn), _robot, revisions=revisions)
+
+    assert reached == 3
+    assert robot == []  # version 1 already recorded: the Robot does not run again
+    assert [sql for sql in conn.executed if sql.startswith("ALTER")] == ["ALTER a", "ALTER b", "ALTER c"]
+    assert conn.recorded == [(2, "0002", "revision_2"), (3, "0003", "revision_3")]
+    assert "pg_advisory_unlock" in conn.executed[-1]
+
+
+@pytest.mark.asyncio
+async def test_migrate_ledger_stops_when_the_robot_fails():
+    conn = _LedgerConn(applied=[])
+
+    async def _robot():
+        return False
+
+    with pytest.raises(RuntimeError):
+        await migrate_ledger(_LedgerPool(conn), _robot, revisions=[_Revision(1, ["legacy"]), _Revision(2, ["ALTER a"])])
+    assert conn.recorded == [] and "ALTER a" not in conn.executed
+    assert "pg_advisory_unlock" in conn.executed[-1]
+
+
+@pytest.mark.asyncio
+async def test_app_database_robot_runs_revision_0001_statements(monkeypatch):
+    import db
+    from db.legacy import Database as LegacyDatabase
+    from db.migrations import MigrationRunner
+
+    statements = LegacyDatabase.evolution_patches() + MigrationRunner(None)._get_patches()
+    monkeypatch.setattr(schema_version, "ledger_revisions", lambda: [_Revision(1, statements)])
+    conn = _LedgerConn(applied=[])
+    database = db.Database()
+    database.pool = _LedgerPool(conn)
+
+    assert await database._run_auto_migrations() == 1
+    assert [sql for sql in conn.executed if sql in statements] == statements
+    assert conn.recorded == [(1, "0001", "revision_1")]
+
+
+@pytest.mark.asyncio
+async def test_other_errors_propagate():
+    with pytest.raises(ConnectionError):
+        await check_schema_version(_Pool(error=ConnectionError("db down")))
+
+
+def test_checksum_order_sensitive():
+    a, b = "CREATE TABLE a (id int);", "CREATE TABLE b (id int);"
+    assert statements_checksum([a, b]) == statements_checksum([f"\n  {a}\n", b])
+    assert statements_checksum([a, b]) != statements_checksum([b, a])
@@ -0,0 +1,83 @@
+"""
+Tests for the Socket.IO helpers (core/socket_manager.py).
+
+Covers:
+- JWT extraction from the handshake (auth payload, Bearer header, access_token cookie)
+- EmitBatcher coalesces per (event, room) into `<EVENT>_BATCH`; a full batch flushes right away
+- emit_to_tenant targets the tenant room and drops events without a tenant
+"""
+
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from core.socket_manager import (
+    EmitBatcher,
+    _token_from_handshake,
+    emit_to_tenant,
+    supervisors_room,
+    tenant_room,
+)
+
+
+class _Server:
+    def __init__(self):
+        self.emits = []
+
+    async def emit(self, event, data, room=None):
+        self.emits.append((event, data, room))
+
+
+def test_token_from_handshake_sources():
+    assert _token_from_handshake({}, {"token": "a.b.c"}) == "a.b.c"
+    assert _token_from_handshake({"HTTP_AUTHORIZATION": "Bearer x.y.z"}, None) == "x.y.z"
+    assert _token_from_handshake({"HTTP_COOKIE": "theme=dark; access_token=c.o.k"}, {}) == "c.o.k"
+    assert _token_from_handshake({"HTTP_COOKIE": "theme=dark"}, None) is None
+    assert tenant_room("7") == "tenant:7"
+    assert supervisors_room(7) == "supervisors:7"
+
+
+@pytest.mark.asyncio
+async def test_batcher_coalesces_per_event_and_room():
+    server = _Server()
+    batcher = EmitBatcher(server, window_ms=20, max_events=100)
+
+    for i in range(3):
+        batcher.add("SUPERVISOR_CHAT_EVENT", {"i": i}, "supervisors:1")
+    batcher.add("SUPERVISOR_CHAT_EVENT", {"i": 9}, "supervisors:2")
+    assert server.emits == []
+
+    await asyncio.sleep(0.06)
+
+    assert sorted(server.emits, key=lambda e: e[2]) == [
+        ("SUPERVISOR_CHAT_EVENT_BATCH", {"events": [{"i": 0}, {"i": 1}, {"i": 2}]}, "supervisors:1"),
+        ("SUPERVISOR_CHAT_EVENT_BATCH", {"events": [{"i": 9}]}, "supervisors:2"),
+    ]
+    assert batcher.get_stats()["queued"] == 4
+    assert batcher.get_stats()["emits"] == 2
+    assert batcher.get_stats()["pending"] == 0
+
+
+@pytest.mark.asyncio
+async def test_batcher_flushes_full_batch_and_on_stop():
+    server = _Server()
+    batcher = EmitBatcher(server, window_ms=10_000, max_events=2)
+
+    batcher.add("EV", 1, "r")
+    batcher.add("EV", 2, "r")
+    await asyncio.sleep(0)
+    assert server.emits == [("EV_BATCH", {"events": [1, 2]}, "r")]
+
+    batcher.add("EV", 3, "r")
+    await batcher.stop()
+    assert server.emits[-1] == ("EV_BATCH", {"events": [3]}, "r")
+
+
+@pytest.mark.asyncio
+async def test_emit_to_tenant_scopes_and_drops_without_tenant():
+    with patch("core.socket_manager.sio.emit", new_callable=AsyncMock) as emit:
+        await emit_to_tenant("NEW_LEAD", {"id": 1}, 5)
+        await emit_to_tenant("NEW_LEAD", {"id": 2}, None)
+
+    emit.assert_awaited_once_with("NEW_LEAD", {"id": 1}, room="tenant:5")
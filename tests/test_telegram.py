@@ -54,33 +54,33 @@ def telegram_service():
 
 @pytest.fixture
 def mock_httpx_success():
-    """Mock httpx.AsyncClient.post returning Telegram API success."""
+    """Mock the pooled Telegram client post() returning Telegram API success."""
     response = Response(
         status_code=200,
         json={"ok": True, "result": {"message_id": 42}},
     )
-    with patch("services.telegram_service.httpx.AsyncClient") as mock_client_cls:
+    with patch("services.telegram_service.http_clients.session") as mock_session:
         mock_client = AsyncMock()
         mock_client.post.return_value = response
         mock_client.__aenter__ = AsyncMock(return_value=mock_client)
         mock_client.__aexit__ = AsyncMock(return_value=False)
-        mock_client_cls.return_value = mock_client
+        mock_session.return_value = mock_client
         yield mock_client
 
 
 @pytest.fixture
 def mock_httpx_failure():
-    """Mock httpx.AsyncClient.post returning Telegram API error."""
+    """Mock the pooled Telegram client post() returning Telegram API error."""
     response = Response(
         status_code=400,
         json={"ok": False, "description": "Bad Request: chat not found"},
     )
-    with patch("services.telegram_service.httpx.AsyncClient") as mock_client_cls:
+    with patch("services.telegram_service.http_clients.session") as mock_session:
         mock_client = AsyncMock()
         mock_client.post.return_value = response
         mock_client.__aenter__ = AsyncMock(return_value=mock_client)
         mock_client.__aexit__ = AsyncMock(return_value=False)
-        mock_client_cls.return_value = mock_client
+        mock_session.return_value = mock_client
         yield mock_client
 
 
@@ -0,0 +1,99 @@
+"""
+Tests for the credential / tenant-resolution cache (core/tenant_cache.py).
+
+Covers:
+- Hits skip the loader; stats report hit rate per namespace
+- Misses (None) use the shorter negative TTL
+- invalidate_tenant drops owned entries (incl. webhook -> tenant) and cached misses
+- invalidate_bot_phones drops the old and new bot number of a tenant
+- LRU bound
+- Remote (pub/sub) invalidations apply unless they originate from this instance
+"""
+
+import json
+import pytest
+
+from core.tenant_cache import TenantCache, NS_CREDENTIAL, NS_WEBHOOK_TENANT
+
+
+class _Loader:
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+@pytest.mark.asyncio
+async def test_hit_skips_loader():
+    cache = TenantCache(max_entries=16, ttl_seconds=60, negative_ttl_seconds=60)
+    loader = _Loader("secret")
+    assert await cache.get_or_load(NS_CREDENTIAL, (1, "YCLOUD_API_KEY"), loader, tenant_id=1) == "secret"
+    assert await cache.get_or_load(NS_CREDENTIAL, (1, "YCLOUD_API_KEY"), loader, tenant_id=1) == "secret"
+
+    assert loader.calls == 1
+    stats = cache.get_stats()["namespaces"][NS_CREDENTIAL]
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["hit_rate"] == 0.5
+
+
+@pytest.mark.asyncio
+async def test_negative_results_use_negative_ttl():
+    cache = TenantCache(max_entries=16, ttl_seconds=60, negative_ttl_seconds=0)
+    loader = _Loader(None)
+    await cache.get_or_load(NS_WEBHOOK_TENANT, ("page", "123"), loader)
+    await cache.get_or_load(NS_WEBHOOK_TENANT, ("page", "123"), loader)
+
+    assert loader.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_invalidate_tenant_drops_owned_and_negative_entries():
+    cache = TenantCache(max_entries=16, ttl_seconds=60, negative_ttl_seconds=60)
+    await cache.get_or_load(NS_CREDENTIAL, (1, "A"), _Loader("a"), tenant_id=1)
+    await cache.get_or_load(NS_CREDENTIAL, (2, "A"), _Loader("b"), tenant_id=2)
+    await cache.get_or_load(NS_WEBHOOK_TENANT, ("page", "p1"), _Loader(1))
+    await cache.get_or_load(NS_WEBHOOK_TENANT, ("page", "unknown"), _Loader(None))
+
+    cache.invalidate_tenant(1)
+
+    keys = set(cache._entries)
+    assert keys == {(NS_CREDENTIAL, (2, "A"))}
+
+
+@pytest.mark.asyncio
+async def test_invalidate_bot_phones_drops_old_and_new_number():
+    cache = TenantCache(max_entries=16, ttl_seconds=60, negative_ttl_seconds=60)
+    await cache.get_or_load(NS_WEBHOOK_TENANT, ("bot_phone", "5491100"), _Loader(1))
+    await cache.get_or_load(NS_WEBHOOK_TENANT, ("bot_phone", "5491199"), _Loader(2))
+    await cache.get_or_load(NS_WEBHOOK_TENANT, ("bot_phone", "5491177"), _Loader(3))
+
+    cache.invalidate_bot_phones("5491100", "5491199", None)
+
+    assert set(cache._entries) == {(NS_WEBHOOK_TENANT, ("bot_phone", "5491177"))}
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction():
+    cache = TenantCache(max_entries=2, ttl_seconds=60, negative_ttl_seconds=60)
+    await cache.get_or_load(NS_CREDENTIAL, (1, "A"), _Loader("a"), tenant_id=1)
+    await cache.get_or_load(NS_CREDENTIAL, (1, "B"), _Loader("b"), tenant_id=1)
+    await cache.get_or_load(NS_CREDENTIAL, (1, "A"), _Loader("a"), tenant_id=1)
+    await cache.get_or_load(NS_CREDENTIAL, (1, "C"), _Loader("c"), tenant_id=1)
+
+    assert (NS_CREDENTIAL, (1, "B")) not in cache._entries
+    assert cache.get_stats()["namespaces"][NS_CREDENTIAL]["evictions"] == 1
+
+
+@pytest.mark.asyncio
+async def test_remote_invalidation_ignores_own_messages():
+    cache = TenantCache(max_entries=16, ttl_seconds=60, negative_ttl_seconds=60)
+    await cache.get_or_load(NS_CREDENTIAL, (1, "A"), _Loader("a"), tenant_id=1)
+
+    cache._apply_remote(json.dumps({"op": "tenant", "tenant_id": 1, "origin": cache._instance_id}))
+    assert cache.get_stats()["size"] == 1
+
+    cache._apply_remote(json.dumps({"op": "key", "namespace": NS_CREDENTIAL, "key": [1, "A"], "origin": "other"}))
+    assert cache.get_stats()["size"] == 0
+    assert cache.get_stats()["remote_invalidations"] == 1
@@ -0,0 +1,283 @@
+"""
+Tests for the two-tier metrics cache (core/two_tier_cache.py).
+
+Covers:
+- Concurrent misses for one key run the loader once; other keys are not blocked
+- Stale entries are served while a single background refresh runs
+- Tag invalidation marks entries stale, including values loaded during the invalidation
+- Redis failures open the breaker (no reconnect per call) and a half-open probe closes it
+- L2 values written before a tag invalidation are only served stale (and refreshed)
+- A failed tag flush keeps the tags pending until Redis takes the delete
+"""
+
+import asyncio
+import json
+import pytest
+
+from core.two_tier_cache import RedisCircuitBreaker, TwoTierCache
+
+
+class _Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class _Loader:
+    def __init__(self, value, delay=0.0):
+        self.value = value
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self.value
+
+
+class _FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    def set(self, key, value, ex=None):
+        self.ops.append(("set", key, value))
+
+    def sadd(self, key, member):
+        self.ops.append(("sadd", key, member))
+
+    def expire(self, key, seconds):
+        pass
+
+    async def execute(self):
+        for op, key, value in self.ops:
+            if op == "set":
+                self.redis.data[key] = value
+            else:
+                self.redis.sets.setdefault(key, set()).add(value)
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.sets = {}
+        self.fail = False
+        self.pings = 0
+
+    async def ping(self):
+        self.pings += 1
+        if self.fail:
+            raise ConnectionError("down")
+
+    async def get(self, key):
+        if self.fail:
+            raise ConnectionError("down")
+        return self.data.get(key)
+
+    def pipeline(self, transaction=False):
+        return _FakePipeline(self)
+
+    async def smembers(self, key):
+        return set(self.sets.get(key, set()))
+
+    async def delete(self, *keys):
+        if self.fail:
+            raise ConnectionError("down")
+        for key in keys:
+            self.data.pop(key, None)
+            self.sets.pop(key, None)
+
+
+def _cache(clock=None, redis=None, breaker=None, **kwargs):
+    kwargs.setdefault("jitter", 0)
+    return TwoTierCache(
+        prefix="metrics",
+        redis_factory=(lambda: redis) if redis is not None else None,
+        clock=clock or _Clock(),
+        breaker=breaker,
+        **kwargs,
+    )
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_load_per_key():
+    cache = _cache()
+    slow, fast = _Loader("slow", delay=0.05), _Loader("fast")
+
+    results = await asyncio.gather(
+        *[cache.get_or_load("a", slow, ttl_seconds=60) for _ in range(5)],
+        cache.get_or_load("b", fast, ttl_seconds=60),
+    )
+
+    assert results == ["slow"] * 5 + ["fast"]
+    assert slow.calls == 1 and fast.calls == 1
+    assert cache.get_stats()["coalesced"] == 4
+
+
+@pytest.mark.asyncio
+async def test_stale_value_served_while_refreshing():
+    clock = _Clock()
+    cache = _cache(clock=clock, stale_seconds=60)
+    loader = _Loader("v1")
+    await cache.get_or_load("k", loader, ttl_seconds=10)
+
+    clock.now += 20
+    loader.value = "v2"
+    assert await cache.get_or_load("k", loader, ttl_seconds=10) == "v1"
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+    assert loader.calls == 2
+    assert await cache.get_or_load("k", loader, ttl_seconds=10) == "v2"
+    assert cache.get_stats()["stale_served"] == 1
+
+
+@pytest.mark.asyncio
+async def test_expired_past_stale_window_loads_synchronously():
+    clock = _Clock()
+    cache = _cache(clock=clock, stale_seconds=5)
+    loader = _Loader("v1")
+    await cache.get_or_load("k", loader, ttl_seconds=10)
+
+    clock.now += 100
+    loader.value = "v2"
+    assert await cache.get_or_load("k", loader, ttl_seconds=10) == "v2"
+
+
+@pytest.mark.asyncio
+async def test_tag_invalidation_marks_only_tagged_entries_stale():
+    cache = _cache(stale_seconds=60)
+    a, b = _Loader("a1"), _Loader("b1")
+    await cache.get_or_load("a", a, ttl_seconds=60, tags=["tenant:1", "seller:1:x"])
+    await cache.get_or_load("b", b, ttl_seconds=60, tags=["tenant:2"])
+
+    cache.invalidate_tags(["tenant:1"])
+    a.value = "a2"
+    # Stale-while-revalidate: the old value once, then the refreshed one
+    assert await cache.get_or_load("a", a, ttl_seconds=60, tags=["tenant:1"]) == "a1"
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert await cache.get_or_load("a", a, ttl_seconds=60, tags=["tenant:1"]) == "a2"
+    assert await cache.get_or_load("b", b, ttl_seconds=60, tags=["tenant:2"]) == "b1"
+    assert b.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidation_during_load_keeps_result_stale():
+    cache = _cache(stale_seconds=60)
+
+    async def _load():
+        cache.invalidate_tags(["tenant:1"])
+        return "raced"
+
+    assert await cache.get_or_load("k", _load, ttl_seconds=60, tags=["tenant:1"]) == "raced"
+    loader = _Loader("fresh")
+    await cache.get_or_load("k", loader, ttl_seconds=60, tags=["tenant:1"])
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert loader.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_lru_bound():
+    cache = _cache(max_entries=2)
+    for key in ("a", "b", "c"):
+        await cache.get_or_load(key, _Loader(key), ttl_seconds=60, tags=["tenant:1"])
+
+    stats = cache.get_stats()
+    assert stats["size"] == 2 and stats["evictions"] == 1
+
+
+@pytest.mark.asyncio
+async def test_redis_failures_open_breaker_and_probe_closes_it():
+    clock = _Clock()
+    redis = _FakeRedis()
+    breaker = RedisCircuitBreaker(failure_threshold=2, cooldown_seconds=30, clock=clock)
+    cache = _cache(clock=clock, redis=redis, breaker=breaker, l1_ttl_seconds=0.001)
+
+    await cache.get_or_load("k", _Loader("v"), ttl_seconds=60)
+    redis.fail = True
+    for i in range(5):
+        await cache.get_or_load(f"miss{i}", _Loader(i), ttl_seconds=60)
+
+    assert breaker.state == RedisCircuitBreaker.OPEN
+    pings_while_open = redis.pings
+    await cache.get_or_load("other", _Loader("x"), ttl_seconds=60)
+    assert redis.pings == pings_while_open
+
+    redis.fail = False
+    clock.now += 31
+    await cache.get_or_load("after", _Loader("y"), ttl_seconds=60)
+    assert breaker.state == RedisCircuitBreaker.CLOSED
+    assert cache.get_stats()["redis_breaker"]["trips"] == 1
+
+
+@pytest.mark.asyncio
+async def test_l2_shared_value_and_tag_flush():
+    clock = _Clock()
+    redis = _FakeRedis()
+    writer = _cache(clock=clock, redis=redis)
+    reader = _cache(clock=clock, redis=redis)
+
+    await writer.get_or_load("k", _Loader("shared"), ttl_seconds=60, tags=["tenant:1"])
+    loader = _Loader("recomputed")
+    assert await reader.get_or_load("k", loader, ttl_seconds=60, tags=["tenant:1"]) == "shared"
+    assert loader.calls == 0
+
+    writer.invalidate_tags(["tenant:1"])
+    await writer.flush_invalidations()
+    assert "metrics:k" not in redis.data
+    assert "metrics:tag:tenant:1" not in redis.sets
+
+
+@pytest.mark.asyncio
+async def test_failed_tag_flush_keeps_tags_pending():
+    clock = _Clock()
+    redis = _FakeRedis()
+    cache = _cache(clock=clock, redis=redis)
+    await cache.get_or_load("k", _Loader("v"), ttl_seconds=60, tags=["tenant:1"])
+
+    cache.invalidate_tags(["tenant:1"])
+    redis.fail = True
+    assert await cache.flush_invalidations() is False
+    assert "metrics:k" in redis.data
+
+    redis.fail = False
+    assert await cache.flush_invalidations() is True
+    assert "metrics:k" not in redis.data
+    assert await cache.flush_invalidations() is True
+
+
+@pytest.mark.asyncio
+async def test_l2_entry_older_than_tag_invalidation_is_not_fresh():
+    clock = _Clock()
+    redis = _FakeRedis()
+    cache = _cache(clock=clock, redis=redis)
+    redis.data["metrics:k"] = json.dumps({
+        "value": "old", "fresh_until": clock.now + 60, "stale_until": clock.now + 120,
+        "stored_at": clock.now - 1, "tags": ["tenant:1"],
+    })
+
+    cache.invalidate_tags(["tenant:1"])
+    loader = _Loader("new")
+    assert await cache.get_or_load("k", loader, ttl_seconds=60, tags=["tenant:1"]) == "old"
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert loader.calls == 1
+    assert await cache.get_or_load("k", loader, ttl_seconds=60, tags=["tenant:1"]) == "new"
+
+
+def test_breaker_half_open_allows_single_probe():
+    clock = _Clock()
+    breaker = RedisCircuitBreaker(failure_threshold=1, cooldown_seconds=10, clock=clock)
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    clock.now += 11
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == RedisCircuitBreaker.OPEN
@@ -0,0 +1,125 @@
+"""
+Tests for the async debounce buffer (whatsapp_service/debounce_buffer.py).
+
+Redis scripts are replaced with AsyncMocks; these tests cover the Python side:
+- Keys and scheduler members are scoped per tenant
+- append() passes the right keys/args to the append script
+- process() hands the fetched batch to the handler, acks (ends the lease) and releases the owner lock
+- A failing handler keeps the inflight batch and reschedules until max_attempts
+"""
+
+import json
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from whatsapp_service.debounce_buffer import DebounceBuffer
+
+
+def _buffer(**kwargs):
+    redis = MagicMock()
+    scripts = {}
+
+    def _register(source):
+        script = AsyncMock()
+        scripts[len(scripts)] = script
+        return script
+
+    redis.register_script.side_effect = _register
+    redis.hgetall = AsyncMock(return_value={"business_number": "5491111111111", "customer_name": "Ana"})
+    redis.hincrby = AsyncMock(return_value=1)
+    redis.zadd = AsyncMock()
+    redis.zrem = AsyncMock()
+    redis.delete = AsyncMock()
+    redis.hdel = AsyncMock()
+    redis.llen = AsyncMock(return_value=0)
+    buf = DebounceBuffer(redis, debounce_seconds=11, **kwargs)
+    return buf, redis
+
+
+def test_keys_are_scoped_per_tenant():
+    a = DebounceBuffer.member(1, "+5491100000000")
+    b = DebounceBuffer.member(2, "+5491100000000")
+    assert a != b
+    assert DebounceBuffer.parse_member(a) == (1, "+5491100000000")
+    assert DebounceBuffer.parse_member(DebounceBuffer.member(None, "123")) == (None, "123")
+
+
+@pytest.mark.asyncio
+async def test_append_uses_tenant_scoped_keys():
+    buf, _ = _buffer()
+    buf._append.return_value = 1
+
+    length = await buf.append(7, "+5491100000000", {"text": "hola"}, business_number="549", customer_name="Ana")
+
+    assert length == 1
+    kwargs = buf._append.call_args.kwargs
+    assert kwargs["keys"] == [
+        "wa:7:+5491100000000:buffer", "wa:7:+5491100000000:meta", "wa:debounce:due",
+    ]
+    assert json.loads(kwargs["args"][0]) == {"text": "hola"}
+    assert kwargs["args"][-1] == "7:+5491100000000"
+
+
+@pytest.mark.asyncio
+async def test_process_hands_batch_to_handler_and_acks():
+    buf, redis = _buffer()
+    buf._fetch.return_value = [json.dumps({"text": "hola"}), json.dumps({"text": "precio?"})]
+    handler = AsyncMock()
+    buf._handler = handler
+
+    await buf.process("7:+5491100000000")
+
+    tenant_id, from_number, items, meta = handler.call_args.args
+    assert (tenant_id, from_number) == (7, "+5491100000000")
+    assert [i["text"] for i in items] == ["hola", "precio?"]
+    assert meta["business_number"] == "5491111111111"
+    redis.delete.assert_awaited_once_with("wa:7:+5491100000000:inflight")
+    # The stored reply and its progress belong to the batch and go with the ack
+    redis.hdel.assert_awaited_once_with("wa:7:+5491100000000:meta", "attempts", "reply", "reply_sent")
+    redis.zrem.assert_awaited_once_with("wa:debounce:due", "7:+5491100000000")
+    assert buf._release.call_args.kwargs["keys"] == ["wa:7:+5491100000000:owner"]
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_rescheduled_then_dropped():
+    buf, redis = _buffer(max_attempts=2)
+    buf._fetch.return_value = [json.dumps({"text": "hola"})]
+    buf._handler = AsyncMock(side_effect=RuntimeError("orchestrator down"))
+
+    redis.hincrby.return_value = 1
+    await buf.process("7:+5491100000000")
+    redis.zadd.assert_awaited_once()
+    redis.delete.assert_not_awaited()
+    redis.zrem.assert_not_awaited()
+
+    redis.hincrby.return_value = 2
+    await buf.process("7:+5491100000000")
+    redis.delete.assert_awaited_once_with("wa:7:+5491100000000:inflight")
+    assert buf._release.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_empty_fetch_ends_lease_and_releases_lock():
+    buf, redis = _buffer()
+    buf._fetch.return_value = []
+    buf._handler = AsyncMock()
+
+    await buf.process("7:+5491100000000")
+
+    buf._handler.assert_not_awaited()
+    redis.zrem.assert_awaited_once_with("wa:debounce:due", "7:+5491100000000")
+    buf._release.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_ack_reschedules_messages_buffered_during_the_batch():
+    buf, redis = _buffer()
+    buf._fetch.return_value = [json.dumps({"text": "hola"})]
+    buf._handler = AsyncMock()
+    redis.llen.return_value = 1
+
+    await buf.process("7:+5491100000000")
+
+    redis.zrem.assert_awaited_once()
+    (mapping,), kwargs = redis.zadd.call_args.args[1:], redis.zadd.call_args.kwargs
+    assert list(mapping) == ["7:+5491100000000"] and kwargs == {"nx": True}
@@ -0,0 +1,146 @@
+"""
+Tests for the outbound bubble sequencer (whatsapp_service/outbound_sequencer.py).
+
+Covers:
+- Long texts are split into ordered bubbles (image first)
+- Receipts fire once per sequence; bubbles to one recipient keep their order across sequences
+- Different recipients are served concurrently; the pauses between bubbles hold no slot
+- deliver() waits for the sequence, resumes from `start` and reports progress
+- The per-tenant token bucket throttles sends
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from whatsapp_service.outbound_sequencer import (
+    OutboundSequencer,
+    TenantRateLimiter,
+    plan_bubbles,
+    split_text,
+)
+
+
+class _Client:
+    def __init__(self, log, send_latency=0.0):
+        self.log = log
+        self.send_latency = send_latency
+
+    async def mark_as_read(self, inbound_id, correlation_id):
+        self.log.append(("read", inbound_id))
+
+    async def typing_indicator(self, inbound_id, correlation_id):
+        self.log.append(("typing", inbound_id))
+
+    async def send_text(self, to, text, correlation_id):
+        await asyncio.sleep(self.send_latency)
+        self.log.append(("text", to, text))
+
+    async def send_image(self, to, url, correlation_id):
+        await asyncio.sleep(self.send_latency)
+        self.log.append(("image", to, url))
+
+
+def _sequencer(log, delay=0.0, rate=1000.0, burst=1000, send_latency=0.0, max_concurrency=10):
+    async def factory(tenant_id, business_number):
+        return _Client(log, send_latency)
+
+    return OutboundSequencer(factory, delay, TenantRateLimiter(rate, burst), max_concurrency=max_concurrency)
+
+
+def _msg(text=None, image=None):
+    return SimpleNamespace(text=text, imageUrl=image)
+
+
+def test_plan_bubbles_splits_long_text_after_image():
+    long_text = " ".join(["Frase número %d del mensaje." % i for i in range(40)])
+    bubbles = plan_bubbles([_msg(text=long_text, image="https://img/1.png"), _msg(text="chau")])
+
+    assert bubbles[0] == ("image", "https://img/1.png")
+    assert bubbles[-1] == ("text", "chau")
+    assert all(len(body) < 400 for kind, body in bubbles if kind == "text")
+    assert " ".join(body for kind, body in bubbles[1:-1]) == long_text
+    assert split_text("hola") == ["hola"]
+
+
+@pytest.mark.asyncio
+async def test_receipts_once_and_order_kept_per_recipient():
+    log = []
+    seq = _sequencer(log)
+
+    assert seq.enqueue([_msg("uno"), _msg("dos")], "+549111", "549", "wamid.1", "c1", tenant_id=1) == 2
+    seq.enqueue([_msg("tres")], "+549111", "549", "wamid.2", "c2", tenant_id=1)
+    await seq.stop(timeout=5)
+
+    texts = [entry[2] for entry in log if entry[0] == "text"]
+    assert texts == ["uno", "dos", "tres"]
+    assert sorted(e for e in log if e[0] in ("read", "typing")) == [
+        ("read", "wamid.1"), ("read", "wamid.2"), ("typing", "wamid.1"), ("typing", "wamid.2"),
+    ]
+    stats = seq.get_stats()
+    assert stats["sequences_sent"] == 2
+    assert stats["bubbles_sent"] == 3
+    assert stats["active_recipients"] == 0
+
+
+@pytest.mark.asyncio
+async def test_recipients_run_concurrently_and_delay_overlaps_send():
+    log = []
+    seq = _sequencer(log, delay=0.1, send_latency=0.05)
+
+    started = time.monotonic()
+    for i in range(5):
+        seq.enqueue([_msg("a"), _msg("b")], f"+54911{i}", "549", None, f"c{i}", tenant_id=1)
+    await seq.stop(timeout=5)
+    elapsed = time.monotonic() - started
+
+    assert len([e for e in log if e[0] == "text"]) == 10
+    # Serial would be 5 recipients * (2 delays + 2 sends) = 1.5s; overlapped and concurrent is ~0.25s
+    assert elapsed < 0.6
+
+
+@pytest.mark.asyncio
+async def test_pauses_between_bubbles_do_not_hold_a_slot():
+    log = []
+    seq = _sequencer(log, delay=0.1, max_concurrency=1)
+
+    started = time.monotonic()
+    for i in range(4):
+        seq.enqueue([_msg("a"), _msg("b")], f"+54911{i}", "549", None, f"c{i}", tenant_id=1)
+    await seq.stop(timeout=5)
+
+    assert len([e for e in log if e[0] == "text"]) == 8
+    # Holding the slot across pauses would serialize 4 recipients * 2 delays = 0.8s
+    assert time.monotonic() - started < 0.5
+
+
+@pytest.mark.asyncio
+async def test_deliver_waits_resumes_and_reports_progress():
+    log, progress = [], []
+    seq = _sequencer(log)
+
+    async def on_sent(index):
+        progress.append(index)
+
+    bubbles = [["text", "uno"], ["text", "dos"], ["text", "tres"]]
+    result = await seq.deliver(bubbles, "+549111", "549", "wamid.1", "c1", tenant_id=1, start=1, on_sent=on_sent)
+
+    assert result == {"sent": 2, "failed": 0}
+    assert [e[2] for e in log if e[0] == "text"] == ["dos", "tres"]
+    assert progress == [1, 2]
+    # A resumed reply does not repeat the receipts
+    assert not [e for e in log if e[0] in ("read", "typing")]
+    assert await seq.deliver(bubbles, "+549111", "549", None, "c2", start=3) == {"sent": 0, "failed": 0}
+
+
+@pytest.mark.asyncio
+async def test_tenant_rate_limiter_throttles():
+    limiter = TenantRateLimiter(rate_per_second=20, burst=2)
+
+    waits = [await limiter.acquire(7) for _ in range(4)]
+
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2] > 0 and waits[3] > 0
+    assert await limiter.acquire(8) == 0.0
@@ -0,0 +1,253 @@
+"""
+Event-driven debounce buffer on redis.asyncio.
+
+Keys (scoped per tenant, so the same customer number on two tenants never shares a buffer):
+  {prefix}:{tenant}:{from}:buffer    LIST  pending messages (JSON)
+  {prefix}:{tenant}:{from}:inflight  LIST  batch being processed (kept until ack, re-delivered after a crash)
+  {prefix}:{tenant}:{from}:meta      HASH  business_number, customer_name, attempts, plus the
+                                     handler's per-batch state (reply, reply_sent) dropped on ack
+  {prefix}:{tenant}:{from}:owner     STR   processing lock (token, PX)
+  {prefix}:debounce:due              ZSET  member "{tenant}:{from}" scored by flush time (ms)
+
+Every append pushes the conversation's flush time DEBOUNCE_SECONDS into the future.
+One scheduler loop per process claims due conversations with a Lua script (SET NX
+owner + lease, atomically) and sleeps until the next due score instead of polling
+TTLs per conversation. Claiming does not drop the member: its score moves to the
+end of the lease (lock_seconds), and only the ack removes it, so a batch whose
+worker died is claimed again once the lease and the owner lock expire. Fetching a batch moves the buffer into the inflight list in
+one script; messages that arrive meanwhile start a new window. The batch is acked
+(inflight deleted) only after the handler returns, so the handler must finish its
+side effects (sending the reply) before returning.
+"""
+import asyncio
+import json
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import structlog
+
+logger = structlog.get_logger()
+
+BatchHandler = Callable[[Optional[int], str, List[dict], Dict[str, str]], Awaitable[None]]
+
+# Meta fields that belong to the inflight batch, not to the conversation
+BATCH_META_FIELDS = ("attempts", "reply", "reply_sent")
+
+_APPEND = """
+redis.call('RPUSH', KEYS[1], ARGV[1])
+redis.call('PEXPIRE', KEYS[1], ARGV[5])
+if ARGV[3] ~= '' then redis.call('HSET', KEYS[2], 'business_number', ARGV[3]) end
+if ARGV[4] ~= '' then redis.call('HSET', KEYS[2], 'customer_name', ARGV[4]) end
+redis.call('PEXPIRE', KEYS[2], ARGV[5])
+redis.call('ZADD', KEYS[3], ARGV[2], ARGV[6])
+return redis.call('LLEN', KEYS[1])
+"""
+
+# Claims due conversations whose owner lock is free and leases them (score = now + lock);
+# busy ones are retried a bit later. Owner keys are derived from the member, so this
+# targets a single (non-cluster) Redis.
+_CLAIM = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+local claimed = {}
+for _, member in ipairs(due) do
+    if redis.call('SET', ARGV[6] .. ':' .. member .. ':owner', ARGV[5], 'NX', 'PX', ARGV[3]) then
+        redis.call('ZADD', KEYS[1], tonumber(ARGV[1]) + tonumber(ARGV[3]), member)
+        table.insert(claimed, member)
+    else
+        redis.call('ZADD', KEYS[1], tonumber(ARGV[1]) + tonumber(ARGV[4]), member)
+    end
+end
+return claimed
+"""
+
+# Atomic fetch-and-trim: a leftover inflight batch (crashed worker) is re-delivered first
+_FETCH = """
+local pending = redis.call('LRANGE', KEYS[2], 0, -1)
+if #pending > 0 then return pending end
+local items = redis.call('LRANGE', KEYS[1], 0, -1)
+if #items > 0 then
+    redis.call('RPUSH', KEYS[2], unpack(items))
+    redis.call('DEL', KEYS[1])
+    redis.call('PEXPIRE', KEYS[2], ARGV[1])
+end
+return items
+"""
+
+_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+return 0
+"""
+
+
+class DebounceBuffer:
+    def __init__(
+        self,
+        redis,
+        debounce_seconds: float,
+        lock_seconds: float = 300,
+        max_sleep_seconds: float = 1.0,
+        busy_retry_seconds: float = 1.0,
+        max_attempts: int = 3,
+        claim_batch: int = 50,
+        key_ttl_seconds: float = 86400,
+        prefix: str = "wa",
+    ):
+        self.redis = redis
+        self.debounce_ms = int(debounce_seconds * 1000)
+        self.lock_ms = int(lock_seconds * 1000)
+        self.max_sleep_seconds = max_sleep_seconds
+        self.busy_retry_ms = int(busy_retry_seconds * 1000)
+        self.max_attempts = max_attempts
+        self.claim_batch = claim_batch
+        self.key_ttl_ms = int(key_ttl_seconds * 1000)
+        self.prefix = prefix
+        self.due_key = f"{prefix}:debounce:due"
+        self._token = uuid.uuid4().hex
+        self._append = redis.register_script(_APPEND)
+        self._claim = redis.register_script(_CLAIM)
+        self._fetch = redis.register_script(_FETCH)
+        self._release = redis.register_script(_RELEASE)
+        self._wakeup = asyncio.Event()
+        self._loop_task: Optional[asyncio.Task] = None
+        self._tasks: set = set()
+        self._handler: Optional[BatchHandler] = None
+
+    # ------------------------------------------------------------------
+    # Keys
+    # ------------------------------------------------------------------
+    @staticmethod
+    def member(tenant_id: Optional[int], from_number: str) -> str:
+        return f"{tenant_id or 0}:{from_number}"
+
+    @staticmethod
+    def parse_member(member: str):
+        tenant, from_number = member.split(":", 1)
+        return (int(tenant) or None), from_number
+
+    def key(self, member: str, kind: str) -> str:
+        return f"{self.prefix}:{member}:{kind}"
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+    async def append(
+        self,
+        tenant_id: Optional[int],
+        from_number: str,
+        item: dict,
+        business_number: Optional[str] = None,
+        customer_name: Optional[str] = None,
+    ) -> int:
+        """Buffers one message and (re)arms the conversation's debounce window. Returns the buffer length."""
+        member = self.member(tenant_id, from_number)
+        due_at = int(time.time() * 1000) + self.debounce_ms
+        length = await self._append(
+            keys=[self.key(member, "buffer"), self.key(member, "meta"), self.due_key],
+            args=[json.dumps(item), due_at, business_number or "", customer_name or "", self.key_ttl_ms, member],
+        )
+        self._wakeup.set()
+        return int(length)
+
+    async def set_batch_meta(self, tenant_id: Optional[int], from_number: str, fields: Dict[str, str]):
+        """Stores per-batch handler state in the meta hash; it survives a crash and is dropped on ack."""
+        await self.redis.hset(self.key(self.member(tenant_id, from_number), "meta"), mapping=fields)
+
+    # ------------------------------------------------------------------
+    # Consumer side
+    # ------------------------------------------------------------------
+    def start(self, handler: BatchHandler):
+        if self._loop_task:
+            return
+        self._handler = handler
+        self._loop_task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0):
+        if self._loop_task:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=timeout)
+
+    async def claim_due(self, now_ms: Optional[int] = None) -> List[str]:
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        claimed = await self._claim(
+            keys=[self.due_key],
+            args=[now_ms, self.claim_batch, self.lock_ms, self.busy_retry_ms, self._token, self.prefix],
+        )
+        return list(claimed or [])
+
+    async def _next_sleep(self) -> float:
+        head = await self.redis.zrange(self.due_key, 0, 0, withscores=True)
+        if not head:
+            return self.max_sleep_seconds
+        wait = (head[0][1] - time.time() * 1000) / 1000
+        return min(max(wait, 0.0), self.max_sleep_seconds)
+
+    async def _run(self):
+        while True:
+            try:
+                self._wakeup.clear()
+                claimed = await self.claim_due()
+                for member in claimed:
+                    task = asyncio.create_task(self.process(member))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                if len(claimed) >= self.claim_batch:
+                    continue
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=await self._next_sleep())
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("debounce_scheduler_error", error=str(e))
+                await asyncio.sleep(self.max_sleep_seconds)
+
+    async def _ack(self, member: str, buffer_key: str):
+        """Ends the lease; messages buffered meanwhile get their flush back (append re-arms after this)."""
+        await self.redis.zrem(self.due_key, member)
+        if await self.redis.llen(buffer_key):
+            await self.redis.zadd(self.due_key, {member: int(time.time() * 1000) + self.debounce_ms}, nx=True)
+
+    async def process(self, member: str):
+        """Runs the handler for one claimed conversation; the owner lock must already be held."""
+        tenant_id, from_number = self.parse_member(member)
+        buffer_key, inflight_key = self.key(member, "buffer"), self.key(member, "inflight")
+        meta_key, owner_key = self.key(member, "meta"), self.key(member, "owner")
+        try:
+            raw_items = await self._fetch(keys=[buffer_key, inflight_key], args=[self.key_ttl_ms])
+            if not raw_items:
+                await self._ack(member, buffer_key)
+                return
+            items = []
+            for raw in raw_items:
+                try:
+                    items.append(json.loads(raw))
+                except (TypeError, ValueError):
+                    items.append({"text": raw})
+            meta = await self.redis.hgetall(meta_key) or {}
+            try:
+                await self._handler(tenant_id, from_number, items, meta)
+            except Exception as e:
+                attempts = await self.redis.hincrby(meta_key, "attempts", 1)
+                if attempts < self.max_attempts:
+                    logger.warning("debounce_batch_retry", error=str(e), attempts=attempts, tenant_id=tenant_id)
+                    await self.redis.zadd(self.due_key, {member: int(time.time() * 1000) + self.debounce_ms})
+                    return
+                logger.error("debounce_batch_dropped", error=str(e), count=len(items), tenant_id=tenant_id)
+            await self.redis.delete(inflight_key)
+            await self.redis.hdel(meta_key, *BATCH_META_FIELDS)
+            await self._ack(member, buffer_key)
+        except Exception as e:
+            logger.error("debounce_process_error", error=str(e), tenant_id=tenant_id)
+        finally:
+            try:
+                await self._release(keys=[owner_key], args=[self._token])
+            except Exception:
+                pass
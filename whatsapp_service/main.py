@@ -3,8 +3,7 @@ import hmac
 import hashlib
 import time
 import uuid
-import asyncio
-import redis
+import redis.asyncio as aioredis
 import httpx
 import structlog
 import json
@@ -17,6 +16,9 @@ from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_excep
 from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
 
 from ycloud_client import YCloudClient
+from debounce_buffer import DebounceBuffer
+from http_clients import http_clients
+from outbound_sequencer import OutboundSequencer, TenantRateLimiter, plan_bubbles
 
 # Initialize config
 load_dotenv()
@@ -35,7 +37,7 @@ async def get_config(name: str, default: str = None, tenant_id: Optional[int] =
         try:
             # Ensure tenant_id is treated as integer for the query
             url = f"{ORCHESTRATOR_URL}/admin/core/internal/credentials/{name}?tenant_id={int(tenant_id)}"
-            async with httpx.AsyncClient() as client:
+            async with http_clients.session() as client:
                 resp = await client.get(
                     url,
                     headers={"X-Internal-Token": INTERNAL_API_TOKEN},
@@ -70,6 +72,11 @@ ORCHESTRATOR_URL = os.getenv("ORCHESTRATOR_SERVICE_URL", "http://orchestrator_se
 # Buffer y respuestas (Redis + ventana de acumulación)
 DEBOUNCE_SECONDS = int(os.getenv("WHATSAPP_DEBOUNCE_SECONDS", "11"))  # Ventana sin mensajes nuevos antes de procesar
 BUBBLE_DELAY_SECONDS = float(os.getenv("WHATSAPP_BUBBLE_DELAY_SECONDS", "4"))  # Delay entre cada burbuja de respuesta
+BUFFER_LOCK_SECONDS = int(os.getenv("WHATSAPP_BUFFER_LOCK_SECONDS", "300"))  # Lock por conversación mientras se responde
+BUFFER_SCHEDULER_MAX_SLEEP_SECONDS = float(os.getenv("WHATSAPP_BUFFER_SCHEDULER_MAX_SLEEP_SECONDS", "1"))  # Máx. espera del scheduler (multi-réplica)
+TENANT_SENDS_PER_SECOND = float(os.getenv("WHATSAPP_TENANT_SENDS_PER_SECOND", "5"))  # Burbujas/seg sostenidas por tenant
+TENANT_SEND_BURST = int(os.getenv("WHATSAPP_TENANT_SEND_BURST", "10"))  # Ráfaga máxima por tenant
+SEQUENCER_MAX_CONCURRENCY = int(os.getenv("WHATSAPP_SEQUENCER_MAX_CONCURRENCY", "50"))  # Destinatarios atendidos en paralelo
 
 # Initialize structlog
 structlog.configure(
@@ -81,8 +88,14 @@ structlog.configure(
 )
 logger = structlog.get_logger()
 
-# Initialize Redis
-redis_client = redis.from_url(REDIS_URL, decode_responses=True)
+# Initialize Redis (async: never block the event loop inside handlers)
+redis_client = aioredis.from_url(REDIS_URL, decode_responses=True)
+debounce_buffer = DebounceBuffer(
+    redis_client,
+    DEBOUNCE_SECONDS,
+    lock_seconds=BUFFER_LOCK_SECONDS,
+    max_sleep_seconds=BUFFER_SCHEDULER_MAX_SLEEP_SECONDS,
+)
 
 # --- Models ---
 class OrchestratorMessage(BaseModel):
@@ -162,7 +175,7 @@ async def verify_signature(request: Request, tenant_id: Optional[int] = None):
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10),
        retry=retry_if_exception_type(httpx.HTTPError))
 async def forward_to_orchestrator(payload: dict, headers: dict):
-    async with httpx.AsyncClient(timeout=httpx.Timeout(120.0, connect=5.0)) as client:
+    async with http_clients.session(timeout=httpx.Timeout(120.0, connect=5.0)) as client:
         response = await client.post(f"{ORCHESTRATOR_URL}/chat", json=payload, headers=headers)
         response.raise_for_status()
         return response.json()
@@ -176,7 +189,7 @@ async def transcribe_audio(audio_url: str, correlation_id: str, tenant_id: Optio
 
     
     try:
-        async with httpx.AsyncClient(timeout=httpx.Timeout(60.0)) as client:
+        async with http_clients.session(timeout=httpx.Timeout(60.0)) as client:
             # 1. Download audio
             audio_res = await client.get(audio_url)
             audio_res.raise_for_status()
@@ -199,157 +212,146 @@ async def transcribe_audio(audio_url: str, correlation_id: str, tenant_id: Optio
         logger.error("transcription_failed", error=str(e), correlation_id=correlation_id)
         return None
 
-async def send_sequence(messages: List[OrchestratorMessage], user_number: str, business_number: str, inbound_id: str, correlation_id: str, tenant_id: Optional[int] = None):
+async def _ycloud_client_for(tenant_id: Optional[int], business_number: str) -> YCloudClient:
     v_ycloud = await get_config("YCLOUD_API_KEY", YCLOUD_API_KEY, tenant_id=tenant_id)
-    client = YCloudClient(v_ycloud, business_number)
-    
-    try: 
-        await client.mark_as_read(inbound_id, correlation_id)
-        await client.typing_indicator(inbound_id, correlation_id)
-    except: pass
+    return YCloudClient(v_ycloud, business_number)
 
-    for msg in messages:
-        try:
-            # 1. Image Bubble
-            if msg.imageUrl:
-                try: await client.typing_indicator(inbound_id, correlation_id)
-                except: pass
-                await asyncio.sleep(BUBBLE_DELAY_SECONDS)
-                await client.send_image(user_number, msg.imageUrl, correlation_id)
-                try: await client.mark_as_read(inbound_id, correlation_id)
-                except: pass
-
-            # 2. Text Bubble(s) with Safety Splitter — varias burbujas con delay entre cada una
-            if msg.text:
-                import re
-                if len(msg.text) > 400:
-                    text_parts = re.split(r'(?<=[.!?]) +', msg.text)
-                    refined_parts = []
-                    current = ""
-                    for p in text_parts:
-                        if len(current) + len(p) < 400:
-                            current += (" " + p if current else p)
-                        else:
-                            if current: refined_parts.append(current)
-                            current = p
-                    if current: refined_parts.append(current)
-                else:
-                    refined_parts = [msg.text]
-
-                for part in refined_parts:
-                    try: await client.typing_indicator(inbound_id, correlation_id)
-                    except: pass
-                    await asyncio.sleep(BUBBLE_DELAY_SECONDS)
-                    await client.send_text(user_number, part, correlation_id)
-                    try: await client.mark_as_read(inbound_id, correlation_id)
-                    except: pass
-
-            # Delay entre cada mensaje/burbuja para evitar desorden
-            await asyncio.sleep(BUBBLE_DELAY_SECONDS)
 
-        except Exception as e:
-            logger.error("sequence_step_error", error=str(e), correlation_id=correlation_id, tenant_id=tenant_id)
+outbound_sequencer = OutboundSequencer(
+    _ycloud_client_for,
+    BUBBLE_DELAY_SECONDS,
+    TenantRateLimiter(TENANT_SENDS_PER_SECOND, TENANT_SEND_BURST),
+    max_concurrency=SEQUENCER_MAX_CONCURRENCY,
+)
+
+
+def send_sequence(messages: List[OrchestratorMessage], user_number: str, business_number: str, inbound_id: str, correlation_id: str, tenant_id: Optional[int] = None) -> int:
+    """Encola la respuesta en el sequencer (orden por destinatario) y vuelve sin esperar el envío de las burbujas."""
+    return outbound_sequencer.enqueue(messages, user_number, business_number, inbound_id, correlation_id, tenant_id=tenant_id)
+
+
+async def deliver_reply(reply: Dict[str, Any], user_number: str, tenant_id: Optional[int], start: int = 0) -> Dict[str, int]:
+    """
+    Envía la respuesta de un lote del buffer y espera a que salgan las burbujas.
+    La respuesta y el avance quedan en el meta del lote: si el proceso cae a mitad,
+    el lote re-entregado retoma desde la burbuja siguiente sin volver a consultar al
+    orquestador (que ya lo marcó como duplicado).
+    """
+    async def mark_sent(index: int):
+        await debounce_buffer.set_batch_meta(tenant_id, user_number, {"reply_sent": str(index + 1)})
+
+    return await outbound_sequencer.deliver(
+        reply["bubbles"], user_number, reply["business_number"], reply.get("inbound_id"), reply["correlation_id"],
+        tenant_id=tenant_id, start=start, on_sent=mark_sent,
+    )
+
+
+def _pending_reply(meta: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    """Respuesta ya calculada de un lote re-entregado (None si el lote es nuevo)."""
+    try:
+        return json.loads(meta["reply"]) if meta.get("reply") else None
+    except (TypeError, ValueError):
+        return None
 
 
 # --- Background Task ---
-async def process_user_buffer(from_number: str, business_number: str, customer_name: Optional[str], event_id: str, provider_message_id: str, tenant_id: Optional[int] = None):
-    buffer_key, timer_key, lock_key = f"buffer:{from_number}", f"timer:{from_number}", f"active_task:{from_number}"
+async def process_user_buffer(tenant_id: Optional[int], from_number: str, items: List[dict], meta: Dict[str, str]):
+    """
+    Procesa un lote del buffer (ya reclamado por DebounceBuffer): lo reenvía al orquestador y responde.
+    Vuelve cuando la respuesta salió, así el lote se confirma (ack) después del envío.
+    """
+    pending = _pending_reply(meta)
+    if pending:
+        start = int(meta.get("reply_sent") or 0)
+        logger.info("resuming_send_sequence", correlation_id=pending.get("correlation_id"), from_number=from_number[-4:], tenant_id=tenant_id, start=start)
+        await deliver_reply(pending, from_number, tenant_id, start=start)
+        return
+
     correlation_id = str(uuid.uuid4())
     log = logger.bind(correlation_id=correlation_id, from_number=from_number[-4:], tenant_id=tenant_id)
+    business_number = meta.get("business_number")
+    customer_name = meta.get("customer_name") or None
+
+    joined_text = "\n".join([i.get("text") or "" for i in items])
+    # Extract referral from any message in the batch (usually the first one has it)
+    referral = next((i.get("referral") for i in items if i.get("referral")), None)
+
+    # We use the LAST message IDs to identify this batch in the orchestrator (deduplication)
+    current_event_id = items[-1].get("event_id")
+    current_wamid = items[-1].get("wamid") or current_event_id
+
+    inbound_event = {
+        "provider": "ycloud", 
+        "event_id": current_event_id, 
+        "provider_message_id": current_wamid,
+        "from_number": from_number, "to_number": business_number, "text": joined_text, "customer_name": customer_name,
+        "event_type": "whatsapp.inbound_message.received", "correlation_id": correlation_id,
+        "referral": referral,
+        "tenant_id": tenant_id # Pass explicit tenant_id
+    }
+
+    headers = {"X-Correlation-Id": correlation_id}
+    if INTERNAL_API_TOKEN: headers["X-Internal-Token"] = INTERNAL_API_TOKEN
+         
+    log.info("forwarding_to_orchestrator", text_preview=joined_text[:50], batch_size=len(items))
+    raw_res = await forward_to_orchestrator(inbound_event, headers)
+    log.info("orchestrator_response_received", status=raw_res.get("status"), send=raw_res.get("send"))
+    
     try:
-        while True:
-            # 1. Debounce Phase: Wait until user stopped typing
-            while True:
-                await asyncio.sleep(2)
-                if redis_client.ttl(timer_key) <= 0: break
-            
-            # 2. Atomic Fetch: How many messages are we starting with?
-            L = redis_client.llen(buffer_key)
-            if L == 0: break
-            
-            raw_items = redis_client.lrange(buffer_key, 0, L-1)
-            parsed_items = []
-            for item in raw_items:
-                try:
-                    parsed_items.append(json.loads(item))
-                except:
-                    # Fallback for legacy items or unexpected formats
-                    parsed_items.append({"text": item, "wamid": provider_message_id, "event_id": event_id})
-            
-            joined_text = "\n".join([i["text"] for i in parsed_items])
-            # Extract referral from any message in the batch (usually the first one has it)
-            referral = next((i.get("referral") for i in parsed_items if i.get("referral")), None)
-            
-            # We use the LAST message IDs to identify this batch in the orchestrator (deduplication)
-            current_event_id = parsed_items[-1].get("event_id") or event_id
-            current_wamid = parsed_items[-1].get("wamid") or provider_message_id
-
-            inbound_event = {
-                "provider": "ycloud", 
-                "event_id": current_event_id, 
-                "provider_message_id": current_wamid,
-                "from_number": from_number, "to_number": business_number, "text": joined_text, "customer_name": customer_name,
-                "event_type": "whatsapp.inbound_message.received", "correlation_id": correlation_id,
-                "referral": referral,
-                "tenant_id": tenant_id # Pass explicit tenant_id
+        orch_res = OrchestratorResult(**raw_res)
+    except Exception as e:
+        # Not retryable: the batch is acknowledged to avoid a stuck conversation
+        log.error("orchestrator_parse_error", error=str(e), raw=raw_res)
+        return
+
+    if orch_res.status == "duplicate":
+        log.info("ignoring_duplicate_response")
+        return
+
+    if orch_res.send:
+        msgs = orch_res.messages
+        if not msgs and orch_res.text:
+            msgs = [OrchestratorMessage(text=orch_res.text)]
+        
+        bubbles = plan_bubbles(msgs) if msgs else []
+        if bubbles:
+            img_count = len([m for m in msgs if m.imageUrl])
+            log.info("starting_send_sequence", count=len(msgs), images_found=img_count)
+            reply = {
+                "bubbles": bubbles, "business_number": business_number,
+                "inbound_id": current_event_id, "correlation_id": correlation_id,
             }
+            await debounce_buffer.set_batch_meta(tenant_id, from_number, {"reply": json.dumps(reply), "reply_sent": "0"})
+            result = await deliver_reply(reply, from_number, tenant_id)
+            log.info("send_sequence_delivered", **result)
 
-            headers = {"X-Correlation-Id": correlation_id}
-            if INTERNAL_API_TOKEN: headers["X-Internal-Token"] = INTERNAL_API_TOKEN
-                 
-            log.info("forwarding_to_orchestrator", text_preview=joined_text[:50])
-            raw_res = await forward_to_orchestrator(inbound_event, headers)
-            log.info("orchestrator_response_received", status=raw_res.get("status"), send=raw_res.get("send"))
-            
-            try:
-                orch_res = OrchestratorResult(**raw_res)
-            except Exception as e:
-                log.error("orchestrator_parse_error", error=str(e), raw=raw_res)
-                # Cleanup and break to avoid stuck state
-                redis_client.ltrim(buffer_key, L, -1)
-                break
-
-            if orch_res.status == "duplicate":
-                log.info("ignoring_duplicate_response")
-                redis_client.ltrim(buffer_key, L, -1)
-                break
-
-            if orch_res.send:
-                msgs = orch_res.messages
-                if not msgs and orch_res.text:
-                    msgs = [OrchestratorMessage(text=orch_res.text)]
-                
-                if msgs:
-                    img_count = len([m for m in msgs if m.imageUrl])
-                    log.info("starting_send_sequence", count=len(msgs), images_found=img_count)
-                    await send_sequence(msgs, from_number, business_number, current_event_id, correlation_id, tenant_id=tenant_id)
 
-            
-            # 3. ATOMIC TRIM: Remove only the messages we just processed
-            redis_client.ltrim(buffer_key, L, -1)
-            
-            # 4. LOOP CHECK: If more messages arrived during the sequence, process them immediately
-            if redis_client.llen(buffer_key) == 0:
-                break
-            else:
-                log.info("new_messages_while_responding", remaining=redis_client.llen(buffer_key))
-                # Nueva ventana de acumulación para los mensajes que llegaron mientras respondíamos
-                redis_client.setex(timer_key, DEBOUNCE_SECONDS, "1")
+@app.on_event("startup")
+async def start_debounce_buffer():
+    await http_clients.start([ORCHESTRATOR_URL, YCloudClient.BASE_URL, "https://api.openai.com"])
+    debounce_buffer.start(process_user_buffer)
 
-    except Exception as e:
-        log.error("buffer_process_error", error=str(e))
-    finally:
-        # Buffer is handled by ltrim inside the loop or error
-        for k in [lock_key, timer_key]:
-            try:
-                redis_client.delete(k)
-            except:
-                pass
+
+@app.on_event("shutdown")
+async def stop_debounce_buffer():
+    await debounce_buffer.stop()
+    await outbound_sequencer.stop()
+    await http_clients.aclose()
+    try:
+        await redis_client.close()
+    except Exception:
+        pass
 
 # --- Endpoints ---
 @app.get("/metrics")
 def metrics(): return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
+@app.get("/metrics/http-clients")
+def http_clients_metrics(): return http_clients.get_stats()
+
+@app.get("/metrics/outbound")
+def outbound_metrics(): return outbound_sequencer.get_stats()
+
 @app.get("/ready")
 def ready():
     if not YCLOUD_WEBHOOK_SECRET: raise HTTPException(status_code=503, detail="Configuration missing")
@@ -383,17 +385,14 @@ async def ycloud_webhook(request: Request, tenant_id: str = None):
         wamid = msg.get("wamid") or event.get("id") or ""
         if wamid:
             dedup_key = f"wamid_seen:{tenant_int}:{wamid}"
-            if redis_client.get(dedup_key):
+            if not await redis_client.set(dedup_key, "1", ex=86400, nx=True):  # 24h TTL
                 logger.info("webhook_duplicate_ignored", wamid=wamid, tenant_id=tenant_int)
                 return {"status": "duplicate_ignored", "wamid": wamid}
-            redis_client.setex(dedup_key, 86400, "1")  # 24h TTL
         
         # A. Text Messages -> Buffer (Debounce) y mismo flujo para transcripción de audio
         if msg_type == "text":
             text = msg.get("text", {}).get("body")
             if text:
-                buffer_key, timer_key, lock_key = f"buffer:{from_n}", f"timer:{from_n}", f"active_task:{from_n}"
-                
                 # Payload enriquecido con referral (Spec Meta Attribution)
                 payload_data = {
                     "text": text,
@@ -406,12 +405,9 @@ async def ycloud_webhook(request: Request, tenant_id: str = None):
                 if referral:
                     payload_data["referral"] = referral
 
-                redis_client.rpush(buffer_key, json.dumps(payload_data))
-                redis_client.setex(timer_key, DEBOUNCE_SECONDS, "1")
-                if not redis_client.get(lock_key):
-                    redis_client.setex(lock_key, 60, "1")
-                    asyncio.create_task(process_user_buffer(from_n, to_n, name, event.get("id"), wamid, tenant_id=tenant_int))
-                return {"status": "buffering_started", "correlation_id": correlation_id}
+                buffered = await debounce_buffer.append(tenant_int, from_n, payload_data, business_number=to_n, customer_name=name)
+                status = "buffering_started" if buffered == 1 else "buffering_updated"
+                return {"status": status, "correlation_id": correlation_id}
             return {"status": "buffering_updated", "correlation_id": correlation_id}
 
         # A.2 Audio -> Transcribir y usar el MISMO buffer que el texto (misma lógica, misma dedup)
@@ -421,17 +417,13 @@ async def ycloud_webhook(request: Request, tenant_id: str = None):
                 logger.info("audio_received_starting_transcription", correlation_id=correlation_id, tenant_id=tenant_id)
                 transcription = await transcribe_audio(node.get("link"), correlation_id, tenant_id=tenant_int)
                 if transcription and transcription.strip():
-                    buffer_key, timer_key, lock_key = f"buffer:{from_n}", f"timer:{from_n}", f"active_task:{from_n}"
-                    redis_client.rpush(buffer_key, json.dumps({
+                    buffered = await debounce_buffer.append(tenant_int, from_n, {
                         "text": transcription.strip(),
                         "wamid": msg.get("wamid") or event.get("id"),
                         "event_id": event.get("id")
-                    }))
-                    redis_client.setex(timer_key, DEBOUNCE_SECONDS, "1")
-                    if not redis_client.get(lock_key):
-                        redis_client.setex(lock_key, 60, "1")
-                        asyncio.create_task(process_user_buffer(from_n, to_n, name, event.get("id"), msg.get("wamid") or event.get("id"), tenant_id=tenant_int))
-                    return {"status": "buffering_started", "correlation_id": correlation_id, "source": "audio"}
+                    }, business_number=to_n, customer_name=name)
+                    status = "buffering_started" if buffered == 1 else "buffering_updated"
+                    return {"status": status, "correlation_id": correlation_id, "source": "audio"}
                 logger.warning("audio_transcription_empty_or_failed", correlation_id=correlation_id)
             return {"status": "ignored_type_or_empty", "type": msg_type}
         
@@ -496,7 +488,7 @@ async def ycloud_webhook(request: Request, tenant_id: str = None):
                              msgs = [OrchestratorMessage(text=orch_res.text)]
                          
                          if msgs:
-                             await send_sequence(msgs, from_n, to_n, event.get("id"), correlation_id, tenant_id=tenant_int)
+                             send_sequence(msgs, from_n, to_n, event.get("id"), correlation_id, tenant_id=tenant_int)
              except Exception as e:
                  logger.error("media_response_processing_error", error=str(e))
                  
@@ -0,0 +1,282 @@
+"""
+Outbound bubble sequencer.
+
+The webhook / debounce task used to await every bubble of a reply serially:
+typing indicator -> sleep BUBBLE_DELAY -> send -> mark_as_read, per bubble,
+holding the conversation's buffer lock for the whole reply.
+
+Now the reply is enqueued and the caller returns right away:
+- One worker per recipient (tenant, to) drains its sequences FIFO, so bubbles
+  and consecutive replies to the same user keep their order.
+- Read receipt + typing indicator are fired once per sequence, in background.
+- The typing delay is measured from the start of the previous send, so the
+  network round-trip of bubble N overlaps with the pause before bubble N+1.
+- Many recipients are served concurrently and every send takes a token from
+  its tenant's bucket (TenantRateLimiter). max_concurrency bounds the sends in
+  flight; the slot is taken per bubble, never across the pauses between them.
+
+deliver() enqueues and waits until the sequence went out, reporting each
+bubble to an on_sent callback: the debounce batch is acked only after delivery,
+and the caller can persist progress to resume a reply cut by a restart.
+"""
+import asyncio
+import re
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+import structlog
+
+logger = structlog.get_logger()
+
+MAX_BUBBLE_CHARS = 400
+
+Bubble = Tuple[str, str]  # ("image", url) | ("text", body)
+ClientFactory = Callable[[Optional[int], str], Awaitable[Any]]
+SentCallback = Callable[[int], Awaitable[None]]  # index of the bubble just handled
+
+
+def split_text(text: str, max_chars: int = MAX_BUBBLE_CHARS) -> List[str]:
+    """Safety splitter: long texts are cut at sentence boundaries into bubbles of < max_chars."""
+    if len(text) <= max_chars:
+        return [text]
+    parts, current = [], ""
+    for sentence in re.split(r'(?<=[.!?]) +', text):
+        if len(current) + len(sentence) < max_chars:
+            current += (" " + sentence if current else sentence)
+        else:
+            if current:
+                parts.append(current)
+            current = sentence
+    if current:
+        parts.append(current)
+    return parts
+
+
+def plan_bubbles(messages: List[Any]) -> List[Bubble]:
+    """Flattens orchestrator messages into ordered bubbles (image first, then its text parts)."""
+    bubbles: List[Bubble] = []
+    for msg in messages:
+        image_url = getattr(msg, "imageUrl", None)
+        text = getattr(msg, "text", None)
+        if image_url:
+            bubbles.append(("image", image_url))
+        if text:
+            bubbles.extend(("text", part) for part in split_text(text))
+    return bubbles
+
+
+class TenantRateLimiter:
+    """Token bucket per tenant: `rate_per_second` sustained sends with bursts up to `burst`."""
+
+    def __init__(self, rate_per_second: float, burst: int):
+        self.rate = rate_per_second
+        self.burst = burst
+        self._buckets: Dict[Optional[int], List[float]] = {}
+
+    async def acquire(self, tenant_id: Optional[int]) -> float:
+        """Waits for a token; returns the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            now = time.monotonic()
+            bucket = self._buckets.setdefault(tenant_id, [float(self.burst), now])
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return waited
+            pause = (1 - bucket[0]) / self.rate
+            waited += pause
+            await asyncio.sleep(pause)
+
+
+@dataclass
+class OutboundSequence:
+    tenant_id: Optional[int]
+    to: str
+    business_number: str
+    inbound_id: Optional[str]
+    correlation_id: str
+    bubbles: List[Bubble]
+    enqueued_at: float = field(default_factory=time.monotonic)
+    # First bubble to send (a resumed reply skips what already went out, and its receipts)
+    start: int = 0
+    on_sent: Optional[SentCallback] = None
+    done: Optional[asyncio.Future] = None
+    sent: int = 0
+    failed: int = 0
+
+
+class OutboundSequencer:
+    def __init__(
+        self,
+        client_factory: ClientFactory,
+        bubble_delay_seconds: float,
+        rate_limiter: TenantRateLimiter,
+        max_concurrency: int = 50,
+    ):
+        self._client_factory = client_factory
+        self.bubble_delay = bubble_delay_seconds
+        self.rate_limiter = rate_limiter
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._queues: Dict[Tuple[Optional[int], str], Deque[OutboundSequence]] = {}
+        self._workers: Dict[Tuple[Optional[int], str], asyncio.Task] = {}
+        self._background: set = set()
+        self._stats = {
+            "sequences_enqueued": 0, "sequences_sent": 0, "bubbles_sent": 0, "bubbles_failed": 0,
+            "receipts_failed": 0, "rate_limited_seconds": 0.0, "queue_wait_max_seconds": 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+    def enqueue(
+        self,
+        messages: List[Any],
+        to: str,
+        business_number: str,
+        inbound_id: Optional[str],
+        correlation_id: str,
+        tenant_id: Optional[int] = None,
+    ) -> int:
+        """Queues a reply for `to`; returns the number of bubbles (0 = nothing to send)."""
+        bubbles = plan_bubbles(messages)
+        if bubbles:
+            self._enqueue(OutboundSequence(tenant_id, to, business_number, inbound_id, correlation_id, bubbles))
+        return len(bubbles)
+
+    async def deliver(
+        self,
+        bubbles: List[Bubble],
+        to: str,
+        business_number: str,
+        inbound_id: Optional[str],
+        correlation_id: str,
+        tenant_id: Optional[int] = None,
+        start: int = 0,
+        on_sent: Optional[SentCallback] = None,
+    ) -> Dict[str, int]:
+        """Queues planned bubbles (from `start`) and waits until they went out. Returns sent/failed counts."""
+        if start >= len(bubbles):
+            return {"sent": 0, "failed": 0}
+        seq = OutboundSequence(
+            tenant_id, to, business_number, inbound_id, correlation_id, [tuple(b) for b in bubbles],
+            start=start, on_sent=on_sent, done=asyncio.get_running_loop().create_future(),
+        )
+        self._enqueue(seq)
+        await seq.done
+        return {"sent": seq.sent, "failed": seq.failed}
+
+    def _enqueue(self, seq: OutboundSequence):
+        key = (seq.tenant_id, seq.to)
+        self._queues.setdefault(key, deque()).append(seq)
+        self._stats["sequences_enqueued"] += 1
+        if key not in self._workers:
+            self._workers[key] = asyncio.create_task(self._drain(key))
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+    async def _drain(self, key):
+        queue = self._queues[key]
+        seq = None
+        try:
+            while queue:
+                seq = queue.popleft()
+                self._stats["queue_wait_max_seconds"] = max(
+                    self._stats["queue_wait_max_seconds"], round(time.monotonic() - seq.enqueued_at, 3)
+                )
+                try:
+                    await self._run_sequence(seq)
+                except Exception as e:
+                    logger.error("sequence_error", error=str(e), correlation_id=seq.correlation_id, tenant_id=seq.tenant_id)
+                if seq.done and not seq.done.done():
+                    seq.done.set_result(None)
+                seq = None
+        finally:
+            self._workers.pop(key, None)
+            # Cancelled (shutdown): callers waiting in deliver() must not hang; their batch stays unacked
+            for pending in ([seq] if seq else []) + list(queue):
+                if pending.done and not pending.done.done():
+                    pending.done.cancel()
+            if not queue:
+                self._queues.pop(key, None)
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _receipts(self, client, seq: OutboundSequence):
+        results = await asyncio.gather(
+            client.mark_as_read(seq.inbound_id, seq.correlation_id),
+            client.typing_indicator(seq.inbound_id, seq.correlation_id),
+            return_exceptions=True,
+        )
+        self._stats["receipts_failed"] += sum(1 for r in results if isinstance(r, Exception))
+
+    async def _run_sequence(self, seq: OutboundSequence):
+        client = await self._client_factory(seq.tenant_id, seq.business_number)
+        if seq.inbound_id and seq.start == 0:
+            self._spawn(self._receipts(client, seq))
+
+        loop = asyncio.get_running_loop()
+        next_send_at = loop.time() + self.bubble_delay
+        for index in range(seq.start, len(seq.bubbles)):
+            kind, value = seq.bubbles[index]
+            # The typing pause and the tenant bucket wait hold no concurrency slot
+            await asyncio.sleep(max(0.0, next_send_at - loop.time()))
+            self._stats["rate_limited_seconds"] += await self.rate_limiter.acquire(seq.tenant_id)
+            next_send_at = loop.time() + self.bubble_delay
+            async with self._semaphore:
+                try:
+                    if kind == "image":
+                        await client.send_image(seq.to, value, seq.correlation_id)
+                    else:
+                        await client.send_text(seq.to, value, seq.correlation_id)
+                    seq.sent += 1
+                    self._stats["bubbles_sent"] += 1
+                except Exception as e:
+                    seq.failed += 1
+                    self._stats["bubbles_failed"] += 1
+                    logger.error("sequence_step_error", error=str(e), kind=kind, correlation_id=seq.correlation_id, tenant_id=seq.tenant_id)
+            if seq.on_sent:
+                try:
+                    await seq.on_sent(index)
+                except Exception as e:
+                    logger.warning("sequence_progress_error", error=str(e), correlation_id=seq.correlation_id)
+        self._stats["sequences_sent"] += 1
+
+    # ------------------------------------------------------------------
+    # Lifecycle / telemetry
+    # ------------------------------------------------------------------
+    async def stop(self, timeout: float = 30.0):
+        """Lets queued replies finish (up to timeout), then cancels what is left."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            # Receipt tasks are spawned by running workers, so re-collect until nothing is left
+            pending = set(self._workers.values()) | set(self._background)
+            if not pending:
+                return
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                for task in pending:
+                    task.cancel()
+                logger.warning("outbound_sequencer_stop_cancelled", pending=len(pending))
+                return
+            await asyncio.wait(pending, timeout=remaining)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "rate_limited_seconds": round(self._stats["rate_limited_seconds"], 3),
+            "active_recipients": len(self._workers),
+            "queued_sequences": sum(len(q) for q in self._queues.values()),
+            "max_concurrency": self.max_concurrency,
+            "bubble_delay_seconds": self.bubble_delay,
+            "tenant_rate_per_second": self.rate_limiter.rate,
+            "tenant_burst": self.rate_limiter.burst,
+        }
@@ -4,6 +4,8 @@ from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_excep
 from typing import Optional
 import structlog
 
+from http_clients import http_clients
+
 logger = structlog.get_logger()
 
 class YCloudClient:
@@ -23,7 +25,7 @@ class YCloudClient:
         retry=retry_if_exception_type(httpx.HTTPError)
     )
     async def _post(self, endpoint: str, json_data: dict, correlation_id: str):
-        async with httpx.AsyncClient(timeout=httpx.Timeout(20.0, connect=5.0)) as client:
+        async with http_clients.session(timeout=httpx.Timeout(20.0, connect=5.0)) as client:
             url = f"{self.BASE_URL}{endpoint}"
             response = await client.post(url, json=json_data, headers=self.headers)
             response.raise_for_status()
@@ -62,7 +64,7 @@ class YCloudClient:
         """Fetches approved WhatsApp templates."""
         logger.info("ycloud_list_templates", business_number=self.business_number, correlation_id=correlation_id)
         # Endpoint: GET /whatsapp/templates
-        async with httpx.AsyncClient(timeout=httpx.Timeout(20.0)) as client:
+        async with http_clients.session(timeout=httpx.Timeout(20.0)) as client:
             url = f"{self.BASE_URL}/whatsapp/templates"
             response = await client.get(url, headers=self.headers)
             response.raise_for_status()